@@ -10,7 +10,8 @@ import os
 import sys
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.openapi.utils import get_openapi
 
 # เพิ่มพาธของโปรเจค
@@ -18,9 +19,12 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
 sys.path.append(project_root)
 
-from src.utils.config import API_HOST, API_PORT, API_DEBUG
+from src.utils.config import API_HOST, API_PORT, API_DEBUG, RESPONSE_COMPRESSION, RESPONSE_COMPRESSION_MIN_SIZE
+from src.utils.config import RESUME_MAX_BYTES, RESUME_MULTIPART_OVERHEAD_BYTES
 from src.utils.logger import get_logger
+from src.utils.json_codec import HAS_ORJSON
 from src.api.dependencies import verify_api_key
+from src.api.upload_limits import MultipartSizeLimitMiddleware
 from src.api.routes import base, user, jobs, chat, admin
 from src.api.routes import user_registration
 
@@ -33,6 +37,14 @@ app = FastAPI(
     description="API สำหรับระบบให้คำปรึกษาด้านอาชีพด้วย AI",
     version="1.0.0",
     dependencies=[Depends(verify_api_key)],
+    # orjson แปลง response ขนาดใหญ่ (เช่น search_results ของแชท) ได้เร็วกว่า json มาตรฐาน
+    default_response_class=ORJSONResponse if HAS_ORJSON else JSONResponse,
+)
+
+# จำกัดขนาดคำขอ multipart ก่อน FastAPI อ่านฟอร์ม (ต้องอยู่ใน CORS middleware เพื่อให้ 413 มี header ของ CORS)
+app.add_middleware(
+    MultipartSizeLimitMiddleware,
+    max_bytes=RESUME_MAX_BYTES + RESUME_MULTIPART_OVERHEAD_BYTES,
 )
 
 # เพิ่ม CORS middleware
@@ -42,8 +54,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # ให้ browser ที่เรียกข้ามโดเมนอ่าน header ที่ API ส่งกลับได้
+    expose_headers=["X-User-Token", "X-Next-Before", "X-Next-After", "ETag"],
 )
 
+# บีบอัด response ตาม Accept-Encoding ของ client (brotli ถ้าติดตั้ง brotli-asgi ไม่เช่นนั้นใช้ gzip)
+if RESPONSE_COMPRESSION:
+    try:
+        from brotli_asgi import BrotliMiddleware
+        # client ที่ไม่รองรับ br จะได้ gzip แทน
+        app.add_middleware(BrotliMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_SIZE, gzip_fallback=True)
+    except ImportError:
+        app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_SIZE)
+
 # เพิ่ม routes
 app.include_router(base.router)
 app.include_router(user.router)
@@ -103,11 +126,19 @@ async def startup_event():
             os.makedirs(dir_path, exist_ok=True)
             logger.info(f"ตรวจสอบโฟลเดอร์ {dir_path} เรียบร้อย")
         
-        # ตรวจสอบ VectorSearch
-        from src.utils.vector_search import VectorSearch
-        vector_search = VectorSearch(VECTOR_DB_DIR)
+        # ตรวจสอบ VectorSearch (โหลด instance ที่ใช้ร่วมกันไว้ล่วงหน้า)
+        from src.utils.vector_search import get_shared_vector_search
+        get_shared_vector_search()
         logger.info("ตรวจสอบ VectorSearch เรียบร้อย")
         
+        # เริ่มตรวจสอบสถานะ LLM server ใน pool
+        from src.utils.llm_pool import get_llm_pool
+        get_llm_pool().start_health_checks()
+        
+        # เริ่มคิวเขียนประวัติการสนทนา
+        from src.utils.storage import get_chat_writer
+        get_chat_writer().start()
+        
         logger.info("เริ่มต้น Career AI Advisor API สำเร็จ")
     except Exception as e:
         logger.error(f"เกิดข้อผิดพลาดในการเริ่มต้น API: {str(e)}")
@@ -117,6 +148,17 @@ async def startup_event():
 async def shutdown_event():
     """ทำงานเมื่อปิด API"""
     logger.info("กำลังปิด Career AI Advisor API...")
+    
+    from src.utils.llm_pool import get_llm_pool
+    await get_llm_pool().stop_health_checks()
+    
+    # เขียนประวัติการสนทนาที่ค้างในคิวให้หมด
+    from src.utils.storage import get_chat_writer
+    await get_chat_writer().close()
+    
+    # ยกเลิกงานเบื้องหลังที่ยังรอคิว
+    from src.utils.job_scheduler import get_job_scheduler
+    get_job_scheduler().shutdown()
 
 # รัน API ถ้าเรียกใช้โดยตรง
 if __name__ == "__main__":
@@ -6,14 +6,18 @@ Dependencies for the Career AI Advisor API.
 This module defines the dependencies used in the API.
 """
 
-from typing import Optional
-from fastapi import Header, HTTPException, Depends
+from typing import Optional, AsyncIterator
+from fastapi import Header, HTTPException, Depends, Response, BackgroundTasks
 from fastapi.security import APIKeyHeader
 
-from src.utils.config import API_KEY
+from src.utils.config import API_KEY, ALLOW_DEFAULT_USER
 from src.utils.logger import get_logger
 from src.utils.vector_search import VectorSearch
-from src.utils.storage import get_app_user
+from src.utils.storage import (
+    get_user, user_exists, authenticate_user, DEFAULT_USER_ID,
+    save_resume_stream, ResumeUploadError, ResumeTooLargeError
+)
+from src.utils.user_store import is_valid_user_id
 
 # ตั้งค่า logger
 logger = get_logger("api.dependencies")
@@ -66,16 +70,137 @@ def get_vector_search_dependency():
             detail=f"เกิดข้อผิดพลาดในการสร้าง VectorSearch: {str(e)}",
         )
 
-async def get_user_from_header():
+def _resolve_user_id(x_user_id: Optional[str], x_user_token: Optional[str], allow_unregistered: bool) -> str:
+    """
+    ระบุผู้ใช้จาก header และยืนยันตัวตน (ใช้ร่วมกันใน get_current_user_id และ get_registering_user_id)
+    
+    Args:
+        x_user_id: รหัสผู้ใช้จาก header
+        x_user_token: token จาก header
+        allow_unregistered: ให้รหัสที่ยังไม่มีผู้ใช้ผ่านได้โดยไม่ต้องมี token (เฉพาะการลงทะเบียน)
+        
+    Returns:
+        str: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+    """
+    if not x_user_id:
+        if ALLOW_DEFAULT_USER:
+            return DEFAULT_USER_ID
+        raise HTTPException(status_code=401, detail="กรุณาระบุผู้ใช้ (X-User-ID)")
+    
+    if not is_valid_user_id(x_user_id):
+        raise HTTPException(status_code=400, detail="รหัสผู้ใช้ไม่ถูกต้อง")
+    
+    if not user_exists(x_user_id):
+        if allow_unregistered:
+            return x_user_id
+        raise HTTPException(
+            status_code=401,
+            detail="ยังไม่ได้ลงทะเบียนผู้ใช้นี้",
+            headers={"WWW-Authenticate": "X-User-Token header"},
+        )
+    
+    if not authenticate_user(x_user_id, x_user_token):
+        logger.warning(f"มีการพยายามเข้าถึงข้อมูลผู้ใช้ {x_user_id} ด้วย token ที่ไม่ถูกต้อง")
+        raise HTTPException(
+            status_code=401,
+            detail="token ของผู้ใช้ไม่ถูกต้อง",
+            headers={"WWW-Authenticate": "X-User-Token header"},
+        )
+    
+    return x_user_id
+
+async def get_current_user_id(
+    x_user_id: Optional[str] = Header(None, description="รหัสผู้ใช้"),
+    x_user_token: Optional[str] = Header(None, description="token ที่ได้รับตอนลงทะเบียน"),
+) -> str:
+    """
+    ระบุผู้ใช้ของคำขอจาก header X-User-ID และยืนยันตัวตนด้วย X-User-Token
+    
+    คำขอที่ไม่มี X-User-ID ใช้ผู้ใช้เริ่มต้น (ถ้า ALLOW_DEFAULT_USER เปิดอยู่)
+    รหัสอื่นต้องเป็นผู้ใช้ที่ลงทะเบียนแล้วและมี token ที่ถูกต้อง
+    
+    Args:
+        x_user_id: รหัสผู้ใช้จาก header
+        x_user_token: token จาก header
+        
+    Returns:
+        str: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+    """
+    return _resolve_user_id(x_user_id, x_user_token, allow_unregistered=False)
+
+async def get_registering_user_id(
+    x_user_id: Optional[str] = Header(None, description="รหัสผู้ใช้"),
+    x_user_token: Optional[str] = Header(None, description="token ที่ได้รับตอนลงทะเบียน"),
+) -> str:
+    """
+    ระบุผู้ใช้สำหรับ endpoint ลงทะเบียน: รหัสที่ยังไม่มีผู้ใช้ผ่านได้เพื่อลงทะเบียนด้วยรหัสนั้น
+    (การลงทะเบียนสร้างผู้ใช้และ token พร้อมกัน และล้มเหลวถ้ามีผู้อื่นลงทะเบียนรหัสนั้นไปก่อน)
+    ผู้ใช้ที่มีข้อมูลแล้วต้องมี token ที่ถูกต้อง
+    
+    Args:
+        x_user_id: รหัสผู้ใช้จาก header
+        x_user_token: token จาก header
+        
+    Returns:
+        str: รหัสผู้ใช้
+    """
+    return _resolve_user_id(x_user_id, x_user_token, allow_unregistered=True)
+
+def attach_user_token(response: Response, token: str) -> None:
+    """
+    ส่ง token ของผู้ใช้ที่เพิ่งลงทะเบียนกลับใน header X-User-Token (ส่งครั้งเดียว ระบบเก็บเฉพาะ hash)
+    
+    Args:
+        response: response ของคำขอ
+        token: token ของผู้ใช้
+    """
+    response.headers["X-User-Token"] = token
+
+async def store_resume_upload(
+    user_id: str,
+    chunks: AsyncIterator[bytes],
+    filename: str,
+    background_tasks: BackgroundTasks,
+) -> str:
+    """
+    บันทึก Resume ที่อัปโหลดแบบ streaming แล้วตั้งงานเบื้องหลังดึงทักษะจาก Resume เข้าโปรไฟล์
+    (งานเบื้องหลังทำงานหลังส่ง response แล้ว)
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        chunks: ข้อมูลของไฟล์ทีละ chunk
+        filename: ชื่อไฟล์ที่อัปโหลด
+        background_tasks: งานเบื้องหลังของคำขอ
+        
+    Returns:
+        str: พาธของไฟล์ Resume
+    """
+    from src.utils.resume_parser import enrich_user_from_resume
+    
+    try:
+        resume_path = await save_resume_stream(user_id, chunks, filename)
+    except ResumeTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ResumeUploadError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการบันทึกไฟล์ Resume: {str(e)}")
+        raise HTTPException(status_code=500, detail="ไม่สามารถบันทึกไฟล์ Resume ได้")
+    
+    background_tasks.add_task(enrich_user_from_resume, user_id, resume_path)
+    return resume_path
+
+async def get_user_from_header(user_id: str = Depends(get_current_user_id)):
     """
     ดึงข้อมูลผู้ใช้จาก header
     
+    Args:
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+        
     Returns:
-        Optional[Dict[str, Any]]: ข้อมูลผู้ใช้ หรือ None ถ้าไม่พบ
+        Optional[User]: ข้อมูลผู้ใช้ หรือ None ถ้าไม่พบ
     """
-    # สำหรับแอปพลิเคชันนี้ใช้ผู้ใช้เดียว
-    user = get_app_user()
-    return user
+    return get_user(user_id)
 
 async def common_parameters(
     personality: Optional[str] = Header(None),
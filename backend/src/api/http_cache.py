@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP caching for read-only endpoints of the Career AI Advisor API.
+
+Responses get a weak ETag derived from the version of the data they are built
+from (the index generation the shared VectorSearch is serving), so a
+conditional GET with a matching ``If-None-Match`` is answered with 304 before
+any data is loaded. The ETag is weak because the compression middleware may
+re-encode the body; the representation is equivalent, not byte-identical.
+Serialized bodies are kept in a small in-process LRU cache keyed by the same
+ETag, so entries for old data are never served.
+"""
+
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from src.utils import json_codec
+from src.utils.config import RESPONSE_CACHE_SIZE
+from src.utils.logger import get_logger
+
+# ตั้งค่า logger
+logger = get_logger("api.http_cache")
+
+# เปลี่ยนค่านี้เมื่อรูปแบบของ response เปลี่ยน เพื่อให้ ETag เดิมใช้ไม่ได้
+RESPONSE_FORMAT_VERSION = "1"
+
+
+# จำนวนครั้งที่สร้าง response ใหม่เมื่อข้อมูลเปลี่ยนเวอร์ชันระหว่างสร้าง
+STALE_BUILD_RETRIES = 2
+
+
+class StaleVersionError(Exception):
+    """เกิดขึ้นจาก build เมื่อข้อมูลที่ใช้สร้าง response ไม่ใช่เวอร์ชันที่ใช้สร้าง ETag แล้ว"""
+
+
+def job_data_version(vector_search: Any) -> str:
+    """
+    เวอร์ชันของข้อมูลอาชีพ: เปลี่ยนเมื่อ VectorSearch ที่ใช้ร่วมกันสลับไปใช้ generation ใหม่
+    (ไม่อ่านไฟล์ ใช้ generation ที่กำลังใช้ค้นหาอยู่)
+
+    Args:
+        vector_search: VectorSearch ที่ใช้สร้าง response
+
+    Returns:
+        str: เวอร์ชันของข้อมูล
+    """
+    return hashlib.sha1(vector_search.data_version().encode('utf-8')).hexdigest()[:16]
+
+
+def make_etag(version: str, request: Request) -> str:
+    """
+    สร้าง weak ETag จากเวอร์ชันของข้อมูลและ URL ของคำขอ
+    (weak เพราะ middleware อาจบีบอัด body ด้วย encoding ต่างกัน เนื้อหาเท่ากันแต่ไบต์ไม่เท่ากัน)
+
+    Args:
+        version: เวอร์ชันของข้อมูลที่ใช้สร้าง response
+        request: คำขอ
+
+    Returns:
+        str: ETag (W/"...")
+    """
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    key = f"{RESPONSE_FORMAT_VERSION}:{version}:{request.url.path}?{query}"
+    return 'W/"' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    ตรวจสอบ header If-None-Match (เทียบแบบ weak ตาม RFC 7232)
+
+    Args:
+        request: คำขอ
+        etag: ETag ของ response ปัจจุบัน
+
+    Returns:
+        bool: True ถ้า client มี response นี้อยู่แล้ว
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ResponseCache:
+    """แคช response ที่แปลงเป็น JSON แล้ว (LRU ตาม ETag)"""
+
+    def __init__(self, max_entries: int = 256):
+        """
+        Args:
+            max_entries: จำนวน response สูงสุดที่เก็บ (0 = ไม่เก็บ)
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag: str) -> Optional[bytes]:
+        """
+        ดึง response จากแคช
+
+        Args:
+            etag: ETag ของ response
+
+        Returns:
+            Optional[bytes]: เนื้อหาของ response หรือ None ถ้าไม่มีในแคช
+        """
+        with self._lock:
+            body = self._entries.get(etag)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return body
+
+    def put(self, etag: str, body: bytes) -> None:
+        """
+        เก็บ response ลงแคช
+
+        Args:
+            etag: ETag ของ response
+            body: เนื้อหาของ response
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[etag] = body
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """ล้างแคชทั้งหมด"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        สถิติของแคช
+
+        Returns:
+            Dict[str, Any]: จำนวน response ในแคช, hits และ misses
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(len(body) for body in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    ดึงแคช response ที่ใช้ร่วมกันทั้งแอป
+
+    Returns:
+        ResponseCache: แคช response
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+    return _response_cache
+
+
+async def cached_json_response(request: Request,
+                               version: Callable[[], str],
+                               build: Callable[[str], Any],
+                               max_age: int) -> Response:
+    """
+    ตอบ GET แบบมี ETag และ Cache-Control: ตอบ 304 ถ้า If-None-Match ตรง, ใช้ response ในแคชถ้ามี
+    ไม่เช่นนั้นเรียก build(version) (ใน thread) แล้วเก็บผลลงแคช
+
+    build ต้องสร้างข้อมูลจากเวอร์ชันที่ได้รับ ถ้าข้อมูลเปลี่ยนเวอร์ชันระหว่างสร้างให้โยน StaleVersionError
+    แล้วจะสร้างใหม่ด้วยเวอร์ชันล่าสุด เพื่อไม่ให้ response ถูกเก็บภายใต้ ETag ของข้อมูลอีกเวอร์ชัน
+
+    Args:
+        request: คำขอ
+        version: ฟังก์ชันที่คืนเวอร์ชันปัจจุบันของข้อมูลที่ใช้สร้าง response
+        build: ฟังก์ชันที่สร้างข้อมูลของ response จากเวอร์ชันที่ระบุ (โยน HTTPException ได้ ซึ่งจะไม่ถูกแคช)
+        max_age: เวลาที่ client และ CDN ใช้ response ได้โดยไม่ต้องตรวจสอบซ้ำ (วินาที)
+
+    Returns:
+        Response: response ของคำขอ
+
+    Raises:
+        HTTPException: 503 ถ้าข้อมูลเปลี่ยนเวอร์ชันระหว่างสร้างติดต่อกันเกิน STALE_BUILD_RETRIES ครั้ง
+    """
+    cache = get_response_cache()
+    for _ in range(STALE_BUILD_RETRIES + 1):
+        current = version()
+        etag = make_etag(current, request)
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        body = cache.get(etag)
+        if body is None:
+            try:
+                content = await asyncio.to_thread(build, current)
+            except StaleVersionError:
+                logger.info(f"ข้อมูลเปลี่ยนเวอร์ชันระหว่างสร้าง response ของ {request.url.path} จะสร้างใหม่")
+                continue
+            body = json_codec.dumps(jsonable_encoder(content), pretty=False)
+            cache.put(etag, body)
+
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    raise HTTPException(status_code=503, detail="ข้อมูลกำลังถูกอัปเดต กรุณาลองใหม่", headers={"Retry-After": "1"})
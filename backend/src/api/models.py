@@ -138,6 +138,7 @@ class ResumeUploadResponse(BaseModel):
     file_name: str = Field(..., description="ชื่อไฟล์")
     content_type: str = Field(..., description="ประเภทของไฟล์")
     message: str = Field(..., description="ข้อความแสดงผล")
+    file_size: Optional[int] = Field(None, description="ขนาดไฟล์ (ไบต์)")
 
 #############################
 # ข้อมูลการวิเคราะห์ Resume
@@ -227,6 +228,7 @@ class ChatRequest(BaseModel):
     personality: PersonalityType = Field(PersonalityType.FRIENDLY, description="บุคลิกของ AI")
     use_combined_search: bool = Field(True, description="ใช้การค้นหาแบบรวมหรือไม่")
     use_fine_tuned: bool = Field(False, description="ใช้โมเดล fine-tuned หรือไม่")
+    chat_id: Optional[str] = Field(None, description="รหัสการสนทนาเดิม (ถ้าต้องการคุยต่อจากบทสนทนาก่อนหน้า)")
 
 class ChatHistory(BaseModel):
     """ประวัติการสนทนา"""
@@ -234,9 +236,19 @@ class ChatHistory(BaseModel):
     user_id: Optional[str] = Field(None, description="รหัสผู้ใช้ (ถ้ามี)")
     messages: List[ChatMessage] = Field([], description="ข้อความในการสนทนา")
     timestamp: str = Field(default_factory=lambda: datetime.now().isoformat(), description="เวลาที่สนทนา")
+    personality: Optional[str] = Field(None, description="บุคลิกของ AI ที่ใช้ในการสนทนา")
+
+class ChatHistorySummary(BaseModel):
+    """สรุปประวัติการสนทนา (ไม่มีเนื้อหาข้อความ)"""
+    id: str = Field(..., description="รหัสการสนทนา")
+    user_id: Optional[str] = Field(None, description="รหัสผู้ใช้ (ถ้ามี)")
+    timestamp: str = Field(..., description="เวลาที่สนทนาล่าสุด")
+    personality: Optional[str] = Field(None, description="บุคลิกของ AI ที่ใช้ในการสนทนา")
+    message_count: int = Field(0, description="จำนวนข้อความ")
+    preview: str = Field("", description="ข้อความแรกของผู้ใช้ (ตัดให้สั้น)")
 
 class ChatResponse(BaseModel):
     """การตอบกลับการสนทนา"""
     chat_id: str = Field(..., description="รหัสการสนทนา")
     message: str = Field(..., description="ข้อความตอบกลับ")
-    search_results: List[Union[Dict[str, Any], JobSearchResult, AdviceSearchResult]] = Field([], description="ผลลัพธ์การค้นหาที่เกี่ยวข้อง")
\ No newline at end of file
+    search_results: List[Union[Dict[str, Any], JobSearchResult, AdviceSearchResult]] = Field([], description="ผลลัพธ์การค้นหาที่เกี่ยวข้อง (ค่าเริ่มต้นเฉพาะ id, type, title, similarity_score)")
\ No newline at end of file
@@ -6,11 +6,15 @@ Admin routes for the Career AI Advisor API.
 This module defines the routes for administration tasks.
 """
 
-from typing import List, Dict, Any, Optional
+import os
+import secrets
+from typing import List, Dict, Any, Optional, Type
 from fastapi import APIRouter, HTTPException, Depends, Query, Path, Body
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
 
+from src.api.dependencies import api_key_header
 from src.utils.fine_tune import FineTuneHelper
+from src.utils.job_scheduler import get_job_scheduler, SCRAPE_SOURCES
 from src.utils.logger import get_logger
 from src.utils.config import API_KEY
 
@@ -31,6 +35,9 @@ class FineTuneRequest(BaseModel):
     """
     num_examples: int = 100
     use_existing_file: Optional[str] = None
+    use_llm: bool = False  # สร้างคำตอบด้วย LLM แทนคำตอบจากเทมเพลต
+    concurrency: Optional[int] = None  # จำนวนคำขอ LLM พร้อมกัน (เฉพาะ use_llm)
+    resume_file: Optional[str] = None  # ชื่อไฟล์ .jsonl เดิมในโฟลเดอร์ fine-tuning ที่ต้องการสร้างต่อ (เฉพาะ use_llm)
 
 class FineTuneResponse(BaseModel):
     """
@@ -40,6 +47,8 @@ class FineTuneResponse(BaseModel):
     message: str
     file_path: Optional[str] = None
     examples_count: Optional[int] = None
+    job_id: Optional[str] = None
+    status: Optional[str] = None
     error: Optional[str] = None
 
 class StartFineTuneRequest(BaseModel):
@@ -61,9 +70,9 @@ class StartFineTuneResponse(BaseModel):
     error: Optional[str] = None
 
 # ฟังก์ชันสำหรับตรวจสอบ admin API key
-async def verify_admin_api_key(api_key: str = Depends(lambda: API_KEY)):
+async def verify_admin_api_key(api_key: Optional[str] = Depends(api_key_header)):
     """
-    ตรวจสอบ admin API key
+    ตรวจสอบ admin API key จาก header X-API-Key (ฟังก์ชัน admin ใช้ไม่ได้ถ้าไม่ได้กำหนด API_KEY)
     
     Args:
         api_key: API key จาก header
@@ -79,6 +88,15 @@ async def verify_admin_api_key(api_key: str = Depends(lambda: API_KEY)):
             detail="ไม่ได้กำหนด API key สำหรับเข้าถึงฟังก์ชัน admin",
         )
     
+    # เทียบแบบใช้เวลาคงที่ เพื่อไม่ให้เดา API key จากเวลาตอบสนองได้
+    if not api_key or not secrets.compare_digest(api_key.encode('utf-8'), API_KEY.encode('utf-8')):
+        logger.warning("มีการพยายามเข้าถึงฟังก์ชัน admin ด้วย API key ที่ไม่ถูกต้อง")
+        raise HTTPException(
+            status_code=401,
+            detail="API key ไม่ถูกต้อง",
+            headers={"WWW-Authenticate": "API key header"},
+        )
+    
     return True
 
 @router.post("/fine-tune/prepare", response_model=FineTuneResponse)
@@ -104,7 +122,6 @@ async def prepare_fine_tune_data(
             logger.info(f"ใช้ไฟล์ที่มีอยู่แล้ว: {request.use_existing_file}")
             
             # ตรวจสอบว่าไฟล์มีอยู่จริงหรือไม่
-            import os
             if not os.path.exists(request.use_existing_file):
                 return FineTuneResponse(
                     success=False,
@@ -123,19 +140,33 @@ async def prepare_fine_tune_data(
                 examples_count=examples_count
             )
         
-        # สร้างชุดข้อมูลใหม่
-        file_path = helper.prepare_fine_tune_data(num_examples=request.num_examples)
-        
-        # นับจำนวนตัวอย่างในไฟล์
-        with open(file_path, 'r', encoding='utf-8') as f:
-            examples_count = sum(1 for _ in f)
+        # สร้างชุดข้อมูลใหม่เป็นงานเบื้องหลัง ติดตามความคืบหน้าได้ที่ /admin/jobs/{job_id}
+        if request.use_llm:
+            if request.resume_file:
+                try:
+                    file_path = helper.resolve_output_file(request.resume_file)
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+            else:
+                file_path = helper.new_output_file()
+            job = get_job_scheduler().submit("fine_tune_generate", {
+                "num_examples": request.num_examples,
+                "concurrency": request.concurrency,
+                "output_file": os.path.basename(file_path),
+            })
+        else:
+            file_path = None
+            job = get_job_scheduler().submit("fine_tune_prepare", {"num_examples": request.num_examples})
         
         return FineTuneResponse(
             success=True,
-            message="สร้างชุดข้อมูล fine-tuning สำเร็จ",
+            message="เริ่มสร้างชุดข้อมูล fine-tuning เบื้องหลัง",
             file_path=file_path,
-            examples_count=examples_count
+            job_id=job["id"],
+            status=job["status"]
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"เกิดข้อผิดพลาดในการสร้างชุดข้อมูล fine-tuning: {str(e)}")
         return FineTuneResponse(
@@ -144,6 +175,25 @@ async def prepare_fine_tune_data(
             error=str(e)
         )
 
+@router.get("/fine-tune/prepare/{job_id}")
+async def get_prepare_job_status(
+    job_id: str = Path(..., description="รหัสงานสร้างชุดข้อมูล fine-tuning"),
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    ดึงความคืบหน้าของงานสร้างชุดข้อมูล fine-tuning (เหมือน /admin/jobs/{job_id})
+    
+    Args:
+        job_id: รหัสงาน
+        
+    Returns:
+        Dict[str, Any]: สถานะ ความคืบหน้า และผลลัพธ์ของงาน
+    """
+    job = get_job_scheduler().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบงาน: {job_id}")
+    return job
+
 @router.post("/fine-tune/start", response_model=StartFineTuneResponse)
 async def start_fine_tuning(
     request: StartFineTuneRequest,
@@ -208,4 +258,249 @@ async def get_model_status(
         "fine_tuned_model": FINE_TUNED_MODEL or "ไม่ได้กำหนด",
         "use_fine_tuned": USE_FINE_TUNED,
         "status": "active" if FINE_TUNED_MODEL and USE_FINE_TUNED else "inactive"
-    }
\ No newline at end of file
+    }
+
+@router.get("/llm/queue")
+async def get_llm_queue_stats(
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    ดึงสถิติคิวคำขอ LLM (จำนวนที่รอ เวลารอ และจำนวนที่ถูกปฏิเสธ)
+    
+    Returns:
+        Dict[str, Any]: สถิติของคิว LLM
+    """
+    from src.utils.llm_admission import get_admission_controller
+    
+    return get_admission_controller().get_stats()
+
+@router.get("/llm/endpoints")
+async def get_llm_endpoint_stats(
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    ดึงสถานะของ LLM server ใน pool (circuit, คำขอค้าง, เวลาตอบสนองเฉลี่ย)
+    
+    Returns:
+        Dict[str, Any]: สถิติของ pool
+    """
+    from src.utils.llm_pool import get_llm_pool
+    
+    return get_llm_pool().get_stats()
+
+@router.get("/llm/routing")
+async def get_llm_routing_stats(
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    ดึงสถิติการเลือกระดับการตอบคำถาม (คำตอบสำเร็จรูป โมเดลเล็ก โมเดลเต็ม)
+    
+    Returns:
+        Dict[str, Any]: สถิติของ QueryRouter
+    """
+    from src.utils.model_router import get_query_router
+    
+    return get_query_router().get_stats()
+
+@router.get("/chat/writer")
+async def get_chat_writer_stats(
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    ดึงสถิติคิวเขียนประวัติการสนทนา (จำนวนที่ค้าง จำนวนชุด และขนาดชุดเฉลี่ย)
+
+    Returns:
+        Dict[str, Any]: สถิติของ ChatHistoryWriter
+    """
+    from src.utils.storage import get_chat_writer
+
+    return get_chat_writer().get_stats()
+
+@router.get("/cache/responses")
+async def get_response_cache_stats(
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    ดึงสถิติแคช response ของ endpoint ที่อ่านอย่างเดียว (จำนวน response ขนาด hits และ misses)
+
+    Returns:
+        Dict[str, Any]: สถิติของ ResponseCache
+    """
+    from src.api.http_cache import get_response_cache
+
+    return get_response_cache().stats()
+
+@router.post("/users/{user_id}/token")
+async def reissue_user_token(
+    user_id: str = Path(..., description="รหัสผู้ใช้"),
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    ออก token ใหม่ให้ผู้ใช้ (token เดิมใช้ไม่ได้อีก) สำหรับผู้ใช้ที่ทำ token หายหรือผู้ใช้เดิมที่ยังไม่มี token
+
+    Args:
+        user_id: รหัสผู้ใช้
+
+    Returns:
+        Dict[str, Any]: รหัสผู้ใช้และ token ใหม่ (ส่งครั้งเดียว ระบบเก็บเฉพาะ hash)
+    """
+    from src.utils.storage import issue_user_token
+
+    token = issue_user_token(user_id)
+    if token is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบผู้ใช้: {user_id}")
+    logger.info(f"ออก token ใหม่ให้ผู้ใช้ {user_id}")
+    return {"user_id": user_id, "token": token}
+
+class JobRequest(BaseModel):
+    """
+    คำขอสำหรับการสร้างงานเบื้องหลัง
+    """
+    type: str  # rebuild, fine_tune_prepare, fine_tune_generate, scrape
+    params: Dict[str, Any] = {}
+
+class RebuildJobParams(BaseModel):
+    """
+    พารามิเตอร์ของงาน rebuild
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    # ชื่อโมเดลบน Hugging Face เช่น BAAI/bge-m3 (ไม่รับพาธในเครื่อง)
+    model_name: Optional[str] = Field(
+        None, max_length=200, pattern=r"^[A-Za-z0-9][A-Za-z0-9_.-]*(/[A-Za-z0-9][A-Za-z0-9_.-]*)?$"
+    )
+    clear: Optional[bool] = None
+    prepare_embedding_data: Optional[bool] = None
+    batch_size: Optional[int] = Field(None, ge=1, le=4096)
+    processes: Optional[int] = Field(None, ge=1, le=64)
+
+class FineTunePrepareJobParams(BaseModel):
+    """
+    พารามิเตอร์ของงาน fine_tune_prepare
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    num_examples: int = Field(100, ge=1, le=100000)
+
+class FineTuneGenerateJobParams(BaseModel):
+    """
+    พารามิเตอร์ของงาน fine_tune_generate
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    num_examples: int = Field(100, ge=1, le=100000)
+    concurrency: Optional[int] = Field(None, ge=1, le=64)
+    # ชื่อไฟล์ .jsonl เดิมในโฟลเดอร์ fine-tuning เพื่อทำงานต่อ
+    output_file: Optional[str] = Field(None, max_length=200, pattern=r"^[A-Za-z0-9_][A-Za-z0-9_.-]*\.jsonl$")
+
+class ScrapeJobParams(BaseModel):
+    """
+    พารามิเตอร์ของงาน scrape
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    sources: Optional[List[str]] = None
+
+    @field_validator("sources")
+    @classmethod
+    def check_sources(cls, value: Optional[List[str]]) -> Optional[List[str]]:
+        unknown = [source for source in value or [] if source not in SCRAPE_SOURCES]
+        if unknown:
+            raise ValueError(f"ไม่รู้จักแหล่งข้อมูล: {', '.join(unknown)} (รองรับ: {', '.join(SCRAPE_SOURCES)})")
+        return value
+
+# ประเภทงาน -> โมเดลพารามิเตอร์ที่รับจาก /admin/jobs
+JOB_PARAM_MODELS: Dict[str, Type[BaseModel]] = {
+    "rebuild": RebuildJobParams,
+    "fine_tune_prepare": FineTunePrepareJobParams,
+    "fine_tune_generate": FineTuneGenerateJobParams,
+    "scrape": ScrapeJobParams,
+}
+
+@router.post("/jobs")
+async def create_job(
+    request: JobRequest,
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    สร้างงานเบื้องหลัง (สร้าง vector database ใหม่ เตรียมข้อมูล fine-tuning หรือเก็บข้อมูล)
+    
+    พารามิเตอร์ถูกตรวจสอบตามประเภทงาน (JOB_PARAM_MODELS) ก่อนส่งให้งาน
+    
+    Args:
+        request: ประเภทงานและพารามิเตอร์
+        
+    Returns:
+        Dict[str, Any]: ข้อมูลงานที่สร้าง
+    """
+    params_model = JOB_PARAM_MODELS.get(request.type)
+    if params_model is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"ไม่รู้จักประเภทงาน: {request.type} (รองรับ: {', '.join(JOB_PARAM_MODELS)})",
+        )
+    try:
+        params = params_model.parse_obj(request.params).dict(exclude_none=True)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"พารามิเตอร์ของงาน {request.type} ไม่ถูกต้อง: {str(e)}")
+    
+    try:
+        return get_job_scheduler().submit(request.type, params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/jobs")
+async def list_jobs(
+    status: Optional[str] = Query(None, description="กรองตามสถานะ"),
+    type: Optional[str] = Query(None, description="กรองตามประเภทงาน"),
+    limit: int = Query(50, ge=1, le=500, description="จำนวนงานสูงสุด"),
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    ดึงรายการงานเบื้องหลัง (ใหม่สุดก่อน)
+    
+    Returns:
+        List[Dict[str, Any]]: รายการงาน
+    """
+    return get_job_scheduler().list_jobs(status=status, job_type=type, limit=limit)
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str = Path(..., description="รหัสงาน"),
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    ดึงสถานะและความคืบหน้าของงานเบื้องหลัง
+    
+    Args:
+        job_id: รหัสงาน
+        
+    Returns:
+        Dict[str, Any]: ข้อมูลงาน
+    """
+    job = get_job_scheduler().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบงาน: {job_id}")
+    return job
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(
+    job_id: str = Path(..., description="รหัสงาน"),
+    _: bool = Depends(verify_admin_api_key)
+):
+    """
+    ยกเลิกงานเบื้องหลัง (งานที่กำลังทำงานจะหยุดที่จุดตรวจสอบถัดไป)
+    
+    Args:
+        job_id: รหัสงาน
+        
+    Returns:
+        Dict[str, Any]: ข้อมูลงาน
+    """
+    try:
+        job = get_job_scheduler().cancel(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบงาน: {job_id}")
+    return job
@@ -8,17 +8,24 @@ This module defines the routes for interacting with the AI.
 
 import json
 import uuid
-from typing import List, Dict, Any, Optional
-from datetime import datetime 
-from fastapi import APIRouter, HTTPException, Depends, Query, Path, Body, BackgroundTasks
+import time
+import asyncio
+from typing import List, Dict, Any, Optional, Union, Literal
+from datetime import datetime, date, timedelta
+from fastapi import APIRouter, HTTPException, Depends, Query, Path, Body, BackgroundTasks, Header, Response, Request
 from pydantic import BaseModel
 
 # นำเข้าฟังก์ชันและโมดูลที่จำเป็น
 from src.utils.llm import safe_chat_with_context  # import จากไฟล์ llm.py ใหม่
-from src.utils.vector_search import VectorSearch
-from src.utils.config import PersonalityType, VECTOR_DB_DIR
-from src.utils.storage import get_app_user, create_chat_message, save_chat_history
-from src.api.models import ChatHistory, ChatMessage, ChatResponse, ChatRequest
+from src.utils.llm_admission import LLMOverloadedError
+from src.utils.conversation import get_conversation_store
+from src.utils.model_router import get_query_router, ModelTier
+from src.utils.vector_search import get_shared_vector_search
+from src.utils.config import PersonalityType, LLM_REQUEST_DEADLINE, STATIC_CACHE_MAX_AGE
+from src.utils.storage import get_user, get_chat_owner, create_chat_message, enqueue_chat_history
+from src.api.dependencies import get_current_user_id
+from src.api.http_cache import cached_json_response
+from src.api.models import ChatHistory, ChatHistorySummary, ChatMessage, ChatResponse, ChatRequest
 from src.utils.logger import get_logger
 
 # ตั้งค่า logger
@@ -31,27 +38,184 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# สร้าง VectorSearch
+# ใช้ VectorSearch ร่วมกับ route อื่น (สลับ generation เองเมื่อมีเวอร์ชันใหม่)
 try:
-    vector_search = VectorSearch(vector_db_dir=VECTOR_DB_DIR)
+    vector_search = get_shared_vector_search()
 except Exception as e:
     logger.error(f"ไม่สามารถสร้าง VectorSearch ได้: {str(e)}")
     vector_search = None
 
+def request_deadline(timeout: Optional[float]) -> float:
+    """
+    คำนวณเวลาสิ้นสุดของคำขอ (ค่าจาก time.monotonic())
+    
+    Args:
+        timeout: เวลาที่ client ยอมรอ (วินาที) จาก header X-Request-Timeout (ไม่เกิน LLM_REQUEST_DEADLINE)
+        
+    Returns:
+        float: เวลาสิ้นสุดของคำขอ
+    """
+    if timeout is None or timeout <= 0:
+        timeout = LLM_REQUEST_DEADLINE
+    return time.monotonic() + min(timeout, LLM_REQUEST_DEADLINE)
+
+async def load_user_context(user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    โหลดข้อมูลผู้ใช้ใน thread แยก เพื่อไม่ให้การอ่านไฟล์บล็อก event loop
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        
+    Returns:
+        Optional[Dict[str, Any]]: ข้อมูลผู้ใช้ หรือ None ถ้ายังไม่มีผู้ใช้
+    """
+    user = await asyncio.to_thread(get_user, user_id)
+    return user.dict() if user else None
+
+async def ensure_chat_owner(chat_id: Optional[str], user_id: str) -> None:
+    """
+    ตรวจสอบว่าการสนทนาที่จะคุยต่อเป็นของผู้ใช้คนนี้ (การสนทนาใหม่ผ่านเสมอ)
+    
+    Args:
+        chat_id: รหัสการสนทนาจากคำขอ
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+    """
+    if not chat_id:
+        return
+    owner = await asyncio.to_thread(get_chat_owner, chat_id)
+    if owner is not None and owner != user_id:
+        raise HTTPException(status_code=404, detail="ไม่พบการสนทนา")
+
+# คีย์ของ search_results ที่ส่งกลับเป็นค่าเริ่มต้น (เนื้อหาเต็มถูกใช้ใน prompt ของ LLM ไปแล้ว)
+COMPACT_RESULT_FIELDS = ("id", "type", "title", "similarity_score")
+
+def project_search_results(results: List[Dict[str, Any]],
+                           fields: Optional[str] = None,
+                           include_context: bool = False) -> List[Dict[str, Any]]:
+    """
+    เลือกเฉพาะคีย์ของผลการค้นหาที่จะส่งกลับใน response
+    
+    Args:
+        results: ผลลัพธ์การค้นหา
+        fields: คีย์ที่ต้องการ คั่นด้วยจุลภาค (id และ type ส่งเสมอ)
+        include_context: ส่งผลลัพธ์ฉบับเต็ม (ใช้เมื่อไม่ได้ระบุ fields)
+        
+    Returns:
+        List[Dict[str, Any]]: ผลลัพธ์ที่เลือกคีย์แล้ว
+    """
+    if fields:
+        keys = list(dict.fromkeys(["id", "type"] + [key.strip() for key in fields.split(",") if key.strip()]))
+    elif include_context:
+        return results
+    else:
+        keys = COMPACT_RESULT_FIELDS
+    return [{key: result[key] for key in keys if key in result} for result in results]
+
+async def search_by_type(search_func, query: str, limit: int, result_type: str) -> List[Dict[str, Any]]:
+    """
+    ค้นหาข้อมูลใน thread แยกและเติมคีย์ type ถ้าไม่มีในผลลัพธ์
+    
+    Args:
+        search_func: ฟังก์ชันค้นหาของ VectorSearch
+        query: คำค้นหา
+        limit: จำนวนผลลัพธ์
+        result_type: ประเภทของผลลัพธ์ (job, advice)
+        
+    Returns:
+        List[Dict[str, Any]]: ผลลัพธ์การค้นหา
+    """
+    results = await asyncio.to_thread(search_func, query, limit)
+    for result in results:
+        if "type" not in result:
+            result["type"] = result_type
+    return results
+
+async def retrieve_search_results(query: str, use_combined_search: bool = True) -> List[Dict[str, Any]]:
+    """
+    ค้นหาข้อมูลที่เกี่ยวข้องกับคำถาม (การค้นหาแบบแยกประเภททำงานพร้อมกัน)
+    
+    Args:
+        query: คำถาม
+        use_combined_search: ใช้การค้นหาแบบรวมหรือไม่
+        
+    Returns:
+        List[Dict[str, Any]]: ผลลัพธ์การค้นหา
+    """
+    if use_combined_search:
+        return await asyncio.to_thread(vector_search.search_combined, query, 5)
+    
+    job_results, advice_results = await asyncio.gather(
+        search_by_type(vector_search.search_jobs, query, 3, "job"),
+        search_by_type(vector_search.search_career_advices, query, 3, "advice"),
+    )
+    return job_results + advice_results
+
+async def route_and_retrieve(request: ChatRequest, user_id: str, use_combined_search: bool = True):
+    """
+    ตรวจสิทธิ์การสนทนา โหลดข้อมูลผู้ใช้ หน่วยความจำของบทสนทนา และค้นหาข้อมูลไปพร้อมกัน
+    แล้วเลือกระดับการตอบคำถาม
+    
+    ถ้าตอบด้วยคำตอบสำเร็จรูปได้ จะไม่รอผลการค้นหา
+    
+    Args:
+        request: ข้อมูลคำถาม
+        user_id: รหัสผู้ใช้
+        use_combined_search: ใช้การค้นหาแบบรวมหรือไม่
+        
+    Returns:
+        Tuple: (ข้อมูลผู้ใช้, ผลลัพธ์การค้นหา, ผลการเลือกระดับการตอบ, หน่วยความจำของบทสนทนา)
+        
+    Raises:
+        HTTPException: ถ้าการสนทนาเดิมไม่ใช่ของผู้ใช้คนนี้
+    """
+    search_task = asyncio.ensure_future(retrieve_search_results(request.message, use_combined_search))
+    try:
+        # การสนทนาเดิมต้องเป็นของผู้ใช้คนนี้ (จัดประเภทคำถามใน thread เพื่อไม่บล็อก event loop)
+        _, user_context, conversation, classification = await asyncio.gather(
+            ensure_chat_owner(request.chat_id, user_id),
+            load_user_context(user_id),
+            get_conversation_store().get_session(request.chat_id),
+            asyncio.to_thread(vector_search.classify_query, request.message),
+        )
+        
+        # เลือกคำตอบสำเร็จรูป โมเดลเล็ก หรือโมเดลเต็มตามความซับซ้อนของคำถาม
+        routing = get_query_router().route(
+            request.message,
+            personality=request.personality,
+            user_context=user_context,
+            classification=classification,
+        )
+        
+        if routing.tier == ModelTier.TEMPLATE:
+            return user_context, [], routing, conversation
+        return user_context, await search_task, routing, conversation
+    finally:
+        if not search_task.done():
+            search_task.cancel()
+
 @router.post("/", response_model=ChatResponse)
 async def ask_question(
     request: ChatRequest,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    x_request_timeout: Optional[float] = Header(None, description="เวลาที่ยอมรอคำตอบ (วินาที)"),
+    fields: Optional[str] = Query(None, description="คีย์ของ search_results ที่ต้องการ คั่นด้วยจุลภาค (เช่น id,title,salary_ranges)"),
+    include_context: bool = Query(False, description="ส่ง search_results ฉบับเต็มที่ใช้ตอบคำถาม"),
+    user_id: str = Depends(get_current_user_id)
 ):
     """
     ถามคำถามและรับคำตอบจาก AI
     
     Args:
         request: ข้อมูลคำถาม
+        x_request_timeout: เวลาที่ยอมรอคำตอบ (วินาที) ถ้า LLM ตอบไม่ทันจะได้คำตอบจากผลการค้นหาแทน
+        fields: คีย์ของ search_results ที่ต้องการ (ค่าเริ่มต้น id, type, title, similarity_score)
+        include_context: ส่ง search_results ฉบับเต็ม
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
         
     Returns:
         ChatResponse: คำตอบจาก AI
     """
+    deadline = request_deadline(x_request_timeout)
     try:
         # ตรวจสอบ VectorSearch
         if vector_search is None:
@@ -61,38 +225,16 @@ async def ask_question(
         if not request.message:
             raise HTTPException(status_code=400, detail="กรุณาระบุคำถาม")
         
-        # ดึงข้อมูลผู้ใช้เดียวในระบบ
-        user_context = None
-        user = get_app_user()
-        if user:
-            user_context = user.dict()
-        
-        # ค้นหาข้อมูลที่เกี่ยวข้อง
-        search_results = []
-        
         # Set default values for optional attributes
         use_combined_search = getattr(request, 'use_combined_search', True)
         use_fine_tuned = getattr(request, 'use_fine_tuned', False)
         
-        if use_combined_search and vector_search is not None:
-            # ใช้การค้นหาแบบรวม
-            search_results = vector_search.search_combined(request.message, limit=5)
-        else:
-            # ใช้การค้นหาแบบแยกประเภท
-            job_results = vector_search.search_jobs(request.message, limit=3)
-            advice_results = vector_search.search_career_advices(request.message, limit=3)
-            
-            # เพิ่มคีย์ type ถ้าไม่มีในผลลัพธ์
-            for job in job_results:
-                if "type" not in job:
-                    job["type"] = "job"
-            
-            for advice in advice_results:
-                if "type" not in advice:
-                    advice["type"] = "advice"
-            
-            # รวมผลลัพธ์
-            search_results = job_results + advice_results
+        # ตรวจสิทธิ์การสนทนา ดึงข้อมูลผู้ใช้และหน่วยความจำของบทสนทนาเดิม ค้นหาข้อมูลที่เกี่ยวข้อง และเลือกระดับการตอบ
+        user_context, search_results, routing, conversation = await route_and_retrieve(
+            request, user_id, use_combined_search
+        )
+        conversation_store = get_conversation_store()
+        chat_id = request.chat_id or str(uuid.uuid4())
         
         # ใช้ฟังก์ชัน safe_chat_with_context ใหม่
         response_text = await safe_chat_with_context(
@@ -100,114 +242,192 @@ async def ask_question(
             search_results=search_results,
             user_context=user_context,
             personality=request.personality,
-            use_fine_tuned=use_fine_tuned
+            use_fine_tuned=use_fine_tuned,
+            conversation=conversation,
+            sticky_key=chat_id,
+            deadline=deadline,
+            routing=routing
         )
         
         # สร้างและบันทึกประวัติการสนทนา
-        chat_history = create_chat_message(request.message, response_text)
+        chat_history = create_chat_message(
+            request.message, response_text, chat_id=chat_id, personality=request.personality.value,
+            user_id=user_id
+        )
+        conversation_store.add_turn(chat_history.id, request.message, response_text)
         
-        # บันทึกประวัติในพื้นหลัง
-        background_tasks.add_task(save_chat_history, chat_history)
+        # บันทึกประวัติผ่านคิวเขียน และสรุปรอบเก่าของบทสนทนาในพื้นหลัง
+        enqueue_chat_history(chat_history)
+        background_tasks.add_task(conversation_store.compact, chat_history.id)
         
         # สร้าง response
         return ChatResponse(
             chat_id=chat_history.id,
             message=response_text,
-            search_results=search_results
+            search_results=project_search_results(search_results, fields, include_context)
         )
         
+    except HTTPException:
+        raise
+    except LLMOverloadedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="ระบบกำลังมีผู้ใช้งานจำนวนมาก กรุณาลองใหม่อีกครั้ง",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
         logger.error(f"เกิดข้อผิดพลาดในการสร้างคำตอบ: {str(e)}")
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการสร้างคำตอบ: {str(e)}")
 
 @router.get("/personalities", response_model=List[str])
-async def get_personalities():
+async def get_personalities(request: Request):
     """
-    ดึงรายการบุคลิกที่สามารถใช้ได้
+    ดึงรายการบุคลิกที่สามารถใช้ได้ (ข้อมูลคงที่ รองรับ ETag / If-None-Match)
     
+    Args:
+        request: คำขอ
+        
     Returns:
         List[str]: รายการบุคลิก
     """
-    return [p.value for p in PersonalityType]
+    personalities = [p.value for p in PersonalityType]
+    return await cached_json_response(
+        request, lambda: ",".join(personalities), lambda version: personalities, STATIC_CACHE_MAX_AGE
+    )
 
-@router.get("/history", response_model=List[ChatHistory])
+@router.get("/history", response_model=List[Union[ChatHistory, ChatHistorySummary]])
 async def get_user_chat_history(
-    limit: int = Query(10, description="จำนวนประวัติการสนทนาที่ต้องการ", ge=1, le=100)
+    response: Response,
+    limit: int = Query(10, description="จำนวนประวัติการสนทนาที่ต้องการ", ge=1, le=100),
+    before: Optional[str] = Query(None, description="เอาเฉพาะการสนทนาที่เก่ากว่า cursor นี้ (ค่า X-Next-Before ของหน้าก่อน)"),
+    after: Optional[str] = Query(None, description="เอาเฉพาะการสนทนาที่ใหม่กว่า cursor นี้ (ค่า X-Next-After ของหน้าก่อน)"),
+    start_date: Optional[date] = Query(None, description="วันที่เริ่มต้น (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="วันที่สิ้นสุด (YYYY-MM-DD, รวมวันนี้)"),
+    personality: Optional[PersonalityType] = Query(None, description="กรองตามบุคลิกของ AI"),
+    view: Literal["full", "summary"] = Query("full", description="full = รวมข้อความ, summary = เฉพาะสรุปไม่มีเนื้อหาข้อความ"),
+    user_id: str = Depends(get_current_user_id)
 ):
     """
-    ดึงประวัติการสนทนาของผู้ใช้
+    ดึงประวัติการสนทนาของผู้ใช้ (ล่าสุดก่อน) แบบแบ่งหน้าด้วย cursor ของเวลาและรหัสการสนทนา
     
     Args:
         limit: จำนวนประวัติการสนทนาที่ต้องการ
+        before: cursor สำหรับหน้าที่เก่ากว่า
+        after: cursor สำหรับหน้าที่ใหม่กว่า
+        start_date: วันที่เริ่มต้น
+        end_date: วันที่สิ้นสุด
+        personality: บุคลิกของ AI
+        view: รูปแบบผลลัพธ์
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว (เห็นเฉพาะการสนทนาของตัวเอง)
         
     Returns:
-        List[ChatHistory]: รายการประวัติการสนทนา
+        List[ChatHistory] หรือ List[ChatHistorySummary]: รายการประวัติการสนทนา
+        (header X-Next-Before / X-Next-After คือ cursor "timestamp|id" ของหน้าถัดไป)
     """
-    from src.utils.storage import get_chat_history
+    from src.utils.storage import get_chat_history, get_chat_history_summaries
+    from src.utils.chat_store import make_cursor
     
-    # ดึงประวัติการสนทนา
-    history = get_chat_history(limit=limit)
+    filters = {
+        "before": before,
+        "after": after,
+        "since": start_date.isoformat() if start_date else None,
+        # end_date รวมทั้งวัน จึงใช้วันถัดไปเป็นขอบเขตแบบไม่รวม
+        "until": (end_date + timedelta(days=1)).isoformat() if end_date else None,
+        "personality": personality.value if personality else None,
+        "user_id": user_id,
+    }
+    
+    # ดึงประวัติการสนทนาใน thread แยก (อาจต้องเขียนคิวที่ค้างลงดิสก์ก่อนอ่าน)
+    if view == "summary":
+        history = await asyncio.to_thread(get_chat_history_summaries, limit=limit, **filters)
+    else:
+        history = await asyncio.to_thread(get_chat_history, limit=limit, **filters)
+    
+    if history:
+        response.headers["X-Next-Before"] = make_cursor(history[-1].timestamp, history[-1].id)
+        response.headers["X-Next-After"] = make_cursor(history[0].timestamp, history[0].id)
     return history
 
 @router.post("/query", response_model=ChatResponse)
-async def query_chat(request: ChatRequest):
+async def query_chat(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    x_request_timeout: Optional[float] = Header(None, description="เวลาที่ยอมรอคำตอบ (วินาที)"),
+    fields: Optional[str] = Query(None, description="คีย์ของ search_results ที่ต้องการ คั่นด้วยจุลภาค (เช่น id,title,salary_ranges)"),
+    include_context: bool = Query(False, description="ส่ง search_results ฉบับเต็มที่ใช้ตอบคำถาม"),
+    user_id: str = Depends(get_current_user_id)
+):
     """
     ส่งคำถามไปยัง LLM และรับคำตอบกลับมา
     
     Args:
         request: คำถามและบุคลิกของ AI
+        x_request_timeout: เวลาที่ยอมรอคำตอบ (วินาที) ถ้า LLM ตอบไม่ทันจะได้คำตอบจากผลการค้นหาแทน
+        fields: คีย์ของ search_results ที่ต้องการ (ค่าเริ่มต้น id, type, title, similarity_score)
+        include_context: ส่ง search_results ฉบับเต็ม
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
         
     Returns:
         ChatResponse: คำตอบจาก LLM
     """
+    deadline = request_deadline(x_request_timeout)
     try:
-        # ดึงข้อมูลผู้ใช้
-        user_context = None
-        user = get_app_user()
-        if user:
-            user_context = user.dict()
-        
         # ตรวจสอบ VectorSearch
         if vector_search is None:
             raise HTTPException(status_code=500, detail="ระบบค้นหาข้อมูลไม่พร้อมใช้งาน")
         
-        # ใช้การค้นหาแบบรวม
-        search_results = vector_search.search_combined(request.message, limit=5)
+        # ตรวจสิทธิ์การสนทนา ดึงข้อมูลผู้ใช้และหน่วยความจำของบทสนทนาเดิม ค้นหาข้อมูลแบบรวม และเลือกระดับการตอบ
+        user_context, search_results, routing, conversation = await route_and_retrieve(request, user_id)
+        conversation_store = get_conversation_store()
+        chat_id = request.chat_id or str(uuid.uuid4())
         
         # ใช้ฟังก์ชันใหม่
         response = await safe_chat_with_context(
             query=request.message,
             search_results=search_results,
             user_context=user_context,
-            personality=request.personality
+            personality=request.personality,
+            conversation=conversation,
+            sticky_key=chat_id,
+            deadline=deadline,
+            routing=routing
         )
         
         # สร้างประวัติการสนทนา
-        chat_id = str(uuid.uuid4())
         timestamp = datetime.now().isoformat()
         
         chat_history = ChatHistory(
             id=chat_id,
-            user_id="app_user",
+            user_id=user_id,
             timestamp=timestamp,
+            personality=request.personality.value,
             messages=[
                 ChatMessage(role="user", content=request.message),
                 ChatMessage(role="assistant", content=response)
             ]
         )
+        conversation_store.add_turn(chat_id, request.message, response)
+        
+        # บันทึกประวัติการสนทนาผ่านคิวเขียน (ไม่รอการเขียนดิสก์)
+        enqueue_chat_history(chat_history)
         
-        # บันทึกประวัติการสนทนา (ข้ามหากเกิดข้อผิดพลาด)
-        try:
-            save_chat_history(chat_history)
-        except Exception as e:
-            logger.error(f"เกิดข้อผิดพลาดในการบันทึกประวัติการสนทนา: {str(e)}")
+        # สรุปรอบเก่าของบทสนทนาหลังตอบกลับแล้ว
+        background_tasks.add_task(conversation_store.compact, chat_id)
         
         return ChatResponse(
             chat_id=chat_id,
             message=response,
-            search_results=search_results
+            search_results=project_search_results(search_results, fields, include_context)
         )
     
+    except HTTPException:
+        raise
+    except LLMOverloadedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="ระบบกำลังมีผู้ใช้งานจำนวนมาก กรุณาลองใหม่อีกครั้ง",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
         logger.error(f"เกิดข้อผิดพลาดในการส่งคำถามไปยัง LLM: {str(e)}")
         raise HTTPException(
@@ -7,11 +7,14 @@ This module defines the routes for job information.
 """
 
 from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, HTTPException, Depends, Query, Path
+from fastapi import APIRouter, HTTPException, Depends, Query, Path, Request
 
 from src.api.models import JobSummary, JobResponse, JobFilter
 from src.utils.logger import get_logger
-from src.utils.vector_search import VectorSearch
+from src.utils.vector_search import VectorSearch, get_shared_vector_search
+from src.api.dependencies import get_current_user_id
+from src.api.http_cache import cached_json_response, job_data_version, StaleVersionError
+from src.utils.config import HTTP_CACHE_MAX_AGE
 
 # ตั้งค่า logger
 logger = get_logger("api.routes.jobs")
@@ -24,101 +27,120 @@ router = APIRouter(
 )
 
 # ฟังก์ชันสำหรับดึง VectorSearch instance
-def get_vector_search():
+def get_vector_search() -> VectorSearch:
     """
-    ดึง VectorSearch instance
+    ดึง VectorSearch ที่ใช้ร่วมกันทั้งแอป (สลับไปใช้ข้อมูลเวอร์ชันใหม่เองในเบื้องหลัง)
     
     Returns:
         VectorSearch: instance ของ VectorSearch
     """
-    # นำเข้า vector_db_dir จาก config
-    from src.utils.config import VECTOR_DB_DIR
+    return get_shared_vector_search()
+
+def current_job_data_version() -> str:
+    """
+    เวอร์ชันของข้อมูลอาชีพที่ VectorSearch ใช้ค้นหาอยู่ (ใช้สร้าง ETag)
     
-    # สร้าง VectorSearch instance
-    return VectorSearch(VECTOR_DB_DIR)
+    Returns:
+        str: เวอร์ชันของข้อมูล
+    """
+    return job_data_version(get_vector_search())
 
 @router.get("/", response_model=List[JobSummary])
 async def list_jobs(
+    request: Request,
     title: Optional[str] = Query(None, description="กรองตามชื่อตำแหน่ง"),
     skill: Optional[str] = Query(None, description="กรองตามทักษะ"),
     limit: int = Query(20, description="จำนวนผลลัพธ์สูงสุด", ge=1, le=100),
-    vector_search: VectorSearch = Depends(get_vector_search),
 ):
     """
-    ดึงรายการอาชีพตามเงื่อนไข
+    ดึงรายการอาชีพตามเงื่อนไข (รองรับ ETag / If-None-Match)
     
     Args:
+        request: คำขอ
         title: กรองตามชื่อตำแหน่ง
         skill: กรองตามทักษะ
         limit: จำนวนผลลัพธ์สูงสุด
-        vector_search: instance ของ VectorSearch
         
     Returns:
         List[JobSummary]: รายการอาชีพ
     """
-    try:
-        # สร้างตัวกรอง
-        filters = {}
-        if title:
-            filters["title"] = title
-        if skill:
-            filters["skill"] = skill
-        
-        # ใช้ VectorSearch
-        # ถ้าไม่มีคำค้นหา ให้ใช้คำทั่วไป
-        search_query = title or skill or "software development"
-        results = vector_search.search_jobs(search_query, limit=limit, filters=filters)
-        
-        # แปลงเป็น JobSummary
-        job_summaries = [
-            JobSummary(id=result["id"], title=result["title"]) 
-            for result in results
-        ]
-        
-        return job_summaries
-    except Exception as e:
-        logger.error(f"เกิดข้อผิดพลาดในการดึงรายการอาชีพ: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการดึงรายการอาชีพ: {str(e)}")
+    def build(version: str) -> List[JobSummary]:
+        try:
+            vector_search = get_vector_search()
+            # สร้างตัวกรอง
+            filters = {}
+            if title:
+                filters["title"] = title
+            if skill:
+                filters["skill"] = skill
+            
+            # ใช้ VectorSearch
+            # ถ้าไม่มีคำค้นหา ให้ใช้คำทั่วไป
+            search_query = title or skill or "software development"
+            results = vector_search.search_jobs(search_query, limit=limit, filters=filters)
+            if job_data_version(vector_search) != version:
+                raise StaleVersionError(version)
+            
+            # แปลงเป็น JobSummary
+            job_summaries = [
+                JobSummary(id=result["id"], title=result["title"]) 
+                for result in results
+            ]
+            
+            return job_summaries
+        except StaleVersionError:
+            raise
+        except Exception as e:
+            logger.error(f"เกิดข้อผิดพลาดในการดึงรายการอาชีพ: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการดึงรายการอาชีพ: {str(e)}")
+    
+    return await cached_json_response(request, current_job_data_version, build, HTTP_CACHE_MAX_AGE)
 
 @router.get("/{job_id}", response_model=JobResponse)
 async def get_job(
+    request: Request,
     job_id: str = Path(..., description="รหัสอาชีพ"),
-    vector_search: VectorSearch = Depends(get_vector_search),
 ):
     """
-    ดึงข้อมูลอาชีพ
+    ดึงข้อมูลอาชีพ (รองรับ ETag / If-None-Match)
     
     Args:
+        request: คำขอ
         job_id: รหัสอาชีพ
-        vector_search: instance ของ VectorSearch
         
     Returns:
         JobResponse: ข้อมูลอาชีพ
     """
-    try:
-        # ดึงข้อมูลอาชีพ
-        job_data = vector_search.get_job_by_id(job_id)
-        
-        if not job_data:
-            raise HTTPException(status_code=404, detail=f"ไม่พบอาชีพ {job_id}")
-        
-        # แปลงเป็น JobResponse
-        job_response = JobResponse(
-            id=job_data["id"],
-            titles=job_data["titles"],
-            description=job_data["description"],
-            skills=job_data.get("skills", []),
-            responsibilities=job_data.get("responsibilities", []),
-            salary_ranges=job_data.get("salary_ranges", []),
-            education_requirements=job_data.get("education_requirements", [])
-        )
-        
-        return job_response
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"เกิดข้อผิดพลาดในการดึงข้อมูลอาชีพ: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการดึงข้อมูลอาชีพ: {str(e)}")
+    def build(version: str) -> JobResponse:
+        try:
+            # ดึงข้อมูลอาชีพ
+            vector_search = get_vector_search()
+            job_data = vector_search.get_job_by_id(job_id)
+            if job_data_version(vector_search) != version:
+                raise StaleVersionError(version)
+            
+            if not job_data:
+                raise HTTPException(status_code=404, detail=f"ไม่พบอาชีพ {job_id}")
+            
+            # แปลงเป็น JobResponse
+            job_response = JobResponse(
+                id=job_data["id"],
+                titles=job_data["titles"],
+                description=job_data["description"],
+                skills=job_data.get("skills", []),
+                responsibilities=job_data.get("responsibilities", []),
+                salary_ranges=job_data.get("salary_ranges", []),
+                education_requirements=job_data.get("education_requirements", [])
+            )
+            
+            return job_response
+        except (HTTPException, StaleVersionError):
+            raise
+        except Exception as e:
+            logger.error(f"เกิดข้อผิดพลาดในการดึงข้อมูลอาชีพ: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการดึงข้อมูลอาชีพ: {str(e)}")
+    
+    return await cached_json_response(request, current_job_data_version, build, HTTP_CACHE_MAX_AGE)
 
 @router.post("/search", response_model=List[JobSummary])
 async def search_jobs(
@@ -167,6 +189,7 @@ async def search_jobs(
 async def recommend_jobs_for_user(
     limit: int = Query(5, description="จำนวนอาชีพที่แนะนำ", ge=1, le=20),
     vector_search: VectorSearch = Depends(get_vector_search),
+    user_id: str = Depends(get_current_user_id),
 ):
     """
     แนะนำอาชีพสำหรับผู้ใช้
@@ -174,14 +197,15 @@ async def recommend_jobs_for_user(
     Args:
         limit: จำนวนอาชีพที่แนะนำ
         vector_search: instance ของ VectorSearch
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
         
     Returns:
         List[JobSummary]: รายการอาชีพที่แนะนำ
     """
     try:
-        # ดึงข้อมูลผู้ใช้เดียวในระบบ
-        from src.utils.storage import get_app_user
-        user = get_app_user()
+        # ดึงข้อมูลผู้ใช้ของคำขอ
+        from src.utils.storage import get_user
+        user = get_user(user_id)
         if not user:
             raise HTTPException(status_code=404, detail=f"ไม่พบข้อมูลผู้ใช้")
         
@@ -190,12 +214,13 @@ async def recommend_jobs_for_user(
         
         # เพิ่มภาษาโปรแกรม
         if user.programming_languages:
-            search_terms.extend(user.programming_languages[:3])  # ใช้แค่ 3 ภาษาแรก
+            search_terms.extend(lang.name for lang in user.programming_languages[:3])  # ใช้แค่ 3 ภาษาแรก
         
-        # เพิ่มทักษะที่มีระดับสูง
-        high_skills = [skill.name for skill in user.skills if skill.proficiency >= 4]
-        if high_skills:
-            search_terms.extend(high_skills[:3])  # ใช้แค่ 3 ทักษะแรก
+        # เพิ่มทักษะที่มีระดับสูงก่อน แล้วจึงทักษะอื่น (เช่น ทักษะที่ได้จาก Resume)
+        ranked_skills = sorted(user.skills, key=lambda skill: skill.proficiency, reverse=True)
+        top_skills = [skill.name for skill in ranked_skills]
+        if top_skills:
+            search_terms.extend(top_skills[:3])  # ใช้แค่ 3 ทักษะแรก
         
         # ถ้าไม่มีคำค้นหา ให้ใช้คำทั่วไป
         if not search_terms:
@@ -9,17 +9,21 @@ This module defines the routes for user management.
 import os
 import json
 import uuid
+from datetime import datetime
 from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, HTTPException, Depends, Query, Path, File, UploadFile, Form, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Query, Path, File, UploadFile, Form, BackgroundTasks, Response, Request
 from fastapi.responses import FileResponse
 
 # เพิ่มการนำเข้า EducationStatus จาก config
 from src.utils.config import EducationStatus
 from src.api.models import User, UserCreate, UserUpdate, UserSummary, ResumeUploadResponse, UserSkill, UserProject, UserWorkExperience
 from src.utils.storage import (
-    create_app_user, get_app_user, update_app_user, save_app_user, app_user_exists,
-    save_app_resume, get_app_resume_path
+    register_new_user, get_user, update_user, save_user, user_exists, delete_user,
+    iter_upload_chunks
 )
+from src.utils.config import RESUME_MAX_BYTES
+from src.utils.user_store import UserExistsError
+from src.api.dependencies import get_current_user_id, get_registering_user_id, attach_user_token, store_resume_upload
 from src.utils.logger import get_logger
 
 # ตั้งค่า logger
@@ -33,20 +37,25 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=User)
-async def get_user_info():
+async def get_user_info(user_id: str = Depends(get_current_user_id)):
     """
     ดึงข้อมูลผู้ใช้
     
+    Args:
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+        
     Returns:
         User: ข้อมูลผู้ใช้
     """
-    user = get_app_user()
+    user = get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="ไม่พบข้อมูลผู้ใช้")
     return user
 
 @router.post("/", response_model=User)
 async def create_new_user(
+    response: Response,
+    background_tasks: BackgroundTasks,
     name: str = Form(...),
     institution: Optional[str] = Form(None),
     education_status: str = Form("student"),  # รับเป็น string แทน Enum
@@ -56,10 +65,11 @@ async def create_new_user(
     tools: str = Form("[]"),  # เปลี่ยนเป็น JSON string
     projects: str = Form("[]"),  # JSON string
     work_experiences: str = Form("[]"),  # JSON string
-    resume: Optional[UploadFile] = File(None)
+    resume: Optional[UploadFile] = File(None),
+    user_id: str = Depends(get_registering_user_id)
 ):
     """
-    สร้างผู้ใช้ใหม่
+    สร้างผู้ใช้ใหม่ (ผู้ใช้ใหม่ที่ระบุ X-User-ID จะได้รับ token ใน header X-User-Token)
     
     Args:
         name: ชื่อผู้ใช้
@@ -71,7 +81,8 @@ async def create_new_user(
         tools: เครื่องมือในรูปแบบ JSON string
         projects: โปรเจกต์ในรูปแบบ JSON string
         work_experiences: ประสบการณ์ทำงานในรูปแบบ JSON string
-        resume: ไฟล์ resume
+        resume: ไฟล์ resume (วิเคราะห์ทักษะในเบื้องหลังหลังส่ง response)
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
         
     Returns:
         User: ข้อมูลผู้ใช้ที่สร้างแล้ว
@@ -141,9 +152,10 @@ async def create_new_user(
         )
         
         # ตรวจสอบว่ามีข้อมูลผู้ใช้อยู่แล้วหรือไม่
-        if app_user_exists():
+        is_new_user = not user_exists(user_id)
+        if not is_new_user:
             # อัปเดตข้อมูลผู้ใช้เดิม
-            user = get_app_user()
+            user = get_user(user_id)
             user.name = user_data.name
             user.institution = user_data.institution
             user.education_status = user_data.education_status
@@ -154,26 +166,31 @@ async def create_new_user(
             user.projects = user_data.projects
             user.work_experiences = user_data.work_experiences
             user.updated_at = datetime.now().isoformat()
-            if not save_app_user(user):
+            if not save_user(user):
                 raise HTTPException(status_code=500, detail="ไม่สามารถอัปเดตข้อมูลผู้ใช้ได้")
         else:
             # สร้างผู้ใช้ใหม่
-            user = create_app_user(user_data)
-            if not user:
+            try:
+                registered = register_new_user(user_data, user_id)
+            except UserExistsError:
+                raise HTTPException(status_code=409, detail="มีผู้ใช้รหัสนี้อยู่แล้ว")
+            if not registered:
                 raise HTTPException(status_code=500, detail="ไม่สามารถสร้างผู้ใช้ได้")
+            user, token = registered
+            attach_user_token(response, token)
         
         # บันทึก resume ถ้ามี
         if resume:
-            content = await resume.read()
-            resume_path = save_app_resume(content, resume.filename)
-            if resume_path:
-                logger.info(f"บันทึกไฟล์ Resume ที่ {resume_path}")
-                # อัปเดต resume_path ในข้อมูลผู้ใช้
-                user.resume_path = resume_path
-                save_app_user(user)
+            # อ่านไฟล์ทีละ chunk (resume_path ในข้อมูลผู้ใช้ถูกบันทึกแล้วใน store_resume_upload)
+            user.resume_path = await store_resume_upload(
+                user_id, iter_upload_chunks(resume), resume.filename, background_tasks
+            )
+            logger.info(f"บันทึกไฟล์ Resume ที่ {user.resume_path}")
         
         return user
         
+    except HTTPException:
+        raise
     except json.JSONDecodeError as e:
         logger.error(f"ข้อมูล JSON ไม่ถูกต้อง: {str(e)}")
         raise HTTPException(status_code=400, detail=f"ข้อมูล JSON ไม่ถูกต้อง: {str(e)}")
@@ -181,51 +198,126 @@ async def create_new_user(
         logger.error(f"เกิดข้อผิดพลาดในการสร้างผู้ใช้: {str(e)}")
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการสร้างผู้ใช้: {str(e)}")
 
+@router.post("/resume", response_model=ResumeUploadResponse)
+async def upload_resume(
+    background_tasks: BackgroundTasks,
+    resume: UploadFile = File(...),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    อัปโหลดไฟล์ Resume (multipart) แล้ววิเคราะห์ทักษะและภาษาโปรแกรมเข้าโปรไฟล์ในเบื้องหลัง
+    
+    FastAPI อ่านฟอร์มทั้งหมดก่อนเรียก endpoint นี้ ขนาดคำขอจึงถูกจำกัดโดย MultipartSizeLimitMiddleware
+    (RESUME_MAX_BYTES + RESUME_MULTIPART_OVERHEAD_BYTES) ถ้าต้องการจำกัดที่ขนาดไฟล์พอดีให้ใช้ PUT /users/resume
+    
+    Args:
+        resume: ไฟล์ resume (PDF, DOCX, DOC หรือ TXT)
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+        
+    Returns:
+        ResumeUploadResponse: ผลลัพธ์การอัปโหลด
+    """
+    if not user_exists(user_id):
+        raise HTTPException(status_code=404, detail="ไม่พบข้อมูลผู้ใช้")
+    
+    resume_path = await store_resume_upload(
+        user_id, iter_upload_chunks(resume), resume.filename, background_tasks
+    )
+    return ResumeUploadResponse(
+        success=True,
+        file_name=os.path.basename(resume_path),
+        content_type=resume.content_type or "application/octet-stream",
+        message="อัปโหลด Resume เรียบร้อยแล้ว กำลังวิเคราะห์ทักษะในเบื้องหลัง",
+        file_size=os.path.getsize(resume_path),
+    )
+
+@router.put("/resume", response_model=ResumeUploadResponse)
+async def stream_resume(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    filename: str = Query(..., description="ชื่อไฟล์ resume (ใช้นามสกุลระบุประเภทไฟล์)"),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    อัปโหลดไฟล์ Resume เป็น body ของคำขอโดยตรง (ไม่ผ่าน multipart)
+    ไฟล์ถูกเขียนลงดิสก์ทีละ chunk ระหว่างรับข้อมูล และหยุดรับทันทีเมื่อขนาดเกิน RESUME_MAX_BYTES
+    
+    Args:
+        request: คำขอที่มีเนื้อหาไฟล์ใน body
+        filename: ชื่อไฟล์ resume
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+        
+    Returns:
+        ResumeUploadResponse: ผลลัพธ์การอัปโหลด
+    """
+    if not user_exists(user_id):
+        raise HTTPException(status_code=404, detail="ไม่พบข้อมูลผู้ใช้")
+    
+    # ปฏิเสธก่อนรับข้อมูลถ้า Content-Length ระบุขนาดเกินไว้แล้ว
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > RESUME_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"ไฟล์ Resume มีขนาดเกิน {RESUME_MAX_BYTES} ไบต์")
+    
+    resume_path = await store_resume_upload(user_id, request.stream(), filename, background_tasks)
+    return ResumeUploadResponse(
+        success=True,
+        file_name=os.path.basename(resume_path),
+        content_type=request.headers.get("content-type", "application/octet-stream"),
+        message="อัปโหลด Resume เรียบร้อยแล้ว กำลังวิเคราะห์ทักษะในเบื้องหลัง",
+        file_size=os.path.getsize(resume_path),
+    )
+
 @router.get("/default", response_model=User)
-async def get_default_user():
+async def get_default_user(user_id: str = Depends(get_current_user_id)):
     """
     ดึงข้อมูลผู้ใช้
     
+    Args:
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+        
     Returns:
         User: ข้อมูลผู้ใช้
     """
-    user = get_app_user()
+    user = get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="ไม่พบข้อมูลผู้ใช้")
     return user
 
 @router.patch("/", response_model=User)
-async def update_user_info(user_data: UserUpdate):
+async def update_user_info(user_data: UserUpdate, user_id: str = Depends(get_current_user_id)):
     """
     อัปเดตข้อมูลผู้ใช้
     
     Args:
         user_data: ข้อมูลผู้ใช้ที่ต้องการอัปเดต
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
         
     Returns:
         User: ข้อมูลผู้ใช้ที่อัปเดตแล้ว
     """
-    user = update_app_user(user_data)
+    user = update_user(user_id, user_data)
     if not user:
         raise HTTPException(status_code=404, detail="ไม่พบข้อมูลผู้ใช้หรือไม่สามารถอัปเดตได้")
     return user
 
 @router.delete("/")
-async def delete_user_info():
+async def delete_user_info(user_id: str = Depends(get_current_user_id)):
     """
     ลบข้อมูลผู้ใช้
     
+    Args:
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+        
     Returns:
         Dict[str, Any]: ผลลัพธ์การลบผู้ใช้
     """
     # ตรวจสอบก่อนว่ามีผู้ใช้หรือไม่
-    user = get_app_user()
+    user = get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="ไม่พบข้อมูลผู้ใช้")
     
     # ลบข้อมูลผู้ใช้
-    from src.utils.storage import delete_app_user
-    success = delete_app_user()
+    success = delete_user(user_id)
     
     if not success:
         raise HTTPException(status_code=500, detail="เกิดข้อผิดพลาดในการลบข้อมูลผู้ใช้")
@@ -233,12 +325,14 @@ async def delete_user_info():
     return {"message": "ลบข้อมูลผู้ใช้เรียบร้อยแล้ว"}
 
 @router.get("/user-status")
-async def check_user_status():
+async def check_user_status(user_id: str = Depends(get_registering_user_id)):
     """
     ตรวจสอบสถานะว่ามีข้อมูลผู้ใช้แล้วหรือไม่
     
+    Args:
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+        
     Returns:
         Dict[str, bool]: สถานะผู้ใช้
     """
-    user_exists = app_user_exists()
-    return {"user_exists": user_exists}
\ No newline at end of file
+    return {"user_exists": user_exists(user_id)}
\ No newline at end of file
@@ -8,13 +8,15 @@ import os
 import json
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, HTTPException, File, UploadFile, Form, Depends
+from fastapi import APIRouter, HTTPException, File, UploadFile, Form, Depends, Response, BackgroundTasks
 from fastapi.responses import JSONResponse
 
 # เพิ่มการนำเข้าที่จำเป็น
 from src.api.models import UserCreate, User, UserSkill, UserProject, UserWorkExperience
 from src.utils.config import EducationStatus, USERS_DIR
-from src.utils.storage import create_app_user, save_app_user, save_app_resume, app_user_exists, get_app_user
+from src.utils.storage import register_new_user, save_user, user_exists, get_user, iter_upload_chunks
+from src.utils.user_store import UserExistsError
+from src.api.dependencies import get_current_user_id, get_registering_user_id, attach_user_token, store_resume_upload
 from src.utils.logger import get_logger
 
 # ตั้งค่า logger
@@ -29,15 +31,19 @@ router = APIRouter(
 
 @router.post("/")
 async def register_user(
+    response: Response,
+    background_tasks: BackgroundTasks,
     user_data: str = Form(...),
-    resume: Optional[UploadFile] = File(None)
+    resume: Optional[UploadFile] = File(None),
+    user_id: str = Depends(get_registering_user_id)
 ):
     """
-    ลงทะเบียนผู้ใช้สำหรับระบบ
+    ลงทะเบียนผู้ใช้สำหรับระบบ (ผู้ใช้ใหม่ที่ระบุ X-User-ID จะได้รับ token ใน header X-User-Token)
     
     Args:
         user_data: ข้อมูลผู้ใช้ในรูปแบบ JSON string
-        resume: ไฟล์ resume (ไม่บังคับ)
+        resume: ไฟล์ resume (ไม่บังคับ, วิเคราะห์ทักษะในเบื้องหลังหลังส่ง response)
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
         
     Returns:
         User: ข้อมูลผู้ใช้ที่สร้างแล้ว
@@ -121,9 +127,10 @@ async def register_user(
         )
         
         # สร้างผู้ใช้ใหม่หรืออัปเดตผู้ใช้ที่มีอยู่แล้ว
-        if app_user_exists():
+        is_new_user = not user_exists(user_id)
+        if not is_new_user:
             # ถ้ามีผู้ใช้อยู่แล้ว ให้อัปเดตข้อมูล
-            user = get_app_user()
+            user = get_user(user_id)
             
             # อัปเดตข้อมูล
             user.name = user_create.name
@@ -138,33 +145,35 @@ async def register_user(
             user.updated_at = datetime.now().isoformat()
             
             # บันทึกข้อมูลผู้ใช้
-            if not save_app_user(user):
+            if not save_user(user):
                 raise HTTPException(status_code=500, detail="ไม่สามารถอัปเดตข้อมูลผู้ใช้ได้")
             
             logger.info(f"อัปเดตข้อมูลผู้ใช้ {user.name} เรียบร้อยแล้ว")
         else:
             # ถ้ายังไม่มีผู้ใช้ ให้สร้างใหม่
-            user = create_app_user(user_create)
-            if not user:
+            try:
+                registered = register_new_user(user_create, user_id)
+            except UserExistsError:
+                raise HTTPException(status_code=409, detail="มีผู้ใช้รหัสนี้อยู่แล้ว")
+            if not registered:
                 raise HTTPException(status_code=500, detail="ไม่สามารถสร้างผู้ใช้ได้")
+            user, token = registered
+            attach_user_token(response, token)
             
             logger.info(f"สร้างผู้ใช้ใหม่ {user.name} เรียบร้อยแล้ว")
         
         # บันทึก resume ถ้ามี
         if resume:
-            content = await resume.read()
-            resume_path = save_app_resume(content, resume.filename)
-            if resume_path:
-                logger.info(f"บันทึกไฟล์ Resume ที่ {resume_path}")
-                
-                # อัปเดต resume_path ในข้อมูลผู้ใช้
-                user.resume_path = resume_path
-                save_app_user(user)
-                
-                logger.info("อัปเดต resume_path ในข้อมูลผู้ใช้เรียบร้อยแล้ว")
+            # อ่านไฟล์ทีละ chunk (resume_path ในข้อมูลผู้ใช้ถูกบันทึกแล้วใน store_resume_upload)
+            user.resume_path = await store_resume_upload(
+                user_id, iter_upload_chunks(resume), resume.filename, background_tasks
+            )
+            logger.info(f"บันทึกไฟล์ Resume ที่ {user.resume_path}")
         
         return user
         
+    except HTTPException:
+        raise
     except json.JSONDecodeError as e:
         logger.error(f"ไม่สามารถแปลงข้อมูลเป็น JSON ได้: {str(e)}")
         raise HTTPException(status_code=400, detail=f"ข้อมูลไม่ถูกต้อง: {str(e)}")
@@ -173,25 +182,30 @@ async def register_user(
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการลงทะเบียน: {str(e)}")
 
 @router.get("/user-status")
-async def check_user_status():
+async def check_user_status(user_id: str = Depends(get_registering_user_id)):
     """
     ตรวจสอบสถานะว่ามีข้อมูลผู้ใช้แล้วหรือไม่
     
+    Args:
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+        
     Returns:
         Dict[str, bool]: สถานะผู้ใช้
     """
-    user_exists = app_user_exists()
-    return {"user_exists": user_exists}
+    return {"user_exists": user_exists(user_id)}
 
 @router.get("/user-info")
-async def get_user_info():
+async def get_user_info(user_id: str = Depends(get_current_user_id)):
     """
     ดึงข้อมูลผู้ใช้ที่ลงทะเบียนไว้
     
+    Args:
+        user_id: รหัสผู้ใช้ที่ยืนยันตัวตนแล้ว
+        
     Returns:
         User หรือ {"user_exists": False}: ข้อมูลผู้ใช้หรือสถานะว่าไม่มีผู้ใช้
     """
-    user = get_app_user()
+    user = get_user(user_id)
     if user:
         return user.dict()  
     return {"user_exists": False}
\ No newline at end of file
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request size limits for multipart uploads to the Career AI Advisor API.
+
+FastAPI parses (and spools) a multipart form before the route runs, so the
+per-file limit in ``save_resume_stream`` only applies after the whole body has
+been received. This middleware enforces the limit on the request itself:
+bodies whose Content-Length is too large get 413 before anything is read, and
+chunked bodies are cut off with 413 as soon as they pass the limit.
+"""
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.utils.logger import get_logger
+
+# ตั้งค่า logger
+logger = get_logger("api.upload_limits")
+
+
+class UploadTooLargeError(Exception):
+    """เกิดขึ้นเมื่อ body ของคำขอ multipart เกินขนาดที่กำหนด"""
+
+
+class MultipartSizeLimitMiddleware:
+    """จำกัดขนาด body ของคำขอ multipart/form-data (คำขอแบบอื่นผ่านไปตามเดิม)"""
+
+    def __init__(self, app: ASGIApp, max_bytes: int):
+        """
+        Args:
+            app: ASGI app ถัดไป
+            max_bytes: ขนาด body สูงสุด (ไบต์)
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"คำขออัปโหลดมีขนาดเกิน {self.max_bytes} ไบต์"},
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+        if not content_type.startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        # ปฏิเสธก่อนรับข้อมูลถ้า Content-Length ระบุขนาดเกินไว้แล้ว
+        content_length = headers.get(b"content-length", b"").decode("latin-1")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            logger.warning(f"ปฏิเสธคำขอ multipart {scope['path']}: Content-Length {content_length} ไบต์")
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise UploadTooLargeError(f"body เกิน {self.max_bytes} ไบต์")
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            # หลังตัดการรับข้อมูล app จะตอบข้อผิดพลาดในการอ่าน body ซึ่งถูกแทนด้วย 413
+            if exceeded and not response_started:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded or response_started:
+                raise
+
+        if exceeded and not response_started:
+            logger.warning(f"ตัดการรับคำขอ multipart {scope['path']} ที่ขนาดเกิน {self.max_bytes} ไบต์")
+            await self._reject(scope, receive, send)
@@ -30,6 +30,10 @@ def main():
                         help='ชื่อโมเดล SentenceTransformer ที่ต้องการใช้')
     parser.add_argument('--no-clear', action='store_true', 
                         help='ไม่ล้างฐานข้อมูล vector เดิมก่อนสร้างใหม่')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='ขนาด batch ของการ encode (ค่าเริ่มต้นจาก EMBEDDING_BATCH_SIZE)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='จำนวน process สำหรับ encode (1 = process เดียว, 0 = อัตโนมัติ)')
     
     args = parser.parse_args()
     
@@ -66,7 +70,9 @@ def main():
             processed_data_dir=processed_data_dir,
             vector_db_dir=vector_db_dir,
             embedding_model=model,
-            clear_vector_db=not args.no_clear
+            clear_vector_db=not args.no_clear,
+            batch_size=args.batch_size,
+            processes=args.processes
         )
         
         # สร้าง embeddings ทั้งหมด
@@ -1,5 +1,5 @@
 import os
-import json
+import sys
 import glob
 import re
 import numpy as np
@@ -7,6 +7,10 @@ import faiss
 from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Any
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.utils.atomic_write import write_bytes_atomic, write_json_atomic
+from src.utils import json_codec
+
 class JobDataProcessor:
     """
     คลาสสำหรับประมวลผลข้อมูลอาชีพทั้งโฟลเดอร์: ทำความสะอาดและสร้าง vector embeddings
@@ -92,7 +96,7 @@ class JobDataProcessor:
         """
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                job_data = json.load(f)
+                job_data = json_codec.load(f)
             
             # ตรวจสอบว่าเป็น dict หรือ list
             if isinstance(job_data, dict):
@@ -173,13 +177,12 @@ class JobDataProcessor:
             
             # บันทึกไฟล์ที่ทำความสะอาดแล้ว
             output_path = os.path.join(output_dir, file_name)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                if len(cleaned_jobs) == 1:
-                    # กรณีมีอาชีพเดียว
-                    json.dump(cleaned_jobs[0], f, ensure_ascii=False, indent=2)
-                else:
-                    # กรณีมีหลายอาชีพ
-                    json.dump(cleaned_jobs, f, ensure_ascii=False, indent=2)
+            if len(cleaned_jobs) == 1:
+                # กรณีมีอาชีพเดียว
+                write_json_atomic(output_path, cleaned_jobs[0])
+            else:
+                # กรณีมีหลายอาชีพ
+                write_json_atomic(output_path, cleaned_jobs)
         
         print(f"ทำความสะอาดข้อมูลเสร็จสิ้น: {len(all_cleaned_jobs)} อาชีพ")
         self.processed_jobs = all_cleaned_jobs
@@ -222,8 +225,7 @@ class JobDataProcessor:
         
         # บันทึก index
         print(f"กำลังบันทึก FAISS index ไปที่ {output_index_path}...")
-        os.makedirs(os.path.dirname(output_index_path), exist_ok=True)
-        faiss.write_index(index, output_index_path)
+        write_bytes_atomic(output_index_path, faiss.serialize_index(index).tobytes(), checksum=True)
         
         # บันทึก metadata
         print(f"กำลังบันทึก metadata ไปที่ {output_metadata_path}...")
@@ -233,8 +235,7 @@ class JobDataProcessor:
             "job_data": self.processed_jobs
         }
         
-        with open(output_metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        write_json_atomic(output_metadata_path, metadata, checksum=True)
         
         print("เสร็จสิ้นการสร้าง vector database!")
     
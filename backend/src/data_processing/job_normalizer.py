@@ -1,4 +1,3 @@
-import json
 import os
 import re
 from typing import Dict, Any, List, Set
@@ -6,6 +5,102 @@ from pathlib import Path
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.utils.text_processor import TextProcessor  # Import the TextProcessor
+from src.utils.atomic_write import write_json_atomic
+from src.utils import json_codec
+
+# Job title normalization mapping (also used to detect roles in chat queries)
+JOB_TITLE_MAPPING = {
+    # Software Engineering
+    "software engineer": "software-engineer",
+    "software developer": "software-engineer",
+    "programmer": "software-engineer",
+    "applications developer": "software-engineer",
+    
+    # Frontend Development
+    "frontend developer": "web-developer",
+    "front-end developer": "web-developer",
+    "front end developer": "web-developer",
+    
+    
+    # UX/UI Design
+    "web designer": "ux-ui-designer",
+    "webdesigner": "ux-ui-designer",
+    "ux designer": "ux-ui-designer",
+    "ui designer": "ux-ui-designer",
+    "ux  ui designer": "ux-ui-designer",
+    "user experience designer": "ux-ui-designer",
+    
+    # Backend Development
+    "backend developer": "web-developer",
+    "back-end developer": "web-developer",
+    "back end developer": "web-developer",
+    
+    # Full Stack Development
+    "full stack developer": "web-developer",
+    "full-stack developer": "web-developer",
+    "web developer": "web-developer",
+
+    
+    # Mobile Development
+    "android developer": "mobile-developer",
+    "ios developer": "mobile-developer",
+    "mobile developer": "mobile-developer",
+    
+    # Data-related roles
+    "data scientist": "data-scientist",
+    "data analyst": "data-analyst",
+    "data engineer": "data-engineer",
+    "business intelligence analyst": "bi-analyst",
+    "bi developer": "bi-developer",
+    "data modeler": "data-modeler",
+    "data architecture": "data-architect",
+    
+    # DevOps and Infrastructure
+    "devops engineer": "devops-engineer",
+    "devops": "devops-engineer",
+    "cloud technology engineer": "cloud-engineer",
+    "system engineer": "system-engineer",
+    "system administrator": "system-administrator",
+    "network engineer": "network-engineer",
+    "network administrator": "network-administrator",
+    "database administrator": "database-administrator",
+    "dba": "database-administrator",
+    
+    # Security roles
+    "security engineer": "security-engineer",
+    "security analyst": "security-analyst",
+    "network security administrator": "security-administrator",
+    "cybersecurity specialist": "cybersecurity-specialist",
+    "it security manager": "security-manager",
+    
+    # Testing/QA roles
+    "software tester": "qa-engineer",
+    "qa engineer": "qa-engineer",
+    "uat specialist": "qa-engineer",
+    "quality analyst": "qa-engineer",
+    "test analyst": "qa-engineer",
+    "testing engineer": "qa-engineer",
+    
+    # Management and analysis roles
+    "project manager": "project-manager",
+    "it project manager": "project-manager",
+    "information technology project manager": "project-manager",
+    "scrum master": "scrum-master",
+    "business analyst": "business-analyst",
+    "systems analyst": "systems-analyst",
+    "system analyst": "systems-analyst",
+    "software analyst": "systems-analyst",
+    
+    # Senior roles
+    "software development manager": "software-development-manager",
+    "it manager": "software-development-manager",
+    "it director": "software-development-manager",
+    "digital technology director": "software-development-manager",
+    "cio": "software-development-manager",
+    "chief information officer": "software-development-manager",
+    "cto": "software-development-manager",
+    "chief technology officer": "software-development-manager",
+}
 
 class JobDataNormalizer:
     def __init__(self, 
@@ -25,98 +120,7 @@ class JobDataNormalizer:
         Path(output_dir).mkdir(parents=True, exist_ok=True)
         
         # Job title normalization mapping
-        self.job_title_mapping = {
-            # Software Engineering
-            "software engineer": "software-engineer",
-            "software developer": "software-engineer",
-            "programmer": "software-engineer",
-            "applications developer": "software-engineer",
-            
-            # Frontend Development
-            "frontend developer": "web-developer",
-            "front-end developer": "web-developer",
-            "front end developer": "web-developer",
-            
-            
-            # UX/UI Design
-            "web designer": "ux-ui-designer",
-            "webdesigner": "ux-ui-designer",
-            "ux designer": "ux-ui-designer",
-            "ui designer": "ux-ui-designer",
-            "ux  ui designer": "ux-ui-designer",
-            "user experience designer": "ux-ui-designer",
-            
-            # Backend Development
-            "backend developer": "web-developer",
-            "back-end developer": "web-developer",
-            "back end developer": "web-developer",
-            
-            # Full Stack Development
-            "full stack developer": "web-developer",
-            "full-stack developer": "web-developer",
-            "web developer": "web-developer",
-
-            
-            # Mobile Development
-            "android developer": "mobile-developer",
-            "ios developer": "mobile-developer",
-            "mobile developer": "mobile-developer",
-            
-            # Data-related roles
-            "data scientist": "data-scientist",
-            "data analyst": "data-analyst",
-            "data engineer": "data-engineer",
-            "business intelligence analyst": "bi-analyst",
-            "bi developer": "bi-developer",
-            "data modeler": "data-modeler",
-            "data architecture": "data-architect",
-            
-            # DevOps and Infrastructure
-            "devops engineer": "devops-engineer",
-            "devops": "devops-engineer",
-            "cloud technology engineer": "cloud-engineer",
-            "system engineer": "system-engineer",
-            "system administrator": "system-administrator",
-            "network engineer": "network-engineer",
-            "network administrator": "network-administrator",
-            "database administrator": "database-administrator",
-            "dba": "database-administrator",
-            
-            # Security roles
-            "security engineer": "security-engineer",
-            "security analyst": "security-analyst",
-            "network security administrator": "security-administrator",
-            "cybersecurity specialist": "cybersecurity-specialist",
-            "it security manager": "security-manager",
-            
-            # Testing/QA roles
-            "software tester": "qa-engineer",
-            "qa engineer": "qa-engineer",
-            "uat specialist": "qa-engineer",
-            "quality analyst": "qa-engineer",
-            "test analyst": "qa-engineer",
-            "testing engineer": "qa-engineer",
-            
-            # Management and analysis roles
-            "project manager": "project-manager",
-            "it project manager": "project-manager",
-            "information technology project manager": "project-manager",
-            "scrum master": "scrum-master",
-            "business analyst": "business-analyst",
-            "systems analyst": "systems-analyst",
-            "system analyst": "systems-analyst",
-            "software analyst": "systems-analyst",
-            
-            # Senior roles
-            "software development manager": "software-development-manager",
-            "it manager": "software-development-manager",
-            "it director": "software-development-manager",
-            "digital technology director": "software-development-manager",
-            "cio": "software-development-manager",
-            "chief information officer": "software-development-manager",
-            "cto": "software-development-manager",
-            "chief technology officer": "software-development-manager",
-        }
+        self.job_title_mapping = dict(JOB_TITLE_MAPPING)
         
         # Data storage
         self.jobs_data = {}
@@ -152,13 +156,13 @@ class JobDataNormalizer:
         """Load data from JSON files"""
         try:
             with open(self.jobs_data_path, 'r', encoding='utf-8') as f:
-                self.jobs_data = json.load(f)
+                self.jobs_data = json_codec.load(f)
             
             with open(self.job_responsibilities_path, 'r', encoding='utf-8') as f:
-                self.job_responsibilities = json.load(f)
+                self.job_responsibilities = json_codec.load(f)
             
             with open(self.it_salary_data_path, 'r', encoding='utf-8') as f:
-                self.it_salary_data = json.load(f)
+                self.it_salary_data = json_codec.load(f)
             
             print("Successfully loaded all data files.")
         
@@ -382,8 +386,8 @@ class JobDataNormalizer:
             if job_data["titles"]:
                 output_path = os.path.join(self.output_dir, f"{normalized_title}.json")
                 
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(job_data, f, ensure_ascii=False, indent=2)
+                # ไฟล์อาชีพถูกอ่านโดย API ระหว่างทำงาน จึงเขียนแบบ atomic
+                write_json_atomic(output_path, job_data)
                 
                 print(f"Saved {output_path}")
     
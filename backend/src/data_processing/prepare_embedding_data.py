@@ -1,12 +1,16 @@
 # backend/src/data_processing/prepare_embedding_data.py
 import os
-import json
+import sys
 import glob
 from pathlib import Path
 from tqdm import tqdm
 import argparse
 from colorama import init, Fore, Style
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.utils.atomic_write import write_json_atomic
+from src.utils import json_codec
+
 # เริ่มต้นใช้งาน colorama สำหรับแสดงสีในเทอร์มินัล
 init(autoreset=True)
 
@@ -20,7 +24,7 @@ def prepare_jobs_data(cleaned_jobs_dir, output_file):
     for job_file in tqdm(job_files, desc="เตรียมข้อมูลอาชีพ"):
         try:
             with open(job_file, 'r', encoding='utf-8') as f:
-                job_data = json.load(f)
+                job_data = json_codec.load(f)
             
             # สร้างข้อความสำหรับทำ embedding
             text_to_embed = ""
@@ -74,8 +78,7 @@ def prepare_jobs_data(cleaned_jobs_dir, output_file):
         # สร้างโฟลเดอร์หากยังไม่มี
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(all_jobs, f, ensure_ascii=False, indent=2)
+        write_json_atomic(output_file, all_jobs)
         
         print(f"{Fore.GREEN}✅ บันทึกข้อมูลสำหรับสร้าง embeddings แล้ว: {len(all_jobs)} รายการ -> {output_file}{Style.RESET_ALL}")
         return True
@@ -96,7 +99,7 @@ def prepare_advices_data(advice_file, output_file):
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         
         with open(advice_file, 'r', encoding='utf-8') as f:
-            advice_data = json.load(f)
+            advice_data = json_codec.load(f)
         
         # ตรวจสอบโครงสร้างข้อมูล
         if "career_advices" not in advice_data:
@@ -145,8 +148,7 @@ def prepare_advices_data(advice_file, output_file):
             embedding_advices.append(embedding_item)
         
         # บันทึกไฟล์ embedding
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(embedding_advices, f, ensure_ascii=False, indent=2)
+        write_json_atomic(output_file, embedding_advices)
         
         print(f"{Fore.GREEN}✅ บันทึกข้อมูลคำแนะนำสำหรับสร้าง embeddings แล้ว: {len(embedding_advices)} รายการ -> {output_file}{Style.RESET_ALL}")
         return True
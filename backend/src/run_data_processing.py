@@ -44,6 +44,7 @@ try:
     from src.data_processing.prepare_embedding_data import prepare_jobs_data, prepare_advices_data
     # โมดูลสำหรับสร้าง vector database
     from src.utils.vector_creator import VectorCreator
+    from src.utils.index_versions import resolve_index_dir
     # โมดูลสำหรับเก็บข้อมูล
     from src.data_collection.jobsdb_scraper import JobDataProcessor as JobsDBScraper
     from src.data_collection.jobsdb_advice_scraper import SimpleArticleScraper
@@ -483,11 +484,12 @@ def create_vector_database(args):
         else:
             display_error("สร้าง Vector Database ไม่สำเร็จทั้งหมด")
             
-        # ตรวจสอบไฟล์ที่สร้างขึ้น
-        job_index_file = os.path.join(args.vector_db_dir, "job_knowledge", "faiss_index.bin")
-        job_metadata_file = os.path.join(args.vector_db_dir, "job_knowledge", "metadata.json")
-        advice_index_file = os.path.join(args.vector_db_dir, "career_advice", "faiss_index.bin")
-        advice_metadata_file = os.path.join(args.vector_db_dir, "career_advice", "metadata.json")
+        # ตรวจสอบไฟล์ที่สร้างขึ้น (ในเวอร์ชันที่ใช้งานอยู่)
+        index_dir = resolve_index_dir(args.vector_db_dir)
+        job_index_file = os.path.join(index_dir, "job_knowledge", "faiss_index.bin")
+        job_metadata_file = os.path.join(index_dir, "job_knowledge", "metadata.json")
+        advice_index_file = os.path.join(index_dir, "career_advice", "faiss_index.bin")
+        advice_metadata_file = os.path.join(index_dir, "career_advice", "metadata.json")
         
         display_substep_progress("ไฟล์ที่สร้างขึ้น:")
         if os.path.exists(job_index_file):
@@ -537,11 +539,12 @@ def print_summary(args, start_time):
     
     embedding_data_file = os.path.join(args.base_dir, "data", "embedding", "embedding_data.json")
     advices_embedding_file = os.path.join(args.base_dir, "data", "embedding", "career_advices_embeddings.json")
-    job_index_file = os.path.join(args.vector_db_dir, "job_knowledge", "faiss_index.bin")
-    job_metadata_file = os.path.join(args.vector_db_dir, "job_knowledge", "metadata.json")
-    advice_index_file = os.path.join(args.vector_db_dir, "career_advice", "faiss_index.bin")
-    advice_metadata_file = os.path.join(args.vector_db_dir, "career_advice", "metadata.json")
-    combined_index_file = os.path.join(args.vector_db_dir, "combined_knowledge", "faiss_index.bin")
+    index_dir = resolve_index_dir(args.vector_db_dir)
+    job_index_file = os.path.join(index_dir, "job_knowledge", "faiss_index.bin")
+    job_metadata_file = os.path.join(index_dir, "job_knowledge", "metadata.json")
+    advice_index_file = os.path.join(index_dir, "career_advice", "faiss_index.bin")
+    advice_metadata_file = os.path.join(index_dir, "career_advice", "metadata.json")
+    combined_index_file = os.path.join(index_dir, "combined_knowledge", "faiss_index.bin")
     
     files_to_check = {
         "ข้อมูล embeddings อาชีพ": embedding_data_file,
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Atomic, crash-safe file writes for Career AI Advisor.
+
+Data is written to a temp file in the target's directory, flushed and fsynced,
+then renamed over the target with ``os.replace``. Readers see either the old
+file or the complete new one, never a truncated file, and a crash leaves at
+most a stray ``.tmp`` file behind. With ``checksum=True`` a ``<file>.sha256``
+sidecar is written after the data so a loader can detect a damaged file.
+"""
+
+import os
+import uuid
+import hashlib
+from contextlib import contextmanager
+from typing import Any, Iterator, IO, Optional, Union
+
+from src.utils.logger import get_logger
+
+# ตั้งค่า logger
+logger = get_logger("atomic_write")
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+# นามสกุลของไฟล์ checksum ที่เขียนคู่กับไฟล์ข้อมูล
+CHECKSUM_SUFFIX = ".sha256"
+
+
+def fsync_dir(dir_path: PathLike) -> None:
+    """
+    บันทึกการเปลี่ยนชื่อไฟล์ในโฟลเดอร์ลงดิสก์ (ไม่รองรับในบางระบบ เช่น Windows)
+
+    Args:
+        dir_path: โฟลเดอร์
+    """
+    try:
+        dir_fd = os.open(str(dir_path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def file_sha256(path: PathLike, chunk_size: int = 1 << 20) -> str:
+    """
+    คำนวณ sha256 ของไฟล์
+
+    Args:
+        path: พาธของไฟล์
+        chunk_size: ขนาดที่อ่านต่อครั้ง (ไบต์)
+
+    Returns:
+        str: ค่า sha256 (hex)
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def atomic_open(path: PathLike,
+                mode: str = 'w',
+                encoding: Optional[str] = 'utf-8',
+                checksum: bool = False,
+                fsync: bool = True) -> Iterator[IO]:
+    """
+    เปิดไฟล์สำหรับเขียนแบบ atomic: ไฟล์ปลายทางถูกแทนที่เมื่อออกจาก with สำเร็จเท่านั้น
+    ถ้าเกิดข้อผิดพลาดระหว่างเขียน ไฟล์เดิมจะไม่ถูกแตะต้อง
+
+    Args:
+        path: พาธของไฟล์ปลายทาง
+        mode: 'w' (ข้อความ) หรือ 'wb' (ไบต์)
+        encoding: encoding สำหรับโหมดข้อความ
+        checksum: เขียนไฟล์ <path>.sha256 คู่กับไฟล์ข้อมูล
+        fsync: fsync ไฟล์และโฟลเดอร์ (ปิดได้สำหรับไฟล์ชั่วคราวที่ไม่ต้องทนต่อไฟดับ)
+
+    Returns:
+        Iterator[IO]: file object ของไฟล์ชั่วคราว
+    """
+    if mode not in ('w', 'wb'):
+        raise ValueError(f"atomic_open รองรับเฉพาะโหมด 'w' และ 'wb': {mode!r}")
+
+    path = os.fspath(path)
+    dir_path = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dir_path, exist_ok=True)
+    tmp_path = os.path.join(dir_path, f".{os.path.basename(path)}.{uuid.uuid4().hex[:12]}.tmp")
+
+    # O_EXCL: ชื่อไฟล์ชั่วคราวไม่ชนกับผู้เขียนคนอื่น, 0o666 + umask: สิทธิ์เหมือน open() ปกติ
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        if mode == 'wb':
+            f = os.fdopen(fd, 'wb')
+        else:
+            f = os.fdopen(fd, 'w', encoding=encoding)
+        with f:
+            yield f
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+
+        digest = None
+        if checksum:
+            digest = file_sha256(tmp_path)
+            # ลบ checksum เดิมก่อน: ถ้าล่มระหว่างนี้ ไฟล์จะไม่มี checksum แทนที่จะมี checksum ที่ไม่ตรง
+            try:
+                os.remove(f"{path}{CHECKSUM_SUFFIX}")
+            except FileNotFoundError:
+                pass
+        os.replace(tmp_path, path)
+        if digest is not None:
+            write_text_atomic(f"{path}{CHECKSUM_SUFFIX}", f"{digest}  {os.path.basename(path)}\n", fsync=fsync)
+        if fsync:
+            fsync_dir(dir_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_bytes_atomic(path: PathLike, data: bytes, checksum: bool = False, fsync: bool = True) -> None:
+    """
+    เขียนไบต์ลงไฟล์แบบ atomic
+
+    Args:
+        path: พาธของไฟล์
+        data: ข้อมูล
+        checksum: เขียนไฟล์ <path>.sha256 คู่กัน
+        fsync: fsync ไฟล์และโฟลเดอร์
+    """
+    with atomic_open(path, 'wb', encoding=None, checksum=checksum, fsync=fsync) as f:
+        f.write(data)
+
+
+def write_text_atomic(path: PathLike, text: str, checksum: bool = False, fsync: bool = True) -> None:
+    """
+    เขียนข้อความลงไฟล์แบบ atomic (UTF-8)
+
+    Args:
+        path: พาธของไฟล์
+        text: ข้อความ
+        checksum: เขียนไฟล์ <path>.sha256 คู่กัน
+        fsync: fsync ไฟล์และโฟลเดอร์
+    """
+    with atomic_open(path, 'w', checksum=checksum, fsync=fsync) as f:
+        f.write(text)
+
+
+def write_json_atomic(path: PathLike,
+                      data: Any,
+                      pretty: Optional[bool] = None,
+                      checksum: bool = False,
+                      fsync: bool = True) -> None:
+    """
+    เขียน JSON ลงไฟล์แบบ atomic (ผ่าน json_codec: กะทัดรัดเป็นค่าเริ่มต้น)
+
+    Args:
+        path: พาธของไฟล์
+        data: ข้อมูลที่แปลงเป็น JSON ได้
+        pretty: เยื้อง 2 ช่อง ถ้าไม่ระบุจะใช้ JSON_PRETTY
+        checksum: เขียนไฟล์ <path>.sha256 คู่กัน
+        fsync: fsync ไฟล์และโฟลเดอร์
+    """
+    from src.utils import json_codec
+
+    payload = json_codec.dumps(data, pretty=pretty)
+    with atomic_open(path, 'wb', encoding=None, checksum=checksum, fsync=fsync) as f:
+        f.write(payload)
+
+
+def verify_checksum(path: PathLike) -> Optional[bool]:
+    """
+    ตรวจสอบไฟล์กับไฟล์ <path>.sha256
+
+    Args:
+        path: พาธของไฟล์ข้อมูล
+
+    Returns:
+        Optional[bool]: True ถ้าตรงกัน, False ถ้าไม่ตรงหรือไม่มีไฟล์ข้อมูล, None ถ้าไม่มีไฟล์ checksum
+    """
+    path = os.fspath(path)
+    try:
+        with open(f"{path}{CHECKSUM_SUFFIX}", 'r', encoding='utf-8') as f:
+            expected = f.read().split()[0]
+    except (FileNotFoundError, IndexError):
+        return None
+
+    try:
+        actual = file_sha256(path)
+    except FileNotFoundError:
+        return False
+    if actual != expected:
+        logger.error(f"checksum ของไฟล์ {path} ไม่ตรงกัน (ไฟล์อาจเสียหาย)")
+        return False
+    return True
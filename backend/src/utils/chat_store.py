@@ -0,0 +1,706 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Indexed chat history store for Career AI Advisor.
+
+Conversations are kept in SQLite (WAL mode) with an index on the conversation
+timestamp, so reading the latest N conversations touches only those N rows and
+their messages instead of every file ever written. ChatHistoryWriter batches
+the per-turn appends from the chat routes into one transaction per flush.
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import List, Optional, Dict, Any, Tuple
+
+from src.utils.logger import get_logger
+from src.api.models import ChatHistory, ChatMessage, ChatHistorySummary
+
+# ตั้งค่า logger
+logger = get_logger("chat_store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    timestamp TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    personality TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT,
+    PRIMARY KEY (chat_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# ความยาวสูงสุดของข้อความตัวอย่างในสรุปการสนทนา
+PREVIEW_CHARS = 100
+
+# ตัวคั่นระหว่างเวลาและรหัสการสนทนาใน cursor ของการแบ่งหน้า
+CURSOR_SEPARATOR = "|"
+
+
+def make_cursor(timestamp: str, chat_id: str) -> str:
+    """
+    สร้าง cursor ของการแบ่งหน้าจากเวลาและรหัสของการสนทนา
+
+    Args:
+        timestamp: เวลาของการสนทนา
+        chat_id: รหัสการสนทนา
+
+    Returns:
+        str: cursor ("timestamp|id")
+    """
+    return f"{timestamp}{CURSOR_SEPARATOR}{chat_id}"
+
+
+def _parse_cursor(cursor: str) -> Tuple[str, Optional[str]]:
+    """
+    แยก cursor เป็นเวลาและรหัสการสนทนา (cursor แบบเดิมที่มีแค่เวลาจะได้รหัสเป็น None)
+
+    Args:
+        cursor: cursor จาก make_cursor หรือเวลาอย่างเดียว
+
+    Returns:
+        Tuple[str, Optional[str]]: เวลาและรหัสการสนทนา
+    """
+    timestamp, separator, chat_id = cursor.partition(CURSOR_SEPARATOR)
+    return timestamp, (chat_id if separator else None)
+
+
+class ChatHistoryStore:
+    """
+    ที่เก็บประวัติการสนทนาแบบมี index ตามเวลา (SQLite โหมด WAL)
+
+    แต่ละ thread ใช้ connection ของตัวเอง ผู้อ่านหลายคนอ่านพร้อมกับผู้เขียนได้
+    """
+
+    def __init__(self, db_path: str, legacy_chats_dir: Optional[str] = None):
+        """
+        เริ่มต้นใช้งาน ChatHistoryStore
+
+        Args:
+            db_path: พาธของไฟล์ฐานข้อมูล
+            legacy_chats_dir: โฟลเดอร์ไฟล์ JSON แบบเดิม (นำเข้าครั้งแรกครั้งเดียว)
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+
+        if legacy_chats_dir:
+            self._import_legacy(legacy_chats_dir)
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        # ฐานข้อมูลที่สร้างก่อนมีคอลัมน์ personality
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(chats)")}
+        if "personality" not in columns:
+            conn.execute("ALTER TABLE chats ADD COLUMN personality TEXT")
+        # index ตาม (timestamp, id) สำหรับ keyset pagination ที่ไม่ข้ามการสนทนาที่มีเวลาเท่ากัน
+        # (แทน index เดิมที่มีแค่ timestamp)
+        for name in ("idx_chats_timestamp", "idx_chats_personality_timestamp", "idx_chats_user_timestamp"):
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_timestamp_id ON chats (timestamp, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_personality_timestamp_id ON chats (personality, timestamp, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_user_timestamp_id ON chats (user_id, timestamp, id)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: จัดการ transaction เอง (BEGIN IMMEDIATE สำหรับการเขียน)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            # fsync ทุก commit ChatHistoryWriter รวมหลายข้อความไว้ใน commit เดียว
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, func, *args):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(conn, *args)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _insert_messages(conn: sqlite3.Connection, chat_id: str, start_seq: int, messages: List[ChatMessage]) -> None:
+        conn.executemany(
+            "INSERT OR REPLACE INTO messages (chat_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [
+                (chat_id, start_seq + i, message.role, message.content, message.timestamp)
+                for i, message in enumerate(messages)
+            ]
+        )
+
+    @classmethod
+    def _replace_chat(cls, conn: sqlite3.Connection, chat_history: ChatHistory) -> None:
+        conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_history.id,))
+        cls._insert_messages(conn, chat_history.id, 0, chat_history.messages)
+        conn.execute(
+            "INSERT OR REPLACE INTO chats (id, user_id, timestamp, message_count, personality) VALUES (?, ?, ?, ?, ?)",
+            (chat_history.id, chat_history.user_id, chat_history.timestamp, len(chat_history.messages), chat_history.personality)
+        )
+
+    @classmethod
+    def _append_chat(cls, conn: sqlite3.Connection, chat_history: ChatHistory) -> None:
+        row = conn.execute("SELECT message_count FROM chats WHERE id = ?", (chat_history.id,)).fetchone()
+        if row is None:
+            cls._replace_chat(conn, chat_history)
+            return
+        cls._insert_messages(conn, chat_history.id, row["message_count"], chat_history.messages)
+        conn.execute(
+            "UPDATE chats SET timestamp = ?, message_count = ?, personality = COALESCE(?, personality) WHERE id = ?",
+            (chat_history.timestamp, row["message_count"] + len(chat_history.messages), chat_history.personality, chat_history.id)
+        )
+
+    def save(self, chat_history: ChatHistory) -> None:
+        """
+        บันทึกประวัติการสนทนา (แทนที่ของเดิมทั้งหมดถ้ามี)
+
+        Args:
+            chat_history: ประวัติการสนทนา
+        """
+        self._write(self._replace_chat, chat_history)
+
+    def append(self, chat_history: ChatHistory) -> None:
+        """
+        เพิ่มข้อความต่อท้ายการสนทนาเดิม (สร้างใหม่ถ้ายังไม่มี) โดยไม่ต้องอ่านข้อความเดิม
+
+        Args:
+            chat_history: ประวัติการสนทนาที่มีเฉพาะข้อความใหม่
+        """
+        self._write(self._append_chat, chat_history)
+
+    def append_many(self, chat_histories: List[ChatHistory]) -> None:
+        """
+        เพิ่มข้อความของหลายการสนทนาใน transaction เดียว (fsync ครั้งเดียวทั้งชุด)
+
+        Args:
+            chat_histories: ประวัติการสนทนาที่มีเฉพาะข้อความใหม่ เรียงตามลำดับที่เกิดขึ้น
+        """
+        def append_all(conn: sqlite3.Connection) -> None:
+            for chat_history in chat_histories:
+                self._append_chat(conn, chat_history)
+
+        self._write(append_all)
+
+    def _load_messages(self, chat_ids: List[str]) -> Dict[str, List[ChatMessage]]:
+        messages: Dict[str, List[ChatMessage]] = {chat_id: [] for chat_id in chat_ids}
+        if not chat_ids:
+            return messages
+        placeholders = ",".join("?" * len(chat_ids))
+        rows = self._connection().execute(
+            f"SELECT chat_id, role, content, timestamp FROM messages WHERE chat_id IN ({placeholders}) ORDER BY chat_id, seq",
+            chat_ids
+        )
+        for row in rows:
+            messages[row["chat_id"]].append(
+                ChatMessage(role=row["role"], content=row["content"], timestamp=row["timestamp"])
+            )
+        return messages
+
+    def _to_histories(self, rows: List[sqlite3.Row]) -> List[ChatHistory]:
+        messages = self._load_messages([row["id"] for row in rows])
+        return [
+            ChatHistory(
+                id=row["id"],
+                user_id=row["user_id"],
+                timestamp=row["timestamp"],
+                personality=row["personality"],
+                messages=messages[row["id"]]
+            )
+            for row in rows
+        ]
+
+    def get(self, chat_id: str) -> Optional[ChatHistory]:
+        """
+        ดึงประวัติการสนทนาตามรหัส
+
+        Args:
+            chat_id: รหัสการสนทนา
+
+        Returns:
+            Optional[ChatHistory]: ประวัติการสนทนา หรือ None ถ้าไม่พบ
+        """
+        rows = self._connection().execute(
+            "SELECT id, user_id, timestamp, personality FROM chats WHERE id = ?", (chat_id,)
+        ).fetchall()
+        histories = self._to_histories(rows)
+        return histories[0] if histories else None
+
+    def owner(self, chat_id: str) -> Optional[str]:
+        """
+        ดึงรหัสผู้ใช้เจ้าของการสนทนา (ไม่โหลดข้อความ)
+
+        Args:
+            chat_id: รหัสการสนทนา
+
+        Returns:
+            Optional[str]: รหัสผู้ใช้ หรือ None ถ้าไม่พบ
+        """
+        row = self._connection().execute("SELECT user_id FROM chats WHERE id = ?", (chat_id,)).fetchone()
+        return row["user_id"] if row else None
+
+    def _select_chats(self,
+                      columns: str,
+                      limit: int,
+                      before: Optional[str] = None,
+                      after: Optional[str] = None,
+                      since: Optional[str] = None,
+                      until: Optional[str] = None,
+                      personality: Optional[str] = None,
+                      user_id: Optional[str] = None) -> List[sqlite3.Row]:
+        """
+        เลือกการสนทนาด้วย keyset pagination บน index ของ (timestamp, id) (ผลลัพธ์เรียงล่าสุดก่อน)
+
+        Args:
+            columns: คอลัมน์ที่ต้องการ (SQL)
+            limit: จำนวนสูงสุด
+            before: cursor ("timestamp|id" จาก make_cursor) เอาเฉพาะที่เก่ากว่า (หน้าถัดไป)
+                    ถ้าเป็นเวลาอย่างเดียวจะเอาเฉพาะที่เก่ากว่าเวลานั้น
+            after: cursor เอาเฉพาะที่ใหม่กว่า (หน้าก่อนหน้า)
+            since: เวลาเริ่มต้นของช่วง (รวม)
+            until: เวลาสิ้นสุดของช่วง (ไม่รวม)
+            personality: บุคลิกของ AI
+            user_id: รหัสผู้ใช้เจ้าของการสนทนา
+
+        Returns:
+            List[sqlite3.Row]: แถวของการสนทนา
+        """
+        conditions: List[str] = []
+        params: List[Any] = []
+        for cursor, operator in ((before, "<"), (after, ">")):
+            if cursor is None:
+                continue
+            timestamp, chat_id = _parse_cursor(cursor)
+            if chat_id is None:
+                conditions.append(f"timestamp {operator} ?")
+                params.append(timestamp)
+            else:
+                # เทียบทั้ง (timestamp, id) การสนทนาที่มีเวลาเท่ากันจึงไม่ถูกข้ามหรือซ้ำระหว่างหน้า
+                conditions.append(f"(timestamp, id) {operator} (?, ?)")
+                params.extend([timestamp, chat_id])
+        for condition, value in (
+            ("timestamp >= ?", since),
+            ("timestamp < ?", until),
+            ("personality = ?", personality),
+            ("user_id = ?", user_id),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        # หน้าที่ใหม่กว่า cursor ต้องอ่านจากเก่าไปใหม่ แล้วกลับลำดับ
+        order = "ASC" if after is not None and before is None else "DESC"
+        rows = self._connection().execute(
+            f"SELECT {columns} FROM chats {where} ORDER BY timestamp {order}, id {order} LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        if order == "ASC":
+            rows.reverse()
+        return rows
+
+    def latest(self, limit: int = 10, **filters: Optional[str]) -> List[ChatHistory]:
+        """
+        ดึงการสนทนาล่าสุด limit รายการ (ล่าสุดก่อน) ผ่าน index ของเวลา
+
+        Args:
+            limit: จำนวนการสนทนาที่ต้องการ
+            **filters: before, after, since, until, personality, user_id (ดู _select_chats)
+
+        Returns:
+            List[ChatHistory]: ประวัติการสนทนา
+        """
+        rows = self._select_chats("id, user_id, timestamp, personality", limit, **filters)
+        return self._to_histories(rows)
+
+    def summaries(self, limit: int = 10, **filters: Optional[str]) -> List[ChatHistorySummary]:
+        """
+        ดึงสรุปการสนทนาล่าสุด โดยไม่โหลดเนื้อหาข้อความทั้งหมด
+
+        Args:
+            limit: จำนวนการสนทนาที่ต้องการ
+            **filters: before, after, since, until, personality, user_id (ดู _select_chats)
+
+        Returns:
+            List[ChatHistorySummary]: สรุปการสนทนา
+        """
+        rows = self._select_chats("id, user_id, timestamp, personality, message_count", limit, **filters)
+        previews: Dict[str, str] = {}
+        if rows:
+            placeholders = ",".join("?" * len(rows))
+            for chat_id, preview in self._connection().execute(
+                f"SELECT chat_id, substr(content, 1, ?) FROM messages "
+                f"WHERE chat_id IN ({placeholders}) AND seq = 0",
+                [PREVIEW_CHARS] + [row["id"] for row in rows]
+            ):
+                previews[chat_id] = preview
+        return [
+            ChatHistorySummary(
+                id=row["id"],
+                user_id=row["user_id"],
+                timestamp=row["timestamp"],
+                personality=row["personality"],
+                message_count=row["message_count"],
+                preview=previews.get(row["id"], "")
+            )
+            for row in rows
+        ]
+
+    def count(self) -> int:
+        """จำนวนการสนทนาทั้งหมด"""
+        return self._connection().execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+
+    def _import_legacy(self, chats_dir: str) -> None:
+        conn = self._connection()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return
+        if not os.path.isdir(chats_dir):
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', '0')")
+            return
+
+        histories = []
+        for filename in os.listdir(chats_dir):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(chats_dir, filename), 'r', encoding='utf-8') as f:
+                    histories.append(ChatHistory.parse_obj(json.load(f)))
+            except Exception as e:
+                logger.error(f"ไม่สามารถนำเข้าประวัติการสนทนา {filename}: {str(e)}")
+
+        def import_all(conn: sqlite3.Connection) -> None:
+            for chat_history in histories:
+                # ไม่ทับการสนทนาที่มีในฐานข้อมูลแล้ว
+                if conn.execute("SELECT 1 FROM chats WHERE id = ?", (chat_history.id,)).fetchone() is None:
+                    self._replace_chat(conn, chat_history)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', ?)",
+                (str(len(histories)),)
+            )
+
+        self._write(import_all)
+        if histories:
+            logger.info(f"นำเข้าประวัติการสนทนาจากไฟล์ JSON เดิม {len(histories)} รายการ")
+
+
+class ChatHistoryWriter:
+    """
+    คิวเขียนประวัติการสนทนาแบบ write-behind
+
+    route ส่งข้อความเข้าคิวโดยไม่ต้องรอดิสก์ คิวจะถูกเขียนลงฐานข้อมูลเป็นชุด
+    เมื่อครบ max_batch รายการหรือครบ flush_interval วินาที และถูกเขียนจนหมดเมื่อปิดแอป
+    ถ้ายังไม่ได้ start() (เช่น สคริปต์) จะเขียนทันทีแบบเดิม
+
+    รายการที่เขียนไม่สำเร็จจะถูกลองใหม่ในรอบถัดไป ถ้าล้มเหลวครบ max_attempts ครั้ง
+    หรือมีรายการที่รอลองใหม่เกิน max_retry_pending รายการ จะถูกย้ายไปไฟล์ dead-letter (JSONL)
+    """
+
+    def __init__(self, store: ChatHistoryStore, max_batch: int = 32, flush_interval: float = 0.5,
+                 max_attempts: int = 5, max_retry_pending: int = 10000,
+                 dead_letter_path: Optional[str] = None):
+        """
+        เริ่มต้นใช้งาน ChatHistoryWriter
+
+        Args:
+            store: ที่เก็บประวัติการสนทนา
+            max_batch: จำนวนรายการที่ทำให้เขียนทันที
+            flush_interval: เวลาสูงสุดที่ข้อความรออยู่ในคิว (วินาที)
+            max_attempts: จำนวนครั้งสูงสุดที่ลองเขียนแต่ละรายการ
+            max_retry_pending: จำนวนรายการสูงสุดที่รอลองเขียนใหม่ (เกินแล้วย้ายรายการเก่าสุดออก)
+            dead_letter_path: ไฟล์ JSONL สำหรับรายการที่เขียนไม่สำเร็จ (None = ทิ้งพร้อมบันทึก log)
+        """
+        self.store = store
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.max_attempts = max(1, max_attempts)
+        self.max_retry_pending = max(0, max_retry_pending)
+        self.dead_letter_path = dead_letter_path
+        self._pending: List[ChatHistory] = []
+        # รายการที่เขียนไม่สำเร็จ (ประวัติการสนทนา, จำนวนครั้งที่ล้มเหลว) เรียงตามลำดับที่เกิดขึ้น
+        self._retry: List[Tuple[ChatHistory, int]] = []
+        # ชุดที่กำลังเขียน (ยังไม่ commit) เพื่อให้การอ่านยังเห็นรายการเหล่านี้
+        self._inflight: List[ChatHistory] = []
+        # เพิ่มขึ้นทุกครั้งที่ชุดที่กำลังเขียนถูก commit หรือคืนเข้าคิว
+        self._version = 0
+        self._pending_lock = threading.Lock()
+        # ให้แต่ละชุดถูกเขียนตามลำดับ แม้จะ flush จากหลาย thread
+        self._flush_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushes = 0
+        self._written = 0
+        self._failures = 0
+        self._dead_lettered = 0
+        self._last_flush_seconds = 0.0
+
+    def start(self) -> None:
+        """เริ่ม task สำหรับเขียนคิวในพื้นหลัง (ต้องเรียกภายใน event loop)"""
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+            logger.info(f"เริ่มคิวเขียนประวัติการสนทนา (ชุดละ {self.max_batch} รายการ หรือทุก {self.flush_interval} วินาที)")
+
+    def submit(self, chat_history: ChatHistory) -> None:
+        """
+        ส่งข้อความใหม่ของการสนทนาเข้าคิว
+
+        Args:
+            chat_history: ประวัติการสนทนาที่มีเฉพาะข้อความใหม่
+        """
+        if self._task is None or self._task.done():
+            self.store.append(chat_history)
+            return
+
+        with self._pending_lock:
+            self._pending.append(chat_history)
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._notify()
+
+    def _notify(self) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _unwritten(self) -> List[ChatHistory]:
+        # ต้องถือ _pending_lock: รายการที่ยังไม่ได้ commit ทั้งหมด เรียงตามลำดับที่เกิดขึ้น
+        return self._inflight + [chat_history for chat_history, _ in self._retry] + self._pending
+
+    def pending_owner(self, chat_id: str) -> Optional[str]:
+        """
+        รหัสผู้ใช้ของการสนทนาที่ยังค้างอยู่ในคิว
+
+        Args:
+            chat_id: รหัสการสนทนา
+
+        Returns:
+            Optional[str]: รหัสผู้ใช้ หรือ None ถ้าไม่มีการสนทนานี้ในคิว
+        """
+        with self._pending_lock:
+            for chat_history in reversed(self._unwritten()):
+                if chat_history.id == chat_id:
+                    return chat_history.user_id
+        return None
+
+    def read_through(self, chat_id: str) -> Optional[ChatHistory]:
+        """
+        ดึงประวัติการสนทนาจากฐานข้อมูลรวมกับข้อความที่ยังค้างอยู่ในคิว โดยไม่ต้อง flush
+
+        Args:
+            chat_id: รหัสการสนทนา
+
+        Returns:
+            Optional[ChatHistory]: ประวัติการสนทนา หรือ None ถ้าไม่พบ
+        """
+        while True:
+            with self._pending_lock:
+                version = self._version
+                unwritten = [h for h in self._unwritten() if h.id == chat_id]
+            chat_history = self.store.get(chat_id)
+            with self._pending_lock:
+                # ถ้ามีชุดถูก commit ระหว่างอ่าน ข้อความอาจซ้ำกับที่อยู่ในฐานข้อมูลแล้ว ให้อ่านใหม่
+                if version == self._version:
+                    break
+
+        # รวมแบบเดียวกับ ChatHistoryStore._append_chat
+        for item in unwritten:
+            if chat_history is None:
+                chat_history = ChatHistory(
+                    id=item.id, user_id=item.user_id, timestamp=item.timestamp,
+                    personality=item.personality, messages=list(item.messages)
+                )
+                continue
+            chat_history.messages.extend(item.messages)
+            chat_history.timestamp = item.timestamp
+            if item.personality is not None:
+                chat_history.personality = item.personality
+        return chat_history
+
+    def pending_count(self) -> int:
+        """จำนวนรายการที่ยังไม่ได้เขียน"""
+        with self._pending_lock:
+            return len(self._pending) + len(self._retry)
+
+    def _dead_letter(self, chat_histories: List[ChatHistory], reason: str) -> None:
+        """บันทึกรายการที่เขียนไม่สำเร็จลงไฟล์ dead-letter (หรือทิ้งถ้าไม่ได้กำหนดไฟล์)"""
+        if not chat_histories:
+            return
+        self._dead_lettered += len(chat_histories)
+        if not self.dead_letter_path:
+            logger.error(f"ทิ้งประวัติการสนทนา {len(chat_histories)} รายการที่เขียนไม่สำเร็จ ({reason})")
+            return
+        try:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                for chat_history in chat_histories:
+                    f.write(json.dumps(chat_history.dict(), ensure_ascii=False) + '\n')
+            logger.error(
+                f"ย้ายประวัติการสนทนา {len(chat_histories)} รายการที่เขียนไม่สำเร็จไปที่ "
+                f"{self.dead_letter_path} ({reason})"
+            )
+        except Exception as e:
+            logger.error(f"ไม่สามารถบันทึกไฟล์ dead-letter {self.dead_letter_path}: {str(e)}")
+
+    def _write_each(self, entries: List[Tuple[ChatHistory, int]]) -> Tuple[int, List[Tuple[ChatHistory, int]], Optional[Exception]]:
+        """
+        เขียนทีละรายการหลังจากเขียนทั้งชุดไม่สำเร็จ (ต้องถือ _flush_lock)
+
+        ถ้ารายการของการสนทนาใดล้มเหลว รายการถัดไปของการสนทนานั้นจะรอรอบถัดไปโดยไม่นับเป็นความล้มเหลว
+        เพื่อให้ข้อความยังเรียงตามลำดับเดิม
+
+        Args:
+            entries: รายการและจำนวนครั้งที่ล้มเหลวแล้ว เรียงตามลำดับที่เกิดขึ้น
+
+        Returns:
+            Tuple[int, List[Tuple[ChatHistory, int]], Optional[Exception]]:
+                จำนวนที่เขียนสำเร็จ, รายการที่ต้องลองใหม่พร้อมจำนวนครั้งที่ล้มเหลว และข้อผิดพลาดล่าสุด
+        """
+        written = 0
+        remaining: List[Tuple[ChatHistory, int]] = []
+        blocked = set()
+        error: Optional[Exception] = None
+        for index, (chat_history, attempts) in enumerate(entries):
+            if chat_history.id in blocked:
+                remaining.append((chat_history, attempts))
+                continue
+            try:
+                self.store.append_many([chat_history])
+            except Exception as e:
+                error = e
+                blocked.add(chat_history.id)
+                remaining.append((chat_history, attempts + 1))
+                continue
+            written += 1
+            with self._pending_lock:
+                # รายการนี้อยู่ในฐานข้อมูลแล้ว read_through ต้องไม่รวมซ้ำ
+                self._inflight = [h for h, _ in remaining] + [h for h, _ in entries[index + 1:]]
+                self._version += 1
+        return written, remaining, error
+
+    def flush(self) -> int:
+        """
+        เขียนรายการทั้งหมดในคิวลงฐานข้อมูลใน transaction เดียว (ถ้าไม่สำเร็จจะเขียนทีละรายการ)
+
+        Returns:
+            int: จำนวนรายการที่เขียน
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                retry, self._retry = self._retry, []
+                fresh, self._pending = self._pending, []
+                batch = [chat_history for chat_history, _ in retry] + fresh
+                self._inflight = batch
+            if not batch:
+                return 0
+
+            start_time = time.perf_counter()
+            try:
+                self.store.append_many(batch)
+            except Exception as e:
+                self._failures += 1
+                logger.error(
+                    f"เกิดข้อผิดพลาดในการเขียนประวัติการสนทนา {len(batch)} รายการ: {str(e)} "
+                    f"จะเขียนทีละรายการ"
+                )
+
+                # เขียนทีละรายการ: เฉพาะรายการที่เขียนไม่ได้จริงถูกนับครั้งที่ล้มเหลว
+                written, failed, error = self._write_each(retry + [(h, 0) for h in fresh])
+
+                # คืนรายการเข้าคิวเพื่อลองใหม่ในรอบถัดไป ยกเว้นรายการที่ล้มเหลวครบ max_attempts ครั้ง
+                expired = [h for h, attempts in failed if attempts >= self.max_attempts]
+                failed = [(h, attempts) for h, attempts in failed if attempts < self.max_attempts]
+                overflow = len(failed) - self.max_retry_pending
+                if overflow > 0:
+                    expired += [h for h, _ in failed[:overflow]]
+                    failed = failed[overflow:]
+                with self._pending_lock:
+                    self._retry = failed
+                    self._inflight = []
+                    self._version += 1
+                self._dead_letter(expired, f"ล้มเหลว {self.max_attempts} ครั้งหรือคิวลองใหม่เต็ม: {str(error or e)}")
+                self._written += written
+                self._last_flush_seconds = time.perf_counter() - start_time
+                return written
+
+            with self._pending_lock:
+                self._inflight = []
+                self._version += 1
+            self._flushes += 1
+            self._written += len(batch)
+            self._last_flush_seconds = time.perf_counter() - start_time
+            return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self.pending_count():
+                await asyncio.to_thread(self.flush)
+
+    async def close(self) -> None:
+        """หยุด task และเขียนรายการที่เหลือในคิวจนหมด"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        written = await asyncio.to_thread(self.flush)
+        if written:
+            logger.info(f"เขียนประวัติการสนทนาที่ค้างในคิว {written} รายการก่อนปิด")
+        # รายการที่ยังเขียนไม่สำเร็จจะหายไปเมื่อปิดแอป จึงย้ายไปไฟล์ dead-letter
+        with self._pending_lock:
+            remaining = [chat_history for chat_history, _ in self._retry] + self._pending
+            self._retry, self._pending = [], []
+        await asyncio.to_thread(self._dead_letter, remaining, "ปิดแอปก่อนเขียนสำเร็จ")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ดึงสถิติของคิวเขียน
+
+        Returns:
+            Dict[str, Any]: สถิติปัจจุบัน
+        """
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "pending": self.pending_count(),
+            "flushes": self._flushes,
+            "written": self._written,
+            "failures": self._failures,
+            "dead_lettered": self._dead_lettered,
+            "avg_batch": round(self._written / self._flushes, 2) if self._flushes else 0.0,
+            "last_flush_seconds": round(self._last_flush_seconds, 4),
+        }
@@ -58,6 +58,7 @@ RAW_DATA_DIR = os.path.join(DATA_DIR, "raw")
 VECTOR_DB_DIR = os.path.join(DATA_DIR, "vector_db")
 FINE_TUNE_DIR = os.path.join(DATA_DIR, "fine_tune")
 USERS_DIR = os.path.join(DATA_DIR, "users")
+JOBS_DIR = os.path.join(DATA_DIR, "jobs")
 
 # โฟลเดอร์ย่อยของข้อมูลที่ประมวลผลแล้ว
 CLEANED_JOBS_DIR = os.path.join(PROCESSED_DATA_DIR, "cleaned_jobs")
@@ -79,7 +80,7 @@ dirs_to_create = [
     RAW_DATA_DIR, VECTOR_DB_DIR, FINE_TUNE_DIR, CLEANED_JOBS_DIR, 
     NORMALIZED_JOBS_DIR, CAREER_ADVICES_DIR, JOB_VECTOR_DIR, 
     ADVICE_VECTOR_DIR, COMBINED_VECTOR_DIR, USERS_DIR,
-    RAW_JOBSDB_DIR, RAW_OTHER_SOURCES_DIR
+    RAW_JOBSDB_DIR, RAW_OTHER_SOURCES_DIR, JOBS_DIR
 ]
 for dir_path in dirs_to_create:
     os.makedirs(dir_path, exist_ok=True)
@@ -91,17 +92,113 @@ API_PORT = int(os.getenv("API_PORT", "8000"))
 API_DEBUG = os.getenv("API_DEBUG", "False").lower() in ("true", "1", "t")
 API_KEY = os.getenv("API_KEY", "")
 
+# บีบอัด response (gzip หรือ brotli ถ้าติดตั้ง brotli-asgi) เมื่อ client รองรับและ response ใหญ่กว่า MIN_SIZE ไบต์
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "True").lower() in ("true", "1", "t")
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1000"))
+
+# แคช HTTP ของ endpoint ที่อ่านอย่างเดียว (ETag + Cache-Control) และแคช response ในหน่วยความจำ (0 = ปิด)
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "300"))
+STATIC_CACHE_MAX_AGE = int(os.getenv("STATIC_CACHE_MAX_AGE", "86400"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
 # ตั้งค่า Embedding Model
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "intfloat/e5-small-v2")
 
+# การ encode ตอนสร้าง vector database (EMBEDDING_PROCESSES: 1 = process เดียว, 0 = อัตโนมัติ)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "1"))
+EMBEDDING_CHUNK_SIZE = int(os.getenv("EMBEDDING_CHUNK_SIZE", "0"))
+
+# จำนวนเวอร์ชันของ vector database ที่เก็บไว้ (รวมเวอร์ชันที่ใช้งานอยู่)
+VECTOR_DB_KEEP_VERSIONS = int(os.getenv("VECTOR_DB_KEEP_VERSIONS", "3"))
+
 # ตั้งค่า LLM
 LLM_MODEL = os.getenv("LLM_MODEL", "llama3.1:latest")
 LLM_API_BASE = os.getenv("LLM_API_BASE", "http://host.docker.internal:11434")
 LLM_API_KEY = os.getenv("LLM_API_KEY", "")
 
+# รายการ LLM server สำหรับกระจายคำขอ (คั่นด้วยจุลภาค ค่าเริ่มต้นคือ LLM_API_BASE เครื่องเดียว)
+LLM_API_BASES = [url.strip() for url in os.getenv("LLM_API_BASES", LLM_API_BASE).split(",") if url.strip()]
+LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "30"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "3"))
+LLM_CIRCUIT_RESET_TIMEOUT = float(os.getenv("LLM_CIRCUIT_RESET_TIMEOUT", "30"))
+
+# ตั้งค่าเวลาตอบกลับสูงสุดของคำขอและการส่งคำขอสำรอง (hedging)
+LLM_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", "60"))
+LLM_FALLBACK_MARGIN = float(os.getenv("LLM_FALLBACK_MARGIN", "1.5"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "True").lower() in ("true", "1", "t")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", "")
+
+# ตั้งค่าการจำกัดคำขอที่ส่งไปยัง LLM พร้อมกัน
+# LLM_MAX_CONCURRENCY_PER_ENDPOINT: จำนวนคำขอพร้อมกันต่อ server (pool เลือกเฉพาะ server ที่ยังว่าง)
+# LLM_MAX_CONCURRENCY: รวมทุก server ใน LLM_API_BASES (ค่าเริ่มต้น = ต่อ server x จำนวน server)
+LLM_MAX_CONCURRENCY_PER_ENDPOINT = int(os.getenv("LLM_MAX_CONCURRENCY_PER_ENDPOINT", "2"))
+LLM_MAX_CONCURRENCY = int(os.getenv(
+    "LLM_MAX_CONCURRENCY", str(LLM_MAX_CONCURRENCY_PER_ENDPOINT * max(1, len(LLM_API_BASES)))
+))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+# ตั้งค่างบประมาณโทเค็นของ prompt
+LLM_PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "3000"))
+LLM_CONTEXT_MAX_LIST_ITEMS = int(os.getenv("LLM_CONTEXT_MAX_LIST_ITEMS", "5"))
+
+# ตั้งค่าหน่วยความจำของบทสนทนาหลายรอบ
+CONVERSATION_RECENT_TURNS = int(os.getenv("CONVERSATION_RECENT_TURNS", "4"))
+CONVERSATION_SUMMARY_MAX_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_MAX_TOKENS", "300"))
+CONVERSATION_MESSAGE_MAX_TOKENS = int(os.getenv("CONVERSATION_MESSAGE_MAX_TOKENS", "200"))
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "500"))
+CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", "3600"))
+# CONVERSATION_MAX_COMPACT_TURNS: จำนวนรอบสูงสุดที่รวมเข้ากับบทสรุปต่อการสรุปหนึ่งครั้ง (จำกัดขนาด prompt ของการสรุป)
+CONVERSATION_MAX_COMPACT_TURNS = int(os.getenv("CONVERSATION_MAX_COMPACT_TURNS", "8"))
+
+# ตั้งค่าการเลือกโมเดลตามความซับซ้อนของคำถาม (LLM_SMALL_MODEL ว่าง = ใช้โมเดลเต็มทุกคำถาม)
+LLM_SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "")
+ROUTER_SHORT_QUERY_CHARS = int(os.getenv("ROUTER_SHORT_QUERY_CHARS", "80"))
+ROUTER_LONG_QUERY_CHARS = int(os.getenv("ROUTER_LONG_QUERY_CHARS", "200"))
+# ตอบคำถามข้อเท็จจริงของอาชีพ (เงินเดือน ทักษะ หน้าที่) จาก normalized_jobs โดยไม่เรียก LLM
+INSTANT_ANSWERS_ENABLED = os.getenv("INSTANT_ANSWERS_ENABLED", "True").lower() in ("true", "1", "t")
+# ระยะเวลาขั้นต่ำ (วินาที) ระหว่างการตรวจว่าไฟล์อาชีพเปลี่ยนหรือไม่
+INSTANT_ANSWERS_RELOAD_INTERVAL = float(os.getenv("INSTANT_ANSWERS_RELOAD_INTERVAL", "5"))
+
 # ตั้งค่า Fine-tuned Model
 FINE_TUNED_MODEL = os.getenv("FINE_TUNED_MODEL", "llama3.1-8b-instruct-fine-tuned")
 USE_FINE_TUNED = os.getenv("USE_FINE_TUNED", "False").lower() in ("true", "1", "t")
+# ตั้งค่าการสร้างคำตอบของชุดข้อมูล fine-tuning ด้วย LLM
+FINE_TUNE_GENERATION_CONCURRENCY = int(os.getenv("FINE_TUNE_GENERATION_CONCURRENCY", "4"))
+FINE_TUNE_GENERATION_MAX_TOKENS = int(os.getenv("FINE_TUNE_GENERATION_MAX_TOKENS", "800"))
+FINE_TUNE_GENERATION_MAX_RETRIES = int(os.getenv("FINE_TUNE_GENERATION_MAX_RETRIES", "3"))
+# จำนวนครั้งที่รอเมื่อคิว LLM เต็มต่อหนึ่งตัวอย่าง (ไม่นับใน MAX_RETRIES, 0 = รอได้ไม่จำกัด)
+FINE_TUNE_GENERATION_MAX_OVERLOAD_WAITS = int(os.getenv("FINE_TUNE_GENERATION_MAX_OVERLOAD_WAITS", "0"))
+
+# คิวเขียนประวัติการสนทนา (เขียนเป็นชุดเมื่อครบจำนวน หรือครบเวลา)
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "32"))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "0.5"))
+# รายการที่เขียนไม่สำเร็จครบจำนวนครั้งนี้ หรือเกินจำนวนที่รอลองใหม่ได้ จะถูกย้ายไปไฟล์ dead-letter
+CHAT_WRITE_MAX_ATTEMPTS = int(os.getenv("CHAT_WRITE_MAX_ATTEMPTS", "10"))
+CHAT_WRITE_MAX_RETRY_PENDING = int(os.getenv("CHAT_WRITE_MAX_RETRY_PENDING", "10000"))
+
+# ที่เก็บข้อมูลผู้ใช้หลายคน
+# ALLOW_DEFAULT_USER: คำขอที่ไม่มี header X-User-ID ใช้ผู้ใช้เริ่มต้น "app_user" โดยไม่ต้องมี token
+# (แบบผู้ใช้คนเดียวเดิม เปิดเฉพาะเมื่อ API ไม่ได้เปิดให้ผู้อื่นเข้าถึง)
+ALLOW_DEFAULT_USER = os.getenv("ALLOW_DEFAULT_USER", "False").lower() in ("true", "1", "t")
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
+# ตั้งค่าการแปลง JSON (JSON_CODEC: auto = ใช้ orjson ถ้าติดตั้งไว้, orjson, json)
+# JSON_PRETTY: เขียนไฟล์ JSON แบบเยื้องให้อ่านง่าย (ค่าเริ่มต้นเขียนแบบกะทัดรัด)
+JSON_CODEC = os.getenv("JSON_CODEC", "auto").lower()
+JSON_PRETTY = os.getenv("JSON_PRETTY", "False").lower() in ("true", "1", "t")
+
+# ตั้งค่าการอัปโหลด Resume (อ่านไฟล์ทีละ chunk และจำกัดขนาดไฟล์)
+RESUME_MAX_BYTES = int(os.getenv("RESUME_MAX_BYTES", str(10 * 1024 * 1024)))
+RESUME_UPLOAD_CHUNK_SIZE = int(os.getenv("RESUME_UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+# คำขอแบบ multipart (ฟอร์มที่มีไฟล์ Resume) ถูกจำกัดที่ RESUME_MAX_BYTES + ค่านี้ (สำหรับฟิลด์อื่นและ boundary)
+RESUME_MULTIPART_OVERHEAD_BYTES = int(os.getenv("RESUME_MULTIPART_OVERHEAD_BYTES", str(1024 * 1024)))
+
+# ตั้งค่างานเบื้องหลังของ admin (จำนวน process สำหรับงานที่ใช้ CPU มาก เช่น สร้าง vector database)
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "1"))
 
 class PersonalityType(str, Enum):
     """ประเภทบุคลิกของ AI"""
@@ -141,16 +238,69 @@ def get_settings() -> Dict[str, Any]:
         "uploads_dir": UPLOADS_DIR,
         "logs_dir": LOGS_DIR,
         "fine_tune_dir": FINE_TUNE_DIR,
+        "jobs_dir": JOBS_DIR,
         "api_host": API_HOST,
         "api_port": API_PORT,
         "api_debug": API_DEBUG,
         "api_key": API_KEY,
+        "response_compression": RESPONSE_COMPRESSION,
+        "response_compression_min_size": RESPONSE_COMPRESSION_MIN_SIZE,
+        "http_cache_max_age": HTTP_CACHE_MAX_AGE,
+        "static_cache_max_age": STATIC_CACHE_MAX_AGE,
+        "response_cache_size": RESPONSE_CACHE_SIZE,
         "embedding_model": EMBEDDING_MODEL,
+        "embedding_batch_size": EMBEDDING_BATCH_SIZE,
+        "embedding_processes": EMBEDDING_PROCESSES,
+        "embedding_chunk_size": EMBEDDING_CHUNK_SIZE,
+        "vector_db_keep_versions": VECTOR_DB_KEEP_VERSIONS,
         "llm_model": LLM_MODEL,
         "llm_api_base": LLM_API_BASE,
         "llm_api_key": LLM_API_KEY,
+        "llm_api_bases": LLM_API_BASES,
+        "llm_health_check_interval": LLM_HEALTH_CHECK_INTERVAL,
+        "llm_circuit_failure_threshold": LLM_CIRCUIT_FAILURE_THRESHOLD,
+        "llm_circuit_reset_timeout": LLM_CIRCUIT_RESET_TIMEOUT,
+        "llm_request_deadline": LLM_REQUEST_DEADLINE,
+        "llm_fallback_margin": LLM_FALLBACK_MARGIN,
+        "llm_hedge_enabled": LLM_HEDGE_ENABLED,
+        "llm_hedge_percentile": LLM_HEDGE_PERCENTILE,
+        "llm_hedge_min_delay": LLM_HEDGE_MIN_DELAY,
+        "llm_hedge_model": LLM_HEDGE_MODEL,
+        "llm_max_concurrency_per_endpoint": LLM_MAX_CONCURRENCY_PER_ENDPOINT,
+        "llm_max_concurrency": LLM_MAX_CONCURRENCY,
+        "llm_max_queue": LLM_MAX_QUEUE,
+        "llm_queue_timeout": LLM_QUEUE_TIMEOUT,
+        "llm_prompt_token_budget": LLM_PROMPT_TOKEN_BUDGET,
+        "llm_context_max_list_items": LLM_CONTEXT_MAX_LIST_ITEMS,
+        "conversation_recent_turns": CONVERSATION_RECENT_TURNS,
+        "conversation_summary_max_tokens": CONVERSATION_SUMMARY_MAX_TOKENS,
+        "conversation_message_max_tokens": CONVERSATION_MESSAGE_MAX_TOKENS,
+        "conversation_max_sessions": CONVERSATION_MAX_SESSIONS,
+        "conversation_ttl": CONVERSATION_TTL,
+        "conversation_max_compact_turns": CONVERSATION_MAX_COMPACT_TURNS,
+        "llm_small_model": LLM_SMALL_MODEL,
+        "router_short_query_chars": ROUTER_SHORT_QUERY_CHARS,
+        "router_long_query_chars": ROUTER_LONG_QUERY_CHARS,
+        "instant_answers_enabled": INSTANT_ANSWERS_ENABLED,
+        "instant_answers_reload_interval": INSTANT_ANSWERS_RELOAD_INTERVAL,
         "fine_tuned_model": FINE_TUNED_MODEL,
         "use_fine_tuned": USE_FINE_TUNED,
+        "fine_tune_generation_concurrency": FINE_TUNE_GENERATION_CONCURRENCY,
+        "fine_tune_generation_max_tokens": FINE_TUNE_GENERATION_MAX_TOKENS,
+        "fine_tune_generation_max_retries": FINE_TUNE_GENERATION_MAX_RETRIES,
+        "fine_tune_generation_max_overload_waits": FINE_TUNE_GENERATION_MAX_OVERLOAD_WAITS,
+        "chat_write_batch_size": CHAT_WRITE_BATCH_SIZE,
+        "chat_write_flush_interval": CHAT_WRITE_FLUSH_INTERVAL,
+        "chat_write_max_attempts": CHAT_WRITE_MAX_ATTEMPTS,
+        "chat_write_max_retry_pending": CHAT_WRITE_MAX_RETRY_PENDING,
+        "allow_default_user": ALLOW_DEFAULT_USER,
+        "user_cache_size": USER_CACHE_SIZE,
+        "json_codec": JSON_CODEC,
+        "json_pretty": JSON_PRETTY,
+        "resume_max_bytes": RESUME_MAX_BYTES,
+        "resume_upload_chunk_size": RESUME_UPLOAD_CHUNK_SIZE,
+        "resume_multipart_overhead_bytes": RESUME_MULTIPART_OVERHEAD_BYTES,
+        "job_max_workers": JOB_MAX_WORKERS,
     }
 
 # การตั้งค่า Unsloth
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-turn conversation memory for Career AI Advisor.
+
+This module keeps the most recent turns of each conversation in memory and
+folds older turns into a rolling summary after each reply, so follow-up
+questions keep their context while the prompt stays within a bounded size.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List
+
+from src.utils.logger import get_logger
+from src.utils.llm_admission import LLMPriority, LLMOverloadedError
+from src.utils.prompt_builder import estimate_tokens, truncate_text_to_tokens
+
+# ตั้งค่า logger
+logger = get_logger("conversation")
+
+# คำสั่งสำหรับให้ LLM สรุปบทสนทนา (คงที่เพื่อให้ใช้ KV cache ของ prefix ซ้ำได้)
+SUMMARY_SYSTEM_PROMPT = (
+    "คุณเป็นผู้ช่วยสรุปบทสนทนาระหว่างผู้ใช้กับแชทบอทให้คำปรึกษาด้านอาชีพไอที\n"
+    "สรุปเป็นภาษาไทยอย่างกระชับ เก็บเฉพาะข้อเท็จจริงเกี่ยวกับผู้ใช้ อาชีพหรือทักษะที่พูดถึง "
+    "คำถามที่ยังค้างอยู่ และคำแนะนำสำคัญที่ให้ไปแล้ว ห้ามแต่งข้อมูลเพิ่ม"
+)
+
+
+@dataclass
+class ConversationTurn:
+    """คำถามและคำตอบหนึ่งรอบของบทสนทนา"""
+    query: str
+    response: str
+
+
+class ConversationSession:
+    """
+    หน่วยความจำของบทสนทนาหนึ่ง
+
+    เก็บรอบล่าสุดไว้แบบเต็ม (ตัดความยาวต่อข้อความ) รอบที่เก่ากว่าจะรอใน pending
+    จนกว่าจะถูกรวมเข้ากับบทสรุปโดย ConversationStore.compact
+    """
+
+    def __init__(self, chat_id: str, max_recent_turns: int = 4, message_max_tokens: int = 200):
+        """
+        เริ่มต้นใช้งาน ConversationSession
+
+        Args:
+            chat_id: รหัสการสนทนา
+            max_recent_turns: จำนวนรอบล่าสุดที่เก็บไว้แบบเต็ม
+            message_max_tokens: จำนวนโทเค็นสูงสุดต่อข้อความเมื่อแสดงใน prompt
+        """
+        self.chat_id = chat_id
+        self.max_recent_turns = max(1, max_recent_turns)
+        self.message_max_tokens = message_max_tokens
+        self.recent: deque = deque()
+        self.pending: List[ConversationTurn] = []
+        self.summary = ""
+        self.turn_count = 0
+        self.last_access = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def add_turn(self, query: str, response: str) -> bool:
+        """
+        เพิ่มรอบใหม่ของบทสนทนา
+
+        Args:
+            query: คำถามของผู้ใช้
+            response: คำตอบของแชทบอท
+
+        Returns:
+            bool: True ถ้ามีรอบเก่าที่รอการสรุป
+        """
+        self.recent.append(ConversationTurn(query=query, response=response))
+        while len(self.recent) > self.max_recent_turns:
+            self.pending.append(self.recent.popleft())
+        self.turn_count += 1
+        self.last_access = time.monotonic()
+        return bool(self.pending)
+
+    def _format_turn(self, turn: ConversationTurn) -> str:
+        query = truncate_text_to_tokens(turn.query, self.message_max_tokens)
+        response = truncate_text_to_tokens(turn.response, self.message_max_tokens)
+        return f"ผู้ใช้: {query}\nแชทบอท: {response}"
+
+    def render(self, max_turns: Optional[int] = None) -> str:
+        """
+        สร้างข้อความบริบทของบทสนทนาสำหรับใส่ใน prompt
+
+        Args:
+            max_turns: จำนวนรอบล่าสุดที่แสดง (None = แสดงทั้งหมดที่เก็บไว้)
+
+        Returns:
+            str: ข้อความบริบทของบทสนทนา (ว่างถ้ายังไม่มีประวัติ)
+        """
+        turns = list(self.recent)
+        if max_turns is not None:
+            turns = turns[-max_turns:] if max_turns > 0 else []
+
+        if not self.summary and not turns:
+            return ""
+
+        text = "บทสนทนาก่อนหน้า:\n"
+        if self.summary:
+            text += f"สรุปบทสนทนาที่ผ่านมา: {self.summary}\n"
+        if turns:
+            text += "\n".join(self._format_turn(turn) for turn in turns) + "\n"
+        return text
+
+
+class ConversationStore:
+    """
+    ที่เก็บหน่วยความจำของบทสนทนาทั้งหมดในหน่วยความจำ
+
+    จำกัดจำนวนบทสนทนาแบบ LRU และหมดอายุตามเวลาที่ไม่ได้ใช้งาน
+    บทสนทนาที่ไม่อยู่ในหน่วยความจำจะถูกสร้างใหม่จากประวัติที่บันทึกไว้
+    """
+
+    def __init__(self,
+                 max_recent_turns: int = 4,
+                 summary_max_tokens: int = 300,
+                 message_max_tokens: int = 200,
+                 max_sessions: int = 500,
+                 ttl_seconds: int = 3600,
+                 max_compact_turns: int = 8):
+        """
+        เริ่มต้นใช้งาน ConversationStore
+
+        Args:
+            max_recent_turns: จำนวนรอบล่าสุดที่เก็บไว้แบบเต็มต่อบทสนทนา
+            summary_max_tokens: จำนวนโทเค็นสูงสุดของบทสรุป
+            message_max_tokens: จำนวนโทเค็นสูงสุดต่อข้อความใน prompt
+            max_sessions: จำนวนบทสนทนาสูงสุดที่เก็บในหน่วยความจำ
+            ttl_seconds: เวลาที่ไม่ได้ใช้งาน (วินาที) ก่อนบทสนทนาถูกลบออก
+            max_compact_turns: จำนวนรอบสูงสุดที่รวมเข้ากับบทสรุปต่อการเรียก compact หนึ่งครั้ง
+        """
+        self.max_recent_turns = max_recent_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.message_max_tokens = message_max_tokens
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_seconds = ttl_seconds
+        self.max_compact_turns = max(1, max_compact_turns)
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+
+        # สถิติ
+        self._summaries = 0
+        self._summary_fallbacks = 0
+
+    def _new_session(self, chat_id: str) -> ConversationSession:
+        return ConversationSession(
+            chat_id,
+            max_recent_turns=self.max_recent_turns,
+            message_max_tokens=self.message_max_tokens,
+        )
+
+    def _evict(self) -> None:
+        """ลบบทสนทนาที่หมดอายุและบทสนทนาที่เก่าที่สุดเมื่อเกินจำนวนที่กำหนด"""
+        now = time.monotonic()
+        expired = [
+            chat_id for chat_id, session in self._sessions.items()
+            if now - session.last_access > self.ttl_seconds and not session.lock.locked()
+        ]
+        for chat_id in expired:
+            del self._sessions[chat_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _load_session(self, chat_id: str) -> Optional[ConversationSession]:
+        """สร้างหน่วยความจำของบทสนทนาจากประวัติที่บันทึกไว้"""
+        from src.utils.storage import get_chat_by_id
+
+        chat_history = get_chat_by_id(chat_id)
+        if chat_history is None:
+            return None
+
+        turns: List[ConversationTurn] = []
+        query = None
+        for message in chat_history.messages:
+            if message.role == "user":
+                query = message.content
+            elif message.role == "assistant" and query is not None:
+                turns.append(ConversationTurn(query=query, response=message.content))
+                query = None
+
+        # เก็บเฉพาะรอบล่าสุดแบบเต็ม รอบที่เก่ากว่าสรุปแบบย่อโดยไม่ใช้ LLM
+        # (ไม่ใส่ลง pending เพื่อไม่ให้ compact ครั้งถัดไปส่งประวัติทั้งหมดไปสรุปใน prompt เดียว)
+        session = self._new_session(chat_id)
+        older, recent = turns[:-session.max_recent_turns], turns[-session.max_recent_turns:]
+        if older:
+            session.summary = self._fallback_summary("", older)
+        for turn in recent:
+            session.add_turn(turn.query, turn.response)
+        session.turn_count = len(turns)
+
+        logger.info(f"โหลดบทสนทนา {chat_id} จากประวัติ ({session.turn_count} รอบ)")
+        return session
+
+    async def get_session(self, chat_id: Optional[str]) -> Optional[ConversationSession]:
+        """
+        ดึงหน่วยความจำของบทสนทนา (ถ้าไม่มีในหน่วยความจำจะโหลดจากประวัติใน thread แยก)
+
+        Args:
+            chat_id: รหัสการสนทนา
+
+        Returns:
+            Optional[ConversationSession]: หน่วยความจำของบทสนทนา หรือ None ถ้าไม่พบ
+        """
+        if not chat_id:
+            return None
+
+        session = self._sessions.get(chat_id)
+        if session is None:
+            loaded = await asyncio.to_thread(self._load_session, chat_id)
+            # คำขออื่นอาจสร้าง session ของบทสนทนานี้ไปแล้วระหว่างรอ
+            session = self._sessions.get(chat_id)
+            if session is None:
+                if loaded is None:
+                    return None
+                session = loaded
+                self._sessions[chat_id] = session
+
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(chat_id)
+        self._evict()
+        return session
+
+    def add_turn(self, chat_id: str, query: str, response: str) -> ConversationSession:
+        """
+        บันทึกรอบใหม่ลงในหน่วยความจำของบทสนทนา
+
+        Args:
+            chat_id: รหัสการสนทนา
+            query: คำถามของผู้ใช้
+            response: คำตอบของแชทบอท
+
+        Returns:
+            ConversationSession: หน่วยความจำของบทสนทนา
+        """
+        session = self._sessions.get(chat_id)
+        if session is None:
+            session = self._new_session(chat_id)
+            self._sessions[chat_id] = session
+        session.add_turn(query, response)
+        self._sessions.move_to_end(chat_id)
+        self._evict()
+        return session
+
+    def _fallback_summary(self, previous: str, turns: List[ConversationTurn]) -> str:
+        """สรุปแบบไม่ใช้ LLM โดยเก็บคำถามล่าสุดไว้ให้มากที่สุดภายในงบโทเค็น"""
+        lines = [previous] if previous else []
+        lines.extend(f"ผู้ใช้เคยถาม: {turn.query}" for turn in turns)
+
+        kept: List[str] = []
+        used = 0
+        for line in reversed(lines):
+            tokens = estimate_tokens(line)
+            if used + tokens > self.summary_max_tokens:
+                if not kept:
+                    kept.append(truncate_text_to_tokens(line, self.summary_max_tokens))
+                break
+            kept.append(line)
+            used += tokens
+        return " ".join(reversed(kept))
+
+    async def _summarize(self, previous: str, turns: List[ConversationTurn]) -> str:
+        """ใช้ LLM รวมบทสรุปเดิมกับรอบที่เก่ากว่าเป็นบทสรุปใหม่"""
+        from src.utils.llm import call_llm_api
+        from src.utils.config import LLM_API_BASE, LLM_API_KEY, LLM_MODEL
+
+        message_budget = max(1, self.message_max_tokens)
+        parts = []
+        if previous:
+            parts.append(f"บทสรุปเดิม:\n{previous}")
+        parts.append("บทสนทนาที่ต้องรวมเข้ากับบทสรุป:\n" + "\n".join(
+            f"ผู้ใช้: {truncate_text_to_tokens(turn.query, message_budget)}\n"
+            f"แชทบอท: {truncate_text_to_tokens(turn.response, message_budget)}"
+            for turn in turns
+        ))
+        parts.append(f"เขียนบทสรุปใหม่ความยาวไม่เกิน {self.summary_max_tokens} โทเค็น:")
+
+        summary = await call_llm_api(
+            prompt="\n\n".join(parts),
+            model=LLM_MODEL,
+            api_base=LLM_API_BASE,
+            api_key=LLM_API_KEY,
+            temperature=0.2,
+            max_tokens=self.summary_max_tokens,
+            priority=LLMPriority.BACKGROUND,
+            system=SUMMARY_SYSTEM_PROMPT,
+            raise_on_error=True,
+        )
+        return truncate_text_to_tokens(summary.strip(), self.summary_max_tokens)
+
+    async def compact(self, chat_id: str) -> None:
+        """
+        รวมรอบเก่าที่รอการสรุปเข้ากับบทสรุปของบทสนทนา (เรียกในพื้นหลังหลังตอบผู้ใช้)
+
+        Args:
+            chat_id: รหัสการสนทนา
+        """
+        session = self._sessions.get(chat_id)
+        if session is None or not session.pending:
+            return
+
+        async with session.lock:
+            # รวมครั้งละไม่เกิน max_compact_turns รอบ ที่เหลือรอการสรุปครั้งถัดไป
+            turns = session.pending[:self.max_compact_turns]
+            if not turns:
+                return
+
+            from src.utils.llm import LLMRequestError
+
+            try:
+                summary = await self._summarize(session.summary, turns)
+                self._summaries += 1
+            except (LLMRequestError, LLMOverloadedError) as e:
+                logger.warning(f"สรุปบทสนทนา {chat_id} ด้วย LLM ไม่สำเร็จ ใช้การสรุปแบบย่อแทน: {str(e)}")
+                summary = ""
+            except Exception as e:
+                logger.error(f"เกิดข้อผิดพลาดในการสรุปบทสนทนา {chat_id}: {str(e)}")
+                summary = ""
+
+            if not summary:
+                summary = self._fallback_summary(session.summary, turns)
+                self._summary_fallbacks += 1
+
+            session.summary = summary
+            # รอบที่เพิ่มเข้ามาระหว่างสรุปจะรอการสรุปครั้งถัดไป
+            del session.pending[:len(turns)]
+            logger.info(f"สรุปบทสนทนา {chat_id} แล้ว ({len(turns)} รอบ, {estimate_tokens(summary)} โทเค็น)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ดึงสถิติของหน่วยความจำบทสนทนา
+
+        Returns:
+            Dict[str, Any]: สถิติปัจจุบัน
+        """
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "pending_turns": sum(len(s.pending) for s in self._sessions.values()),
+            "summaries": self._summaries,
+            "summary_fallbacks": self._summary_fallbacks,
+        }
+
+
+_conversation_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """
+    ดึง ConversationStore ที่ใช้ร่วมกันทั้งแอป (สร้างครั้งแรกจากค่าคอนฟิก)
+
+    Returns:
+        ConversationStore: ที่เก็บหน่วยความจำของบทสนทนา
+    """
+    global _conversation_store
+    if _conversation_store is None:
+        from src.utils.config import (
+            CONVERSATION_RECENT_TURNS, CONVERSATION_SUMMARY_MAX_TOKENS,
+            CONVERSATION_MESSAGE_MAX_TOKENS, CONVERSATION_MAX_SESSIONS, CONVERSATION_TTL,
+            CONVERSATION_MAX_COMPACT_TURNS
+        )
+        _conversation_store = ConversationStore(
+            max_recent_turns=CONVERSATION_RECENT_TURNS,
+            summary_max_tokens=CONVERSATION_SUMMARY_MAX_TOKENS,
+            message_max_tokens=CONVERSATION_MESSAGE_MAX_TOKENS,
+            max_sessions=CONVERSATION_MAX_SESSIONS,
+            ttl_seconds=CONVERSATION_TTL,
+            max_compact_turns=CONVERSATION_MAX_COMPACT_TURNS,
+        )
+    return _conversation_store
@@ -9,8 +9,12 @@ This module provides functions for preparing data and fine-tuning LLM models.
 import os
 import json
 import glob
+import time
 import random
-from typing import List, Dict, Any, Optional, Tuple
+import hashlib
+import itertools
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator, Set
 import httpx
 import asyncio
 from tqdm import tqdm
@@ -31,6 +35,71 @@ from src.utils.storage import get_app_user
 # ตั้งค่า logger
 logger = get_logger("fine_tune")
 
+
+@dataclass
+class FineTuneCandidate:
+    """
+    ตัวอย่างสำหรับ fine-tuning ที่ยังไม่ได้สร้างคำตอบ
+
+    คำตอบจะถูกสร้างเฉพาะตัวอย่างที่ถูกเลือกแล้วเท่านั้น
+    """
+    source: str  # job, advice, user
+    personality: PersonalityType
+    question: str
+    prompt: str
+    data: Dict[str, Any]
+    job_title: str = ""
+
+
+@dataclass
+class GenerationStats:
+    """
+    ความคืบหน้าและอัตราการสร้างชุดข้อมูล fine-tuning
+
+    ผู้เรียกสามารถส่งออบเจกต์นี้เข้าไปแล้วอ่านค่าระหว่างทำงานเพื่อติดตามความคืบหน้าได้
+    """
+    target: int = 0  # จำนวนตัวอย่างที่ต้องการทั้งหมด
+    resumed: int = 0  # ตัวอย่างที่มีอยู่แล้วในไฟล์ (ข้ามไม่สร้างซ้ำ)
+    selected: int = 0  # ตัวอย่างที่ต้องสร้างในรอบนี้
+    completed: int = 0
+    failed: int = 0
+    retries: int = 0
+    overload_waits: int = 0  # จำนวนครั้งที่รอเพราะคิว LLM เต็ม (ไม่นับเป็นการลองใหม่)
+    llm_seconds: float = 0.0  # เวลารวมที่รอคำตอบจาก LLM
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        แปลงสถิติเป็น dict สำหรับส่งกลับทาง API
+
+        Returns:
+            Dict[str, Any]: สถิติพร้อมอัตราการสร้างและเวลาที่เหลือโดยประมาณ
+        """
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        rate = self.completed / elapsed if elapsed > 0 else 0.0
+        pending = max(0, self.selected - self.completed - self.failed)
+        return {
+            "target": self.target,
+            "resumed": self.resumed,
+            "selected": self.selected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "overload_waits": self.overload_waits,
+            "progress": round((self.resumed + self.completed) / self.target, 4) if self.target else 0.0,
+            "elapsed_seconds": round(elapsed, 1),
+            "examples_per_second": round(rate, 3),
+            "avg_llm_latency": round(self.llm_seconds / self.completed, 3) if self.completed else None,
+            "eta_seconds": round(pending / rate, 1) if rate > 0 and self.finished_at is None else None,
+        }
+
+
+def _prompt_hash(prompt: str) -> str:
+    """แฮชของ prompt สำหรับตรวจว่าตัวอย่างถูกเขียนลงไฟล์แล้วหรือยัง"""
+    return hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+
+
 class FineTuneHelper:
     """
     คลาสช่วยเหลือสำหรับการสร้างชุดข้อมูลและทำ fine-tuning
@@ -107,24 +176,23 @@ class FineTuneHelper:
                 career_advice_data = json.load(f)
             logger.info(f"โหลดข้อมูลคำแนะนำอาชีพสำเร็จ: {len(career_advice_data)} รายการ")
             
-        # โหลดข้อมูลผู้ใช้
-        user_data = get_app_user()
+        # โหลดข้อมูลผู้ใช้ (get_app_user คืนผู้ใช้คนเดียวหรือ None)
+        user = get_app_user()
+        user_data = [user.dict()] if user else []
         logger.info(f"โหลดข้อมูลผู้ใช้สำเร็จ: {len(user_data)} รายการ")
         
         return job_data, career_advice_data, user_data
     
-    def _generate_prompts_from_job_data(self, job_data: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    def _generate_prompts_from_job_data(self, job_data: List[Dict[str, Any]]) -> Iterator[FineTuneCandidate]:
         """
         สร้าง prompts จากข้อมูลอาชีพ
         
         Args:
             job_data: ข้อมูลอาชีพ
             
-        Returns:
-            List ของ prompt-response pairs
+        Yields:
+            FineTuneCandidate: ตัวอย่างทีละรายการ
         """
-        prompts = []
-        
         # คำถามพื้นฐานเกี่ยวกับอาชีพ
         job_question_templates = [
             "อาชีพ {job_title} ทำอะไรบ้าง?",
@@ -142,47 +210,54 @@ class FineTuneHelper:
             "ฉันเคยทำ {job_title} อยากย้ายไป {other_job} ต้องทำอะไรบ้าง",
         ]
         
+        # ชื่ออาชีพทั้งหมด (คำนวณครั้งเดียว แทนการสร้างรายการใหม่ทุกอาชีพ)
+        all_titles = [j["metadata"]["titles"][0] for j in job_data if j.get("metadata", {}).get("titles")]
+        
         # สร้าง prompts จากข้อมูลอาชีพ
+        position = -1
         for job in job_data:
-            job_title = job.get("metadata", {}).get("titles", [""])[0]
+            titles = job.get("metadata", {}).get("titles")
+            if titles:
+                position += 1
+            job_title = (titles or [""])[0]
             if not job_title:
                 continue
             
-            # หา job อื่นเพื่อใช้ในคำถามเปรียบเทียบ
-            other_jobs = [j.get("metadata", {}).get("titles", [""])[0] for j in job_data if j != job and j.get("metadata", {}).get("titles")]
-            other_job = random.choice(other_jobs) if other_jobs else "นักพัฒนาซอฟต์แวร์"
+            # หา job อื่นเพื่อใช้ในคำถามเปรียบเทียบ (สุ่มโดยข้ามตำแหน่งของตัวเอง)
+            if len(all_titles) > 1:
+                index = random.randrange(len(all_titles) - 1)
+                other_job = all_titles[index + 1 if index >= position else index]
+            else:
+                other_job = "นักพัฒนาซอฟต์แวร์"
+            
+            # สร้าง context จากข้อมูลอาชีพ
+            context = f"ข้อมูลอาชีพ:\n{job.get('text', '')}"
             
             for template in job_question_templates:
                 question = template.format(job_title=job_title, other_job=other_job)
                 
                 # สร้าง prompt ในแต่ละบุคลิก
                 for personality_type in PersonalityType:
-                    # สร้าง context จากข้อมูลอาชีพ
-                    context = f"ข้อมูลอาชีพ:\n{job.get('text', '')}"
                     personality_instruction = self.personality_instructions.get(personality_type, "")
                     
-                    # สร้าง prompt ในรูปแบบที่เหมาะสำหรับ fine-tuning
-                    prompt = {
-                        "prompt": f"{personality_instruction}\n\nคำถาม: {question}\n\nบริบท:\n{context}\n\nคำตอบ:",
-                        "completion": self._generate_mock_response(question, job, personality_type)
-                    }
-                    
-                    prompts.append(prompt)
-        
-        return prompts
+                    yield FineTuneCandidate(
+                        source="job",
+                        personality=personality_type,
+                        question=question,
+                        prompt=f"{personality_instruction}\n\nคำถาม: {question}\n\nบริบท:\n{context}\n\nคำตอบ:",
+                        data=job
+                    )
     
-    def _generate_prompts_from_career_advice(self, career_advice_data: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    def _generate_prompts_from_career_advice(self, career_advice_data: List[Dict[str, Any]]) -> Iterator[FineTuneCandidate]:
         """
         สร้าง prompts จากข้อมูลคำแนะนำอาชีพ
         
         Args:
             career_advice_data: ข้อมูลคำแนะนำอาชีพ
             
-        Returns:
-            List ของ prompt-response pairs
+        Yields:
+            FineTuneCandidate: ตัวอย่างทีละรายการ
         """
-        prompts = []
-
         resume_question_templates = [
             "วิธีเขียน resume สำหรับตำแหน่ง {tag}",
             "ต้องเตรียม resume ยังไงสำหรับสมัครงาน {tag}",
@@ -229,17 +304,15 @@ class FineTuneHelper:
                     context = f"คำแนะนำ:\nหัวข้อ: {title}\n{advice.get('text', '')}"
                     personality_instruction = self.personality_instructions.get(personality_type, "")
                     
-                    # สร้าง prompt ในรูปแบบที่เหมาะสำหรับ fine-tuning
-                    prompt = {
-                        "prompt": f"{personality_instruction}\n\nคำถาม: {question}\n\nบริบท:\n{context}\n\nคำตอบ:",
-                        "completion": self._generate_mock_response(question, advice, personality_type)
-                    }
-                    
-                    prompts.append(prompt)
-        
-        return prompts
+                    yield FineTuneCandidate(
+                        source="advice",
+                        personality=personality_type,
+                        question=question,
+                        prompt=f"{personality_instruction}\n\nคำถาม: {question}\n\nบริบท:\n{context}\n\nคำตอบ:",
+                        data=advice
+                    )
     
-    def _generate_prompts_from_user_data(self, user_data: List[Dict[str, Any]], job_data: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    def _generate_prompts_from_user_data(self, user_data: List[Dict[str, Any]], job_data: List[Dict[str, Any]]) -> Iterator[FineTuneCandidate]:
         """
         สร้าง prompts จากข้อมูลผู้ใช้
         
@@ -247,11 +320,9 @@ class FineTuneHelper:
             user_data: ข้อมูลผู้ใช้
             job_data: ข้อมูลอาชีพ (ใช้สำหรับอ้างอิง)
             
-        Returns:
-            List ของ prompt-response pairs
+        Yields:
+            FineTuneCandidate: ตัวอย่างทีละรายการ
         """
-        prompts = []
-        
         # คำถามเฉพาะบุคคลเกี่ยวกับการแนะนำอาชีพและการพัฒนาทักษะ
         user_question_templates = [
             "ฉันมีทักษะด้าน {skills} อยากสมัครงาน {job_title} ควรเตรียมตัวอย่างไร?",
@@ -354,18 +425,17 @@ class FineTuneHelper:
                         for personality_type in PersonalityType:
                             personality_instruction = self.personality_instructions.get(personality_type, "")
                             
-                            # สร้าง prompt ในรูปแบบที่เหมาะสำหรับ fine-tuning
-                            prompt = {
-                                "prompt": f"{personality_instruction}\n\nคำถาม: {question}\n\nบริบท:\n{user_context}\n\nคำตอบ:",
-                                "completion": self._generate_mock_response_for_user(question, user, job_title, personality_type)
-                            }
-                            
-                            prompts.append(prompt)
+                            yield FineTuneCandidate(
+                                source="user",
+                                personality=personality_type,
+                                question=question,
+                                prompt=f"{personality_instruction}\n\nคำถาม: {question}\n\nบริบท:\n{user_context}\n\nคำตอบ:",
+                                data=user,
+                                job_title=job_title
+                            )
                     except KeyError:
                         # ข้ามหากมีปัญหาในการแทนที่ตัวแปรในเทมเพลต
                         continue
-        
-        return prompts
     
     def _generate_mock_response(self, question: str, data: Dict[str, Any], personality: PersonalityType) -> str:
         """
@@ -501,70 +571,390 @@ class FineTuneHelper:
 
     ขอให้โชคดีกับการสมัครงาน!"""
     
-    def prepare_fine_tune_data(self, num_examples: int = 100) -> str:
+    def _iter_candidates(self) -> Iterator[FineTuneCandidate]:
+        """
+        สร้างตัวอย่างจากข้อมูลทุกแหล่งแบบ generator (ไม่เก็บตัวอย่างทั้งหมดไว้ในหน่วยความจำ)
+        
+        Yields:
+            FineTuneCandidate: ตัวอย่างทีละรายการ
+        """
+        # โหลดข้อมูลทั้งหมด (รวมข้อมูลผู้ใช้)
+        job_data, career_advice_data, user_data = self._load_data()
+        
+        return itertools.chain(
+            self._generate_prompts_from_job_data(job_data),
+            self._generate_prompts_from_career_advice(career_advice_data),
+            self._generate_prompts_from_user_data(user_data, job_data)
+        )
+    
+    def _select_examples(self, candidates: Iterable[FineTuneCandidate], num_examples: int) -> Tuple[List[FineTuneCandidate], int]:
+        """
+        เลือกตัวอย่างให้แต่ละบุคลิกมีจำนวนเท่า ๆ กันด้วย reservoir sampling ในรอบเดียว
+        
+        ตัวอย่างที่ไม่ถูกเลือกเข้าโควตาของบุคลิกจะเข้า reservoir สำรอง
+        เพื่อใช้เติมเมื่อบางบุคลิกมีตัวอย่างไม่พอหรือจำนวนหารไม่ลงตัว
+        หน่วยความจำที่ใช้จึงขึ้นกับ num_examples ไม่ใช่จำนวนตัวอย่างทั้งหมด
+        
+        Args:
+            candidates: ตัวอย่างทั้งหมด (generator)
+            num_examples: จำนวนตัวอย่างที่ต้องการ
+            
+        Returns:
+            Tuple ของ (ตัวอย่างที่เลือกแบบสุ่มลำดับแล้ว, จำนวนตัวอย่างทั้งหมดที่พิจารณา)
+        """
+        quota = num_examples // len(PersonalityType)
+        reservoirs: Dict[PersonalityType, List[FineTuneCandidate]] = {p: [] for p in PersonalityType}
+        seen: Dict[PersonalityType, int] = {p: 0 for p in PersonalityType}
+        overflow: List[FineTuneCandidate] = []
+        overflow_seen = 0
+        total = 0
+        
+        for candidate in candidates:
+            total += 1
+            reservoir = reservoirs[candidate.personality]
+            seen[candidate.personality] += 1
+            
+            if len(reservoir) < quota:
+                reservoir.append(candidate)
+                continue
+            
+            # Algorithm R: แทนที่ตัวอย่างเดิมด้วยความน่าจะเป็น quota / seen
+            index = random.randrange(seen[candidate.personality])
+            if index < quota:
+                reservoir[index], candidate = candidate, reservoir[index]
+            
+            # ตัวอย่างที่ไม่ได้อยู่ในโควตาเข้า reservoir สำรอง
+            overflow_seen += 1
+            if len(overflow) < num_examples:
+                overflow.append(candidate)
+            else:
+                index = random.randrange(overflow_seen)
+                if index < num_examples:
+                    overflow[index] = candidate
+        
+        selected = [candidate for p in PersonalityType for candidate in reservoirs[p]]
+        
+        # เพิ่มตัวอย่างที่เหลือ (ถ้ามี)
+        remaining = num_examples - len(selected)
+        if remaining > 0:
+            selected.extend(overflow[:remaining])
+        
+        random.shuffle(selected)
+        return selected, total
+    
+    def _complete_example(self, candidate: FineTuneCandidate) -> Dict[str, str]:
         """
-        เตรียมข้อมูลสำหรับการทำ fine-tuning
+        สร้างคำตอบให้ตัวอย่างที่ถูกเลือก
+        
+        Args:
+            candidate: ตัวอย่างที่ยังไม่มีคำตอบ
+            
+        Returns:
+            Dict ของ prompt และ completion
+        """
+        if candidate.source == "user":
+            completion = self._generate_mock_response_for_user(candidate.question, candidate.data, candidate.job_title, candidate.personality)
+        else:
+            completion = self._generate_mock_response(candidate.question, candidate.data, candidate.personality)
+        
+        return {"prompt": candidate.prompt, "completion": completion}
+    
+    def new_output_file(self) -> str:
+        """
+        สร้างพาธของไฟล์ข้อมูล fine-tuning ใหม่
+        
+        Returns:
+            พาธของไฟล์ในโฟลเดอร์ output_dir
+        """
+        return os.path.join(self.output_dir, f"fine_tune_data_{int(time.time())}.jsonl")
+    
+    def resolve_output_file(self, file_name: str) -> str:
+        """
+        แปลงชื่อไฟล์ข้อมูล fine-tuning เป็นพาธในโฟลเดอร์ output_dir
+        
+        รับเฉพาะชื่อไฟล์ .jsonl (ไม่มีโฟลเดอร์) เพื่อไม่ให้เขียนทับไฟล์นอกโฟลเดอร์ output_dir
+        
+        Args:
+            file_name: ชื่อไฟล์ เช่น fine_tune_data_1700000000.jsonl
+            
+        Returns:
+            พาธของไฟล์ในโฟลเดอร์ output_dir
+            
+        Raises:
+            ValueError: ถ้าไม่ใช่ชื่อไฟล์ .jsonl หรือพาธอยู่นอกโฟลเดอร์ output_dir
+        """
+        if (not isinstance(file_name, str) or file_name != os.path.basename(file_name)
+                or "\\" in file_name or "\0" in file_name):
+            raise ValueError(f"ต้องระบุเฉพาะชื่อไฟล์ในโฟลเดอร์ข้อมูล fine-tuning: {file_name!r}")
+        if not file_name.endswith(".jsonl"):
+            raise ValueError(f"ไฟล์ข้อมูล fine-tuning ต้องเป็น .jsonl: {file_name!r}")
+        
+        output_dir = os.path.realpath(self.output_dir)
+        file_path = os.path.realpath(os.path.join(output_dir, file_name))
+        # ตรวจซ้ำหลัง resolve symlink
+        if os.path.dirname(file_path) != output_dir:
+            raise ValueError(f"ไฟล์ข้อมูล fine-tuning ต้องอยู่ในโฟลเดอร์ {self.output_dir}: {file_name!r}")
+        return file_path
+    
+    def _write_jsonl(self, examples: Iterable[Dict[str, str]], output_file: str) -> int:
+        """
+        เขียนตัวอย่างลงไฟล์ JSONL ทีละบรรทัด
+        
+        Args:
+            examples: ตัวอย่าง (generator)
+            output_file: พาธของไฟล์ผลลัพธ์
+            
+        Returns:
+            จำนวนตัวอย่างที่เขียน
+        """
+        count = 0
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for example in examples:
+                f.write(json.dumps(example, ensure_ascii=False) + '\n')
+                count += 1
+        return count
+    
+    def prepare_fine_tune_data(self, num_examples: int = 100, stats: Optional[GenerationStats] = None) -> str:
+        """
+        เตรียมข้อมูลสำหรับการทำ fine-tuning (คำตอบจากเทมเพลต)
         
         Args:
             num_examples: จำนวนตัวอย่างที่ต้องการสร้าง
+            stats: ออบเจกต์สำหรับรายงานความคืบหน้า (ถ้ามี)
             
         Returns:
             พาธของไฟล์ข้อมูลที่สร้าง
         """
         logger.info(f"เริ่มต้นเตรียมข้อมูลสำหรับ fine-tuning ({num_examples} ตัวอย่าง)")
+        stats = stats or GenerationStats()
+        stats.target = num_examples
         
-        # โหลดข้อมูลทั้งหมด (รวมข้อมูลผู้ใช้)
-        job_data, career_advice_data, user_data = self._load_data()
+        # สร้าง prompts แบบ generator และเลือกตัวอย่างในรอบเดียว
+        selected, total = self._select_examples(self._iter_candidates(), num_examples)
+        stats.selected = len(selected)
         
-        # สร้าง prompts
-        job_prompts = self._generate_prompts_from_job_data(job_data)
-        advice_prompts = self._generate_prompts_from_career_advice(career_advice_data)
-        user_prompts = self._generate_prompts_from_user_data(user_data, job_data)
+        # ตรวจสอบจำนวนตัวอย่างแต่ละประเภท
+        source_counts = {"job": 0, "advice": 0, "user": 0}
+        for candidate in selected:
+            source_counts[candidate.source] += 1
         
-        logger.info(f"สร้าง prompts สำเร็จ: {len(job_prompts)} จากข้อมูลอาชีพ, {len(advice_prompts)} จากคำแนะนำอาชีพ, {len(user_prompts)} จากข้อมูลผู้ใช้")
+        logger.info(f"สร้าง prompts สำเร็จ: {total} ตัวอย่างทั้งหมด")
+        logger.info(f"สัดส่วนตัวอย่าง: {source_counts['job']} อาชีพ, {source_counts['advice']} คำแนะนำ, {source_counts['user']} ผู้ใช้ (รวม {len(selected)})")
         
-        # รวมและสุ่ม prompts
-        all_prompts = job_prompts + advice_prompts + user_prompts
-        random.shuffle(all_prompts)
+        # บันทึกไฟล์ (สร้างคำตอบเฉพาะตัวอย่างที่ถูกเลือก ทีละรายการ)
+        output_file = os.path.join(self.output_dir, f"fine_tune_data_{int(time.time())}.jsonl")
+        def _examples() -> Iterator[Dict[str, str]]:
+            for candidate in selected:
+                yield self._complete_example(candidate)
+                stats.completed += 1
         
-        # จำกัดจำนวนตัวอย่าง
-        examples_per_personality = num_examples // len(PersonalityType)
-        selected_prompts = []
+        count = self._write_jsonl(_examples(), output_file)
+        stats.finished_at = time.time()
         
-        # กระจายตัวอย่างให้แต่ละบุคลิกมีจำนวนเท่า ๆ กัน
-        for personality in PersonalityType:
-            personality_prompts = [p for p in all_prompts if personality.value in p["prompt"]]
-            selected_prompts.extend(personality_prompts[:examples_per_personality])
+        logger.info(f"สร้างข้อมูลสำหรับ fine-tuning สำเร็จ: {count} ตัวอย่าง -> {output_file}")
+        return output_file
+    
+    def _load_checkpoint(self, output_file: str) -> Set[str]:
+        """
+        อ่านแฮชของ prompt ที่เขียนลงไฟล์แล้ว เพื่อทำงานต่อจากจุดเดิม
         
-        # เพิ่มตัวอย่างที่เหลือ (ถ้ามี)
-        if len(selected_prompts) < num_examples:
-            remaining = num_examples - len(selected_prompts)
-            remaining_prompts = [p for p in all_prompts if p not in selected_prompts]
-            selected_prompts.extend(remaining_prompts[:remaining])
+        บรรทัดสุดท้ายที่เขียนไม่ครบ (เช่น กระบวนการหยุดกลางคัน) จะถูกตัดทิ้ง
         
-        # กำหนดสัดส่วนของประเภทข้อมูล
-        # ตรวจสอบจำนวนตัวอย่างแต่ละประเภท
-        job_count = len([p for p in selected_prompts if "ข้อมูลอาชีพ" in p["prompt"]])
-        advice_count = len([p for p in selected_prompts if "คำแนะนำ" in p["prompt"]])
-        user_count = len([p for p in selected_prompts if "ข้อมูลผู้ใช้" in p["prompt"]])
+        Args:
+            output_file: ไฟล์ JSONL ที่สร้างไว้ก่อนหน้า
+            
+        Returns:
+            Set ของแฮชของ prompt ที่มีอยู่แล้ว
+        """
+        done: Set[str] = set()
+        if not os.path.exists(output_file):
+            return done
         
-        logger.info(f"สัดส่วนตัวอย่าง: {job_count} อาชีพ, {advice_count} คำแนะนำ, {user_count} ผู้ใช้ (รวม {len(selected_prompts)})")
+        valid_end = 0
+        offset = 0
+        with open(output_file, 'rb+') as f:
+            for line in f:
+                offset += len(line)
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    done.add(_prompt_hash(json.loads(line)["prompt"]))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"ข้ามบรรทัดที่อ่านไม่ได้ใน {output_file} (ตำแหน่ง {offset - len(line)})")
+                valid_end = offset
+            
+            if valid_end < offset:
+                logger.warning(f"ตัดบรรทัดที่เขียนไม่ครบท้ายไฟล์ {output_file}")
+                f.truncate(valid_end)
         
-        # บันทึกไฟล์
-        timestamp = asyncio.get_event_loop().time()
-        output_file = os.path.join(self.output_dir, f"fine_tune_data_{int(timestamp)}.jsonl")
+        return done
+    
+    async def _generate_llm_completion(self, candidate: FineTuneCandidate, max_tokens: int,
+                                       max_retries: int, stats: GenerationStats,
+                                       max_overload_waits: int = 0) -> Optional[str]:
+        """
+        สร้างคำตอบของตัวอย่างด้วย LLM (ลำดับความสำคัญ BATCH ไม่แย่งคิวกับผู้ใช้)
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for prompt in selected_prompts:
-                f.write(json.dumps(prompt, ensure_ascii=False) + '\n')
+        การรอเพราะคิว LLM เต็ม (LLMOverloadedError) ไม่นับรวมใน max_retries
+        เพราะเป็นเรื่องปกติของงาน BATCH เมื่อมีผู้ใช้มาก
         
-        logger.info(f"สร้างข้อมูลสำหรับ fine-tuning สำเร็จ: {len(selected_prompts)} ตัวอย่าง -> {output_file}")
+        Args:
+            candidate: ตัวอย่างที่ยังไม่มีคำตอบ
+            max_tokens: จำนวนโทเค็นสูงสุดของคำตอบ
+            max_retries: จำนวนครั้งที่ลองใหม่เมื่อเรียกใช้ไม่สำเร็จ
+            stats: สถิติการสร้าง
+            max_overload_waits: จำนวนครั้งสูงสุดที่รอเมื่อคิว LLM เต็ม (0 = รอได้ไม่จำกัด)
+            
+        Returns:
+            Optional[str]: คำตอบ หรือ None ถ้าสร้างไม่สำเร็จ
+        """
+        from src.utils.llm import call_llm_api, LLMRequestError
+        from src.utils.llm_admission import LLMPriority, LLMOverloadedError
+        
+        attempt = 0
+        overload_waits = 0
+        while attempt <= max_retries:
+            started = time.monotonic()
+            try:
+                completion = await call_llm_api(
+                    prompt=candidate.prompt,
+                    model=LLM_MODEL,
+                    api_base=LLM_API_BASE,
+                    api_key=LLM_API_KEY,
+                    max_tokens=max_tokens,
+                    priority=LLMPriority.BATCH,
+                    raise_on_error=True
+                )
+                completion = completion.strip()
+                if completion:
+                    stats.llm_seconds += time.monotonic() - started
+                    return completion
+                logger.warning(f"LLM ตอบกลับว่างเปล่า (ครั้งที่ {attempt + 1}): {candidate.question}")
+            except LLMOverloadedError as e:
+                # คิวเต็มเพราะมีคำขอของผู้ใช้มาก รอแล้วค่อยลองใหม่ โดยไม่นับเป็นการลองใหม่
+                overload_waits += 1
+                stats.overload_waits += 1
+                if max_overload_waits and overload_waits > max_overload_waits:
+                    logger.warning(f"คิว LLM เต็มติดต่อกันเกิน {max_overload_waits} ครั้ง: {candidate.question}")
+                    break
+                await asyncio.sleep(e.retry_after)
+                continue
+            except LLMRequestError as e:
+                logger.warning(f"สร้างคำตอบไม่สำเร็จ (ครั้งที่ {attempt + 1}): {str(e)}")
+                if not e.retryable:
+                    break
+                if attempt < max_retries:
+                    await asyncio.sleep(min(2 ** attempt, 30))
+            
+            attempt += 1
+            if attempt <= max_retries:
+                stats.retries += 1
+        
+        return None
+    
+    async def prepare_fine_tune_data_with_llm(self,
+                                              num_examples: int = 100,
+                                              output_file: Optional[str] = None,
+                                              concurrency: Optional[int] = None,
+                                              stats: Optional[GenerationStats] = None) -> str:
+        """
+        เตรียมข้อมูลสำหรับการทำ fine-tuning โดยให้ LLM สร้างคำตอบจริง
+        
+        ส่งคำขอผ่าน worker แบบ async จำนวนจำกัด และเขียนแต่ละตัวอย่างลงไฟล์ทันทีที่ได้คำตอบ
+        ถ้าระบุ output_file ที่มีอยู่แล้ว จะทำงานต่อโดยข้าม prompt ที่เขียนไว้แล้ว
+        และสร้างเพิ่มจนครบ num_examples
+        
+        Args:
+            num_examples: จำนวนตัวอย่างที่ต้องการทั้งหมด
+            output_file: ชื่อไฟล์ผลลัพธ์ .jsonl ในโฟลเดอร์ output_dir (ถ้าไม่ระบุจะสร้างไฟล์ใหม่)
+            concurrency: จำนวนคำขอที่ส่งไปยัง LLM พร้อมกัน (ค่าเริ่มต้นจาก FINE_TUNE_GENERATION_CONCURRENCY)
+            stats: ออบเจกต์สำหรับรายงานความคืบหน้า (ถ้ามี)
+            
+        Returns:
+            พาธของไฟล์ข้อมูลที่สร้าง
+            
+        Raises:
+            ValueError: ถ้า output_file ไม่ใช่ชื่อไฟล์ .jsonl ในโฟลเดอร์ output_dir
+        """
+        from src.utils.config import (
+            FINE_TUNE_GENERATION_CONCURRENCY, FINE_TUNE_GENERATION_MAX_TOKENS, FINE_TUNE_GENERATION_MAX_RETRIES,
+            FINE_TUNE_GENERATION_MAX_OVERLOAD_WAITS
+        )
+        
+        concurrency = max(1, concurrency or FINE_TUNE_GENERATION_CONCURRENCY)
+        output_file = self.resolve_output_file(output_file) if output_file else self.new_output_file()
+        stats = stats or GenerationStats()
+        stats.target = num_examples
+        
+        logger.info(f"เริ่มต้นเตรียมข้อมูลสำหรับ fine-tuning ด้วย LLM ({num_examples} ตัวอย่าง, {concurrency} คำขอพร้อมกัน) -> {output_file}")
+        
+        # โหลดข้อมูลและเลือกตัวอย่างใน thread แยก (งาน I/O และ CPU)
+        done = await asyncio.to_thread(self._load_checkpoint, output_file)
+        stats.resumed = len(done)
+        needed = num_examples - len(done)
+        if needed <= 0:
+            stats.finished_at = time.time()
+            logger.info(f"ไฟล์ {output_file} มีตัวอย่างครบแล้ว ({len(done)} ตัวอย่าง)")
+            return output_file
+        if done:
+            logger.info(f"ทำงานต่อจากไฟล์เดิม: มีแล้ว {len(done)} ตัวอย่าง ต้องสร้างเพิ่ม {needed} ตัวอย่าง")
+        
+        def _select() -> List[FineTuneCandidate]:
+            candidates = (c for c in self._iter_candidates() if _prompt_hash(c.prompt) not in done)
+            return self._select_examples(candidates, needed)[0]
+        
+        selected = await asyncio.to_thread(_select)
+        stats.selected = len(selected)
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        
+        with open(output_file, 'a', encoding='utf-8') as f:
+            async def worker() -> None:
+                while True:
+                    candidate = await queue.get()
+                    if candidate is None:
+                        return
+                    try:
+                        completion = await self._generate_llm_completion(
+                            candidate, FINE_TUNE_GENERATION_MAX_TOKENS, FINE_TUNE_GENERATION_MAX_RETRIES, stats,
+                            max_overload_waits=FINE_TUNE_GENERATION_MAX_OVERLOAD_WAITS
+                        )
+                    except Exception as e:
+                        # worker ต้องไม่หยุด ไม่เช่นนั้นคิวจะค้าง
+                        logger.error(f"เกิดข้อผิดพลาดในการสร้างคำตอบ: {str(e)}")
+                        completion = None
+                    if completion is None:
+                        stats.failed += 1
+                        continue
+                    # เขียนทันทีเพื่อให้ทำงานต่อได้ถ้าหยุดกลางคัน (event loop เดียว ไม่มีการเขียนซ้อนกัน)
+                    f.write(json.dumps({"prompt": candidate.prompt, "completion": completion}, ensure_ascii=False) + '\n')
+                    f.flush()
+                    stats.completed += 1
+                    if stats.completed % 50 == 0:
+                        logger.info(f"ความคืบหน้าการสร้างข้อมูล fine-tuning: {stats.to_dict()}")
+            
+            workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+            try:
+                for candidate in selected:
+                    await queue.put(candidate)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+                stats.finished_at = time.time()
+        
+        logger.info(f"สร้างข้อมูลสำหรับ fine-tuning ด้วย LLM สำเร็จ: {stats.to_dict()} -> {output_file}")
         return output_file
     
     async def start_fine_tuning(self, data_file: str) -> Dict[str, Any]:
         """
         เริ่มกระบวนการ fine-tuning
         
+        อัปโหลดไฟล์ข้อมูลแบบ stream (multipart) ก่อน แล้วจึงสร้างงาน fine-tuning
+        โดยอ้างอิงไฟล์ที่อัปโหลด ไม่ต้องอ่านข้อมูลทั้งไฟล์เข้าหน่วยความจำ
+        
         Args:
             data_file: ไฟล์ข้อมูลสำหรับ fine-tuning
             
@@ -580,22 +970,8 @@ class FineTuneHelper:
             return {"success": False, "error": error_msg}
         
         try:
-            # อ่านไฟล์ข้อมูล
-            with open(data_file, 'r', encoding='utf-8') as f:
-                training_data = [json.loads(line) for line in f.readlines()]
-            
-            logger.info(f"อ่านข้อมูล fine-tuning สำเร็จ: {len(training_data)} ตัวอย่าง")
-            
-            # สร้าง payload สำหรับ API
-            payload = {
-                "base_model": LLM_MODEL,
-                "training_data": training_data,
-                "hyperparameters": {
-                    "n_epochs": 3,
-                    "batch_size": 4,
-                    "learning_rate": 1e-5
-                }
-            }
+            file_size = os.path.getsize(data_file)
+            logger.info(f"ไฟล์ข้อมูล fine-tuning: {file_size / 1024 / 1024:.2f} MB")
             
             # สร้าง headers
             headers = {}
@@ -603,9 +979,38 @@ class FineTuneHelper:
                 headers["Authorization"] = f"Bearer {LLM_API_KEY}"
             
             # ส่งคำขอไปยัง API
-            logger.info(f"กำลังส่งคำขอ fine-tuning ไปยัง API: {LLM_API_BASE}")
+            logger.info(f"กำลังอัปโหลดไฟล์ข้อมูล fine-tuning ไปยัง API: {LLM_API_BASE}")
             
             async with httpx.AsyncClient() as client:
+                # อัปโหลดไฟล์ (httpx อ่านไฟล์เป็น chunk ระหว่างส่ง)
+                with open(data_file, 'rb') as f:
+                    response = await client.post(
+                        f"{LLM_API_BASE}/v1/files",  # ปรับ endpoint ตาม API ที่ใช้
+                        data={"purpose": "fine-tune"},
+                        files={"file": (os.path.basename(data_file), f, "application/jsonl")},
+                        headers=headers,
+                        timeout=httpx.Timeout(60.0, write=None)
+                    )
+                
+                if response.status_code != 200:
+                    error_msg = f"เกิดข้อผิดพลาดในการอัปโหลดไฟล์ fine-tuning: HTTP {response.status_code}, {response.text}"
+                    logger.error(error_msg)
+                    return {"success": False, "error": error_msg}
+                
+                training_file = response.json().get("id", "")
+                logger.info(f"อัปโหลดไฟล์ข้อมูล fine-tuning สำเร็จ: {training_file}")
+                
+                # สร้าง payload สำหรับ API
+                payload = {
+                    "base_model": LLM_MODEL,
+                    "training_file": training_file,
+                    "hyperparameters": {
+                        "n_epochs": 3,
+                        "batch_size": 4,
+                        "learning_rate": 1e-5
+                    }
+                }
+                
                 response = await client.post(
                     f"{LLM_API_BASE}/v1/fine-tunes",  # ปรับ endpoint ตาม API ที่ใช้
                     json=payload,
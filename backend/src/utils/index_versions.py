@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Versioned layout for the vector database.
+
+Every build writes a complete index set into its own directory under
+``vector_db/versions/<version>/`` and then publishes it by atomically
+replacing the ``vector_db/CURRENT`` pointer file. Readers resolve the pointer
+and never see a half-written index. Trees without a pointer file keep using the
+legacy flat layout (``vector_db/job_knowledge`` etc.).
+"""
+
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from src.utils.logger import get_logger
+from src.utils.atomic_write import write_text_atomic
+
+# ตั้งค่า logger
+logger = get_logger("index_versions")
+
+# ชื่อไฟล์ pointer และโฟลเดอร์เก็บแต่ละเวอร์ชัน
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+# โฟลเดอร์ย่อยของแต่ละเวอร์ชัน (เหมือนโครงสร้างแบบเดิม)
+INDEX_SUBDIRS = ["job_knowledge", "career_advice", "combined_knowledge"]
+
+PathLike = Union[str, Path]
+
+
+def _versions_root(vector_db_dir: PathLike) -> Path:
+    return Path(vector_db_dir) / VERSIONS_DIR
+
+
+def get_current_version(vector_db_dir: PathLike) -> Optional[str]:
+    """
+    อ่านชื่อเวอร์ชันที่ใช้งานอยู่จากไฟล์ pointer
+
+    Args:
+        vector_db_dir: โฟลเดอร์ของฐานข้อมูล vector
+
+    Returns:
+        Optional[str]: ชื่อเวอร์ชัน หรือ None ถ้ายังใช้โครงสร้างแบบเดิม
+    """
+    try:
+        with open(Path(vector_db_dir) / CURRENT_FILE, 'r', encoding='utf-8') as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning(f"ไม่สามารถอ่านไฟล์ pointer ของ vector database: {str(e)}")
+        return None
+
+    if not version or not (_versions_root(vector_db_dir) / version).is_dir():
+        logger.warning(f"ไฟล์ pointer ชี้ไปยังเวอร์ชันที่ไม่มีอยู่: {version!r}")
+        return None
+    return version
+
+
+def resolve_index_dir(vector_db_dir: PathLike) -> str:
+    """
+    หาโฟลเดอร์ที่เก็บ index ชุดที่ใช้งานอยู่
+
+    Args:
+        vector_db_dir: โฟลเดอร์ของฐานข้อมูล vector
+
+    Returns:
+        str: โฟลเดอร์ของเวอร์ชันปัจจุบัน หรือ vector_db_dir สำหรับโครงสร้างแบบเดิม
+    """
+    version = get_current_version(vector_db_dir)
+    if version is None:
+        return str(vector_db_dir)
+    return str(_versions_root(vector_db_dir) / version)
+
+
+def pointer_signature(vector_db_dir: PathLike) -> Optional[Tuple[int, int]]:
+    """
+    ค่าที่เปลี่ยนทุกครั้งที่มีการสลับเวอร์ชัน (ใช้ตรวจสอบแบบไม่ต้องอ่านไฟล์)
+
+    Args:
+        vector_db_dir: โฟลเดอร์ของฐานข้อมูล vector
+
+    Returns:
+        Optional[Tuple[int, int]]: (inode, mtime_ns) ของไฟล์ pointer หรือ None ถ้าไม่มี
+    """
+    try:
+        stat = os.stat(Path(vector_db_dir) / CURRENT_FILE)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def create_version_dir(vector_db_dir: PathLike) -> Path:
+    """
+    สร้างโฟลเดอร์สำหรับเวอร์ชันใหม่ (ยังไม่ถูกใช้งานจนกว่าจะ publish)
+
+    Args:
+        vector_db_dir: โฟลเดอร์ของฐานข้อมูล vector
+
+    Returns:
+        Path: โฟลเดอร์ของเวอร์ชันใหม่
+    """
+    versions_root = _versions_root(vector_db_dir)
+    versions_root.mkdir(parents=True, exist_ok=True)
+    # ชื่อเวอร์ชันเรียงตามเวลาได้ตรง ๆ
+    version_dir = versions_root / datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    version_dir.mkdir()
+    return version_dir
+
+
+def publish_version(vector_db_dir: PathLike, version: str) -> None:
+    """
+    สลับให้ผู้อ่านใช้เวอร์ชันที่ระบุ ด้วยการแทนที่ไฟล์ pointer แบบ atomic
+
+    Args:
+        vector_db_dir: โฟลเดอร์ของฐานข้อมูล vector
+        version: ชื่อเวอร์ชัน (ชื่อโฟลเดอร์ใน versions/)
+    """
+    if not (_versions_root(vector_db_dir) / version).is_dir():
+        raise FileNotFoundError(f"ไม่พบโฟลเดอร์ของเวอร์ชัน {version}")
+
+    # เขียนไฟล์ชั่วคราว + fsync + เปลี่ยนชื่อทับ: ผู้อ่านเห็น pointer เดิมหรือใหม่เท่านั้น
+    write_text_atomic(Path(vector_db_dir) / CURRENT_FILE, version + "\n")
+
+    logger.info(f"สลับ vector database ไปใช้เวอร์ชัน {version}")
+
+
+def discard_version(vector_db_dir: PathLike, version: str) -> None:
+    """
+    ลบเวอร์ชันที่สร้างไม่สำเร็จ (ต้องไม่ใช่เวอร์ชันที่ใช้งานอยู่)
+
+    Args:
+        vector_db_dir: โฟลเดอร์ของฐานข้อมูล vector
+        version: ชื่อเวอร์ชัน
+    """
+    if version == get_current_version(vector_db_dir):
+        raise ValueError(f"ไม่สามารถลบเวอร์ชันที่ใช้งานอยู่: {version}")
+    shutil.rmtree(_versions_root(vector_db_dir) / version, ignore_errors=True)
+
+
+def prune_versions(vector_db_dir: PathLike, keep: int = 3) -> List[str]:
+    """
+    ลบเวอร์ชันเก่า โดยเก็บเวอร์ชันล่าสุดไว้ keep เวอร์ชัน (รวมเวอร์ชันที่ใช้งานอยู่)
+
+    เวอร์ชันก่อนหน้าถูกเก็บไว้สำหรับผู้อ่านที่ยังโหลดเวอร์ชันเดิมไม่เสร็จ
+
+    Args:
+        vector_db_dir: โฟลเดอร์ของฐานข้อมูล vector
+        keep: จำนวนเวอร์ชันที่เก็บไว้
+
+    Returns:
+        List[str]: ชื่อเวอร์ชันที่ถูกลบ
+    """
+    versions_root = _versions_root(vector_db_dir)
+    if not versions_root.is_dir():
+        return []
+
+    current = get_current_version(vector_db_dir)
+    versions = sorted((p.name for p in versions_root.iterdir() if p.is_dir()), reverse=True)
+    # เวอร์ชันที่ใหม่กว่าเวอร์ชันปัจจุบันอาจกำลังถูกสร้างอยู่ จึงไม่ลบ
+    if current is not None:
+        versions = [v for v in versions if v <= current]
+
+    removed = []
+    for version in versions[max(keep, 1):]:
+        if version == current:
+            continue
+        shutil.rmtree(versions_root / version, ignore_errors=True)
+        removed.append(version)
+
+    if removed:
+        logger.info(f"ลบ vector database เวอร์ชันเก่า {len(removed)} เวอร์ชัน: {', '.join(removed)}")
+    return removed
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Instant answers for structured job facts.
+
+This module detects questions that ask for one fact (salary, skills or
+responsibilities) about one role and answers them directly from the
+normalized job files, without calling the LLM.
+"""
+
+import os
+import re
+import json
+import glob
+import time
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Tuple
+
+from src.utils.logger import get_logger
+
+# ตั้งค่า logger
+logger = get_logger("job_facts")
+
+# คำที่ใช้ระบุเรื่องที่ถาม (aspect)
+ASPECT_TERMS = {
+    "salary": ["เงินเดือน", "salary", "รายได้", "ค่าตอบแทน", "ได้เงิน"],
+    "skills": ["ทักษะ", "สกิล", "skill", "ต้องรู้อะไร", "ต้องใช้อะไร", "ต้องเก่งอะไร"],
+    "responsibilities": ["หน้าที่", "ความรับผิดชอบ", "responsibilit", "ทำอะไรบ้าง", "ทำงานอะไร", "ทําอะไรบ้าง"],
+}
+
+# ชื่อเรื่องที่ถามสำหรับแสดงในคำตอบ
+ASPECT_NAMES = {
+    "salary": "เงินเดือน",
+    "skills": "ทักษะที่ต้องการ",
+    "responsibilities": "หน้าที่ความรับผิดชอบ",
+}
+
+# ข้อความเสริมเรื่องเงินเดือน (ตามกฎข้อ 2 ของ system prompt)
+SALARY_NOTE = "เงินเดือนอาจแตกต่างกันตามโครงสร้างบริษัท ขนาดบริษัท และภูมิภาค"
+
+
+@dataclass
+class JobFactQuery:
+    """ผลการสกัด intent และ slot จากคำถาม"""
+    job_id: str
+    aspect: str  # salary, skills, responsibilities
+    matched_title: str
+
+
+def _alias_pattern(alias: str) -> re.Pattern:
+    # ชื่อภาษาอังกฤษต้องไม่ติดกับตัวอักษรอื่น (เช่น "cto" ใน "director")
+    return re.compile(r"(?<![a-z0-9])" + re.escape(alias) + r"(?![a-z0-9])")
+
+
+class JobFactStore:
+    """
+    ข้อมูลอาชีพจาก normalized_jobs/*.json สำหรับตอบคำถามข้อเท็จจริงทันที
+
+    โหลดไฟล์ใหม่อัตโนมัติเมื่อไฟล์ในโฟลเดอร์เปลี่ยน (ตรวจจาก mtime อย่างมากทุก reload_interval วินาที)
+    """
+
+    def __init__(self, normalized_jobs_dir: str, max_items: int = 8,
+                 title_mapping: Optional[Dict[str, str]] = None, reload_interval: float = 5.0):
+        """
+        เริ่มต้นใช้งาน JobFactStore
+
+        Args:
+            normalized_jobs_dir: โฟลเดอร์ของไฟล์อาชีพที่ normalize แล้ว
+            max_items: จำนวนรายการสูงสุดที่แสดงในคำตอบ
+            title_mapping: ชื่อตำแหน่ง -> รหัสอาชีพ (ค่าเริ่มต้นคือ JOB_TITLE_MAPPING ของ JobDataNormalizer)
+            reload_interval: ระยะเวลาขั้นต่ำ (วินาที) ระหว่างการตรวจว่าไฟล์เปลี่ยนหรือไม่ (0 = ตรวจทุกครั้ง)
+        """
+        self.normalized_jobs_dir = normalized_jobs_dir
+        self.max_items = max_items
+        self._title_mapping = title_mapping
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._aliases: List[Tuple[str, re.Pattern, str]] = []  # (ชื่อ, pattern, รหัสอาชีพ) เรียงจากยาวไปสั้น
+        self._signature: Optional[Tuple] = None
+        self.reload_interval = reload_interval
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _files_signature(self) -> Tuple:
+        files = sorted(glob.glob(os.path.join(self.normalized_jobs_dir, "*.json")))
+        return tuple((f, os.path.getmtime(f)) for f in files)
+
+    def _ensure_loaded(self) -> None:
+        # ไม่ต้อง glob/stat ทุกไฟล์ในทุกคำถาม ตรวจอย่างมากทุก reload_interval วินาที
+        if self._signature is not None and time.monotonic() < self._next_check:
+            return
+        # ให้ thread เดียวตรวจและโหลดใหม่ thread อื่นที่มีข้อมูลเดิมอยู่แล้วใช้ข้อมูลเดิมไปก่อน
+        if not self._lock.acquire(blocking=self._signature is None):
+            return
+        try:
+            # thread อื่นอาจโหลดเสร็จระหว่างที่รอ lock
+            if self._signature is None or time.monotonic() >= self._next_check:
+                self._reload_if_changed()
+        finally:
+            self._next_check = time.monotonic() + self.reload_interval
+            self._lock.release()
+
+    def _reload_if_changed(self) -> None:
+        try:
+            signature = self._files_signature()
+        except OSError as e:
+            logger.warning(f"ไม่สามารถตรวจสอบไฟล์อาชีพใน {self.normalized_jobs_dir}: {str(e)}")
+            return
+        if signature == self._signature:
+            return
+
+        jobs = {}
+        for file_path, _ in signature:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+                jobs[job.get("id") or os.path.splitext(os.path.basename(file_path))[0]] = job
+            except Exception as e:
+                logger.error(f"เกิดข้อผิดพลาดในการโหลดไฟล์อาชีพ {file_path}: {str(e)}")
+
+        title_mapping = self._title_mapping
+        if title_mapping is None:
+            from src.data_processing.job_normalizer import JOB_TITLE_MAPPING
+            title_mapping = JOB_TITLE_MAPPING
+
+        aliases: Dict[str, str] = {}
+        for title, job_id in title_mapping.items():
+            if job_id in jobs:
+                aliases[title.lower()] = job_id
+        for job_id, job in jobs.items():
+            aliases.setdefault(job_id.replace("-", " "), job_id)
+            for title in job.get("titles", []):
+                aliases.setdefault(title.lower(), job_id)
+
+        self._jobs = jobs
+        self._aliases = [
+            (alias, _alias_pattern(alias), job_id)
+            for alias, job_id in sorted(aliases.items(), key=lambda item: -len(item[0]))
+        ]
+        self._signature = signature
+        logger.info(f"โหลดข้อมูลอาชีพสำหรับคำตอบทันที {len(jobs)} อาชีพ ({len(aliases)} ชื่อตำแหน่ง)")
+
+    def extract(self, query: str) -> Optional[JobFactQuery]:
+        """
+        สกัดอาชีพและเรื่องที่ถามจากคำถาม
+
+        Args:
+            query: คำถาม
+
+        Returns:
+            Optional[JobFactQuery]: ผลการสกัด หรือ None ถ้าไม่ใช่คำถามข้อเท็จจริงของอาชีพเดียว
+        """
+        self._ensure_loaded()
+        text = query.lower()
+
+        aspects = [aspect for aspect, terms in ASPECT_TERMS.items() if any(term in text for term in terms)]
+        if len(aspects) != 1:
+            return None
+
+        matched: Dict[str, str] = {}
+        remaining = text
+        for alias, pattern, job_id in self._aliases:
+            if pattern.search(remaining):
+                matched.setdefault(job_id, alias)
+                # ตัดชื่อที่พบแล้วออก ไม่ให้ชื่อสั้นที่อยู่ในชื่อยาวถูกนับซ้ำ
+                remaining = pattern.sub(" ", remaining)
+        if len(matched) != 1:
+            return None
+
+        job_id, alias = next(iter(matched.items()))
+        return JobFactQuery(job_id=job_id, aspect=aspects[0], matched_title=alias)
+
+    def _display_title(self, job: Dict[str, Any], matched_title: str) -> str:
+        for title in job.get("titles", []):
+            if title.lower() == matched_title:
+                return title
+        # ชื่อย่อ เช่น dba, cto แสดงเป็นตัวพิมพ์ใหญ่
+        return matched_title.upper() if len(matched_title) <= 4 else matched_title.title()
+
+    def _salary_lines(self, job: Dict[str, Any], matched_title: str) -> List[str]:
+        ranges = job.get("salary_ranges", [])
+        # ใช้ช่วงเงินเดือนของชื่อตำแหน่งที่ถามก่อน ถ้ามี
+        specific = [r for r in ranges if matched_title in [t.lower() for t in r.get("titles") or []]]
+        lines = []
+        for salary_range in specific or ranges:
+            experience = salary_range.get("experience", "")
+            salary = salary_range.get("salary", "")
+            if salary:
+                lines.append(f"- ประสบการณ์ {experience} ปี: {salary} บาท")
+        return lines
+
+    def answer(self, query: str, personality: str = "friendly") -> Optional[str]:
+        """
+        ตอบคำถามข้อเท็จจริงของอาชีพจากข้อมูลที่มีโครงสร้าง
+
+        Args:
+            query: คำถาม
+            personality: บุคลิกของ AI
+
+        Returns:
+            Optional[str]: คำตอบภาษาไทย หรือ None ถ้าตอบไม่ได้ (ควรส่งให้ LLM)
+        """
+        fact_query = self.extract(query)
+        if fact_query is None:
+            return None
+
+        job = self._jobs.get(fact_query.job_id)
+        if not job:
+            return None
+
+        if fact_query.aspect == "salary":
+            lines = self._salary_lines(job, fact_query.matched_title)
+        else:
+            lines = [f"- {item}" for item in job.get(fact_query.aspect, []) if item][:self.max_items]
+        if not lines:
+            return None
+
+        title = self._display_title(job, fact_query.matched_title)
+        aspect_name = ASPECT_NAMES[fact_query.aspect]
+        if personality == "formal":
+            intro = f"{aspect_name}ของตำแหน่ง {title} มีรายละเอียดดังนี้ครับ"
+        elif personality == "fun":
+            intro = f"มาเช็ค{aspect_name}ของสาย {title} กันเลย!"
+        else:
+            intro = f"{aspect_name}ของ {title} ประมาณนี้เลยนะ"
+
+        answer = intro + "\n" + "\n".join(lines)
+        if fact_query.aspect == "salary":
+            answer += f"\n\n*{SALARY_NOTE}"
+        logger.info(f"ตอบคำถามทันทีจากข้อมูลอาชีพ: {fact_query.job_id} ({fact_query.aspect})")
+        return answer
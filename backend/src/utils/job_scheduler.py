@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Background job scheduler for Career AI Advisor.
+
+This module runs long admin and pipeline tasks (vector database rebuild,
+fine-tune data preparation, scraping) outside the request handlers. CPU-bound
+work runs in a process pool so it cannot block API workers serving chat
+traffic. Job status is persisted to disk and can be polled or cancelled.
+"""
+
+import os
+import json
+import uuid
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from contextlib import contextmanager
+from datetime import datetime
+from enum import Enum
+from typing import Dict, Any, Optional, List, Callable, Tuple, Iterator
+
+from src.utils.logger import get_logger
+from src.utils.atomic_write import write_json_atomic
+from src.utils import json_codec
+
+# ตั้งค่า logger
+logger = get_logger("job_scheduler")
+
+
+class JobStatus(str, Enum):
+    """สถานะของงานเบื้องหลัง"""
+    PENDING = "pending"  # รอ process ว่าง
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+# สถานะที่งานจบแล้ว
+FINISHED_STATUSES = {JobStatus.COMPLETED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value}
+
+
+class JobCancelledError(Exception):
+    """เกิดขึ้นในงานเมื่อมีการขอยกเลิก (ตรวจที่จุดตรวจสอบของงาน)"""
+
+
+class JobContext:
+    """
+    ช่องทางสื่อสารระหว่างงานกับ JobScheduler
+
+    ใช้ไฟล์ในโฟลเดอร์งาน จึงทำงานได้ทั้งใน process ย่อยและใน process ของ API:
+    - {job_id}.progress.json: ความคืบหน้าล่าสุดที่งานรายงาน
+    - {job_id}.cancel: มีไฟล์นี้แปลว่ามีการขอยกเลิก
+    """
+
+    def __init__(self, job_id: str, jobs_dir: str):
+        """
+        เริ่มต้นใช้งาน JobContext
+
+        Args:
+            job_id: รหัสงาน
+            jobs_dir: โฟลเดอร์ที่เก็บสถานะงาน
+        """
+        self.job_id = job_id
+        self.progress_path = os.path.join(jobs_dir, f"{job_id}.progress.json")
+        self.cancel_path = os.path.join(jobs_dir, f"{job_id}.cancel")
+
+    def report(self, progress: float, message: str = "", details: Optional[Dict[str, Any]] = None) -> None:
+        """
+        รายงานความคืบหน้าของงาน
+
+        Args:
+            progress: ความคืบหน้า 0.0-1.0
+            message: ข้อความอธิบายขั้นตอนปัจจุบัน
+            details: ข้อมูลเพิ่มเติม (เช่น สถิติ)
+        """
+        try:
+            # ความคืบหน้าเขียนบ่อยและไม่จำเป็นต้องทนต่อไฟดับ จึงไม่ fsync
+            write_json_atomic(self.progress_path, {
+                "progress": round(max(0.0, min(1.0, progress)), 4),
+                "message": message,
+                "details": details or {},
+                "updated_at": datetime.now().isoformat(),
+            }, fsync=False)
+        except OSError as e:
+            logger.warning(f"ไม่สามารถบันทึกความคืบหน้าของงาน {self.job_id}: {str(e)}")
+
+    def is_cancelled(self) -> bool:
+        """ตรวจว่ามีการขอยกเลิกงานหรือไม่"""
+        return os.path.exists(self.cancel_path)
+
+    def check_cancelled(self) -> None:
+        """
+        จุดตรวจสอบการยกเลิก (เรียกระหว่างขั้นตอนของงาน)
+
+        Raises:
+            JobCancelledError: ถ้ามีการขอยกเลิก
+        """
+        if self.is_cancelled():
+            raise JobCancelledError(f"งาน {self.job_id} ถูกยกเลิก")
+
+    @contextmanager
+    def track(self, stats: Any, message: str, interval: float = 2.0) -> Iterator[None]:
+        """
+        รายงานความคืบหน้าจากออบเจกต์สถิติ (ที่มี to_dict() และคีย์ progress) เป็นระยะระหว่างทำงาน
+
+        Args:
+            stats: ออบเจกต์สถิติที่งานอัปเดตระหว่างทำงาน เช่น GenerationStats
+            message: ข้อความอธิบายขั้นตอน
+            interval: ระยะเวลาระหว่างการรายงาน (วินาที)
+        """
+        stop = threading.Event()
+
+        def _reporter() -> None:
+            while not stop.wait(interval):
+                details = stats.to_dict()
+                self.report(details.get("progress", 0.0), message, details)
+
+        thread = threading.Thread(target=_reporter, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+            details = stats.to_dict()
+            self.report(details.get("progress", 0.0), message, details)
+
+
+def run_rebuild_job(params: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    """
+    เตรียมข้อมูล embedding และสร้าง vector database ใหม่
+
+    Args:
+        params: model_name (ค่าเริ่มต้น EMBEDDING_MODEL), clear (ล้างฐานข้อมูลเดิม, ค่าเริ่มต้น True),
+                prepare_embedding_data (เตรียมไฟล์ embedding ก่อน, ค่าเริ่มต้น True),
+                batch_size, processes (ค่าเริ่มต้นจาก EMBEDDING_BATCH_SIZE, EMBEDDING_PROCESSES)
+        ctx: JobContext ของงาน
+
+    Returns:
+        Dict[str, Any]: จำนวน vector ของแต่ละฐานข้อมูล
+    """
+    from src.utils.config import (
+        EMBEDDING_MODEL, PROCESSED_DATA_DIR, VECTOR_DB_DIR, EMBEDDING_DIR,
+        NORMALIZED_JOBS_DIR, CAREER_ADVICES_DIR
+    )
+
+    if params.get("prepare_embedding_data", True):
+        from src.data_processing.prepare_embedding_data import prepare_jobs_data, prepare_advices_data
+
+        ctx.report(0.05, "กำลังเตรียมข้อมูลอาชีพสำหรับ embeddings")
+        prepare_jobs_data(NORMALIZED_JOBS_DIR, os.path.join(EMBEDDING_DIR, "embedding_data.json"))
+        ctx.check_cancelled()
+
+        ctx.report(0.1, "กำลังเตรียมข้อมูลคำแนะนำอาชีพสำหรับ embeddings")
+        prepare_advices_data(
+            os.path.join(CAREER_ADVICES_DIR, "career_advices.json"),
+            os.path.join(EMBEDDING_DIR, "career_advices_embeddings.json")
+        )
+        ctx.check_cancelled()
+
+    model_name = params.get("model_name") or EMBEDDING_MODEL
+    ctx.report(0.15, f"กำลังโหลดโมเดล {model_name}")
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name)
+    ctx.check_cancelled()
+
+    from src.utils.vector_creator import VectorCreator
+
+    ctx.report(0.2, "กำลังสร้าง vector database")
+    vector_creator = VectorCreator(
+        processed_data_dir=PROCESSED_DATA_DIR,
+        vector_db_dir=VECTOR_DB_DIR,
+        embedding_model=model,
+        clear_vector_db=params.get("clear", True),
+        batch_size=params.get("batch_size"),
+        processes=params.get("processes")
+    )
+    results = vector_creator.create_all_embeddings()
+
+    summary = {}
+    for name, result in results.items():
+        if isinstance(result, dict) and "success" in result:
+            summary[name] = {
+                "success": bool(result.get("success", False)),
+                "vectors_count": result.get("vectors_count", 0),
+                "error": result.get("error"),
+            }
+        elif result is not None:
+            # ข้อมูลประกอบ เช่น version, published, build_plan
+            summary[name] = result
+    ctx.report(1.0, "สร้าง vector database เสร็จสิ้น", summary)
+    return summary
+
+
+def run_fine_tune_prepare_job(params: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    """
+    สร้างชุดข้อมูล fine-tuning ด้วยคำตอบจากเทมเพลต
+
+    Args:
+        params: num_examples (ค่าเริ่มต้น 100)
+        ctx: JobContext ของงาน
+
+    Returns:
+        Dict[str, Any]: พาธของไฟล์และสถิติการสร้าง
+    """
+    from src.utils.fine_tune import FineTuneHelper, GenerationStats
+
+    helper = FineTuneHelper()
+    stats = GenerationStats()
+    ctx.check_cancelled()
+
+    with ctx.track(stats, "กำลังสร้างชุดข้อมูล fine-tuning"):
+        file_path = helper.prepare_fine_tune_data(int(params.get("num_examples", 100)), stats)
+
+    return {"file_path": file_path, "stats": stats.to_dict()}
+
+
+async def run_fine_tune_generate_job(params: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    """
+    สร้างชุดข้อมูล fine-tuning โดยให้ LLM สร้างคำตอบ
+
+    ทำงานใน event loop ของ API (งานรอ I/O) เพื่อให้คำขอ LLM ผ่านคิวลำดับความสำคัญเดียวกับแชท
+
+    Args:
+        params: num_examples, concurrency, output_file (ชื่อไฟล์เดิมในโฟลเดอร์ fine-tuning เพื่อทำงานต่อ)
+        ctx: JobContext ของงาน
+
+    Returns:
+        Dict[str, Any]: พาธของไฟล์และสถิติการสร้าง
+    """
+    from src.utils.fine_tune import FineTuneHelper, GenerationStats
+
+    helper = FineTuneHelper()
+    stats = GenerationStats()
+    output_file = params.get("output_file")
+    output_file = helper.resolve_output_file(output_file) if output_file else helper.new_output_file()
+
+    with ctx.track(stats, f"กำลังสร้างชุดข้อมูล fine-tuning ด้วย LLM -> {output_file}"):
+        file_path = await helper.prepare_fine_tune_data_with_llm(
+            num_examples=int(params.get("num_examples", 100)),
+            output_file=output_file,
+            concurrency=params.get("concurrency"),
+            stats=stats
+        )
+
+    return {"file_path": file_path, "stats": stats.to_dict()}
+
+
+def run_scrape_job(params: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    """
+    เก็บข้อมูลจากแหล่งต่างๆ (เหมือนขั้นตอนที่ 1 ของ run_data_processing)
+
+    Args:
+        params: sources (รายการจาก jobsdb, advice, salary, responsibilities ค่าเริ่มต้นคือทั้งหมด)
+        ctx: JobContext ของงาน
+
+    Returns:
+        Dict[str, Any]: ผลลัพธ์ของแต่ละแหล่งข้อมูล
+    """
+    from src.utils.config import CAREER_ADVICES_DIR, RAW_OTHER_SOURCES_DIR
+
+    sources = params.get("sources") or list(SCRAPE_SOURCES)
+    unknown = [s for s in sources if s not in SCRAPE_SOURCES]
+    if unknown:
+        raise ValueError(f"ไม่รู้จักแหล่งข้อมูล: {', '.join(unknown)}")
+
+    results = {}
+    for index, source in enumerate(sources):
+        ctx.check_cancelled()
+        ctx.report(index / len(sources), f"กำลังเก็บข้อมูลจาก {source}")
+
+        if source == "jobsdb":
+            from src.data_collection.jobsdb_scraper import JobDataProcessor as JobsDBScraper
+            result = JobsDBScraper().process()
+        elif source == "advice":
+            from src.data_collection.jobsdb_advice_scraper import SimpleArticleScraper
+            result = SimpleArticleScraper(CAREER_ADVICES_DIR).scrape()
+        elif source == "salary":
+            from src.data_collection.salary_scraper import ISMTechSalaryScraper
+            result = ISMTechSalaryScraper(output_folder=RAW_OTHER_SOURCES_DIR).scrape()
+        else:
+            from src.data_collection.resp_scraper import JobResponsibilityScraper
+            result = JobResponsibilityScraper(output_folder=RAW_OTHER_SOURCES_DIR).scrape()
+
+        results[source] = result if isinstance(result, dict) else {"result": str(result)}
+
+    ctx.report(1.0, "เก็บข้อมูลเสร็จสิ้น")
+    return results
+
+
+# แหล่งข้อมูลที่งาน scrape รองรับ
+SCRAPE_SOURCES = ("jobsdb", "advice", "salary", "responsibilities")
+
+# ประเภทงาน -> (ฟังก์ชัน, ที่ทำงาน) โดย "process" = process pool, "async" = event loop ของ API
+JOB_TYPES: Dict[str, Tuple[Callable, str]] = {
+    "rebuild": (run_rebuild_job, "process"),
+    "fine_tune_prepare": (run_fine_tune_prepare_job, "process"),
+    "fine_tune_generate": (run_fine_tune_generate_job, "async"),
+    "scrape": (run_scrape_job, "process"),
+}
+
+
+def _execute_job(job_type: str, job_id: str, params: Dict[str, Any], jobs_dir: str) -> Dict[str, Any]:
+    """รันงานใน process ย่อยแล้วคืนผลลัพธ์ (ข้อผิดพลาดถูกแปลงเป็นสถานะ ไม่ส่งข้าม process)"""
+    ctx = JobContext(job_id, jobs_dir)
+    func, _ = JOB_TYPES[job_type]
+    ctx.report(0.0, "เริ่มงาน")
+    try:
+        ctx.check_cancelled()
+        return {"status": JobStatus.COMPLETED.value, "result": func(params, ctx)}
+    except JobCancelledError:
+        return {"status": JobStatus.CANCELLED.value}
+    except Exception as e:
+        logger.error(f"งาน {job_type} ({job_id}) ล้มเหลว: {str(e)}")
+        return {"status": JobStatus.FAILED.value, "error": str(e)}
+
+
+class JobScheduler:
+    """
+    ตัวจัดการงานเบื้องหลังพร้อมตารางสถานะงานที่บันทึกลงดิสก์
+
+    งานประเภท "process" รันใน ProcessPoolExecutor (spawn) แยกจาก API worker
+    งานประเภท "async" (งานที่รอ I/O เช่น เรียก LLM) รันเป็น task ใน event loop ของ API
+    การยกเลิกงานที่ยังไม่เริ่มมีผลทันที ส่วนงานที่กำลังทำงานจะหยุดที่จุดตรวจสอบถัดไป
+    """
+
+    def __init__(self, jobs_dir: str, max_workers: int = 1):
+        """
+        เริ่มต้นใช้งาน JobScheduler
+
+        Args:
+            jobs_dir: โฟลเดอร์ที่เก็บสถานะงาน
+            max_workers: จำนวน process สูงสุดสำหรับงานประเภท "process"
+        """
+        self.jobs_dir = jobs_dir
+        self.max_workers = max(1, max_workers)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._futures: Dict[str, Future] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        self._load_jobs()
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _load_jobs(self) -> None:
+        for file_name in os.listdir(self.jobs_dir):
+            if not file_name.endswith(".json") or file_name.endswith(".progress.json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, file_name), 'r', encoding='utf-8') as f:
+                    job = json_codec.load(f)
+            except Exception as e:
+                logger.error(f"ไม่สามารถโหลดสถานะงาน {file_name}: {str(e)}")
+                continue
+
+            if job.get("status") not in FINISHED_STATUSES:
+                # งานที่ค้างจากการรันครั้งก่อน (เซิร์ฟเวอร์หยุดระหว่างทำงาน)
+                job["status"] = JobStatus.FAILED.value
+                job["error"] = "งานถูกขัดจังหวะเนื่องจากเซิร์ฟเวอร์หยุดทำงาน"
+                job["finished_at"] = datetime.now().isoformat()
+                self._persist(job)
+            self._jobs[job["id"]] = job
+
+        if self._jobs:
+            logger.info(f"โหลดสถานะงานเบื้องหลัง {len(self._jobs)} งาน")
+
+    def _persist(self, job: Dict[str, Any]) -> None:
+        try:
+            write_json_atomic(self._job_path(job["id"]), job)
+        except OSError as e:
+            logger.error(f"ไม่สามารถบันทึกสถานะงาน {job['id']}: {str(e)}")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn แทน fork: process ของ API มี thread และ event loop ที่ไม่ควรคัดลอกไป
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _read_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(JobContext(job_id, self.jobs_dir).progress_path, 'r', encoding='utf-8') as f:
+                return json_codec.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _apply_progress(self, job: Dict[str, Any]) -> None:
+        progress = self._read_progress(job["id"])
+        if not progress:
+            return
+        job["progress"] = progress.get("progress", job["progress"])
+        job["message"] = progress.get("message", job["message"])
+        job["details"] = progress.get("details", job["details"])
+        if job["status"] == JobStatus.PENDING.value:
+            # process ย่อยเริ่มรายงานความคืบหน้าแล้ว แปลว่างานเริ่มทำงานแล้ว
+            job["status"] = JobStatus.RUNNING.value
+            job["started_at"] = progress.get("updated_at") or datetime.now().isoformat()
+            self._persist(job)
+
+    def _finish(self, job_id: str, outcome: Dict[str, Any]) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            self._apply_progress(job)
+            job["status"] = outcome["status"]
+            # ผลลัพธ์ต้องเป็น JSON ได้ (แปลงค่าที่ไม่ใช่ JSON เป็นข้อความ)
+            job["result"] = json.loads(json.dumps(outcome.get("result"), ensure_ascii=False, default=str))
+            job["error"] = outcome.get("error")
+            job["finished_at"] = datetime.now().isoformat()
+            if job["status"] == JobStatus.COMPLETED.value:
+                job["progress"] = 1.0
+            if not job.get("started_at"):
+                job["started_at"] = job["finished_at"]
+            self._persist(job)
+            self._futures.pop(job_id, None)
+            self._tasks.pop(job_id, None)
+
+        ctx = JobContext(job_id, self.jobs_dir)
+        for path in (ctx.progress_path, ctx.cancel_path):
+            if os.path.exists(path):
+                os.remove(path)
+        logger.info(f"งาน {job['type']} ({job_id}) จบด้วยสถานะ {job['status']}")
+
+    def _on_future_done(self, job_id: str, future: Future) -> None:
+        if future.cancelled():
+            outcome = {"status": JobStatus.CANCELLED.value}
+        else:
+            try:
+                outcome = future.result()
+            except Exception as e:
+                # เช่น process ย่อยถูก kill (BrokenProcessPool)
+                outcome = {"status": JobStatus.FAILED.value, "error": str(e)}
+        self._finish(job_id, outcome)
+
+    async def _run_async_job(self, job_id: str, func: Callable, params: Dict[str, Any]) -> None:
+        ctx = JobContext(job_id, self.jobs_dir)
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = JobStatus.RUNNING.value
+            job["started_at"] = datetime.now().isoformat()
+            self._persist(job)
+        ctx.report(0.0, "เริ่มงาน")
+
+        try:
+            outcome = {"status": JobStatus.COMPLETED.value, "result": await func(params, ctx)}
+        except (asyncio.CancelledError, JobCancelledError):
+            outcome = {"status": JobStatus.CANCELLED.value}
+        except Exception as e:
+            logger.error(f"งาน {job['type']} ({job_id}) ล้มเหลว: {str(e)}")
+            outcome = {"status": JobStatus.FAILED.value, "error": str(e)}
+        self._finish(job_id, outcome)
+
+    def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        สร้างและเริ่มงานเบื้องหลัง
+
+        งานประเภท "async" ต้องเรียกจากภายใน event loop (เช่น route handler แบบ async)
+
+        Args:
+            job_type: ประเภทงาน (คีย์ของ JOB_TYPES)
+            params: พารามิเตอร์ของงาน (ต้องเป็น JSON ได้)
+
+        Returns:
+            Dict[str, Any]: ข้อมูลงานที่สร้าง
+
+        Raises:
+            ValueError: ถ้าไม่รู้จักประเภทงาน
+        """
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"ไม่รู้จักประเภทงาน: {job_type} (รองรับ: {', '.join(JOB_TYPES)})")
+
+        func, kind = JOB_TYPES[job_type]
+        params = params or {}
+        job_id = str(uuid.uuid4())
+        job = {
+            "id": job_id,
+            "type": job_type,
+            "params": params,
+            "status": JobStatus.PENDING.value,
+            "progress": 0.0,
+            "message": "",
+            "details": {},
+            "result": None,
+            "error": None,
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+        }
+
+        with self._lock:
+            self._jobs[job_id] = job
+            self._persist(job)
+
+        if kind == "async":
+            task = asyncio.get_running_loop().create_task(self._run_async_job(job_id, func, params))
+            self._tasks[job_id] = task
+        else:
+            future = self._get_executor().submit(_execute_job, job_type, job_id, params, self.jobs_dir)
+            self._futures[job_id] = future
+            future.add_done_callback(lambda f, job_id=job_id: self._on_future_done(job_id, f))
+
+        logger.info(f"สร้างงานเบื้องหลัง {job_type} ({job_id})")
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        ดึงสถานะงานพร้อมความคืบหน้าล่าสุด
+
+        Args:
+            job_id: รหัสงาน
+
+        Returns:
+            Optional[Dict[str, Any]]: ข้อมูลงาน หรือ None ถ้าไม่พบ
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] not in FINISHED_STATUSES:
+                self._apply_progress(job)
+            return dict(job)
+
+    def list_jobs(self, status: Optional[str] = None, job_type: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        ดึงรายการงาน (ใหม่สุดก่อน)
+
+        Args:
+            status: กรองตามสถานะ (ถ้ามี)
+            job_type: กรองตามประเภทงาน (ถ้ามี)
+            limit: จำนวนงานสูงสุด
+
+        Returns:
+            List[Dict[str, Any]]: รายการงาน
+        """
+        with self._lock:
+            job_ids = [
+                job["id"] for job in sorted(self._jobs.values(), key=lambda j: j["created_at"], reverse=True)
+                if (status is None or job["status"] == status) and (job_type is None or job["type"] == job_type)
+            ][:limit]
+        return [job for job in (self.get_job(job_id) for job_id in job_ids) if job]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        ขอยกเลิกงาน
+
+        งานที่ยังรอคิวถูกยกเลิกทันที งานที่กำลังทำงานจะหยุดที่จุดตรวจสอบถัดไป
+
+        Args:
+            job_id: รหัสงาน
+
+        Returns:
+            Optional[Dict[str, Any]]: ข้อมูลงาน หรือ None ถ้าไม่พบ
+
+        Raises:
+            ValueError: ถ้างานจบไปแล้ว
+        """
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        if job["status"] in FINISHED_STATUSES:
+            raise ValueError(f"งาน {job_id} จบแล้ว ({job['status']})")
+
+        # สร้างไฟล์ขอยกเลิกก่อน เผื่องานเริ่มทำงานระหว่างนี้
+        with open(JobContext(job_id, self.jobs_dir).cancel_path, 'w', encoding='utf-8') as f:
+            f.write(datetime.now().isoformat())
+
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            logger.info(f"ยกเลิกงานที่รอคิว {job_id}")
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+
+        logger.info(f"ขอยกเลิกงาน {job_id}")
+        return self.get_job(job_id)
+
+    def shutdown(self) -> None:
+        """หยุดรับงานและยกเลิกงานที่ยังรอคิว (งานที่กำลังทำงานใน process ย่อยจะทำต่อจนจบ)"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_job_scheduler: Optional[JobScheduler] = None
+
+
+def get_job_scheduler() -> JobScheduler:
+    """
+    ดึง JobScheduler ที่ใช้ร่วมกันทั้งแอป (สร้างครั้งแรกจากค่าคอนฟิก)
+
+    Returns:
+        JobScheduler: ตัวจัดการงานเบื้องหลัง
+    """
+    global _job_scheduler
+    if _job_scheduler is None:
+        from src.utils.config import JOBS_DIR, JOB_MAX_WORKERS
+        _job_scheduler = JobScheduler(JOBS_DIR, max_workers=JOB_MAX_WORKERS)
+    return _job_scheduler
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON codec for Career AI Advisor.
+
+Uses orjson when it is installed (JSON_CODEC=auto or orjson) and the standard
+library ``json`` module otherwise. Output is compact UTF-8 by default;
+JSON_PRETTY=true (or ``pretty=True`` per call) writes 2-space indented JSON
+for files that people read by hand.
+"""
+
+import io
+import json
+from typing import Any, IO, Optional, Union
+
+from src.utils.config import JSON_CODEC, JSON_PRETTY
+from src.utils.logger import get_logger
+
+# ตั้งค่า logger
+logger = get_logger("json_codec")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if JSON_CODEC == "orjson" and orjson is None:
+    logger.warning("JSON_CODEC=orjson แต่ไม่ได้ติดตั้ง orjson จะใช้ json มาตรฐานแทน")
+
+# True ถ้าใช้ orjson ในการแปลง JSON
+HAS_ORJSON = orjson is not None and JSON_CODEC != "json"
+
+# ชื่อ codec ที่ใช้อยู่
+JSON_BACKEND = "orjson" if HAS_ORJSON else "json"
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def dumps(data: Any, pretty: Optional[bool] = None) -> bytes:
+    """
+    แปลงข้อมูลเป็น JSON (UTF-8 bytes)
+
+    Args:
+        data: ข้อมูลที่แปลงเป็น JSON ได้
+        pretty: เยื้อง 2 ช่อง ถ้าไม่ระบุจะใช้ JSON_PRETTY
+
+    Returns:
+        bytes: JSON
+    """
+    if pretty is None:
+        pretty = JSON_PRETTY
+
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(data, option=_ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if pretty else 0))
+        except orjson.JSONEncodeError:
+            # เช่น จำนวนเต็มเกิน 64 บิต ซึ่ง json มาตรฐานรองรับ
+            pass
+
+    if pretty:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return text.encode('utf-8')
+
+
+def dumps_str(data: Any, pretty: Optional[bool] = None) -> str:
+    """
+    แปลงข้อมูลเป็น JSON (str)
+
+    Args:
+        data: ข้อมูลที่แปลงเป็น JSON ได้
+        pretty: เยื้อง 2 ช่อง ถ้าไม่ระบุจะใช้ JSON_PRETTY
+
+    Returns:
+        str: JSON
+    """
+    return dumps(data, pretty=pretty).decode('utf-8')
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """
+    แปลง JSON เป็นข้อมูล Python
+    (ข้อผิดพลาดเป็น json.JSONDecodeError ทั้งสอง codec)
+
+    Args:
+        data: JSON
+
+    Returns:
+        Any: ข้อมูลที่แปลงแล้ว
+    """
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return json.loads(data)
+
+
+def load(f: IO) -> Any:
+    """
+    อ่าน JSON จาก file object (โหมดข้อความหรือไบต์)
+
+    Args:
+        f: file object
+
+    Returns:
+        Any: ข้อมูลที่แปลงแล้ว
+    """
+    return loads(f.read())
+
+
+def dump(data: Any, f: IO, pretty: Optional[bool] = None) -> None:
+    """
+    เขียน JSON ลง file object (โหมดข้อความหรือไบต์)
+
+    Args:
+        data: ข้อมูลที่แปลงเป็น JSON ได้
+        f: file object
+        pretty: เยื้อง 2 ช่อง ถ้าไม่ระบุจะใช้ JSON_PRETTY
+    """
+    payload = dumps(data, pretty=pretty)
+    if isinstance(f, io.TextIOBase):
+        f.write(payload.decode('utf-8'))
+    else:
+        f.write(payload)
@@ -8,13 +8,69 @@ This module provides functions for interacting with large language models.
 
 import asyncio
 import json
+import textwrap
+import time
 from typing import Dict, Any, Optional, List, Union
 import httpx
 
 # ตั้งค่า logger สำหรับไฟล์นี้โดยเฉพาะ
 from src.utils.logger import get_logger
+from src.utils.llm_admission import LLMPriority, LLMOverloadedError, get_admission_controller
+from src.utils.llm_pool import get_llm_pool
+from src.utils.conversation import ConversationSession
+from src.utils.model_router import ModelTier, RoutingDecision
+from src.utils.prompt_builder import (
+    PromptAssembler,
+    estimate_tokens,
+    truncate_list,
+    format_job_result,
+    format_advice_result,
+    RESULT_SEPARATOR,
+    GROUP_SEPARATOR,
+)
 logger = get_logger("llm")
 
+# จำนวนทักษะ/ภาษาสูงสุดที่แสดงในกฎเพิ่มเติมของ prompt
+PROMPT_RULE_MAX_ITEMS = 10
+# งบโทเค็นขั้นต่ำที่เหลือไว้ให้บริบท แม้ส่วนคำสั่งจะยาว
+MIN_CONTEXT_TOKENS = 256
+
+# คำสั่งหลักของที่ปรึกษา (คงที่ทุกคำขอ ห้ามใส่ข้อมูลที่เปลี่ยนตามคำถามหรือผู้ใช้)
+BASE_SYSTEM_PROMPT = """คุณเป็นที่ปรึกษาด้านอาชีพให้คำแนะนำแก่นักศึกษาวิทยาการคอมพิวเตอร์และผู้สนใจงานด้าน IT
+ถ้าผู้ใช้ถามอย่างอื่นที่ไม่เกี่ยวกับการหางานสาย IT ให้ตอบว่าไม่ทราบหรือไม่อยู่ในขอบเขตไปเลยไม่ต้องเอาข้อมูลอะไรมาตอบ
+ตอบคำถามเกี่ยวกับอาชีพและตำแหน่ง เพื่อช่วยพัฒนาทักษะ หรือเตรียมตัวเข้าทำงาน เป็นภาษาไทย
+ใช้ข้อมูลต่อไปนี้เป็นหลักในการตอบ และอ้างอิงชื่อตำแหน่งงานเพื่อให้คำตอบน่าเชื่อถือ และตอบคำถามตามบุคลิกที่กำหนด
+ถ้าผู้ใช้ทักทายให้แนะนำตัวไปว่าคุณเป็นที่ปรึกษาด้านอาชีพให้คำแนะนำแก่นักศึกษาวิทยาการคอมพิวเตอร์และผู้สนใจงานด้าน IT โดยตอบให้เหมาะสมกับบุคลิกที่กำหนดหรือแนะนำตัวเพิ่มเติม
+และกรณีผู้ใช้พิมพผิดเล็กน้อย ก็ตอบแบบชื่อที่ถูกต้อง
+
+กฎสำหรับการตอบ:
+1. ตอบคำถามตามบุคลิกที่กำหนด
+2. กรณีที่มีการถามถึงเงินเดือน ให้เสริมว่า "เงินเดือนอาจแตกต่างกันตามโครงสร้างบริษัท ขนาดบริษัท และภูมิภาค"
+3. ถ้าผู้ใช้ไม่รู้ว่าตัวเองถนัดอะไร และไม่มีข้อมูลผู้ใช้ในระบบ ให้ถามว่า "ช่วยบอกสกิล ภาษาโปรแกรม หรือเครื่องมือที่เคยใช้
+   โปรเจกต์ที่เคยทำ หรือประเมินทักษะของตัวเองแต่ละด้านจาก 1-5 คะแนนได้ไหม"
+4. ตอบให้กระชับ มีหัวข้อ หรือรายการข้อสั้นๆ เพื่อให้อ่านง่าย
+5. ถ้ามีข้อมูลผู้ใช้ ให้นำมาประกอบการตอบโดยแนะนำอาชีพหรือทักษะที่เหมาะสมกับประวัติและความสามารถของผู้ใช้
+6. ถ้าไม่มีข้อมูลเพียงพอในการตอบคำถาม ให้ตอบว่า "ขออภัย ฉันไม่มีข้อมูลเพียงพอในการตอบคำถามนี้"
+7. นำข้อมูลที่ได้มาจัดเรียง และแก้ไขคำอธิบายให้เป็นสไตล์ของตัวเอง โดยยังคงเนื้อหาสำคัญ
+8. ถ้าผู้ใช้ถามอย่างอื่นที่ไม่เกี่ยวกับการหางานสาย IT ให้ตอบว่าไม่ทราบหรือไม่อยู่ในขอบเขตไปเลยไม่ต้องเอาข้อมูลอะไรมาตอบ"""
+
+# cache ของ system prompt ต่อบุคลิก (สร้างครั้งเดียว ให้ได้ข้อความเดิมทุกไบต์)
+_system_prompt_cache: Dict[str, str] = {}
+
+class LLMRequestError(Exception):
+    """เกิดขึ้นเมื่อเรียกใช้ LLM API ไม่สำเร็จ (timeout, เชื่อมต่อไม่ได้ หรือ status ผิดพลาด)"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        # False เมื่อเป็นข้อผิดพลาดของคำขอเอง (เช่น 4xx) ซึ่งส่งไป server อื่นก็ไม่ช่วย
+        self.retryable = retryable
+
+class LLMDeadlineError(LLMRequestError):
+    """เกิดขึ้นเมื่อเรียกใช้ LLM ไม่เสร็จภายในเวลาที่กำหนดของคำขอ"""
+
+    def __init__(self, message: str):
+        super().__init__(message, retryable=False)
+
 # ฟังก์ชันใหม่สำหรับการสนทนากับ LLM
 async def safe_chat_with_context(
     query: str,
@@ -25,10 +81,18 @@ async def safe_chat_with_context(
     llm_api_base: Optional[str] = None,
     llm_api_key: Optional[str] = None,
     llm_model: Optional[str] = None,
+    priority: LLMPriority = LLMPriority.INTERACTIVE,
+    conversation: Optional[ConversationSession] = None,
+    sticky_key: Optional[str] = None,
+    deadline: Optional[float] = None,
+    routing: Optional[RoutingDecision] = None,
 ) -> str:
     """
     ฟังก์ชันปลอดภัยสำหรับสนทนากับ LLM โดยใช้บริบทที่กำหนด
     
+    ถ้ากำหนด deadline และ LLM ตอบไม่ทันก่อน deadline - LLM_FALLBACK_MARGIN
+    จะตอบกลับด้วยข้อมูลจากผลการค้นหาแทน (ไม่ผ่าน LLM)
+    
     Args:
         query: คำถามจากผู้ใช้
         search_results: ผลลัพธ์การค้นหาข้อมูลที่เกี่ยวข้อง (ถ้ามี)
@@ -38,10 +102,26 @@ async def safe_chat_with_context(
         llm_api_base: URL ของ LLM API
         llm_api_key: API key สำหรับ LLM
         llm_model: ชื่อโมเดล LLM
+        priority: ลำดับความสำคัญของคำขอในคิว LLM
+        conversation: หน่วยความจำของบทสนทนาก่อนหน้า (ถ้ามี)
+        sticky_key: คีย์สำหรับส่งคำขอของบทสนทนาเดียวกันไปยัง LLM server เดิม (เช่น chat_id)
+        deadline: เวลาสิ้นสุดของคำขอ (ค่าจาก time.monotonic())
+        routing: ผลการเลือกระดับการตอบจาก QueryRouter (คำตอบสำเร็จรูปหรือโมเดลที่ใช้)
         
     Returns:
         str: คำตอบจาก LLM
+        
+    Raises:
+        LLMOverloadedError: ถ้าคิว LLM เต็ม (ผู้เรียกควรตอบกลับด้วย 503)
     """
+    # คำถามที่ตอบด้วยคำตอบสำเร็จรูปได้ ไม่ต้องเรียก LLM
+    if routing is not None and routing.tier == ModelTier.TEMPLATE and routing.answer:
+        return format_response_with_personality(routing.answer, user_context, personality)
+    
+    # โมเดลขนาดเล็กสำหรับคำถามง่าย (ไม่ใช้แทนโมเดล fine-tuned ที่ขอไว้)
+    if llm_model is None and not use_fine_tuned and routing is not None and routing.model:
+        llm_model = routing.model
+    
     # นำเข้าค่าคอนฟิกถ้าไม่ได้ระบุ
     if llm_api_base is None or llm_api_key is None or llm_model is None:
         try:
@@ -55,53 +135,35 @@ async def safe_chat_with_context(
             llm_api_key = llm_api_key or ""
             llm_model = llm_model or "llama3.1:latest"
     
-    # สร้างคำแนะนำบุคลิกตามประเภท
-    personality_instructions = get_personality_instructions(personality)
-    
-    # สร้างบริบทจากข้อมูลการค้นหา
-    context_text = build_search_context(search_results)
-    
-    # สร้างบริบทจากข้อมูลผู้ใช้
-    user_context_text = build_user_context(user_context)
-    
-    # รวมบริบททั้งหมด
-    combined_context = "\n\n==========\n\n".join(filter(None, [context_text, user_context_text]))
-    
-    # สร้าง prompt พื้นฐานสำหรับ LLM
-    prompt = f"""
-    คุณเป็นที่ปรึกษาด้านอาชีพให้คำแนะนำแก่นักศึกษาวิทยาการคอมพิวเตอร์และผู้สนใจงานด้าน IT 
-    ถ้าผู้ใช้ถามอย่างอื่นที่ไม่เกี่ยวกับการหางานสาย IT ให้ตอบว่าไม่ทราบหรือไม่อยู่ในขอบเขตไปเลยไม่ต้องเอาข้อมูลอะไรมาตอบ
-    ตอบคำถามเกี่ยวกับอาชีพและตำแหน่ง เพื่อช่วยพัฒนาทักษะ หรือเตรียมตัวเข้าทำงาน เป็นภาษาไทย
-    ใช้ข้อมูลต่อไปนี้เป็นหลักในการตอบ และอ้างอิงชื่อตำแหน่งงานเพื่อให้คำตอบน่าเชื่อถือ และตอบคำถามตามบุคลิกที่กำหนด
-    ถ้าผู้ใช้ทักทายให้แนะนำตัวไปว่าคุณเป็นที่ปรึกษาด้านอาชีพให้คำแนะนำแก่นักศึกษาวิทยาการคอมพิวเตอร์และผู้สนใจงานด้าน IT โดยตอบให้เหมาะสมกับบุคลิกที่กำหนดหรือแนะนำตัวเพิ่มเติม
-    และกรณีผู้ใช้พิมพผิดเล็กน้อย ก็ตอบแบบชื่อที่ถูกต้อง
-
-    {personality_instructions}
-
-    กฎสำหรับการตอบ:
-    1. ตอบคำถามตามบุคลิกที่กำหนด
-    2. กรณีที่มีการถามถึงเงินเดือน ให้เสริมว่า "เงินเดือนอาจแตกต่างกันตามโครงสร้างบริษัท ขนาดบริษัท และภูมิภาค"
-    3. ถ้าผู้ใช้ไม่รู้ว่าตัวเองถนัดอะไร และไม่มีข้อมูลผู้ใช้ในระบบ ให้ถามว่า "ช่วยบอกสกิล ภาษาโปรแกรม หรือเครื่องมือที่เคยใช้ 
-       โปรเจกต์ที่เคยทำ หรือประเมินทักษะของตัวเองแต่ละด้านจาก 1-5 คะแนนได้ไหม"
-    4. ตอบให้กระชับ มีหัวข้อ หรือรายการข้อสั้นๆ เพื่อให้อ่านง่าย
-    5. ถ้ามีข้อมูลผู้ใช้ ให้นำมาประกอบการตอบโดยแนะนำอาชีพหรือทักษะที่เหมาะสมกับประวัติและความสามารถของผู้ใช้
-    6. ถ้าไม่มีข้อมูลเพียงพอในการตอบคำถาม ให้ตอบว่า "ขออภัย ฉันไม่มีข้อมูลเพียงพอในการตอบคำถามนี้"
-    7. นำข้อมูลที่ได้มาจัดเรียง และแก้ไขคำอธิบายให้เป็นสไตล์ของตัวเอง โดยยังคงเนื้อหาสำคัญ
-    8. ถ้าผู้ใช้ถามอย่างอื่นที่ไม่เกี่ยวกับการหางานสาย IT ให้ตอบว่าไม่ทราบหรือไม่อยู่ในขอบเขตไปเลยไม่ต้องเอาข้อมูลอะไรมาตอบ
-    """
-    
-    # ตรวจสอบคำถามเพื่อปรับ prompt ให้เหมาะสม
-    prompt = customize_prompt_for_query(prompt, query, user_context)
-    
-    # เพิ่มบริบทและคำถาม
-    prompt += f"""
-    
-    ข้อมูล:
-    {combined_context}
-
-    คำถาม: {query}
-    คำตอบ:
-    """
+    try:
+        from src.utils.config import LLM_PROMPT_TOKEN_BUDGET, LLM_CONTEXT_MAX_LIST_ITEMS, LLM_FALLBACK_MARGIN
+    except ImportError:
+        LLM_PROMPT_TOKEN_BUDGET, LLM_CONTEXT_MAX_LIST_ITEMS, LLM_FALLBACK_MARGIN = 3000, 5, 1.5
+    
+    # ส่วน system คงที่ต่อบุคลิก (byte-identical ทุกคำขอ) เพื่อให้ backend ใช้ KV cache ของ prefix ซ้ำได้
+    system_prompt = build_system_prompt(personality)
+    
+    # คำแนะนำเฉพาะคำถามนี้ (เปลี่ยนตามคำถาม จึงอยู่ในส่วนของผู้ใช้หลัง system)
+    query_instructions = customize_prompt_for_query("", query, user_context).strip()
+    question_text = f"คำถาม: {query}\nคำตอบ:"
+    
+    # สร้างบริบทจากข้อมูลการค้นหาและข้อมูลผู้ใช้ภายในงบโทเค็นที่เหลือจากคำสั่งและคำถาม
+    context_budget = max(
+        MIN_CONTEXT_TOKENS,
+        LLM_PROMPT_TOKEN_BUDGET
+        - estimate_tokens(system_prompt)
+        - estimate_tokens(query_instructions)
+        - estimate_tokens(question_text),
+    )
+    combined_context = build_budgeted_context(
+        search_results,
+        user_context,
+        token_budget=context_budget,
+        max_list_items=LLM_CONTEXT_MAX_LIST_ITEMS,
+        conversation=conversation,
+    )
+    
+    prompt = build_user_prompt(combined_context, query_instructions, question_text)
     
     # ส่ง prompt ไปยัง LLM
     try:
@@ -109,18 +171,69 @@ async def safe_chat_with_context(
             prompt=prompt,
             model=llm_model,
             api_base=llm_api_base,
-            api_key=llm_api_key
+            api_key=llm_api_key,
+            priority=priority,
+            system=system_prompt,
+            sticky_key=sticky_key,
+            # เผื่อเวลาไว้สร้างคำตอบสำรองก่อนถึง deadline ของคำขอ HTTP
+            deadline=deadline - LLM_FALLBACK_MARGIN if deadline is not None else None
         )
         
         # ตกแต่งคำตอบตามบุคลิกหากจำเป็น
         response = format_response_with_personality(response, user_context, personality)
         
         return response
+    except LLMDeadlineError:
+        logger.warning("LLM ตอบไม่ทันเวลา ตอบกลับด้วยข้อมูลจากผลการค้นหาแทน")
+        response = build_fallback_answer(search_results, personality, LLM_CONTEXT_MAX_LIST_ITEMS)
+        return format_response_with_personality(response, user_context, personality)
+    except LLMOverloadedError:
+        # ส่งต่อให้ route ตอบกลับด้วย 503 + Retry-After
+        raise
     except Exception as e:
         logger.error(f"เกิดข้อผิดพลาดในการเรียกใช้ LLM API: {str(e)}")
         # คำตอบฉุกเฉินในกรณีที่ LLM ไม่ตอบสนอง
         return f"ขออภัย เกิดข้อผิดพลาดในระบบ ไม่สามารถตอบคำถามได้ในขณะนี้ โปรดลองใหม่ภายหลัง"
 
+def build_system_prompt(personality: str) -> str:
+    """
+    สร้าง system prompt สำหรับบุคลิกที่กำหนด
+    
+    ข้อความที่ได้จะเหมือนเดิมทุกไบต์สำหรับบุคลิกเดียวกัน จึงเป็น prefix ที่ LLM backend
+    ใช้ KV cache ซ้ำได้ระหว่างคำขอ
+    
+    Args:
+        personality: บุคลิกของ AI
+        
+    Returns:
+        str: system prompt
+    """
+    key = (personality or "friendly").lower()
+    if key not in _system_prompt_cache:
+        personality_instructions = textwrap.dedent(get_personality_instructions(key)).strip()
+        _system_prompt_cache[key] = f"{BASE_SYSTEM_PROMPT}\n\n{personality_instructions}"
+    return _system_prompt_cache[key]
+
+def build_user_prompt(context: str, query_instructions: str, question_text: str) -> str:
+    """
+    สร้างข้อความส่วนของผู้ใช้ (ส่วนที่เปลี่ยนตามคำขอ) ต่อท้าย system prompt
+    
+    Args:
+        context: บริบทจากผลการค้นหาและข้อมูลผู้ใช้
+        query_instructions: คำแนะนำเฉพาะคำถามนี้
+        question_text: คำถามและตัวนำคำตอบ
+        
+    Returns:
+        str: ข้อความส่วนของผู้ใช้
+    """
+    parts = []
+    if context:
+        parts.append(f"ข้อมูล:\n{context}")
+    if query_instructions:
+        parts.append(f"คำแนะนำเพิ่มเติมสำหรับคำถามนี้:\n{query_instructions}")
+    parts.append(question_text)
+    return "\n\n".join(parts)
+
 def get_personality_instructions(personality: str) -> str:
     """
     สร้างคำแนะนำสำหรับบุคลิกที่กำหนด
@@ -170,12 +283,13 @@ def get_personality_instructions(personality: str) -> str:
     # ให้ใช้บุคลิกเป็นมิตรถ้าไม่พบบุคลิกที่ระบุ
     return personality_instructions.get(personality.lower(), personality_instructions["friendly"])
 
-def build_search_context(search_results: Optional[List[Dict[str, Any]]]) -> str:
+def build_search_context(search_results: Optional[List[Dict[str, Any]]], max_list_items: Optional[int] = None) -> str:
     """
     สร้างบริบทจากผลการค้นหา
     
     Args:
         search_results: ผลลัพธ์การค้นหา
+        max_list_items: จำนวนรายการสูงสุดต่อหัวข้อ (None = ไม่จำกัด)
         
     Returns:
         str: บริบทที่สร้างขึ้น
@@ -196,76 +310,14 @@ def build_search_context(search_results: Optional[List[Dict[str, Any]]]) -> str:
                 advice_results.append(result)
     
     # สร้างบริบทจากข้อมูลอาชีพ
-    job_context_text = ""
-    if job_results:
-        job_parts = []
-        for i, job in enumerate(job_results):
-            content = job.get("content", {})
-            title = job.get("title", "ไม่ระบุ")
-            
-            # ตรวจสอบว่า content เป็น dictionary หรือไม่
-            if not isinstance(content, dict):
-                content = {}
-            
-            job_part = f"ตำแหน่ง {i+1}: {title}\n"
-            
-            # เพิ่มคำอธิบาย
-            description = content.get("description", "")
-            if description:
-                job_part += f"คำอธิบาย: {description}\n"
-            
-            # เพิ่มความรับผิดชอบ
-            responsibilities = content.get("responsibilities", [])
-            if responsibilities and isinstance(responsibilities, list):
-                job_part += "ความรับผิดชอบ:\n"
-                for resp in responsibilities:
-                    job_part += f"- {resp}\n"
-            
-            # เพิ่มทักษะ
-            skills = content.get("skills", [])
-            if skills and isinstance(skills, list):
-                job_part += f"ทักษะที่ต้องการ: {', '.join(skills)}\n"
-            
-            # เพิ่มเงินเดือน
-            salary_ranges = content.get("salary_ranges", [])
-            if salary_ranges and isinstance(salary_ranges, list):
-                job_part += "ช่วงเงินเดือน:\n"
-                for salary in salary_ranges:
-                    if isinstance(salary, dict):
-                        job_part += f"- ประสบการณ์ {salary.get('experience', 'ไม่ระบุ')}: {salary.get('salary', 'ไม่ระบุ')}\n"
-            
-            job_parts.append(job_part)
-        
-        job_context_text = "\n---\n".join(job_parts)
+    job_context_text = RESULT_SEPARATOR.join(
+        format_job_result(job, i + 1, max_list_items) for i, job in enumerate(job_results)
+    )
     
     # สร้างบริบทจากข้อมูลคำแนะนำ
-    advice_context_text = ""
-    if advice_results:
-        advice_parts = []
-        for i, advice in enumerate(advice_results):
-            content = advice.get("content", {})
-            title = advice.get("title", "ไม่ระบุ")
-            
-            # ตรวจสอบว่า content เป็น dictionary หรือไม่
-            if not isinstance(content, dict):
-                content = {}
-            
-            advice_part = f"คำแนะนำ {i+1}: {title}\n"
-            advice_part += f"{content.get('text_preview', 'ไม่มีรายละเอียด')}\n"
-            
-            # เพิ่มแท็ก
-            tags = content.get("tags", [])
-            if tags and isinstance(tags, list):
-                advice_part += f"แท็ก: {', '.join(tags)}\n"
-            
-            # เพิ่มแหล่งที่มา
-            source = content.get("source", "")
-            if source:
-                advice_part += f"แหล่งที่มา: {source}\n"
-            
-            advice_parts.append(advice_part)
-        
-        advice_context_text = "\n---\n".join(advice_parts)
+    advice_context_text = RESULT_SEPARATOR.join(
+        format_advice_result(advice, i + 1, max_list_items) for i, advice in enumerate(advice_results)
+    )
     
     # รวมบริบทเข้าด้วยกัน
     contexts = []
@@ -274,14 +326,55 @@ def build_search_context(search_results: Optional[List[Dict[str, Any]]]) -> str:
     if advice_context_text:
         contexts.append(f"คำแนะนำเพิ่มเติม:\n{advice_context_text}")
     
-    return "\n\n==========\n\n".join(contexts)
+    return GROUP_SEPARATOR.join(contexts)
 
-def build_user_context(user_context: Optional[Dict[str, Any]]) -> str:
+def build_budgeted_context(
+    search_results: Optional[List[Dict[str, Any]]],
+    user_context: Optional[Dict[str, Any]],
+    token_budget: int,
+    max_list_items: Optional[int] = 5,
+    conversation: Optional[ConversationSession] = None,
+) -> str:
+    """
+    สร้างบริบทจากผลการค้นหาและข้อมูลผู้ใช้ให้อยู่ภายในงบโทเค็น
+    
+    ข้อมูลผู้ใช้มาก่อน ตามด้วยบทสนทนาก่อนหน้า แล้วจึงเป็นผลการค้นหาเรียงตามคะแนน
+    รายการที่ยาวจะถูกตัด และผลลัพธ์ที่ใส่ไม่พอจะถูกละไว้พร้อมข้อความสรุป
+    
+    Args:
+        search_results: ผลลัพธ์การค้นหา
+        user_context: ข้อมูลผู้ใช้
+        token_budget: จำนวนโทเค็นสูงสุดของบริบท
+        max_list_items: จำนวนรายการสูงสุดต่อหัวข้อ
+        conversation: หน่วยความจำของบทสนทนาก่อนหน้า
+        
+    Returns:
+        str: บริบทที่สร้างขึ้น
+    """
+    assembler = PromptAssembler(token_budget=token_budget, max_list_items=max_list_items)
+    if user_context:
+        assembler.add_section(
+            name="user",
+            render=lambda limit: build_user_context(user_context, limit),
+            score=float("inf"),
+        )
+    if conversation is not None and conversation.render():
+        # แบบย่อจะเหลือบทสรุปกับรอบล่าสุดเท่านั้น
+        assembler.add_section(
+            name="conversation",
+            render=lambda limit: conversation.render(limit),
+            score=float("inf"),
+        )
+    assembler.add_search_results(search_results)
+    return assembler.assemble().text
+
+def build_user_context(user_context: Optional[Dict[str, Any]], max_items: Optional[int] = None) -> str:
     """
     สร้างบริบทจากข้อมูลผู้ใช้
     
     Args:
         user_context: ข้อมูลผู้ใช้
+        max_items: จำนวนทักษะ/ภาษา/เครื่องมือสูงสุดที่แสดง (None = ไม่จำกัด)
         
     Returns:
         str: บริบทผู้ใช้ที่สร้างขึ้น
@@ -324,7 +417,7 @@ def build_user_context(user_context: Optional[Dict[str, Any]]) -> str:
                     skills_text.append(skill)
         
         if skills_text:
-            user_context_text += f"ทักษะ: {', '.join(skills_text)}\n"
+            user_context_text += f"ทักษะ: {', '.join(truncate_list(skills_text, max_items))}\n"
     
     # ภาษาโปรแกรม
     if user_context.get('programming_languages'):
@@ -338,7 +431,7 @@ def build_user_context(user_context: Optional[Dict[str, Any]]) -> str:
                     prog_langs.append(lang)
         
         if prog_langs:
-            user_context_text += f"ภาษาโปรแกรม: {', '.join(prog_langs)}\n"
+            user_context_text += f"ภาษาโปรแกรม: {', '.join(truncate_list(prog_langs, max_items))}\n"
     
     # เครื่องมือ
     if user_context.get('tools'):
@@ -352,7 +445,7 @@ def build_user_context(user_context: Optional[Dict[str, Any]]) -> str:
                     tools_text.append(tool)
         
         if tools_text:
-            user_context_text += f"เครื่องมือ: {', '.join(tools_text)}\n"
+            user_context_text += f"เครื่องมือ: {', '.join(truncate_list(tools_text, max_items))}\n"
     
     # โปรเจกต์
     if user_context.get('projects'):
@@ -414,7 +507,7 @@ def customize_prompt_for_query(prompt: str, query: str, user_context: Optional[D
                     user_skills.append(skill)
         
         if user_skills:
-            prompt += f"\n12. ผู้ใช้มีทักษะด้าน {', '.join(user_skills)} ให้แนะนำการต่อยอดจากทักษะเหล่านี้"
+            prompt += f"\n12. ผู้ใช้มีทักษะด้าน {', '.join(truncate_list(user_skills, PROMPT_RULE_MAX_ITEMS))} ให้แนะนำการต่อยอดจากทักษะเหล่านี้"
         
         # ดึงภาษาโปรแกรม
         user_languages = []
@@ -426,7 +519,7 @@ def customize_prompt_for_query(prompt: str, query: str, user_context: Optional[D
                     user_languages.append(lang)
         
         if user_languages:
-            prompt += f"\n13. ผู้ใช้เชี่ยวชาญภาษา {', '.join(user_languages)} ให้แนะนำการพัฒนาต่อยอดจากภาษาเหล่านี้"
+            prompt += f"\n13. ผู้ใช้เชี่ยวชาญภาษา {', '.join(truncate_list(user_languages, PROMPT_RULE_MAX_ITEMS))} ให้แนะนำการพัฒนาต่อยอดจากภาษาเหล่านี้"
 
 
     # ปรับ prompt ตามประเภทคำถาม
@@ -501,6 +594,37 @@ def format_response_with_personality(response: str, user_context: Optional[Dict[
     
     return response
 
+def build_fallback_answer(
+    search_results: Optional[List[Dict[str, Any]]],
+    personality: str,
+    max_list_items: Optional[int] = 5,
+    max_results: int = 3,
+) -> str:
+    """
+    สร้างคำตอบจากผลการค้นหาโดยตรง (ไม่ผ่าน LLM) สำหรับกรณีที่ LLM ตอบไม่ทันเวลา
+    
+    Args:
+        search_results: ผลลัพธ์การค้นหา
+        personality: บุคลิกของ AI
+        max_list_items: จำนวนรายการสูงสุดต่อหัวข้อ
+        max_results: จำนวนผลลัพธ์สูงสุดที่แสดง
+        
+    Returns:
+        str: คำตอบสำรอง
+    """
+    context = build_search_context((search_results or [])[:max_results], max_list_items)
+    if not context:
+        return "ขออภัย ระบบไม่สามารถตอบคำถามได้ทันเวลาในขณะนี้ โปรดลองใหม่อีกครั้ง"
+    
+    if personality == "formal":
+        intro = "ขออภัย ขณะนี้ระบบใช้เวลาประมวลผลนานกว่าปกติ จึงขอนำเสนอข้อมูลที่เกี่ยวข้องกับคำถามของท่านดังนี้"
+    elif personality == "fun":
+        intro = "โอ๊ะ! ตอนนี้ระบบคิดช้าไปหน่อย เอาข้อมูลที่เกี่ยวข้องไปดูก่อนเลยนะ!"
+    else:
+        intro = "ขอโทษนะ ตอนนี้ระบบตอบช้ากว่าปกติ เลยขอสรุปข้อมูลที่เกี่ยวข้องให้ก่อนนะ"
+    
+    return f"{intro}\n\n{context}"
+
 async def call_llm_api(
     prompt: str,
     model: str,
@@ -508,10 +632,19 @@ async def call_llm_api(
     api_key: Optional[str] = None,
     temperature: float = 0.7,
     max_tokens: int = 1000,
+    priority: LLMPriority = LLMPriority.INTERACTIVE,
+    system: Optional[str] = None,
+    raise_on_error: bool = False,
+    sticky_key: Optional[str] = None,
+    deadline: Optional[float] = None,
 ) -> str:
     """
     เรียกใช้ LLM API และส่งคืนการตอบกลับ
     
+    ถ้า api_base เป็น server หนึ่งใน LLM_API_BASES (หรือไม่ระบุ) คำขอจะถูกกระจายผ่าน LLMEndpointPool
+    และลองส่งไปยัง server อื่นเมื่อ server ที่เลือกล้มเหลว คำขอ INTERACTIVE ที่ช้ากว่า p95
+    จะถูกส่งซ้ำไปยัง server อื่นที่ว่าง (hedging เมื่อมี slot ว่างเท่านั้น) แล้วใช้คำตอบที่มาถึงก่อน
+    
     Args:
         prompt: ข้อความคำถามหรือคำสั่งที่จะส่งไปยัง LLM
         model: ชื่อโมเดล LLM ที่จะใช้
@@ -519,9 +652,199 @@ async def call_llm_api(
         api_key: API key สำหรับ LLM (ถ้ามี)
         temperature: ระดับความสร้างสรรค์ของการตอบ (0.0-1.0)
         max_tokens: จำนวนโทเค็นสูงสุดที่จะสร้าง
+        priority: ลำดับความสำคัญของคำขอในคิว LLM
+        system: system prompt คงที่ (ส่งแยกจาก prompt เพื่อให้ backend ใช้ KV cache ของ prefix ซ้ำได้)
+        raise_on_error: ส่ง LLMRequestError เมื่อเรียกใช้ไม่สำเร็จ แทนการคืนข้อความแจ้งข้อผิดพลาด
+        sticky_key: คีย์สำหรับส่งคำขอของบทสนทนาเดียวกันไปยัง server เดิม
+        deadline: เวลาสิ้นสุด (ค่าจาก time.monotonic()) รวมเวลารอในคิว
         
     Returns:
-        str: ข้อความตอบกลับจาก LLM
+        str: ข้อความตอบกลับจาก LLM (หรือข้อความแจ้งข้อผิดพลาดถ้า raise_on_error=False)
+        
+    Raises:
+        LLMOverloadedError: ถ้าคิว LLM เต็มหรือรอเกินเวลาที่กำหนด
+        LLMDeadlineError: ถ้าเลย deadline (ส่งเสมอ ไม่ขึ้นกับ raise_on_error)
+        LLMRequestError: ถ้า raise_on_error=True และเรียกใช้ไม่สำเร็จ
+    """
+    async def _call() -> str:
+        # จำกัดจำนวนคำขอที่ส่งไปยัง LLM พร้อมกัน คำขอที่เกินจะรอในคิวตามลำดับความสำคัญ
+        async with get_admission_controller().slot(priority):
+            pool = get_llm_pool()
+            if api_base and not pool.has_endpoint(api_base):
+                # server ที่ไม่ได้อยู่ใน pool ส่งตรงโดยไม่กระจายคำขอ
+                return await _post_llm_generate(prompt, model, api_base, api_key, temperature, max_tokens, system)
+            return await _post_llm_generate_pooled(
+                pool, prompt, model, api_key, temperature, max_tokens, system, sticky_key,
+                hedge=priority == LLMPriority.INTERACTIVE,
+            )
+    
+    try:
+        if deadline is None:
+            return await _call()
+        
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMDeadlineError("หมดเวลาก่อนเริ่มเรียกใช้ LLM API")
+        try:
+            return await asyncio.wait_for(_call(), timeout=remaining)
+        except asyncio.TimeoutError:
+            logger.warning(f"การเรียกใช้ LLM API เกินเวลาที่กำหนด ({remaining:.1f} วินาที)")
+            raise LLMDeadlineError("การเรียกใช้ LLM API เกินเวลาที่กำหนด")
+    except LLMDeadlineError:
+        raise
+    except LLMRequestError as e:
+        if raise_on_error:
+            raise
+        return str(e)
+
+def _hedge_delay(pool) -> Optional[float]:
+    """เวลาที่รอคำตอบก่อนส่งคำขอสำรอง (None = ไม่ส่งคำขอสำรอง)"""
+    try:
+        from src.utils.config import LLM_HEDGE_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_DELAY
+    except ImportError:
+        LLM_HEDGE_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_DELAY = True, 95.0, 2.0
+    
+    if not LLM_HEDGE_ENABLED:
+        return None
+    # ยังไม่มีข้อมูลเวลาตอบสนองพอ จะยังไม่ส่งคำขอสำรอง
+    percentile = pool.latency_percentile(LLM_HEDGE_PERCENTILE)
+    if percentile is None:
+        return None
+    return max(LLM_HEDGE_MIN_DELAY, percentile)
+
+async def _post_llm_generate_pooled(
+    pool,
+    prompt: str,
+    model: str,
+    api_key: Optional[str],
+    temperature: float,
+    max_tokens: int,
+    system: Optional[str],
+    sticky_key: Optional[str],
+    hedge: bool = False,
+) -> str:
+    """
+    ส่งคำขอไปยัง server ที่ pool เลือก และลอง server ถัดไปเมื่อเกิดข้อผิดพลาดที่ลองใหม่ได้
+    
+    Raises:
+        LLMRequestError: ถ้าทุก server ล้มเหลวหรือไม่มี server ที่ใช้งานได้
+    """
+    hedge_delay = _hedge_delay(pool) if hedge else None
+    tried = []
+    last_error: Optional[LLMRequestError] = None
+    for _ in range(len(pool.endpoints)):
+        endpoint = pool.select(sticky_key=sticky_key, exclude=tried)
+        if endpoint is None:
+            break
+        tried.append(endpoint)
+        try:
+            return await _generate_with_hedge(
+                pool, endpoint, tried, prompt, model, api_key, temperature, max_tokens, system, hedge_delay
+            )
+        except LLMRequestError as e:
+            if not e.retryable:
+                raise
+            last_error = e
+            logger.warning(f"LLM server {endpoint.base_url} ล้มเหลว กำลังลอง server ถัดไป")
+    
+    if last_error is not None:
+        raise last_error
+    logger.error("ไม่มี LLM server ที่พร้อมใช้งาน")
+    raise LLMRequestError("ไม่สามารถเชื่อมต่อกับ LLM API ได้: ไม่มี server ที่พร้อมใช้งาน")
+
+async def _generate_on_endpoint(pool, endpoint, prompt: str, model: str, api_key: Optional[str],
+                                temperature: float, max_tokens: int, system: Optional[str]) -> str:
+    async with pool.use(endpoint):
+        return await _post_llm_generate(prompt, model, endpoint.base_url, api_key, temperature, max_tokens, system)
+
+async def _generate_with_hedge(
+    pool,
+    endpoint,
+    tried: List[Any],
+    prompt: str,
+    model: str,
+    api_key: Optional[str],
+    temperature: float,
+    max_tokens: int,
+    system: Optional[str],
+    hedge_delay: Optional[float],
+) -> str:
+    """
+    ส่งคำขอไปยัง endpoint และถ้ายังไม่ได้คำตอบภายใน hedge_delay ให้ส่งคำขอสำรอง
+    ไปยัง server อื่นที่ยังว่าง (ใช้ LLM_HEDGE_MODEL ถ้ากำหนด) แล้วใช้คำตอบที่สำเร็จก่อน
+    
+    คำขอสำรองต้องได้ slot ของตัวเองจาก admission controller โดยไม่รอ
+    ถ้าไม่มี slot ว่าง มีคำขอรอในคิว หรือไม่มี server อื่นที่ว่าง จะรอคำขอเดิมต่อไปโดยไม่ส่งคำขอสำรอง
+    """
+    primary = asyncio.ensure_future(
+        _generate_on_endpoint(pool, endpoint, prompt, model, api_key, temperature, max_tokens, system)
+    )
+    pending = {primary}
+    try:
+        if hedge_delay is None:
+            return await primary
+        
+        done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+        if done:
+            return primary.result()
+        
+        # ไม่ส่งคำขอสำรองไปยัง server เดิม (รวมถึง server ที่ลองไปแล้ว) และไม่ส่งไปยัง server ที่เต็ม
+        hedge_endpoint = pool.select(exclude=tried, require_capacity=True)
+        if hedge_endpoint is None:
+            return await primary
+        
+        admission = get_admission_controller()
+        if not admission.try_acquire(LLMPriority.INTERACTIVE):
+            # ระบบมีงานเต็มหรือมีคำขออื่นรออยู่ ส่งคำขอสำรองจะแย่ง slot ของคำขออื่น
+            return await primary
+        tried.append(hedge_endpoint)
+        
+        try:
+            from src.utils.config import LLM_HEDGE_MODEL
+        except ImportError:
+            LLM_HEDGE_MODEL = ""
+        hedge_model = LLM_HEDGE_MODEL or model
+        
+        logger.info(
+            f"คำขอไปยัง {endpoint.base_url} ช้ากว่า {hedge_delay:.1f} วินาที "
+            f"ส่งคำขอสำรองไปยัง {hedge_endpoint.base_url} โมเดล: {hedge_model}"
+        )
+        hedge_start = time.monotonic()
+        hedged = asyncio.ensure_future(
+            _generate_on_endpoint(pool, hedge_endpoint, prompt, hedge_model, api_key, temperature, max_tokens, system)
+        )
+        # คืน slot ของคำขอสำรองเมื่อคำขอจบ (รวมถึงเมื่อถูกยกเลิก)
+        hedged.add_done_callback(lambda _: admission.release(time.monotonic() - hedge_start))
+        pending.add(hedged)
+        
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    pool.record_hedge(won=task is hedged)
+                    return task.result()
+                error = task.exception()
+        pool.record_hedge(won=False)
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _post_llm_generate(
+    prompt: str,
+    model: str,
+    api_base: str,
+    api_key: Optional[str],
+    temperature: float,
+    max_tokens: int,
+    system: Optional[str] = None,
+) -> str:
+    """
+    ส่งคำขอไปยัง Ollama /api/generate (ไม่ผ่านการจำกัดคำขอ)
+    
+    Raises:
+        LLMRequestError: ถ้าเรียกใช้ไม่สำเร็จ (ข้อความเป็นคำอธิบายที่แสดงต่อผู้ใช้ได้)
     """
     try:
         logger.info(f"กำลังเรียกใช้ LLM API: {api_base} โมเดล: {model}")
@@ -536,6 +859,10 @@ async def call_llm_api(
             "max_tokens": max_tokens,
         }
         
+        # system prompt ถูกวางไว้ก่อน prompt ใน template ของโมเดล จึงเป็น prefix เดิมทุกคำขอ
+        if system:
+            payload["system"] = system
+        
         # สร้าง headers
         headers = {
             "Content-Type": "application/json"
@@ -563,15 +890,20 @@ async def call_llm_api(
                 else:
                     error_msg = f"LLM API ตอบกลับด้วย status code: {response.status_code}, {response.text}"
                     logger.error(error_msg)
-                    return f"เกิดข้อผิดพลาดในการเรียกใช้ LLM API: {error_msg}"
+                    raise LLMRequestError(
+                        f"เกิดข้อผิดพลาดในการเรียกใช้ LLM API: {error_msg}",
+                        retryable=response.status_code >= 500 or response.status_code == 429,
+                    )
                     
             except httpx.TimeoutException:
                 logger.error("การเรียกใช้ LLM API หมดเวลา (timeout)")
-                return "การเรียกใช้ LLM API หมดเวลา กรุณาลองอีกครั้งในภายหลัง"
+                raise LLMRequestError("การเรียกใช้ LLM API หมดเวลา กรุณาลองอีกครั้งในภายหลัง")
             except httpx.RequestError as e:
                 logger.error(f"เกิดข้อผิดพลาดในการเชื่อมต่อกับ LLM API: {str(e)}")
-                return f"ไม่สามารถเชื่อมต่อกับ LLM API ได้: {str(e)}"
+                raise LLMRequestError(f"ไม่สามารถเชื่อมต่อกับ LLM API ได้: {str(e)}")
     
+    except LLMRequestError:
+        raise
     except Exception as e:
         logger.error(f"เกิดข้อผิดพลาดในการเรียกใช้ LLM API: {str(e)}")
-        return "เกิดข้อผิดพลาดในระบบ ไม่สามารถตอบคำถามได้ในขณะนี้"
\ No newline at end of file
+        raise LLMRequestError("เกิดข้อผิดพลาดในระบบ ไม่สามารถตอบคำถามได้ในขณะนี้")
\ No newline at end of file
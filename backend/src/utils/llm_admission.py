@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM admission control for Career AI Advisor.
+
+This module limits how many requests are sent to the LLM backend at the same
+time and queues the rest by priority, rejecting early when the queue is full.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Dict, Any, Optional, List, AsyncIterator
+
+from src.utils.logger import get_logger
+
+# ตั้งค่า logger
+logger = get_logger("llm_admission")
+
+
+class LLMPriority(IntEnum):
+    """ลำดับความสำคัญของคำขอ LLM (ค่าน้อย = สำคัญกว่า)"""
+    INTERACTIVE = 0  # คำถามจากผู้ใช้ผ่าน /chat
+    BACKGROUND = 1  # งานเบื้องหลังของแชท เช่น การสรุปบทสนทนา
+    BATCH = 2  # งานชุดใหญ่ เช่น การสร้างข้อมูล fine-tuning
+
+
+class LLMOverloadedError(Exception):
+    """เกิดขึ้นเมื่อ LLM backend รับคำขอเพิ่มไม่ได้ (ควรตอบกลับด้วย 503)"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMAdmissionController:
+    """
+    ตัวควบคุมการรับคำขอเข้าสู่ LLM backend
+
+    จำกัดจำนวนคำขอที่กำลังทำงานพร้อมกันด้วย semaphore และมีคิวรอแบบมีขอบเขต
+    เรียงตาม LLMPriority (ในระดับเดียวกันเรียงตามลำดับการมาถึง)
+    เมื่อคิวเต็ม คำขอที่สำคัญกว่าจะแทนที่คำขอล่าสุดที่สำคัญน้อยกว่า มิฉะนั้นจะถูกปฏิเสธทันที
+    """
+
+    def __init__(self, max_in_flight: int = 2, max_queue: int = 32, queue_timeout: float = 30.0):
+        """
+        เริ่มต้นใช้งาน LLMAdmissionController
+
+        Args:
+            max_in_flight: จำนวนคำขอสูงสุดที่ส่งไปยัง LLM พร้อมกัน
+            max_queue: จำนวนคำขอสูงสุดที่รอในคิว
+            queue_timeout: เวลารอในคิวสูงสุด (วินาที) ก่อนถูกปฏิเสธ
+        """
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+
+        self._in_flight = 0
+        self._waiters: List[list] = []  # heap ของ [priority, seq, future]
+        self._queued = 0
+        self._seq = itertools.count()
+
+        # สถิติสำหรับส่งออก
+        self._admitted = {p: 0 for p in LLMPriority}
+        self._rejected = {p: 0 for p in LLMPriority}
+        self._timed_out = {p: 0 for p in LLMPriority}
+        self._wait_total = {p: 0.0 for p in LLMPriority}
+        self._wait_max = {p: 0.0 for p in LLMPriority}
+        self._service_ewma: Optional[float] = None
+
+    def _retry_after(self) -> int:
+        """ประมาณเวลา (วินาที) ที่ควรให้ผู้เรียกลองใหม่ จากเวลาให้บริการเฉลี่ยและความยาวคิว"""
+        service_time = self._service_ewma or 1.0
+        waves = (self._queued + self.max_in_flight) / self.max_in_flight
+        return max(1, math.ceil(service_time * waves))
+
+    def _reject(self, priority: LLMPriority, reason: str) -> LLMOverloadedError:
+        self._rejected[priority] += 1
+        retry_after = self._retry_after()
+        logger.warning(f"ปฏิเสธคำขอ LLM ({priority.name}): {reason}, retry-after {retry_after}s")
+        return LLMOverloadedError(f"ระบบ LLM มีคำขอมากเกินไป: {reason}", retry_after=retry_after)
+
+    def _evict_lowest(self, priority: LLMPriority) -> bool:
+        """ขับคำขอล่าสุดที่สำคัญน้อยกว่า priority ออกจากคิว เพื่อเปิดที่ให้คำขอใหม่"""
+        victim = None
+        for entry in self._waiters:
+            if entry[2].done():
+                continue
+            if entry[0] > priority and (victim is None or (entry[0], entry[1]) > (victim[0], victim[1])):
+                victim = entry
+        if victim is None:
+            return False
+        victim_priority = LLMPriority(victim[0])
+        victim[2].set_exception(self._reject(victim_priority, "ถูกแทนที่ด้วยคำขอที่สำคัญกว่า"))
+        self._queued -= 1
+        return True
+
+    def _wake_next(self) -> None:
+        """ส่งต่อ slot ที่ว่างให้คำขอถัดไปในคิว"""
+        while self._waiters and self._in_flight < self.max_in_flight:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._queued -= 1
+            self._in_flight += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: LLMPriority = LLMPriority.INTERACTIVE) -> float:
+        """
+        ขอ slot สำหรับเรียกใช้ LLM
+
+        Args:
+            priority: ลำดับความสำคัญของคำขอ
+
+        Returns:
+            float: เวลาที่รอในคิว (วินาที)
+
+        Raises:
+            LLMOverloadedError: ถ้าคิวเต็มหรือรอเกิน queue_timeout
+        """
+        priority = LLMPriority(priority)
+        start = time.monotonic()
+
+        if self._in_flight < self.max_in_flight and self._queued == 0:
+            self._in_flight += 1
+            self._record_admission(priority, 0.0)
+            return 0.0
+
+        if self._queued >= self.max_queue and not self._evict_lowest(priority):
+            raise self._reject(priority, "คิวเต็ม")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [int(priority), next(self._seq), future]
+        heapq.heappush(self._waiters, entry)
+        self._queued += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self._queued -= 1
+                self._timed_out[priority] += 1
+                raise self._reject(priority, f"รอในคิวเกิน {self.queue_timeout:.0f} วินาที")
+            if future.exception() is not None:
+                raise future.exception()
+            # ได้ slot พอดีกับที่หมดเวลา ให้ใช้งานต่อ
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # ได้ slot แล้วแต่ผู้เรียกถูกยกเลิก ต้องคืน slot
+                self.release()
+            elif not future.done():
+                future.cancel()
+                self._queued -= 1
+            raise
+
+        wait_time = time.monotonic() - start
+        self._record_admission(priority, wait_time)
+        return wait_time
+
+    def try_acquire(self, priority: LLMPriority = LLMPriority.INTERACTIVE) -> bool:
+        """
+        ขอ slot โดยไม่รอ (สำหรับคำขอเสริม เช่น คำขอสำรอง ที่ไม่ควรแย่ง slot จากคำขอในคิว)
+
+        Args:
+            priority: ลำดับความสำคัญของคำขอ
+
+        Returns:
+            bool: True ถ้าได้ slot (ต้องเรียก release เมื่อเสร็จ), False ถ้าไม่มี slot ว่างหรือมีคำขอรอในคิว
+        """
+        priority = LLMPriority(priority)
+        if self._in_flight >= self.max_in_flight or self._queued > 0:
+            return False
+        self._in_flight += 1
+        self._record_admission(priority, 0.0)
+        return True
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        """
+        คืน slot หลังเรียกใช้ LLM เสร็จ
+
+        Args:
+            service_time: เวลาที่ใช้เรียก LLM (วินาที) สำหรับประมาณ Retry-After
+        """
+        if service_time is not None:
+            if self._service_ewma is None:
+                self._service_ewma = service_time
+            else:
+                self._service_ewma = 0.8 * self._service_ewma + 0.2 * service_time
+        self._in_flight = max(0, self._in_flight - 1)
+        self._wake_next()
+
+    def _record_admission(self, priority: LLMPriority, wait_time: float) -> None:
+        self._admitted[priority] += 1
+        self._wait_total[priority] += wait_time
+        self._wait_max[priority] = max(self._wait_max[priority], wait_time)
+
+    @asynccontextmanager
+    async def slot(self, priority: LLMPriority = LLMPriority.INTERACTIVE) -> AsyncIterator[float]:
+        """
+        context manager สำหรับครอบการเรียกใช้ LLM
+
+        Args:
+            priority: ลำดับความสำคัญของคำขอ
+
+        Yields:
+            float: เวลาที่รอในคิว (วินาที)
+        """
+        wait_time = await self.acquire(priority)
+        start = time.monotonic()
+        try:
+            yield wait_time
+        finally:
+            self.release(time.monotonic() - start)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ดึงสถิติของคิวและการรับคำขอ
+
+        Returns:
+            Dict[str, Any]: สถิติปัจจุบัน
+        """
+        queued_by_priority = {p.name.lower(): 0 for p in LLMPriority}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                queued_by_priority[LLMPriority(priority).name.lower()] += 1
+
+        per_priority = {}
+        for p in LLMPriority:
+            admitted = self._admitted[p]
+            per_priority[p.name.lower()] = {
+                "queued": queued_by_priority[p.name.lower()],
+                "admitted": admitted,
+                "rejected": self._rejected[p],
+                "timed_out": self._timed_out[p],
+                "avg_wait_seconds": round(self._wait_total[p] / admitted, 4) if admitted else 0.0,
+                "max_wait_seconds": round(self._wait_max[p], 4),
+            }
+
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "avg_service_seconds": round(self._service_ewma, 4) if self._service_ewma is not None else None,
+            "priorities": per_priority,
+        }
+
+
+_admission_controller: Optional[LLMAdmissionController] = None
+
+
+def get_admission_controller() -> LLMAdmissionController:
+    """
+    ดึง LLMAdmissionController ที่ใช้ร่วมกันทั้งแอป (สร้างครั้งแรกจากค่าคอนฟิก)
+
+    Returns:
+        LLMAdmissionController: ตัวควบคุมการรับคำขอ
+    """
+    global _admission_controller
+    if _admission_controller is None:
+        try:
+            from src.utils.config import LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT
+        except ImportError:
+            LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT = 2, 32, 30.0
+        _admission_controller = LLMAdmissionController(
+            max_in_flight=LLM_MAX_CONCURRENCY,
+            max_queue=LLM_MAX_QUEUE,
+            queue_timeout=LLM_QUEUE_TIMEOUT,
+        )
+        logger.info(
+            f"สร้าง LLMAdmissionController: max_in_flight={LLM_MAX_CONCURRENCY}, "
+            f"max_queue={LLM_MAX_QUEUE}, queue_timeout={LLM_QUEUE_TIMEOUT}s"
+        )
+    return _admission_controller
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM endpoint pool for Career AI Advisor.
+
+This module spreads LLM requests over several Ollama servers. It balances by
+outstanding requests weighted with EWMA latency, stops sending to failing
+servers with a circuit breaker, runs periodic health checks and keeps a
+conversation on the same server so its prompt prefix stays in the KV cache.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, AsyncIterator, Iterable
+
+import httpx
+
+from src.utils.logger import get_logger
+
+# ตั้งค่า logger
+logger = get_logger("llm_pool")
+
+# สถานะของ circuit breaker
+CIRCUIT_CLOSED = "closed"  # ใช้งานได้ตามปกติ
+CIRCUIT_OPEN = "open"  # หยุดส่งคำขอชั่วคราว
+CIRCUIT_HALF_OPEN = "half_open"  # ลองส่งคำขอทดสอบหนึ่งคำขอ
+
+
+class LLMEndpoint:
+    """สถานะของ LLM server หนึ่งเครื่องใน pool"""
+
+    def __init__(self, base_url: str, failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 max_outstanding: int = 2):
+        """
+        เริ่มต้นใช้งาน LLMEndpoint
+
+        Args:
+            base_url: URL พื้นฐานของ LLM server
+            failure_threshold: จำนวนครั้งที่ล้มเหลวติดกันก่อนเปิด circuit
+            reset_timeout: เวลา (วินาที) ก่อนลองส่งคำขอทดสอบหลังเปิด circuit
+            max_outstanding: จำนวนคำขอที่ส่งไปยัง server นี้พร้อมกันได้
+        """
+        self.base_url = base_url.rstrip("/")
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_outstanding = max(1, max_outstanding)
+
+        self.outstanding = 0
+        self.ewma_latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.healthy = True
+        self.last_health_check: Optional[float] = None
+
+        # สถิติ
+        self.requests = 0
+        self.failures = 0
+
+    def is_available(self, now: Optional[float] = None) -> bool:
+        """ตรวจสอบว่าส่งคำขอไปยัง server นี้ได้หรือไม่"""
+        now = now if now is not None else time.monotonic()
+        if self.state == CIRCUIT_OPEN:
+            return now - self.opened_at >= self.reset_timeout
+        if self.state == CIRCUIT_HALF_OPEN:
+            return not self.probe_in_flight
+        return self.healthy
+
+    def has_capacity(self) -> bool:
+        """ตรวจสอบว่า server ยังรับคำขอเพิ่มได้โดยไม่เกิน max_outstanding"""
+        return self.outstanding < self.max_outstanding
+
+    def load_score(self, default_latency: float) -> float:
+        """คะแนนภาระงาน (น้อย = ว่างกว่า) จากจำนวนคำขอค้างคูณเวลาตอบสนองเฉลี่ย ถ่วงด้วยความล้มเหลวล่าสุด"""
+        latency = self.ewma_latency if self.ewma_latency is not None else default_latency
+        return (self.outstanding + 1) * latency * (1 + self.consecutive_failures)
+
+    def on_start(self) -> bool:
+        """
+        บันทึกการเริ่มคำขอ
+
+        Returns:
+            bool: True ถ้าคำขอนี้เป็นคำขอทดสอบของ circuit ที่ half-open (ต้องส่งกลับให้ on_finish)
+        """
+        if self.state == CIRCUIT_OPEN:
+            # ครบเวลาแล้ว ให้คำขอนี้เป็นคำขอทดสอบ
+            self.state = CIRCUIT_HALF_OPEN
+        probe = self.state == CIRCUIT_HALF_OPEN and not self.probe_in_flight
+        if probe:
+            self.probe_in_flight = True
+        self.outstanding += 1
+        self.requests += 1
+        return probe
+
+    def on_finish(self, latency: float, success: Optional[bool], probe: bool = False) -> None:
+        """
+        บันทึกผลของคำขอ
+
+        Args:
+            latency: เวลาที่ใช้ (วินาที)
+            success: ผลของคำขอ (None คือคำขอถูกยกเลิก ไม่นับเป็นผลสำเร็จหรือล้มเหลว)
+            probe: ค่าที่ on_start ส่งกลับ (ล้างสถานะคำขอทดสอบเฉพาะคำขอทดสอบเอง)
+        """
+        self.outstanding = max(0, self.outstanding - 1)
+        if probe:
+            self.probe_in_flight = False
+        if success is None:
+            return
+        if success:
+            self.ewma_latency = latency if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency
+            self.consecutive_failures = 0
+            self.healthy = True
+            if self.state != CIRCUIT_CLOSED:
+                logger.info(f"ปิด circuit ของ LLM server {self.base_url} (กลับมาใช้งานได้)")
+            self.state = CIRCUIT_CLOSED
+            return
+
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == CIRCUIT_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self) -> None:
+        """เปิด circuit หยุดส่งคำขอไปยัง server นี้ชั่วคราว"""
+        if self.state != CIRCUIT_OPEN:
+            logger.warning(
+                f"เปิด circuit ของ LLM server {self.base_url} "
+                f"(ล้มเหลวติดกัน {self.consecutive_failures} ครั้ง) เป็นเวลา {self.reset_timeout:.0f} วินาที"
+            )
+        self.state = CIRCUIT_OPEN
+        self.opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "state": self.state,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "max_outstanding": self.max_outstanding,
+            "ewma_latency_seconds": round(self.ewma_latency, 4) if self.ewma_latency is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class LLMEndpointPool:
+    """
+    pool ของ LLM server สำหรับกระจายคำขอ
+
+    เลือก server ที่ยังรับคำขอได้ (ไม่เกิน max_outstanding) และมีคะแนนภาระงานต่ำสุด
+    เว้นแต่บทสนทนานั้นเคยใช้ server ที่ยังว่างพอ (sticky routing) เพื่อให้ server ใช้ KV cache ของ prompt เดิมซ้ำได้
+    """
+
+    def __init__(self,
+                 base_urls: Iterable[str],
+                 failure_threshold: int = 3,
+                 reset_timeout: float = 30.0,
+                 health_check_interval: float = 30.0,
+                 sticky_max_entries: int = 1000,
+                 sticky_load_factor: float = 2.0,
+                 latency_window: int = 200,
+                 max_outstanding_per_endpoint: int = 2):
+        """
+        เริ่มต้นใช้งาน LLMEndpointPool
+
+        Args:
+            base_urls: รายการ URL พื้นฐานของ LLM server
+            failure_threshold: จำนวนครั้งที่ล้มเหลวติดกันก่อนเปิด circuit
+            reset_timeout: เวลา (วินาที) ก่อนลองส่งคำขอทดสอบหลังเปิด circuit
+            health_check_interval: ช่วงเวลา (วินาที) ระหว่างการตรวจสอบสถานะ server
+            sticky_max_entries: จำนวนบทสนทนาสูงสุดที่จำ server ไว้
+            sticky_load_factor: ยอมใช้ server เดิมของบทสนทนาถ้าภาระงานไม่เกินกี่เท่าของ server ที่ว่างที่สุด
+            latency_window: จำนวนเวลาตอบสนองล่าสุดที่เก็บไว้คำนวณ percentile
+            max_outstanding_per_endpoint: จำนวนคำขอพร้อมกันสูงสุดต่อ server
+        """
+        urls = []
+        for url in base_urls:
+            url = url.strip().rstrip("/")
+            if url and url not in urls:
+                urls.append(url)
+        if not urls:
+            raise ValueError("ต้องระบุ LLM server อย่างน้อยหนึ่งเครื่อง")
+
+        self.endpoints = [
+            LLMEndpoint(url, failure_threshold, reset_timeout, max_outstanding_per_endpoint) for url in urls
+        ]
+        self.health_check_interval = health_check_interval
+        self.sticky_max_entries = sticky_max_entries
+        self.sticky_load_factor = sticky_load_factor
+        self._sticky: "OrderedDict[str, LLMEndpoint]" = OrderedDict()
+        self._health_task: Optional[asyncio.Task] = None
+        self._latencies: deque = deque(maxlen=max(1, latency_window))
+
+        # สถิติ
+        self._sticky_hits = 0
+        self._sticky_misses = 0
+        self._no_endpoint = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+
+    def has_endpoint(self, base_url: Optional[str]) -> bool:
+        """ตรวจสอบว่า URL นี้เป็น server หนึ่งใน pool หรือไม่"""
+        if not base_url:
+            return False
+        base_url = base_url.rstrip("/")
+        return any(endpoint.base_url == base_url for endpoint in self.endpoints)
+
+    def latency_percentile(self, percentile: float, min_samples: int = 20) -> Optional[float]:
+        """
+        คำนวณ percentile ของเวลาตอบสนองล่าสุดของคำขอที่สำเร็จ
+
+        Args:
+            percentile: percentile ที่ต้องการ (0-100)
+            min_samples: จำนวนตัวอย่างขั้นต่ำ ถ้าน้อยกว่านี้จะคืน None
+
+        Returns:
+            Optional[float]: เวลาตอบสนอง (วินาที) หรือ None ถ้าข้อมูลไม่พอ
+        """
+        if len(self._latencies) < max(1, min_samples):
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def record_hedge(self, won: bool) -> None:
+        """บันทึกว่าส่งคำขอสำรอง (hedge) และคำขอสำรองตอบกลับก่อนหรือไม่"""
+        self._hedges += 1
+        if won:
+            self._hedge_wins += 1
+
+    def _default_latency(self) -> float:
+        latencies = [e.ewma_latency for e in self.endpoints if e.ewma_latency is not None]
+        return sum(latencies) / len(latencies) if latencies else 1.0
+
+    def select(self,
+               sticky_key: Optional[str] = None,
+               exclude: Iterable[LLMEndpoint] = (),
+               require_capacity: bool = False) -> Optional[LLMEndpoint]:
+        """
+        เลือก LLM server สำหรับคำขอ
+
+        server ที่ยังไม่เต็ม max_outstanding ถูกเลือกก่อน ถ้าทุก server เต็มจะเลือก server
+        ที่ว่างที่สุด (คำขอผ่าน admission control มาแล้ว) เว้นแต่ require_capacity=True
+
+        Args:
+            sticky_key: คีย์ของบทสนทนา (ถ้ามี) สำหรับส่งไปยัง server เดิม
+            exclude: server ที่ไม่ต้องการเลือก (เช่น ที่เพิ่งล้มเหลว)
+            require_capacity: เลือกเฉพาะ server ที่ยังไม่เต็ม
+
+        Returns:
+            Optional[LLMEndpoint]: server ที่เลือก หรือ None ถ้าไม่มี server ที่ใช้งานได้
+        """
+        now = time.monotonic()
+        excluded = set(id(e) for e in exclude)
+        candidates = [e for e in self.endpoints if id(e) not in excluded and e.is_available(now)]
+        with_capacity = [e for e in candidates if e.has_capacity()]
+        if with_capacity or require_capacity:
+            candidates = with_capacity
+        if not candidates:
+            self._no_endpoint += 1
+            return None
+
+        default_latency = self._default_latency()
+        best = min(candidates, key=lambda e: e.load_score(default_latency))
+
+        if sticky_key:
+            previous = self._sticky.get(sticky_key)
+            if previous is not None and previous in candidates and (
+                previous.load_score(default_latency) <= best.load_score(default_latency) * self.sticky_load_factor
+            ):
+                self._sticky_hits += 1
+                self._sticky.move_to_end(sticky_key)
+                return previous
+            self._sticky_misses += 1
+            self._sticky[sticky_key] = best
+            self._sticky.move_to_end(sticky_key)
+            while len(self._sticky) > self.sticky_max_entries:
+                self._sticky.popitem(last=False)
+
+        return best
+
+    @asynccontextmanager
+    async def use(self, endpoint: LLMEndpoint) -> AsyncIterator[LLMEndpoint]:
+        """
+        context manager สำหรับครอบคำขอที่ส่งไปยัง server (นับคำขอค้างและบันทึกผล)
+
+        คำขอที่จบด้วย exception ที่มี retryable=False (เช่น 4xx) จะไม่นับเป็นความล้มเหลวของ server
+        และคำขอที่ถูกยกเลิกจะไม่ถูกนับผล
+
+        Args:
+            endpoint: server ที่เลือกไว้
+        """
+        probe = endpoint.on_start()
+        start = time.monotonic()
+        success: Optional[bool] = False
+        try:
+            yield endpoint
+            success = True
+        except asyncio.CancelledError:
+            success = None
+            raise
+        except Exception as e:
+            if not getattr(e, "retryable", True):
+                success = True
+            raise
+        finally:
+            latency = time.monotonic() - start
+            endpoint.on_finish(latency, success, probe)
+            if success:
+                self._latencies.append(latency)
+
+    async def check_health(self) -> None:
+        """ตรวจสอบสถานะของทุก server ผ่าน /api/tags"""
+        async with httpx.AsyncClient() as client:
+            await asyncio.gather(*(self._check_endpoint(client, e) for e in self.endpoints))
+
+    async def _check_endpoint(self, client: "httpx.AsyncClient", endpoint: LLMEndpoint) -> None:
+        try:
+            response = await client.get(f"{endpoint.base_url}/api/tags", timeout=5.0)
+            healthy = response.status_code == 200
+        except Exception as e:
+            logger.warning(f"ตรวจสอบสถานะ LLM server {endpoint.base_url} ไม่สำเร็จ: {str(e)}")
+            healthy = False
+
+        endpoint.last_health_check = time.monotonic()
+        if healthy and not endpoint.healthy:
+            logger.info(f"LLM server {endpoint.base_url} กลับมาใช้งานได้")
+            if endpoint.state == CIRCUIT_OPEN:
+                # ให้คำขอถัดไปเป็นคำขอทดสอบได้ทันที
+                endpoint.opened_at = 0.0
+        elif not healthy and endpoint.healthy:
+            logger.warning(f"LLM server {endpoint.base_url} ไม่พร้อมใช้งาน")
+        endpoint.healthy = healthy
+
+    async def _health_loop(self) -> None:
+        while True:
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"เกิดข้อผิดพลาดในการตรวจสอบสถานะ LLM server: {str(e)}")
+            await asyncio.sleep(self.health_check_interval)
+
+    def start_health_checks(self) -> None:
+        """เริ่มตรวจสอบสถานะ server เป็นระยะในพื้นหลัง"""
+        if self.health_check_interval > 0 and (self._health_task is None or self._health_task.done()):
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+            logger.info(f"เริ่มตรวจสอบสถานะ LLM server ทุก {self.health_check_interval:.0f} วินาที")
+
+    async def stop_health_checks(self) -> None:
+        """หยุดการตรวจสอบสถานะ server"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ดึงสถิติของ pool
+
+        Returns:
+            Dict[str, Any]: สถิติปัจจุบัน
+        """
+        return {
+            "endpoints": [e.get_stats() for e in self.endpoints],
+            "sticky_entries": len(self._sticky),
+            "sticky_hits": self._sticky_hits,
+            "sticky_misses": self._sticky_misses,
+            "no_endpoint_available": self._no_endpoint,
+            "latency_p50_seconds": self._round(self.latency_percentile(50, min_samples=1)),
+            "latency_p95_seconds": self._round(self.latency_percentile(95, min_samples=1)),
+            "hedges": self._hedges,
+            "hedge_wins": self._hedge_wins,
+        }
+
+    @staticmethod
+    def _round(value: Optional[float]) -> Optional[float]:
+        return round(value, 4) if value is not None else None
+
+
+_llm_pool: Optional[LLMEndpointPool] = None
+
+
+def get_llm_pool() -> LLMEndpointPool:
+    """
+    ดึง LLMEndpointPool ที่ใช้ร่วมกันทั้งแอป (สร้างครั้งแรกจากค่าคอนฟิก)
+
+    Returns:
+        LLMEndpointPool: pool ของ LLM server
+    """
+    global _llm_pool
+    if _llm_pool is None:
+        from src.utils.config import (
+            LLM_API_BASES, LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_TIMEOUT, LLM_HEALTH_CHECK_INTERVAL,
+            LLM_MAX_CONCURRENCY_PER_ENDPOINT
+        )
+        _llm_pool = LLMEndpointPool(
+            LLM_API_BASES,
+            failure_threshold=LLM_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=LLM_CIRCUIT_RESET_TIMEOUT,
+            health_check_interval=LLM_HEALTH_CHECK_INTERVAL,
+            max_outstanding_per_endpoint=LLM_MAX_CONCURRENCY_PER_ENDPOINT,
+        )
+        logger.info(f"สร้าง LLMEndpointPool: {', '.join(e.base_url for e in _llm_pool.endpoints)}")
+    return _llm_pool
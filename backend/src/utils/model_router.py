@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Query complexity router for Career AI Advisor.
+
+This module decides per question whether it can be answered from a template,
+by a lightweight model, or needs the full model, based on the query type,
+its length and whether the user's profile is involved.
+"""
+
+import re
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, Any, Optional, List, Tuple
+
+from src.utils.logger import get_logger
+from src.utils.job_facts import JobFactStore
+
+# ตั้งค่า logger
+logger = get_logger("model_router")
+
+# คำทักทาย (ทั้งข้อความต้องเป็นคำทักทาย ไม่มีคำถามต่อท้าย)
+GREETING_PATTERN = re.compile(
+    r"^\s*(สวัสดี|หวัดดี|ดีจ้า|ดีครับ|ดีค่ะ|hello|hi|hey|ทักทาย)\s*(ครับ|ค่ะ|คะ|จ้า|จ้ะ|นะ|ๆ|!|\.)*\s*$",
+    re.IGNORECASE,
+)
+
+# คำที่แสดงว่าคำถามอ้างถึงตัวผู้ใช้เอง (ต้องใช้ข้อมูลโปรไฟล์)
+SELF_REFERENCE_TERMS = [
+    "ฉัน", "ผม", "หนู", "เรา", "ตัวเอง", "เหมาะกับ", "ของฉัน", "ของผม",
+    "my ", " me ", "myself", "i am", "i'm",
+]
+
+# คำที่แสดงว่าเป็นการวางแผนอาชีพหรือคำถามหลายส่วน
+PLANNING_TERMS = [
+    "วางแผน", "แผน", "roadmap", "เส้นทาง", "เปลี่ยนสาย", "ย้ายสาย", "เริ่มต้นยังไง",
+    "ควรเรียน", "ควรเริ่ม", "เปรียบเทียบ", "เทียบ", "ต่างกัน", "ดีกว่า", "plan", "compare",
+]
+
+# ประเภทคำถามที่เป็นสายงานเฉพาะ (จาก VectorSearch._identify_query_type)
+JOB_CATEGORY_TYPES = {"frontend", "backend", "fullstack", "data", "devops", "mobile", "security"}
+
+
+class ModelTier(str, Enum):
+    """ระดับของการตอบคำถาม"""
+    TEMPLATE = "template"  # คำตอบสำเร็จรูป ไม่เรียก LLM
+    SMALL = "small"  # โมเดลขนาดเล็ก
+    LARGE = "large"  # โมเดลเต็ม
+
+
+@dataclass
+class RoutingDecision:
+    """ผลการเลือกระดับของการตอบคำถาม"""
+    tier: ModelTier
+    reason: str
+    model: Optional[str] = None  # None = ใช้โมเดลเริ่มต้นของผู้เรียก
+    answer: Optional[str] = None  # คำตอบสำเร็จรูป (เฉพาะ TEMPLATE)
+    query_types: List[str] = field(default_factory=list)
+
+
+def greeting_answer(personality: str) -> str:
+    """
+    คำตอบสำเร็จรูปสำหรับคำทักทายตามบุคลิก
+
+    Args:
+        personality: บุคลิกของ AI
+
+    Returns:
+        str: คำทักทายและแนะนำตัว
+    """
+    if personality == "formal":
+        return (
+            "สวัสดีครับ ผมเป็นที่ปรึกษาด้านอาชีพสำหรับนักศึกษาวิทยาการคอมพิวเตอร์และผู้สนใจงานด้าน IT\n"
+            "ท่านสามารถสอบถามเกี่ยวกับตำแหน่งงาน ทักษะที่จำเป็น เงินเดือน หรือการเตรียมตัวสมัครงานได้ครับ"
+        )
+    if personality == "fun":
+        return (
+            "หวัดดีจ้าา! เราคือเพื่อนที่ปรึกษาสายอาชีพ IT ประจำตัวคุณเลย\n"
+            "อยากรู้เรื่องงาน สกิล เงินเดือน หรือจะเตรียมตัวสมัครงานยังไง ถามมาได้เลย!"
+        )
+    return (
+        "สวัสดี! เราเป็นที่ปรึกษาด้านอาชีพสำหรับนักศึกษาวิทยาการคอมพิวเตอร์และคนที่สนใจงานสาย IT\n"
+        "อยากรู้เรื่องตำแหน่งงาน ทักษะ เงินเดือน หรือการเตรียมตัวสมัครงาน ถามได้เลยนะ"
+    )
+
+
+class QueryRouter:
+    """
+    เลือกระดับของการตอบคำถามตามความซับซ้อน
+
+    คำทักทายและคำถามข้อเท็จจริงของอาชีพเดียวที่มีข้อมูลใน JobFactStore ใช้คำตอบสำเร็จรูป
+    คำถามนอกขอบเขตและคำถามข้อเท็จจริงสั้นๆ อื่นใช้โมเดลขนาดเล็ก
+    ส่วนคำถามที่ต้องใช้โปรไฟล์ผู้ใช้หรือวางแผนอาชีพหลายส่วนใช้โมเดลเต็ม
+    """
+
+    def __init__(self,
+                 small_model: Optional[str] = None,
+                 short_query_chars: int = 80,
+                 long_query_chars: int = 200,
+                 job_facts: Optional[JobFactStore] = None):
+        """
+        เริ่มต้นใช้งาน QueryRouter
+
+        Args:
+            small_model: ชื่อโมเดลขนาดเล็ก (None หรือว่าง = ใช้โมเดลเต็มแทน แต่ยังนับสถิติการเลือก)
+            short_query_chars: ความยาวสูงสุดของคำถามที่ถือว่าสั้น
+            long_query_chars: ความยาวขั้นต่ำของคำถามที่ถือว่ายาว
+            job_facts: ข้อมูลอาชีพสำหรับตอบคำถามข้อเท็จจริงทันที (None = ไม่ใช้)
+        """
+        self.small_model = small_model or None
+        self.short_query_chars = short_query_chars
+        self.long_query_chars = long_query_chars
+        self.job_facts = job_facts
+
+        # สถิติ
+        self._tiers = {tier.value: 0 for tier in ModelTier}
+        self._reasons: Dict[str, int] = {}
+
+    def _decide(self, query: str, personality: str, user_context: Optional[Dict[str, Any]],
+                query_types: List[str], in_scope: bool) -> Tuple[ModelTier, str, Optional[str]]:
+        text = query.strip()
+        lowered = f" {text.lower()} "
+        length = len(text)
+
+        if GREETING_PATTERN.match(text):
+            return ModelTier.TEMPLATE, "greeting", greeting_answer(personality)
+
+        # คำถามที่อ้างถึงตัวผู้ใช้และมีโปรไฟล์ ต้องใช้โมเดลเต็มเพื่อนำโปรไฟล์มาประกอบ
+        if user_context and ("user" in query_types or any(term in lowered for term in SELF_REFERENCE_TERMS)):
+            return ModelTier.LARGE, "profile", None
+
+        question_marks = text.count("?") + text.count("？")
+        categories = [t for t in query_types if t in JOB_CATEGORY_TYPES]
+        if (
+            length >= self.long_query_chars
+            or question_marks > 1
+            or any(term in lowered for term in PLANNING_TERMS)
+            or len(categories) > 1
+            or ("resume" in query_types and "job" in query_types and length > self.short_query_chars)
+        ):
+            return ModelTier.LARGE, "multi_part", None
+
+        # คำถามข้อเท็จจริงของอาชีพเดียว (เงินเดือน ทักษะ หน้าที่) ตอบจากข้อมูลอาชีพได้ทันที
+        if self.job_facts is not None and length <= self.long_query_chars:
+            answer = self.job_facts.answer(text, personality)
+            if answer:
+                return ModelTier.TEMPLATE, "job_fact", answer
+
+        if not in_scope and length <= self.short_query_chars:
+            # โมเดลเล็กปฏิเสธคำถามนอกขอบเขตตามกฎใน system prompt ได้
+            return ModelTier.SMALL, "out_of_scope", None
+
+        if "salary" in query_types and length <= self.short_query_chars:
+            return ModelTier.SMALL, "salary_lookup", None
+
+        if length <= self.short_query_chars and len(query_types) <= 2:
+            return ModelTier.SMALL, "short_fact", None
+
+        return ModelTier.LARGE, "default", None
+
+    def route(self,
+              query: str,
+              personality: str = "friendly",
+              user_context: Optional[Dict[str, Any]] = None,
+              classification: Optional[Dict[str, Any]] = None) -> RoutingDecision:
+        """
+        เลือกระดับของการตอบคำถาม
+
+        Args:
+            query: คำถามจากผู้ใช้
+            personality: บุคลิกของ AI (ใช้กับคำตอบสำเร็จรูป)
+            user_context: ข้อมูลผู้ใช้ (ถ้ามี)
+            classification: ผลจาก VectorSearch.classify_query (ถ้ามี)
+
+        Returns:
+            RoutingDecision: ผลการเลือก
+        """
+        classification = classification or {}
+        query_types = list(classification.get("query_types") or [])
+        in_scope = classification.get("in_scope", True)
+
+        tier, reason, answer = self._decide(query, personality, user_context, query_types, in_scope)
+        decision = RoutingDecision(tier=tier, reason=reason, answer=answer, query_types=query_types)
+        if tier == ModelTier.SMALL:
+            decision.model = self.small_model
+
+        self._tiers[tier.value] += 1
+        self._reasons[reason] = self._reasons.get(reason, 0) + 1
+        logger.info(f"เลือกระดับการตอบ: {tier.value} ({reason}) ประเภทคำถาม: {', '.join(query_types) or '-'}")
+        return decision
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ดึงสถิติการเลือกระดับของการตอบคำถาม
+
+        Returns:
+            Dict[str, Any]: จำนวนคำถามต่อระดับและต่อเหตุผล
+        """
+        total = sum(self._tiers.values())
+        return {
+            "small_model": self.small_model,
+            "total": total,
+            "tiers": dict(self._tiers),
+            "tier_ratio": {k: round(v / total, 4) if total else 0.0 for k, v in self._tiers.items()},
+            "reasons": dict(self._reasons),
+        }
+
+
+_query_router: Optional[QueryRouter] = None
+
+
+def get_query_router() -> QueryRouter:
+    """
+    ดึง QueryRouter ที่ใช้ร่วมกันทั้งแอป (สร้างครั้งแรกจากค่าคอนฟิก)
+
+    Returns:
+        QueryRouter: ตัวเลือกระดับของการตอบคำถาม
+    """
+    global _query_router
+    if _query_router is None:
+        from src.utils.config import (
+            LLM_SMALL_MODEL, ROUTER_SHORT_QUERY_CHARS, ROUTER_LONG_QUERY_CHARS,
+            INSTANT_ANSWERS_ENABLED, INSTANT_ANSWERS_RELOAD_INTERVAL, NORMALIZED_JOBS_DIR
+        )
+        _query_router = QueryRouter(
+            small_model=LLM_SMALL_MODEL,
+            short_query_chars=ROUTER_SHORT_QUERY_CHARS,
+            long_query_chars=ROUTER_LONG_QUERY_CHARS,
+            job_facts=(
+                JobFactStore(NORMALIZED_JOBS_DIR, reload_interval=INSTANT_ANSWERS_RELOAD_INTERVAL)
+                if INSTANT_ANSWERS_ENABLED else None
+            ),
+        )
+    return _query_router
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prompt building utilities for Career AI Advisor.
+
+This module assembles LLM context under a token budget: sections are ranked
+by retrieval score, long lists are truncated with a summary marker and
+sections that no longer fit are dropped.
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+from src.utils.logger import get_logger
+
+# ตั้งค่า logger
+logger = get_logger("prompt_builder")
+
+# ตัวอักษรที่ไม่ใช่ ASCII (เช่น ภาษาไทย) ใช้โทเค็นมากกว่าภาษาอังกฤษต่อตัวอักษร
+_NON_ASCII_RE = re.compile(r"[^\x00-\x7f]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# ตัวคั่นระหว่างผลการค้นหาและระหว่างกลุ่มบริบท (ใช้รูปแบบเดียวกับ build_search_context)
+RESULT_SEPARATOR = "\n---\n"
+GROUP_SEPARATOR = "\n\n==========\n\n"
+DROPPED_MARKER = "(ละข้อมูลอีก {count} รายการเนื่องจากจำกัดความยาว)"
+
+TokenCounter = Callable[[str], int]
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    ประมาณจำนวนโทเค็นของข้อความแบบรวดเร็ว (ไม่ต้องโหลด tokenizer)
+
+    ใช้อัตราประมาณ 4 ตัวอักษร ASCII ต่อโทเค็น และ 2 ตัวอักษรไทยต่อโทเค็น
+    ซึ่งใกล้เคียงกับ tokenizer ของ llama3 และค่อนข้างประมาณเกินเล็กน้อย
+
+    Args:
+        text: ข้อความที่ต้องการนับ
+
+    Returns:
+        int: จำนวนโทเค็นโดยประมาณ
+    """
+    if not text:
+        return 0
+    non_ascii = len(_NON_ASCII_RE.findall(text))
+    ascii_chars = len(_WHITESPACE_RE.sub("", text)) - non_ascii
+    return math.ceil(non_ascii / 2) + math.ceil(ascii_chars / 4)
+
+
+def truncate_list(items: List[str], max_items: Optional[int]) -> List[str]:
+    """
+    ตัดรายการให้เหลือไม่เกิน max_items พร้อมเพิ่มข้อความสรุปจำนวนที่ถูกตัด
+
+    Args:
+        items: รายการข้อความ
+        max_items: จำนวนสูงสุดที่ต้องการ (None = ไม่จำกัด)
+
+    Returns:
+        List[str]: รายการที่ตัดแล้ว
+    """
+    if max_items is None or len(items) <= max_items:
+        return list(items)
+    hidden = len(items) - max_items
+    return list(items[:max_items]) + [f"... และอีก {hidden} รายการ"]
+
+
+def truncate_text_to_tokens(text: str, max_tokens: int, token_counter: TokenCounter = estimate_tokens) -> str:
+    """
+    ตัดข้อความให้มีจำนวนโทเค็นไม่เกินที่กำหนด โดยตัดที่ท้ายบรรทัดถ้าเป็นไปได้
+
+    Args:
+        text: ข้อความ
+        max_tokens: จำนวนโทเค็นสูงสุด
+        token_counter: ฟังก์ชันนับโทเค็น
+
+    Returns:
+        str: ข้อความที่ตัดแล้ว (มีเครื่องหมายตัดทอนถ้าถูกตัด)
+    """
+    if token_counter(text) <= max_tokens:
+        return text
+    marker = "\n...(ตัดทอนเนื่องจากจำกัดความยาว)"
+    budget = max_tokens - token_counter(marker)
+    if budget <= 0:
+        return ""
+
+    # ค้นหาแบบ binary search หาความยาวที่ยาวที่สุดที่ยังอยู่ในงบ
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if token_counter(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    cut = text[:low]
+
+    # ตัดที่ท้ายบรรทัดถ้าไม่เสียเนื้อหามากเกินไป
+    newline = cut.rfind("\n")
+    if newline > len(cut) // 2:
+        cut = cut[:newline]
+    return cut.rstrip() + marker
+
+
+def _result_content(result: Dict[str, Any]) -> Dict[str, Any]:
+    """ดึงเนื้อหาของผลการค้นหา (รองรับทั้งแบบมี content และแบบ flat จาก search_jobs/search_career_advices)"""
+    content = result.get("content")
+    if isinstance(content, dict) and content:
+        return content
+    return result
+
+
+def result_score(result: Dict[str, Any]) -> float:
+    """
+    ดึงคะแนนความเกี่ยวข้องของผลการค้นหา (weighted_score ถ้ามี มิฉะนั้น similarity_score)
+
+    Args:
+        result: ผลการค้นหา
+
+    Returns:
+        float: คะแนนความเกี่ยวข้อง
+    """
+    score = result.get("weighted_score", result.get("similarity_score", 0.0))
+    try:
+        return float(score)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def format_job_result(job: Dict[str, Any], number: int, max_list_items: Optional[int] = None) -> str:
+    """
+    แปลงผลการค้นหาอาชีพเป็นข้อความบริบท
+
+    Args:
+        job: ผลการค้นหาอาชีพ
+        number: ลำดับที่แสดง
+        max_list_items: จำนวนรายการสูงสุดของแต่ละหัวข้อ (None = ไม่จำกัด)
+
+    Returns:
+        str: ข้อความบริบทของอาชีพ
+    """
+    content = _result_content(job)
+    title = job.get("title", "ไม่ระบุ")
+
+    job_part = f"ตำแหน่ง {number}: {title}\n"
+
+    # เพิ่มคำอธิบาย
+    description = content.get("description", "")
+    if description:
+        job_part += f"คำอธิบาย: {description}\n"
+
+    # เพิ่มความรับผิดชอบ
+    responsibilities = content.get("responsibilities", [])
+    if responsibilities and isinstance(responsibilities, list):
+        job_part += "ความรับผิดชอบ:\n"
+        for resp in truncate_list([str(r) for r in responsibilities], max_list_items):
+            job_part += f"- {resp}\n"
+
+    # เพิ่มทักษะ
+    skills = content.get("skills", [])
+    if skills and isinstance(skills, list):
+        skill_limit = max_list_items * 2 if max_list_items is not None else None
+        job_part += f"ทักษะที่ต้องการ: {', '.join(truncate_list([str(s) for s in skills], skill_limit))}\n"
+
+    # เพิ่มเงินเดือน
+    salary_ranges = content.get("salary_ranges", [])
+    if salary_ranges and isinstance(salary_ranges, list):
+        salary_lines = [
+            f"ประสบการณ์ {salary.get('experience', 'ไม่ระบุ')}: {salary.get('salary', 'ไม่ระบุ')}"
+            for salary in salary_ranges if isinstance(salary, dict)
+        ]
+        if salary_lines:
+            job_part += "ช่วงเงินเดือน:\n"
+            for line in truncate_list(salary_lines, max_list_items):
+                job_part += f"- {line}\n"
+
+    return job_part
+
+
+def format_advice_result(advice: Dict[str, Any], number: int, max_list_items: Optional[int] = None) -> str:
+    """
+    แปลงผลการค้นหาคำแนะนำเป็นข้อความบริบท
+
+    Args:
+        advice: ผลการค้นหาคำแนะนำ
+        number: ลำดับที่แสดง
+        max_list_items: จำนวนแท็กสูงสุด (None = ไม่จำกัด)
+
+    Returns:
+        str: ข้อความบริบทของคำแนะนำ
+    """
+    content = _result_content(advice)
+    title = advice.get("title", "ไม่ระบุ")
+
+    advice_part = f"คำแนะนำ {number}: {title}\n"
+    advice_part += f"{content.get('text_preview', 'ไม่มีรายละเอียด')}\n"
+
+    # เพิ่มแท็ก
+    tags = content.get("tags", [])
+    if tags and isinstance(tags, list):
+        advice_part += f"แท็ก: {', '.join(truncate_list([str(t) for t in tags], max_list_items))}\n"
+
+    # เพิ่มแหล่งที่มา
+    source = content.get("source", "")
+    if source:
+        advice_part += f"แหล่งที่มา: {source}\n"
+
+    return advice_part
+
+
+@dataclass
+class PromptSection:
+    """ส่วนหนึ่งของบริบทที่จะใส่ใน prompt"""
+    name: str
+    group: str  # หัวข้อกลุ่ม เช่น "ข้อมูลอาชีพ:" (ว่าง = ไม่มีหัวข้อ)
+    score: float
+    render: Callable[[Optional[int]], str]  # รับ max_list_items แล้วคืนข้อความ
+    order: int = 0
+
+
+@dataclass
+class AssembledContext:
+    """ผลลัพธ์จากการประกอบบริบท"""
+    text: str
+    tokens: int
+    included: List[str] = field(default_factory=list)
+    truncated: List[str] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)
+
+
+class PromptAssembler:
+    """
+    ประกอบบริบทของ prompt ภายใต้งบประมาณโทเค็น
+
+    ส่วนที่มีคะแนนสูงจะถูกใส่ก่อน ถ้าไม่พอดีงบจะลองแสดงแบบย่อ (ลดจำนวนรายการ)
+    แล้วจึงตัดข้อความ และส่วนที่เหลือจะถูกละพร้อมข้อความสรุปจำนวนที่ละไว้
+    """
+
+    # จำนวนโทเค็นขั้นต่ำที่คุ้มค่าจะใส่ส่วนที่ถูกตัดข้อความ
+    MIN_SECTION_TOKENS = 48
+
+    def __init__(self,
+                 token_budget: int,
+                 max_list_items: Optional[int] = 5,
+                 token_counter: TokenCounter = estimate_tokens):
+        """
+        เริ่มต้นใช้งาน PromptAssembler
+
+        Args:
+            token_budget: จำนวนโทเค็นสูงสุดของบริบททั้งหมด
+            max_list_items: จำนวนรายการสูงสุดต่อหัวข้อ (ความรับผิดชอบ เงินเดือน แท็ก)
+            token_counter: ฟังก์ชันนับโทเค็น (เปลี่ยนเป็น tokenizer จริงได้)
+        """
+        self.token_budget = max(0, token_budget)
+        self.max_list_items = max_list_items
+        self.count_tokens = token_counter
+        self.sections: List[PromptSection] = []
+
+    def add_section(self, name: str, render: Callable[[Optional[int]], str], score: float, group: str = "") -> None:
+        """
+        เพิ่มส่วนของบริบท
+
+        Args:
+            name: ชื่อส่วน (ใช้ใน log)
+            render: ฟังก์ชันที่รับ max_list_items แล้วคืนข้อความ
+            score: คะแนนความสำคัญ (สูง = ใส่ก่อน)
+            group: หัวข้อกลุ่มที่ส่วนนี้อยู่
+        """
+        self.sections.append(PromptSection(name=name, group=group, score=score, render=render, order=len(self.sections)))
+
+    def add_search_results(self, search_results: Optional[List[Dict[str, Any]]]) -> None:
+        """
+        เพิ่มผลการค้นหาอาชีพและคำแนะนำเป็นส่วนของบริบท โดยใช้คะแนนจากการค้นหา
+
+        Args:
+            search_results: ผลลัพธ์การค้นหา
+        """
+        job_number = 0
+        advice_number = 0
+        for result in search_results or []:
+            if not isinstance(result, dict):
+                continue
+            result_type = result.get("type", "")
+            if result_type == "job":
+                job_number += 1
+                self.add_section(
+                    name=f"job:{result.get('id', job_number)}",
+                    render=lambda limit, r=result, n=job_number: format_job_result(r, n, limit),
+                    score=result_score(result),
+                    group="ข้อมูลอาชีพ:",
+                )
+            elif result_type == "advice":
+                advice_number += 1
+                self.add_section(
+                    name=f"advice:{result.get('id', advice_number)}",
+                    render=lambda limit, r=result, n=advice_number: format_advice_result(r, n, limit),
+                    score=result_score(result),
+                    group="คำแนะนำเพิ่มเติม:",
+                )
+
+    def _fit_section(self, section: PromptSection, remaining: int) -> Tuple[Optional[str], bool]:
+        """หาข้อความของส่วนที่พอดีกับงบที่เหลือ คืน (ข้อความ, ถูกย่อหรือไม่) หรือ (None, False) ถ้าใส่ไม่ได้"""
+        text = section.render(self.max_list_items)
+        if self.count_tokens(text) <= remaining:
+            return text, False
+
+        # ลองแสดงแบบย่อ
+        compact_limit = 2 if self.max_list_items is None else min(2, self.max_list_items)
+        text = section.render(compact_limit)
+        if self.count_tokens(text) <= remaining:
+            return text, True
+
+        if remaining >= self.MIN_SECTION_TOKENS:
+            return truncate_text_to_tokens(text, remaining, self.count_tokens), True
+        return None, False
+
+    def assemble(self) -> AssembledContext:
+        """
+        ประกอบบริบทให้อยู่ภายในงบประมาณโทเค็น
+
+        Returns:
+            AssembledContext: ข้อความบริบทและรายละเอียดส่วนที่ใส่/ตัด/ละ
+        """
+        result = AssembledContext(text="", tokens=0)
+        chosen: Dict[str, List[str]] = {}
+        group_order: List[str] = []
+        # เผื่อโทเค็นสำหรับข้อความสรุปส่วนที่ถูกละ
+        remaining = self.token_budget - self.count_tokens(DROPPED_MARKER.format(count=len(self.sections)))
+
+        for section in sorted(self.sections, key=lambda s: (-s.score, s.order)):
+            # เผื่อโทเค็นสำหรับหัวข้อกลุ่มและตัวคั่น
+            if section.group in chosen:
+                overhead = self.count_tokens(RESULT_SEPARATOR)
+            else:
+                overhead = self.count_tokens(section.group) + self.count_tokens(GROUP_SEPARATOR)
+            text, truncated = self._fit_section(section, remaining - overhead)
+            if not text:
+                result.dropped.append(section.name)
+                continue
+
+            if section.group not in chosen:
+                chosen[section.group] = []
+                group_order.append(section.group)
+            chosen[section.group].append(text)
+            remaining -= overhead + self.count_tokens(text)
+            (result.truncated if truncated else result.included).append(section.name)
+
+        blocks = []
+        for group in group_order:
+            body = RESULT_SEPARATOR.join(chosen[group])
+            blocks.append(f"{group}\n{body}" if group else body)
+
+        if result.dropped:
+            blocks.append(DROPPED_MARKER.format(count=len(result.dropped)))
+
+        result.text = GROUP_SEPARATOR.join(blocks)
+        result.tokens = self.count_tokens(result.text)
+
+        if result.truncated or result.dropped:
+            logger.info(
+                f"ประกอบบริบท {result.tokens}/{self.token_budget} โทเค็น: "
+                f"ใส่ครบ {len(result.included)}, ย่อ {len(result.truncated)}, ละ {len(result.dropped)}"
+            )
+        return result
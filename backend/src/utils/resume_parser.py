@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resume parsing for Career AI Advisor.
+
+Extracts plain text from uploaded PDF/DOCX resumes, matches it against the
+IT vocabulary used by vector search, and merges the skills and programming
+languages it finds into the user's profile so recommendations can use them.
+"""
+
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from src.utils.logger import get_logger
+
+# ตั้งค่า logger
+logger = get_logger("resume_parser")
+
+# ระดับความชำนาญของทักษะที่ได้จาก Resume (ผู้ใช้ปรับเองได้ภายหลัง)
+RESUME_SKILL_PROFICIENCY = 3
+
+# คำใน TECH_KEYWORDS ที่เป็นภาษาโปรแกรม -> ชื่อที่แสดง
+LANGUAGE_LABELS = {
+    "python": "Python",
+    "java": "Java",
+    "javascript": "JavaScript",
+    "typescript": "TypeScript",
+    "c#": "C#",
+    "c++": "C++",
+    "php": "PHP",
+    "ruby": "Ruby",
+}
+
+# คำใน TECH_KEYWORDS ที่เป็นทักษะ -> ชื่อที่แสดง (คำอื่น เช่น ชื่อตำแหน่งงาน ไม่นับเป็นทักษะ)
+SKILL_LABELS = {
+    "web": "Web Development",
+    "frontend": "Frontend",
+    "backend": "Backend",
+    "fullstack": "Full Stack",
+    "full stack": "Full Stack",
+    "devops": "DevOps",
+    "database": "Database",
+    "ux": "UX",
+    "ui": "UI",
+    "react": "React",
+    "angular": "Angular",
+    "node": "Node.js",
+    "mobile": "Mobile Development",
+    "android": "Android",
+    "ios": "iOS",
+    "cloud": "Cloud",
+    "aws": "AWS",
+    "azure": "Azure",
+    "network": "Network",
+    "security": "Security",
+    "qa": "QA",
+    "testing": "Testing",
+}
+
+_keyword_patterns = None
+
+
+def _get_keyword_patterns() -> Dict[str, "re.Pattern"]:
+    """
+    สร้าง regex ของคำศัพท์ไอที (คำต้องไม่ติดกับตัวอักษรอื่น เช่น java ไม่นับใน javascript)
+
+    Returns:
+        Dict[str, re.Pattern]: คำศัพท์และ regex
+    """
+    global _keyword_patterns
+    if _keyword_patterns is None:
+        from src.utils.vector_search import TECH_KEYWORDS
+        _keyword_patterns = {
+            keyword: re.compile(rf"(?<![\w]){re.escape(keyword)}(?![\w+#])", re.IGNORECASE)
+            for keyword in TECH_KEYWORDS
+            if keyword in LANGUAGE_LABELS or keyword in SKILL_LABELS
+        }
+    return _keyword_patterns
+
+
+def extract_resume_text(file_path: str) -> str:
+    """
+    ดึงข้อความจากไฟล์ Resume (PDF, DOCX หรือ TXT)
+
+    Args:
+        file_path: พาธของไฟล์ Resume
+
+    Returns:
+        str: ข้อความใน Resume หรือสตริงว่างถ้าไม่รองรับหรืออ่านไม่ได้
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        if ext == ".pdf":
+            return _extract_pdf_text(file_path)
+        if ext == ".docx":
+            from docx import Document
+            document = Document(file_path)
+            paragraphs = [p.text for p in document.paragraphs]
+            for table in document.tables:
+                for row in table.rows:
+                    paragraphs.extend(cell.text for cell in row.cells)
+            return "\n".join(paragraphs)
+        if ext == ".txt":
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                return f.read()
+    except Exception as e:
+        logger.error(f"ไม่สามารถอ่านข้อความจาก Resume {file_path}: {str(e)}")
+        return ""
+
+    logger.warning(f"ไม่รองรับการอ่านข้อความจากไฟล์ {ext}: {file_path}")
+    return ""
+
+
+def _extract_pdf_text(file_path: str) -> str:
+    """
+    ดึงข้อความจากไฟล์ PDF ด้วย pdfplumber (ถ้าไม่มีจะใช้ PyPDF2)
+
+    Args:
+        file_path: พาธของไฟล์ PDF
+
+    Returns:
+        str: ข้อความใน PDF
+    """
+    try:
+        import pdfplumber
+    except ImportError:
+        from PyPDF2 import PdfReader
+        reader = PdfReader(file_path)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+    with pdfplumber.open(file_path) as pdf:
+        return "\n".join(page.extract_text() or "" for page in pdf.pages)
+
+
+def extract_resume_skills(text: str) -> Dict[str, List[str]]:
+    """
+    หาทักษะและภาษาโปรแกรมในข้อความ Resume จากคำศัพท์ไอทีของระบบค้นหา
+
+    Args:
+        text: ข้อความใน Resume
+
+    Returns:
+        Dict[str, List[str]]: {"skills": [...], "programming_languages": [...]} เรียงตามตำแหน่งที่พบ
+    """
+    found = []
+    for keyword, pattern in _get_keyword_patterns().items():
+        match = pattern.search(text)
+        if match:
+            found.append((match.start(), keyword))
+    found.sort()
+
+    skills: List[str] = []
+    languages: List[str] = []
+    for _, keyword in found:
+        if keyword in LANGUAGE_LABELS:
+            label, target = LANGUAGE_LABELS[keyword], languages
+        else:
+            label, target = SKILL_LABELS[keyword], skills
+        if label not in target:
+            target.append(label)
+
+    return {"skills": skills, "programming_languages": languages}
+
+
+def _merge_skills(current: List[Any], names: List[str]) -> List[str]:
+    """
+    เพิ่มทักษะที่ยังไม่มีในรายการเดิม (เทียบชื่อแบบไม่สนตัวพิมพ์)
+
+    Args:
+        current: รายการ UserSkill เดิม (ถูกแก้ไข)
+        names: ชื่อทักษะที่พบใน Resume
+
+    Returns:
+        List[str]: ชื่อทักษะที่เพิ่มใหม่
+    """
+    from src.api.models import UserSkill
+
+    existing = {skill.name.strip().lower() for skill in current}
+    added = []
+    for name in names:
+        if name.lower() not in existing:
+            current.append(UserSkill(name=name, proficiency=RESUME_SKILL_PROFICIENCY))
+            existing.add(name.lower())
+            added.append(name)
+    return added
+
+
+def enrich_user_from_resume(user_id: str, resume_path: str) -> Optional[Dict[str, Any]]:
+    """
+    อ่าน Resume แล้วเพิ่มทักษะและภาษาโปรแกรมที่พบลงในข้อมูลผู้ใช้
+    (ใช้เป็นงานเบื้องหลังหลังอัปโหลด Resume)
+
+    Args:
+        user_id: รหัสผู้ใช้
+        resume_path: พาธของไฟล์ Resume ที่อัปโหลด
+
+    Returns:
+        Optional[Dict[str, Any]]: ทักษะและภาษาที่เพิ่มใหม่ หรือ None ถ้าไม่ได้อัปเดตข้อมูลผู้ใช้
+    """
+    from src.utils.storage import modify_user
+
+    text = extract_resume_text(resume_path)
+    if not text.strip():
+        logger.warning(f"ไม่พบข้อความใน Resume {resume_path}")
+        return None
+
+    extracted = extract_resume_skills(text)
+    added: Dict[str, List[str]] = {}
+
+    def merge(user: Any) -> bool:
+        # ทำงานภายใต้ล็อกของ shard กับข้อมูลผู้ใช้ล่าสุด จึงไม่ทับการแก้ไขโปรไฟล์ที่เกิดขึ้นระหว่างดึงข้อความ
+        if user.resume_path and os.path.abspath(user.resume_path) != os.path.abspath(resume_path):
+            return False
+        added["skills"] = _merge_skills(user.skills, extracted["skills"])
+        added["programming_languages"] = _merge_skills(user.programming_languages, extracted["programming_languages"])
+        if not (added["skills"] or added["programming_languages"]):
+            return False
+        user.updated_at = datetime.now().isoformat()
+        return True
+
+    user = modify_user(user_id, merge)
+    if user is None:
+        logger.warning(f"ไม่พบผู้ใช้ {user_id} หรือไม่สามารถบันทึกทักษะจาก Resume")
+        return None
+    if not added:
+        logger.info(f"ข้ามการวิเคราะห์ Resume {resume_path} เพราะผู้ใช้ {user_id} อัปโหลดไฟล์ใหม่แล้ว")
+        return None
+
+    logger.info(
+        f"วิเคราะห์ Resume ของผู้ใช้ {user_id}: เพิ่มทักษะ {added['skills']} "
+        f"และภาษาโปรแกรม {added['programming_languages']}"
+    )
+    return added
@@ -7,70 +7,122 @@ This module provides functions for file storage and retrieval.
 """
 
 import os
-import json
 import shutil
+import threading
 import uuid
-from typing import Dict, List, Any, Optional, Union, BinaryIO
+from typing import Dict, List, Any, Optional, Union, BinaryIO, AsyncIterator, Tuple, Callable
 from datetime import datetime
 from pathlib import Path
 
 from src.utils.config import USERS_DIR, UPLOADS_DIR, EducationStatus
 from src.utils.logger import get_logger
-from src.api.models import User, UserCreate, UserUpdate, ChatHistory, ChatMessage
+from src.utils.atomic_write import atomic_open
+from src.api.models import User, UserCreate, UserUpdate, ChatHistory, ChatHistorySummary, ChatMessage
 
 # ตั้งค่า logger
 logger = get_logger("storage")
 
-# ไฟล์สำหรับเก็บข้อมูลผู้ใช้คนเดียว
+# ไฟล์ข้อมูลผู้ใช้คนเดียวแบบเดิม (นำเข้าที่เก็บข้อมูลผู้ใช้ครั้งแรก)
 USER_FILE = os.path.join(USERS_DIR, "user.json")
+# โฟลเดอร์เก็บข้อมูลผู้ใช้ (ไฟล์ shard แยกตาม prefix ของรหัสผู้ใช้)
+PROFILES_DIR = os.path.join(USERS_DIR, "profiles")
 # โฟลเดอร์สำหรับเก็บ Resume
 RESUME_DIR = os.path.join(USERS_DIR, "resume")
-# โฟลเดอร์สำหรับเก็บประวัติการสนทนา
+# โฟลเดอร์สำหรับเก็บประวัติการสนทนา (ไฟล์ JSON แบบเดิม นำเข้าฐานข้อมูลครั้งแรก)
 CHATS_DIR = os.path.join(USERS_DIR, "chats")
+# ฐานข้อมูลประวัติการสนทนา
+CHAT_DB_FILE = os.path.join(USERS_DIR, "chat_history.db")
+# ประวัติการสนทนาที่เขียนลงฐานข้อมูลไม่สำเร็จ (JSONL)
+CHAT_DEAD_LETTER_FILE = os.path.join(USERS_DIR, "chat_history_dead_letter.jsonl")
 
 # สร้างโฟลเดอร์ที่จำเป็น
 os.makedirs(USERS_DIR, exist_ok=True)
 os.makedirs(RESUME_DIR, exist_ok=True)
 os.makedirs(CHATS_DIR, exist_ok=True)
 
+# รหัสผู้ใช้เริ่มต้น (ผู้ใช้คนเดียวแบบเดิม และคำขอที่ไม่ระบุผู้ใช้)
+DEFAULT_USER_ID = "app_user"
+
+_user_store = None
+_user_store_lock = threading.Lock()
+
+def get_user_store():
+    """
+    ดึง UserStore ที่ใช้ร่วมกันทั้งแอป (สร้างเมื่อเรียกใช้ครั้งแรก และนำเข้า user.json เดิม)
+    
+    Returns:
+        UserStore: ที่เก็บข้อมูลผู้ใช้
+    """
+    global _user_store
+    if _user_store is None:
+        with _user_store_lock:
+            if _user_store is None:
+                from src.utils.user_store import UserStore
+                from src.utils.config import USER_CACHE_SIZE
+                store = UserStore(PROFILES_DIR, cache_size=USER_CACHE_SIZE)
+                store.import_legacy(USER_FILE)
+                _user_store = store
+    return _user_store
+
+def user_exists(user_id: str) -> bool:
+    """
+    ตรวจสอบว่ามีข้อมูลผู้ใช้หรือไม่
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        
+    Returns:
+        bool: True ถ้ามีข้อมูลผู้ใช้, False ถ้าไม่มี
+    """
+    try:
+        return get_user_store().exists(user_id)
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการตรวจสอบผู้ใช้ {user_id}: {str(e)}")
+        return False
+
 def app_user_exists() -> bool:
     """
-    ตรวจสอบว่ามีไฟล์ข้อมูลผู้ใช้หรือไม่
+    ตรวจสอบว่ามีข้อมูลผู้ใช้เริ่มต้นหรือไม่
     
     Returns:
-        bool: True ถ้ามีไฟล์ข้อมูลผู้ใช้, False ถ้าไม่มี
+        bool: True ถ้ามีข้อมูลผู้ใช้, False ถ้าไม่มี
     """
-    return os.path.exists(USER_FILE)
+    return user_exists(DEFAULT_USER_ID)
 
-def get_app_user() -> Optional[User]:
+def get_user(user_id: str) -> Optional[User]:
     """
-    ดึงข้อมูลผู้ใช้จากไฟล์ user.json
+    ดึงข้อมูลผู้ใช้
     
+    ข้อมูลที่แปลงแล้วถูกแคชไว้ในหน่วยความจำ และคืนเป็นสำเนา
+    ผู้เรียกจึงแก้ไขได้โดยไม่กระทบผู้เรียกรายอื่น
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        
     Returns:
         Optional[User]: ข้อมูลผู้ใช้ หรือ None ถ้าไม่พบ
     """
     try:
-        # ตรวจสอบว่าไฟล์มีอยู่หรือไม่
-        if not os.path.exists(USER_FILE):
-            logger.info("ไม่พบไฟล์ข้อมูลผู้ใช้")
-            return None
-        
-        # อ่านข้อมูลจากไฟล์
-        with open(USER_FILE, 'r', encoding='utf-8') as f:
-            user_data = json.load(f)
-        
-        # แปลงเป็น User object
-        user = User.parse_obj(user_data)
-        
-        logger.info(f"ดึงข้อมูลผู้ใช้สำเร็จ: {user.name}")
+        user = get_user_store().get(user_id)
+        if user is None:
+            logger.info(f"ไม่พบข้อมูลผู้ใช้ {user_id}")
         return user
     except Exception as e:
-        logger.error(f"เกิดข้อผิดพลาดในการดึงข้อมูลผู้ใช้: {str(e)}")
+        logger.error(f"เกิดข้อผิดพลาดในการดึงข้อมูลผู้ใช้ {user_id}: {str(e)}")
         return None
 
-def save_app_user(user: User) -> bool:
+def get_app_user() -> Optional[User]:
     """
-    บันทึกข้อมูลผู้ใช้ลงไฟล์ user.json
+    ดึงข้อมูลผู้ใช้เริ่มต้น
+    
+    Returns:
+        Optional[User]: ข้อมูลผู้ใช้ หรือ None ถ้าไม่พบ
+    """
+    return get_user(DEFAULT_USER_ID)
+
+def save_user(user: User) -> bool:
+    """
+    บันทึกข้อมูลผู้ใช้ (ตาม user.id)
     
     Args:
         user: ข้อมูลผู้ใช้ที่ต้องการบันทึก
@@ -79,25 +131,49 @@ def save_app_user(user: User) -> bool:
         bool: สถานะความสำเร็จ
     """
     try:
-        # สร้างโฟลเดอร์ถ้ายังไม่มี
-        os.makedirs(os.path.dirname(USER_FILE), exist_ok=True)
-        
-        # แปลงเป็น dict แล้วบันทึก
-        user_dict = user.dict()
-        with open(USER_FILE, 'w', encoding='utf-8') as f:
-            json.dump(user_dict, f, ensure_ascii=False, indent=2)
+        get_user_store().put(user)
         
-        logger.info(f"บันทึกข้อมูลผู้ใช้ {user.name} สำเร็จ")
+        logger.info(f"บันทึกข้อมูลผู้ใช้ {user.name} ({user.id}) สำเร็จ")
         return True
     except Exception as e:
         logger.error(f"เกิดข้อผิดพลาดในการบันทึกข้อมูลผู้ใช้: {str(e)}")
         return False
 
-def update_app_user(user_data: UserUpdate) -> Optional[User]:
+def modify_user(user_id: str, mutate: Callable[[User], bool]) -> Optional[User]:
+    """
+    แก้ไขข้อมูลผู้ใช้ล่าสุดแล้วบันทึกภายใต้ล็อกของ shard (ไม่ทับการบันทึกที่เกิดขึ้นพร้อมกัน)
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        mutate: ฟังก์ชันที่แก้ไข User คืน True ถ้ามีการเปลี่ยนแปลงที่ต้องบันทึก
+        
+    Returns:
+        Optional[User]: ข้อมูลผู้ใช้หลังแก้ไข หรือ None ถ้าไม่พบผู้ใช้หรือไม่สำเร็จ
+    """
+    try:
+        return get_user_store().update(user_id, mutate)
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการแก้ไขข้อมูลผู้ใช้ {user_id}: {str(e)}")
+        return None
+
+def save_app_user(user: User) -> bool:
+    """
+    บันทึกข้อมูลผู้ใช้ (ชื่อเดิมของ save_user)
+    
+    Args:
+        user: ข้อมูลผู้ใช้ที่ต้องการบันทึก
+        
+    Returns:
+        bool: สถานะความสำเร็จ
+    """
+    return save_user(user)
+
+def update_user(user_id: str, user_data: UserUpdate) -> Optional[User]:
     """
     อัปเดตข้อมูลผู้ใช้
     
     Args:
+        user_id: รหัสผู้ใช้
         user_data: ข้อมูลผู้ใช้ที่ต้องการอัปเดต
         
     Returns:
@@ -105,11 +181,11 @@ def update_app_user(user_data: UserUpdate) -> Optional[User]:
     """
     try:
         # ดึงข้อมูลผู้ใช้เดิม
-        user = get_app_user()
+        user = get_user(user_id)
         if not user:
             # ถ้าไม่มีข้อมูลผู้ใช้เดิม ให้สร้างใหม่
             user = User(
-                id="app_user",
+                id=user_id,
                 name="App User",
                 institution="",
                 education_status=EducationStatus.STUDENT,
@@ -140,7 +216,7 @@ def update_app_user(user_data: UserUpdate) -> Optional[User]:
         updated_user = User.parse_obj(user_dict)
         
         # บันทึกข้อมูลผู้ใช้
-        if not save_app_user(updated_user):
+        if not save_user(updated_user):
             logger.error(f"ไม่สามารถบันทึกข้อมูลผู้ใช้")
             return None
         
@@ -150,19 +226,51 @@ def update_app_user(user_data: UserUpdate) -> Optional[User]:
         logger.error(f"เกิดข้อผิดพลาดในการอัปเดตผู้ใช้: {str(e)}")
         return None
 
-def create_app_user(user_data: UserCreate) -> Optional[User]:
+def update_app_user(user_data: UserUpdate) -> Optional[User]:
+    """
+    อัปเดตข้อมูลผู้ใช้เริ่มต้น
+    
+    Args:
+        user_data: ข้อมูลผู้ใช้ที่ต้องการอัปเดต
+        
+    Returns:
+        Optional[User]: ข้อมูลผู้ใช้ที่อัปเดตแล้ว หรือ None ถ้าไม่สำเร็จ
     """
-    สร้างข้อมูลผู้ใช้ใหม่
+    return update_user(DEFAULT_USER_ID, user_data)
+
+def _new_user(user_data: UserCreate, user_id: str) -> User:
+    # สร้าง User object ใหม่จากข้อมูลที่ลงทะเบียน
+    now = datetime.now().isoformat()
+    return User(
+        id=user_id,
+        name=user_data.name,
+        institution=user_data.institution,
+        education_status=user_data.education_status,
+        year=user_data.year,
+        skills=user_data.skills,
+        programming_languages=user_data.programming_languages,
+        tools=user_data.tools,
+        projects=user_data.projects,
+        work_experiences=user_data.work_experiences,
+        resume_path=None,
+        created_at=now,
+        updated_at=now
+    )
+
+def create_user(user_data: UserCreate, user_id: str = DEFAULT_USER_ID) -> Optional[User]:
+    """
+    สร้างข้อมูลผู้ใช้ใหม่ (ถ้ามีผู้ใช้รหัสนี้อยู่แล้วจะอัปเดตข้อมูลเดิม)
     
     Args:
         user_data: ข้อมูลผู้ใช้
+        user_id: รหัสผู้ใช้
         
     Returns:
         Optional[User]: ข้อมูลผู้ใช้ที่สร้างแล้ว หรือ None ถ้าไม่สำเร็จ
     """
     try:
         # ตรวจสอบว่ามีผู้ใช้อยู่แล้วหรือไม่
-        existing_user = get_app_user()
+        existing_user = get_user(user_id)
         if existing_user:
             # แทนที่จะสร้างใหม่ ให้อัปเดตผู้ใช้เดิม
             logger.info(f"พบผู้ใช้เดิม {existing_user.name} จะทำการอัปเดตข้อมูล")
@@ -178,35 +286,18 @@ def create_app_user(user_data: UserCreate) -> Optional[User]:
             existing_user.updated_at = datetime.now().isoformat()
             
             # บันทึกข้อมูลผู้ใช้
-            if save_app_user(existing_user):
+            if save_user(existing_user):
                 logger.info(f"อัปเดตผู้ใช้เดิมสำเร็จ: {existing_user.name}")
                 return existing_user
             else:
                 logger.error(f"ไม่สามารถอัปเดตข้อมูลผู้ใช้เดิมได้")
                 return None
             
-        # สร้างเวลาปัจจุบัน
-        now = datetime.now().isoformat()
-        
         # สร้าง User object
-        user = User(
-            id="app_user",  # ใช้ ID คงที่
-            name=user_data.name,
-            institution=user_data.institution,
-            education_status=user_data.education_status,
-            year=user_data.year,
-            skills=user_data.skills,
-            programming_languages=user_data.programming_languages,
-            tools=user_data.tools,
-            projects=user_data.projects,
-            work_experiences=user_data.work_experiences,
-            resume_path=None,
-            created_at=now,
-            updated_at=now
-        )
+        user = _new_user(user_data, user_id)
         
         # บันทึกข้อมูลผู้ใช้
-        if not save_app_user(user):
+        if not save_user(user):
             logger.error(f"ไม่สามารถบันทึกข้อมูลผู้ใช้")
             return None
         
@@ -216,11 +307,174 @@ def create_app_user(user_data: UserCreate) -> Optional[User]:
         logger.error(f"เกิดข้อผิดพลาดในการสร้างผู้ใช้: {str(e)}")
         return None
 
-def save_app_resume(content, filename: str) -> Optional[str]:
+def register_new_user(user_data: UserCreate, user_id: str) -> Optional[Tuple[User, str]]:
+    """
+    ลงทะเบียนผู้ใช้ใหม่พร้อม token (ตรวจว่ายังไม่มีผู้ใช้และบันทึกในขั้นตอนเดียวภายใต้ล็อกของ shard)
+    
+    Args:
+        user_data: ข้อมูลผู้ใช้
+        user_id: รหัสผู้ใช้
+        
+    Returns:
+        Optional[Tuple[User, str]]: ข้อมูลผู้ใช้และ token หรือ None ถ้าไม่สำเร็จ
+        
+    Raises:
+        UserExistsError: ถ้ามีผู้ใช้รหัสนี้อยู่แล้ว
+    """
+    from src.utils.user_store import UserExistsError
+    
+    user = _new_user(user_data, user_id)
+    try:
+        token = get_user_store().create(user)
+    except UserExistsError:
+        raise
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการลงทะเบียนผู้ใช้ {user_id}: {str(e)}")
+        return None
+    
+    logger.info(f"สร้างผู้ใช้สำเร็จ: {user.name}")
+    return user, token
+
+def create_app_user(user_data: UserCreate) -> Optional[User]:
+    """
+    สร้างข้อมูลผู้ใช้เริ่มต้น
+    
+    Args:
+        user_data: ข้อมูลผู้ใช้
+        
+    Returns:
+        Optional[User]: ข้อมูลผู้ใช้ที่สร้างแล้ว หรือ None ถ้าไม่สำเร็จ
+    """
+    return create_user(user_data, DEFAULT_USER_ID)
+
+def delete_user(user_id: str) -> bool:
+    """
+    ลบข้อมูลผู้ใช้
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        
+    Returns:
+        bool: สถานะความสำเร็จ
+    """
+    try:
+        if get_user_store().delete(user_id):
+            logger.info(f"ลบข้อมูลผู้ใช้ {user_id} สำเร็จ")
+            return True
+        else:
+            logger.warning(f"ไม่พบข้อมูลผู้ใช้ {user_id} ที่จะลบ")
+            return False
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการลบข้อมูลผู้ใช้: {str(e)}")
+        return False
+
+def delete_app_user() -> bool:
+    """
+    ลบข้อมูลผู้ใช้เริ่มต้น
+    
+    Returns:
+        bool: สถานะความสำเร็จ
+    """
+    return delete_user(DEFAULT_USER_ID)
+
+def issue_user_token(user_id: str) -> Optional[str]:
+    """
+    สร้าง token สำหรับยืนยันตัวตนของผู้ใช้ (ส่งให้ client ครั้งเดียว เก็บเฉพาะ hash)
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        
+    Returns:
+        Optional[str]: token หรือ None ถ้าไม่สำเร็จ
+    """
+    try:
+        return get_user_store().issue_token(user_id)
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการสร้าง token ของผู้ใช้ {user_id}: {str(e)}")
+        return None
+
+def authenticate_user(user_id: str, token: Optional[str]) -> bool:
+    """
+    ยืนยันตัวตนของผู้ใช้ด้วย token
+    
+    ผู้ใช้ที่ไม่มี token (เช่น ข้อมูลที่สร้างก่อนมีระบบ token) ยืนยันตัวตนไม่ได้
+    จนกว่าผู้ดูแลจะออก token ใหม่ให้ผ่าน /admin/users/{user_id}/token
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        token: token จากคำขอ
+        
+    Returns:
+        bool: True ถ้ายืนยันตัวตนสำเร็จ
+    """
+    try:
+        return get_user_store().verify_token(user_id, token)
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการยืนยันตัวตนของผู้ใช้ {user_id}: {str(e)}")
+        return False
+
+def list_user_ids() -> List[str]:
+    """
+    รหัสผู้ใช้ทั้งหมดในระบบ
+    
+    Returns:
+        List[str]: รหัสผู้ใช้
+    """
+    try:
+        return get_user_store().user_ids()
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการดึงรายชื่อผู้ใช้: {str(e)}")
+        return []
+
+class ResumeUploadError(ValueError):
+    """ไฟล์ Resume ที่อัปโหลดไม่ผ่านการตรวจสอบ (นามสกุลไม่รองรับ)"""
+
+class ResumeTooLargeError(ResumeUploadError):
+    """ไฟล์ Resume ที่อัปโหลดมีขนาดเกินที่กำหนด"""
+
+# นามสกุลไฟล์ Resume ที่รับอัปโหลดผ่านการอัปโหลดแบบ streaming
+RESUME_EXTENSIONS = (".pdf", ".docx", ".doc", ".txt")
+
+def _new_resume_path(user_id: str, filename: str) -> str:
     """
-    บันทึกไฟล์ Resume สำหรับผู้ใช้แอพ
+    สร้างพาธไฟล์ Resume ใหม่ของผู้ใช้ (แยกโฟลเดอร์ตามผู้ใช้)
     
     Args:
+        user_id: รหัสผู้ใช้
+        filename: ชื่อไฟล์ที่อัปโหลด (ใช้เฉพาะนามสกุล)
+        
+    Returns:
+        str: พาธของไฟล์ Resume
+    """
+    user_resume_dir = os.path.join(RESUME_DIR, user_id)
+    os.makedirs(user_resume_dir, exist_ok=True)
+    
+    _, ext = os.path.splitext(filename or "")
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    return os.path.join(user_resume_dir, f"resume_{timestamp}{ext.lower()}")
+
+def _set_resume_path(user_id: str, file_path: str) -> None:
+    """
+    อัปเดต resume_path ในข้อมูลผู้ใช้ (ถ้ามีผู้ใช้) ภายใต้ล็อกของ shard
+    เพื่อไม่ให้ทับการเพิ่มทักษะจาก Resume หรือการแก้ไขโปรไฟล์ที่เกิดขึ้นพร้อมกัน
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        file_path: พาธของไฟล์ Resume
+    """
+    def set_path(user: User) -> bool:
+        user.resume_path = file_path
+        user.updated_at = datetime.now().isoformat()
+        return True
+    
+    modify_user(user_id, set_path)
+
+def save_resume(user_id: str, content, filename: str) -> Optional[str]:
+    """
+    บันทึกไฟล์ Resume ของผู้ใช้ (แยกโฟลเดอร์ตามผู้ใช้)
+    
+    Args:
+        user_id: รหัสผู้ใช้
         content: เนื้อหาของไฟล์ (bytes)
         filename: ชื่อไฟล์
         
@@ -228,19 +482,10 @@ def save_app_resume(content, filename: str) -> Optional[str]:
         Optional[str]: พาธของไฟล์ Resume หรือ None ถ้าไม่สำเร็จ
     """
     try:
-        # สร้างโฟลเดอร์ถ้ายังไม่มี
-        os.makedirs(RESUME_DIR, exist_ok=True)
-        
-        # สร้างชื่อไฟล์
-        _, ext = os.path.splitext(filename)
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        new_filename = f"resume_{timestamp}{ext}"
-        
-        # สร้างพาธไฟล์
-        file_path = os.path.join(RESUME_DIR, new_filename)
+        file_path = _new_resume_path(user_id, filename)
         
-        # บันทึกไฟล์
-        with open(file_path, 'wb') as f:
+        # บันทึกไฟล์ (แบบ atomic ไม่มีไฟล์ที่เขียนไม่ครบค้างอยู่ถ้าการอัปโหลดล้มเหลว)
+        with atomic_open(file_path, 'wb', encoding=None) as f:
             # ตรวจสอบว่าข้อมูลเป็น bytes หรือ BinaryIO
             if hasattr(content, 'read'):
                 # กรณีเป็น BinaryIO (file-like object)
@@ -250,14 +495,7 @@ def save_app_resume(content, filename: str) -> Optional[str]:
                 f.write(content)
         
         # อัปเดตข้อมูลผู้ใช้
-        user = get_app_user()
-        if user:
-            user_dict = user.dict()
-            user_dict["resume_path"] = file_path
-            user_dict["updated_at"] = datetime.now().isoformat()
-            
-            updated_user = User.parse_obj(user_dict)
-            save_app_user(updated_user)
+        _set_resume_path(user_id, file_path)
         
         logger.info(f"บันทึกไฟล์ Resume {file_path} สำเร็จ")
         return file_path
@@ -265,16 +503,108 @@ def save_app_resume(content, filename: str) -> Optional[str]:
         logger.error(f"เกิดข้อผิดพลาดในการบันทึกไฟล์ Resume: {str(e)}")
         return None
 
-def get_app_resume_path() -> Optional[str]:
+async def save_resume_stream(user_id: str,
+                             chunks: AsyncIterator[bytes],
+                             filename: str,
+                             max_bytes: Optional[int] = None) -> str:
+    """
+    บันทึกไฟล์ Resume จากข้อมูลที่ทยอยส่งมาทีละ chunk โดยไม่อ่านทั้งไฟล์เข้าหน่วยความจำ
+    
+    การเขียนไฟล์ทำใน thread เพื่อไม่บล็อก event loop และเป็นแบบ atomic:
+    ถ้าไฟล์ใหญ่เกินหรือการอัปโหลดขาดกลางทาง จะไม่มีไฟล์ค้างและ resume_path เดิมไม่เปลี่ยน
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        chunks: ข้อมูลของไฟล์ทีละ chunk
+        filename: ชื่อไฟล์ที่อัปโหลด
+        max_bytes: ขนาดไฟล์สูงสุด (ไบต์) ถ้าไม่ระบุจะใช้ RESUME_MAX_BYTES
+        
+    Returns:
+        str: พาธของไฟล์ Resume
+        
+    Raises:
+        ResumeUploadError: นามสกุลไฟล์ไม่รองรับ
+        ResumeTooLargeError: ไฟล์มีขนาดเกิน max_bytes
     """
-    ดึงพาธของไฟล์ Resume
+    import asyncio
     
+    if max_bytes is None:
+        from src.utils.config import RESUME_MAX_BYTES
+        max_bytes = RESUME_MAX_BYTES
+    
+    _, ext = os.path.splitext(filename or "")
+    if ext.lower() not in RESUME_EXTENSIONS:
+        raise ResumeUploadError(f"ไม่รองรับไฟล์ Resume นามสกุล '{ext}' (รองรับ {', '.join(RESUME_EXTENSIONS)})")
+    
+    file_path = _new_resume_path(user_id, filename)
+    writer = atomic_open(file_path, 'wb', encoding=None)
+    f = await asyncio.to_thread(writer.__enter__)
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise ResumeTooLargeError(f"ไฟล์ Resume มีขนาดเกิน {max_bytes} ไบต์")
+            await asyncio.to_thread(f.write, chunk)
+    except BaseException as e:
+        # ลบไฟล์ชั่วคราว ไฟล์ Resume เดิมไม่ถูกแตะต้อง
+        await asyncio.to_thread(writer.__exit__, type(e), e, e.__traceback__)
+        raise
+    # fsync และเปลี่ยนชื่อไฟล์
+    await asyncio.to_thread(writer.__exit__, None, None, None)
+    
+    await asyncio.to_thread(_set_resume_path, user_id, file_path)
+    
+    logger.info(f"บันทึกไฟล์ Resume {file_path} ({size} ไบต์) สำเร็จ")
+    return file_path
+
+async def iter_upload_chunks(upload, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    อ่านไฟล์ที่อัปโหลด (เช่น fastapi.UploadFile) ทีละ chunk
+    
+    Args:
+        upload: object ที่มีเมธอด async read(size)
+        chunk_size: ขนาดที่อ่านต่อครั้ง (ไบต์) ถ้าไม่ระบุจะใช้ RESUME_UPLOAD_CHUNK_SIZE
+        
+    Returns:
+        AsyncIterator[bytes]: ข้อมูลทีละ chunk
+    """
+    if chunk_size is None:
+        from src.utils.config import RESUME_UPLOAD_CHUNK_SIZE
+        chunk_size = RESUME_UPLOAD_CHUNK_SIZE
+    
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+def save_app_resume(content, filename: str) -> Optional[str]:
+    """
+    บันทึกไฟล์ Resume สำหรับผู้ใช้เริ่มต้น
+    
+    Args:
+        content: เนื้อหาของไฟล์ (bytes)
+        filename: ชื่อไฟล์
+        
+    Returns:
+        Optional[str]: พาธของไฟล์ Resume หรือ None ถ้าไม่สำเร็จ
+    """
+    return save_resume(DEFAULT_USER_ID, content, filename)
+
+def get_resume_path(user_id: str) -> Optional[str]:
+    """
+    ดึงพาธของไฟล์ Resume ของผู้ใช้
+    
+    Args:
+        user_id: รหัสผู้ใช้
+        
     Returns:
         Optional[str]: พาธของไฟล์ Resume หรือ None ถ้าไม่พบ
     """
     try:
         # ดึงข้อมูลผู้ใช้
-        user = get_app_user()
+        user = get_user(user_id)
         if not user:
             logger.warning("ไม่พบข้อมูลผู้ใช้")
             return None
@@ -295,6 +625,66 @@ def get_app_resume_path() -> Optional[str]:
         logger.error(f"เกิดข้อผิดพลาดในการดึงพาธของไฟล์ Resume: {str(e)}")
         return None
 
+def get_app_resume_path() -> Optional[str]:
+    """
+    ดึงพาธของไฟล์ Resume ของผู้ใช้เริ่มต้น
+    
+    Returns:
+        Optional[str]: พาธของไฟล์ Resume หรือ None ถ้าไม่พบ
+    """
+    return get_resume_path(DEFAULT_USER_ID)
+
+_chat_store = None
+_chat_store_lock = threading.Lock()
+
+def get_chat_store():
+    """
+    ดึง ChatHistoryStore ที่ใช้ร่วมกันทั้งแอป (สร้างเมื่อเรียกใช้ครั้งแรก)
+    
+    Returns:
+        ChatHistoryStore: ที่เก็บประวัติการสนทนา
+    """
+    global _chat_store
+    if _chat_store is None:
+        with _chat_store_lock:
+            if _chat_store is None:
+                from src.utils.chat_store import ChatHistoryStore
+                _chat_store = ChatHistoryStore(CHAT_DB_FILE, legacy_chats_dir=CHATS_DIR)
+    return _chat_store
+
+_chat_writer = None
+
+def get_chat_writer():
+    """
+    ดึง ChatHistoryWriter (คิวเขียนแบบ write-behind) ที่ใช้ร่วมกันทั้งแอป
+    
+    Returns:
+        ChatHistoryWriter: คิวเขียนประวัติการสนทนา
+    """
+    global _chat_writer
+    if _chat_writer is None:
+        with _chat_store_lock:
+            if _chat_writer is None:
+                from src.utils.chat_store import ChatHistoryWriter
+                from src.utils.config import (
+                    CHAT_WRITE_BATCH_SIZE, CHAT_WRITE_FLUSH_INTERVAL,
+                    CHAT_WRITE_MAX_ATTEMPTS, CHAT_WRITE_MAX_RETRY_PENDING
+                )
+                _chat_writer = ChatHistoryWriter(
+                    get_chat_store(),
+                    max_batch=CHAT_WRITE_BATCH_SIZE,
+                    flush_interval=CHAT_WRITE_FLUSH_INTERVAL,
+                    max_attempts=CHAT_WRITE_MAX_ATTEMPTS,
+                    max_retry_pending=CHAT_WRITE_MAX_RETRY_PENDING,
+                    dead_letter_path=CHAT_DEAD_LETTER_FILE
+                )
+    return _chat_writer
+
+def _flush_pending_chats() -> None:
+    # ให้การอ่านหลายรายการเห็นข้อความที่ยังค้างอยู่ในคิวเขียน (เขียนลงดิสก์ ห้ามเรียกใน event loop)
+    if _chat_writer is not None and _chat_writer.pending_count():
+        _chat_writer.flush()
+
 def save_chat_history(chat_history: ChatHistory) -> bool:
     """
     บันทึกประวัติการสนทนา
@@ -306,16 +696,7 @@ def save_chat_history(chat_history: ChatHistory) -> bool:
         bool: สถานะความสำเร็จ
     """
     try:
-        # สร้างโฟลเดอร์ถ้ายังไม่มี
-        os.makedirs(CHATS_DIR, exist_ok=True)
-        
-        # กำหนดชื่อไฟล์
-        chat_file = os.path.join(CHATS_DIR, f"{chat_history.id}.json")
-        
-        # แปลงเป็น dict แล้วบันทึก
-        chat_dict = chat_history.dict()
-        with open(chat_file, 'w', encoding='utf-8') as f:
-            json.dump(chat_dict, f, ensure_ascii=False, indent=2)
+        get_chat_store().save(chat_history)
         
         logger.info(f"บันทึกประวัติการสนทนา {chat_history.id} สำเร็จ")
         return True
@@ -323,38 +704,106 @@ def save_chat_history(chat_history: ChatHistory) -> bool:
         logger.error(f"เกิดข้อผิดพลาดในการบันทึกประวัติการสนทนา: {str(e)}")
         return False
 
-def get_chat_history(limit: int = 10) -> List[ChatHistory]:
+def get_chat_by_id(chat_id: str) -> Optional[ChatHistory]:
     """
-    ดึงประวัติการสนทนา
+    ดึงประวัติการสนทนาตามรหัสการสนทนา
     
     Args:
-        limit: จำนวนประวัติการสนทนาที่ต้องการ
+        chat_id: รหัสการสนทนา
         
     Returns:
-        List[ChatHistory]: ประวัติการสนทนา
+        Optional[ChatHistory]: ประวัติการสนทนา หรือ None ถ้าไม่พบ
     """
     try:
-        chat_histories = []
+        # รวมข้อความที่ยังค้างในคิวเขียนโดยไม่ต้อง flush (ไม่รอดิสก์)
+        if _chat_writer is not None:
+            return _chat_writer.read_through(chat_id)
+        return get_chat_store().get(chat_id)
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการดึงประวัติการสนทนา {chat_id}: {str(e)}")
+        return None
+
+def get_chat_owner(chat_id: str) -> Optional[str]:
+    """
+    ดึงรหัสผู้ใช้เจ้าของการสนทนา
+    
+    Args:
+        chat_id: รหัสการสนทนา
         
-        # ตรวจสอบว่ามีโฟลเดอร์ประวัติการสนทนาหรือไม่
-        if not os.path.exists(CHATS_DIR):
-            logger.warning("ไม่พบโฟลเดอร์ประวัติการสนทนา")
-            return []
+    Returns:
+        Optional[str]: รหัสผู้ใช้ หรือ None ถ้ายังไม่มีการสนทนานี้
+    """
+    try:
+        # การสนทนาใหม่อาจยังอยู่ในคิวเขียน
+        if _chat_writer is not None:
+            owner = _chat_writer.pending_owner(chat_id)
+            if owner is not None:
+                return owner
+        return get_chat_store().owner(chat_id)
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการดึงเจ้าของการสนทนา {chat_id}: {str(e)}")
+        return None
+
+def append_chat_history(chat_history: ChatHistory) -> bool:
+    """
+    เพิ่มข้อความต่อท้ายประวัติการสนทนาเดิม (สร้างใหม่ถ้ายังไม่มี)
+    
+    Args:
+        chat_history: ประวัติการสนทนาที่มีเฉพาะข้อความใหม่
         
-        # อ่านไฟล์ทั้งหมดในโฟลเดอร์
-        for filename in os.listdir(CHATS_DIR):
-            if filename.endswith('.json'):
-                chat_file = os.path.join(CHATS_DIR, filename)
-                with open(chat_file, 'r', encoding='utf-8') as f:
-                    chat_data = json.load(f)
-                    chat_history = ChatHistory.parse_obj(chat_data)
-                    chat_histories.append(chat_history)
+    Returns:
+        bool: สถานะความสำเร็จ
+    """
+    try:
+        get_chat_store().append(chat_history)
         
-        # เรียงตามเวลา (ล่าสุดก่อน)
-        chat_histories.sort(key=lambda x: x.timestamp, reverse=True)
+        logger.info(f"เพิ่มข้อความในประวัติการสนทนา {chat_history.id} สำเร็จ")
+        return True
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการบันทึกประวัติการสนทนา: {str(e)}")
+        return False
+
+def enqueue_chat_history(chat_history: ChatHistory) -> None:
+    """
+    ส่งข้อความใหม่ของการสนทนาเข้าคิวเขียนแบบ write-behind (ไม่รอการเขียนดิสก์)
+    
+    Args:
+        chat_history: ประวัติการสนทนาที่มีเฉพาะข้อความใหม่
+    """
+    try:
+        get_chat_writer().submit(chat_history)
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการบันทึกประวัติการสนทนา: {str(e)}")
+
+def get_chat_history(limit: int = 10,
+                     before: Optional[str] = None,
+                     after: Optional[str] = None,
+                     since: Optional[str] = None,
+                     until: Optional[str] = None,
+                     personality: Optional[str] = None,
+                     user_id: Optional[str] = None) -> List[ChatHistory]:
+    """
+    ดึงประวัติการสนทนาล่าสุด (ใช้ index ตามเวลา อ่านเฉพาะ limit รายการ)
+    เขียนคิวที่ค้างลงดิสก์ก่อนอ่าน ผู้เรียกใน event loop ควรเรียกผ่าน asyncio.to_thread
+    
+    Args:
+        limit: จำนวนประวัติการสนทนาที่ต้องการ
+        before: cursor ("timestamp|id") เอาเฉพาะการสนทนาที่เก่ากว่า
+        after: cursor ("timestamp|id") เอาเฉพาะการสนทนาที่ใหม่กว่า
+        since: เวลาเริ่มต้นของช่วง (รวม)
+        until: เวลาสิ้นสุดของช่วง (ไม่รวม)
+        personality: บุคลิกของ AI
+        user_id: รหัสผู้ใช้เจ้าของการสนทนา (ไม่ระบุ = ทุกผู้ใช้)
         
-        # จำกัดจำนวน
-        chat_histories = chat_histories[:limit]
+    Returns:
+        List[ChatHistory]: ประวัติการสนทนา (ล่าสุดก่อน)
+    """
+    try:
+        _flush_pending_chats()
+        chat_histories = get_chat_store().latest(
+            limit, before=before, after=after, since=since, until=until, personality=personality,
+            user_id=user_id
+        )
         
         logger.info(f"ดึงประวัติการสนทนา {len(chat_histories)} รายการ สำเร็จ")
         return chat_histories
@@ -362,24 +811,63 @@ def get_chat_history(limit: int = 10) -> List[ChatHistory]:
         logger.error(f"เกิดข้อผิดพลาดในการดึงประวัติการสนทนา: {str(e)}")
         return []
 
-def create_chat_message(query: str, response: str) -> ChatHistory:
+def get_chat_history_summaries(limit: int = 10,
+                               before: Optional[str] = None,
+                               after: Optional[str] = None,
+                               since: Optional[str] = None,
+                               until: Optional[str] = None,
+                               personality: Optional[str] = None,
+                               user_id: Optional[str] = None) -> List[ChatHistorySummary]:
+    """
+    ดึงสรุปประวัติการสนทนา (ไม่มีเนื้อหาข้อความ) รองรับตัวกรองเดียวกับ get_chat_history
+    เขียนคิวที่ค้างลงดิสก์ก่อนอ่าน ผู้เรียกใน event loop ควรเรียกผ่าน asyncio.to_thread
+    
+    Args:
+        limit: จำนวนประวัติการสนทนาที่ต้องการ
+        before: cursor ("timestamp|id") เอาเฉพาะการสนทนาที่เก่ากว่า
+        after: cursor ("timestamp|id") เอาเฉพาะการสนทนาที่ใหม่กว่า
+        since: เวลาเริ่มต้นของช่วง (รวม)
+        until: เวลาสิ้นสุดของช่วง (ไม่รวม)
+        personality: บุคลิกของ AI
+        user_id: รหัสผู้ใช้เจ้าของการสนทนา (ไม่ระบุ = ทุกผู้ใช้)
+        
+    Returns:
+        List[ChatHistorySummary]: สรุปประวัติการสนทนา (ล่าสุดก่อน)
+    """
+    try:
+        _flush_pending_chats()
+        return get_chat_store().summaries(
+            limit, before=before, after=after, since=since, until=until, personality=personality,
+            user_id=user_id
+        )
+    except Exception as e:
+        logger.error(f"เกิดข้อผิดพลาดในการดึงสรุปประวัติการสนทนา: {str(e)}")
+        return []
+
+def create_chat_message(query: str, response: str, chat_id: Optional[str] = None,
+                        personality: Optional[str] = None,
+                        user_id: str = DEFAULT_USER_ID) -> ChatHistory:
     """
     สร้างประวัติการสนทนาใหม่
     
     Args:
         query: คำถาม
         response: คำตอบ
+        chat_id: รหัสการสนทนาเดิม (ถ้าไม่ระบุจะสร้างรหัสใหม่)
+        personality: บุคลิกของ AI ที่ใช้ตอบ
+        user_id: รหัสผู้ใช้เจ้าของการสนทนา
         
     Returns:
         ChatHistory: ประวัติการสนทนาที่สร้างแล้ว
     """
-    chat_id = str(uuid.uuid4())
+    chat_id = chat_id or str(uuid.uuid4())
     timestamp = datetime.now().isoformat()
     
     chat_history = ChatHistory(
         id=chat_id,
-        user_id="app_user",  # ใช้ ID คงที่
+        user_id=user_id,
         timestamp=timestamp,
+        personality=personality,
         messages=[
             ChatMessage(role="user", content=query),
             ChatMessage(role="assistant", content=response)
@@ -387,37 +875,3 @@ def create_chat_message(query: str, response: str) -> ChatHistory:
     )
     
     return chat_history
-
-# สำหรับ backward compatibility อาจจะยังคงฟังก์ชันเดิมไว้
-def get_user(user_id: str) -> Optional[User]:
-    """
-    ดึงข้อมูลผู้ใช้
-    
-    Args:
-        user_id: รหัสผู้ใช้
-        
-    Returns:
-        Optional[User]: ข้อมูลผู้ใช้ หรือ None ถ้าไม่พบ
-    """
-    if user_id == "app_user":
-        return get_app_user()
-    return None
-
-def delete_app_user() -> bool:
-    """
-    ลบข้อมูลผู้ใช้
-    
-    Returns:
-        bool: สถานะความสำเร็จ
-    """
-    try:
-        if os.path.exists(USER_FILE):
-            os.remove(USER_FILE)
-            logger.info("ลบข้อมูลผู้ใช้สำเร็จ")
-            return True
-        else:
-            logger.warning("ไม่พบไฟล์ข้อมูลผู้ใช้ที่จะลบ")
-            return False
-    except Exception as e:
-        logger.error(f"เกิดข้อผิดพลาดในการลบข้อมูลผู้ใช้: {str(e)}")
-        return False
\ No newline at end of file
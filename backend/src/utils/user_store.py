@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-user profile store for Career AI Advisor.
+
+Profiles are appended as JSON lines to shard files chosen by a hash prefix of
+the user id (``users/profiles/<shard>.jsonl``). Each process keeps an
+id -> (offset, length) index per shard, so reading a profile is a single read
+of one record. Writers append under an exclusive lock on the shard file, so
+several API processes can share one directory; a reader notices records
+appended by another process from the shard size and scans only the new tail.
+Superseded records are dropped by compacting a shard into a temp file that
+atomically replaces the old one.
+"""
+
+import os
+import re
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: ล็อกได้เฉพาะภายใน process เดียว
+    fcntl = None
+
+from src.utils.logger import get_logger
+from src.utils.atomic_write import atomic_open
+from src.utils import json_codec
+from src.api.models import User
+
+# ตั้งค่า logger
+logger = get_logger("user_store")
+
+# รูปแบบรหัสผู้ใช้ที่รับได้ (ใช้เป็นชื่อโฟลเดอร์ของ Resume ด้วย)
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# จำนวนตัวอักษรของ hash ที่ใช้เลือก shard (2 ตัว = 256 shard)
+SHARD_PREFIX_CHARS = 2
+
+# compact shard เมื่อมีเรคคอร์ดที่ถูกแทนที่แล้วเกินจำนวนนี้ และเกินจำนวนเรคคอร์ดที่ใช้งานอยู่
+COMPACT_MIN_GARBAGE = 64
+
+
+class UserExistsError(ValueError):
+    """เกิดขึ้นเมื่อสร้างผู้ใช้ด้วยรหัสที่มีอยู่แล้ว"""
+
+
+def is_valid_user_id(user_id: str) -> bool:
+    """
+    ตรวจสอบรูปแบบรหัสผู้ใช้
+
+    Args:
+        user_id: รหัสผู้ใช้
+
+    Returns:
+        bool: True ถ้าใช้ได้
+    """
+    return bool(user_id) and USER_ID_PATTERN.match(user_id) is not None
+
+
+def hash_token(token: str) -> str:
+    """
+    แปลง token ของผู้ใช้เป็นค่า hash สำหรับเก็บลงดิสก์
+
+    Args:
+        token: token ของผู้ใช้
+
+    Returns:
+        str: sha256 ของ token
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class _Entry:
+    """ตำแหน่งของเรคคอร์ดล่าสุดของผู้ใช้ใน shard"""
+
+    __slots__ = ("offset", "length", "token_hash")
+
+    def __init__(self, offset: int, length: int, token_hash: Optional[str]):
+        self.offset = offset
+        self.length = length
+        self.token_hash = token_hash
+
+
+class _ShardIndex:
+    """index ของ shard หนึ่งไฟล์ (อ้างอิงกับ inode ของไฟล์ที่สแกน)"""
+
+    def __init__(self):
+        self.inode: Optional[int] = None
+        # scanned = ไบต์ที่นำเข้า index แล้ว, size = ขนาดไฟล์ที่อ่านล่าสุด (รวมบรรทัดที่ยังเขียนไม่จบ)
+        self.scanned = 0
+        self.size = 0
+        self.entries: Dict[str, _Entry] = {}
+        self.garbage = 0
+        self.lock = threading.RLock()
+
+    def reset(self, inode: Optional[int]) -> None:
+        self.inode = inode
+        self.scanned = 0
+        self.size = 0
+        self.entries = {}
+        self.garbage = 0
+
+
+class UserStore:
+    """
+    ที่เก็บข้อมูลผู้ใช้หลายคน แบ่งไฟล์ตาม prefix ของ hash รหัสผู้ใช้
+
+    ผู้เรียกได้รับสำเนาของ User เสมอ ข้อมูลที่แคชไว้จึงไม่ถูกแก้ไขจากภายนอก
+    """
+
+    def __init__(self, base_dir: str, cache_size: int = 1024):
+        """
+        เริ่มต้นใช้งาน UserStore
+
+        Args:
+            base_dir: โฟลเดอร์เก็บไฟล์ shard
+            cache_size: จำนวน User ที่แปลงแล้วที่เก็บไว้ในหน่วยความจำ
+        """
+        self.base_dir = base_dir
+        self.cache_size = max(0, cache_size)
+        os.makedirs(base_dir, exist_ok=True)
+
+        self._shards: Dict[str, _ShardIndex] = {}
+        self._shards_lock = threading.Lock()
+        # user_id -> (inode, offset, User) ใช้ได้ตราบที่ index ยังชี้ไปที่เรคคอร์ดเดิม
+        self._cache: "OrderedDict[str, Tuple[int, int, User]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # shard และ index
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def shard_for(user_id: str) -> str:
+        """
+        เลือก shard ของผู้ใช้ (prefix ของ hash ทำให้ผู้ใช้กระจายเท่า ๆ กัน)
+
+        Args:
+            user_id: รหัสผู้ใช้
+
+        Returns:
+            str: ชื่อ shard
+        """
+        return hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:SHARD_PREFIX_CHARS]
+
+    def _shard_path(self, shard: str) -> str:
+        return os.path.join(self.base_dir, f"{shard}.jsonl")
+
+    def _shard_index(self, shard: str) -> _ShardIndex:
+        index = self._shards.get(shard)
+        if index is None:
+            with self._shards_lock:
+                index = self._shards.setdefault(shard, _ShardIndex())
+        return index
+
+    def _apply(self, index: _ShardIndex, data: bytes, base_offset: int) -> int:
+        """เพิ่มเรคคอร์ดที่สมบูรณ์ (จบด้วยขึ้นบรรทัดใหม่) เข้า index คืนจำนวนไบต์ที่ใช้ไป"""
+        position = 0
+        while True:
+            end = data.find(b"\n", position)
+            if end < 0:
+                return position
+            line = data[position:end]
+            if line.strip():
+                try:
+                    record = json_codec.loads(line)
+                    user_id = record["id"]
+                except (ValueError, KeyError, TypeError):
+                    # เรคคอร์ดที่เขียนไม่สมบูรณ์ (เช่น process ล่มระหว่างเขียน)
+                    logger.warning(f"ข้ามเรคคอร์ดที่เสียหายใน shard ที่ตำแหน่ง {base_offset + position}")
+                    index.garbage += 1
+                else:
+                    # เรคคอร์ดเดิมของผู้ใช้ และเรคคอร์ดการลบ ไม่ต้องเก็บไว้เมื่อ compact
+                    if user_id in index.entries:
+                        index.garbage += 1
+                    if record.get("deleted"):
+                        index.entries.pop(user_id, None)
+                        index.garbage += 1
+                    else:
+                        index.entries[user_id] = _Entry(
+                            base_offset + position, end - position, record.get("token_hash")
+                        )
+            position = end + 1
+
+    def _refresh(self, shard: str) -> _ShardIndex:
+        """
+        ทำให้ index ตรงกับไฟล์ shard บนดิสก์
+
+        ใช้ os.stat ครั้งเดียว ถ้าไฟล์ยาวขึ้นจะอ่านเฉพาะส่วนที่เพิ่มมา
+        ถ้าไฟล์ถูกแทนที่ (compact) จะสแกนใหม่ทั้งไฟล์
+        """
+        index = self._shard_index(shard)
+        path = self._shard_path(shard)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with index.lock:
+                if index.inode is not None:
+                    index.reset(None)
+            return index
+
+        if stat.st_ino == index.inode and stat.st_size == index.size:
+            return index
+
+        with index.lock:
+            with open(path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != index.inode:
+                    index.reset(inode)
+                f.seek(index.scanned)
+                data = f.read()
+            index.size = index.scanned + len(data)
+            index.scanned += self._apply(index, data, index.scanned)
+        return index
+
+    @contextmanager
+    def _locked_shard(self, shard: str):
+        """
+        เปิดไฟล์ shard แบบล็อกการเขียน (ทั้งระหว่าง thread และระหว่าง process)
+
+        ถ้าไฟล์ถูก compact ระหว่างรอล็อก จะเปิดไฟล์ใหม่แล้วล็อกอีกครั้ง
+        """
+        index = self._shard_index(shard)
+        path = self._shard_path(shard)
+        with index.lock:
+            while True:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                    if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                        break
+                except FileNotFoundError:
+                    pass
+                os.close(fd)
+            try:
+                yield fd
+            finally:
+                os.close(fd)
+
+    def _write_locked(self, fd: int, record: dict) -> None:
+        """เขียนเรคคอร์ดต่อท้าย shard ที่ล็อกอยู่แล้ว (เขียนครั้งเดียวทั้งบรรทัด แล้ว fsync)"""
+        payload = json_codec.dumps(record, pretty=False) + b"\n"
+        size = os.fstat(fd).st_size
+        # ปิดบรรทัดที่เขียนค้างไว้จากการล่มครั้งก่อน เพื่อไม่ให้ต่อกับเรคคอร์ดใหม่
+        if size and os.pread(fd, 1, size - 1) != b"\n":
+            payload = b"\n" + payload
+        os.write(fd, payload)
+        os.fsync(fd)
+
+    def _append(self, shard: str, record: dict) -> None:
+        """เขียนเรคคอร์ดต่อท้าย shard แบบ atomic"""
+        with self._locked_shard(shard) as fd:
+            self._write_locked(fd, record)
+            index = self._refresh(shard)
+        if index.garbage >= COMPACT_MIN_GARBAGE and index.garbage > len(index.entries):
+            self.compact(shard)
+
+    def _read_record(self, shard: str, user_id: str) -> Optional[Tuple[int, _Entry, dict]]:
+        for _ in range(3):
+            index = self._refresh(shard)
+            entry = index.entries.get(user_id)
+            if entry is None:
+                return None
+            inode = index.inode
+            try:
+                with open(self._shard_path(shard), 'rb') as f:
+                    # ไฟล์ถูก compact หลังจาก refresh: ตำแหน่งเดิมใช้ไม่ได้ ลองใหม่
+                    if os.fstat(f.fileno()).st_ino != inode:
+                        continue
+                    f.seek(entry.offset)
+                    data = f.read(entry.length)
+            except FileNotFoundError:
+                continue
+            return inode, entry, json_codec.loads(data)
+        raise RuntimeError(f"ไม่สามารถอ่านข้อมูลผู้ใช้ {user_id} ได้ (shard ถูกเขียนทับต่อเนื่อง)")
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def exists(self, user_id: str) -> bool:
+        """
+        ตรวจสอบว่ามีผู้ใช้หรือไม่
+
+        Args:
+            user_id: รหัสผู้ใช้
+
+        Returns:
+            bool: True ถ้ามี
+        """
+        return user_id in self._refresh(self.shard_for(user_id)).entries
+
+    def get(self, user_id: str) -> Optional[User]:
+        """
+        ดึงข้อมูลผู้ใช้ (อ่านและแปลงเรคคอร์ดเฉพาะเมื่อเรคคอร์ดเปลี่ยนจากที่แคชไว้)
+
+        Args:
+            user_id: รหัสผู้ใช้
+
+        Returns:
+            Optional[User]: สำเนาข้อมูลผู้ใช้ หรือ None ถ้าไม่พบ
+        """
+        shard = self.shard_for(user_id)
+        index = self._refresh(shard)
+        entry = index.entries.get(user_id)
+        if entry is None:
+            return None
+
+        with self._cache_lock:
+            cached = self._cache.get(user_id)
+            if cached is not None and cached[0] == index.inode and cached[1] == entry.offset:
+                self._cache.move_to_end(user_id)
+                return cached[2].copy(deep=True)
+
+        found = self._read_record(shard, user_id)
+        if found is None:
+            return None
+        inode, entry, record = found
+        user = User.parse_obj(record["user"])
+        self._remember(user_id, inode, entry.offset, user)
+        return user.copy(deep=True)
+
+    def _remember(self, user_id: str, inode: int, offset: int, user: User) -> None:
+        if not self.cache_size:
+            return
+        with self._cache_lock:
+            self._cache[user_id] = (inode, offset, user)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _remember_written(self, shard: str, user: User) -> _ShardIndex:
+        """write-through: เรคคอร์ดที่เพิ่งเขียน (ภายใต้ล็อกของ shard) คือเวอร์ชันล่าสุด"""
+        index = self._refresh(shard)
+        entry = index.entries.get(user.id)
+        if entry is not None:
+            self._remember(user.id, index.inode, entry.offset, user.copy(deep=True))
+        return index
+
+    def put(self, user: User, token_hash: Optional[str] = None) -> None:
+        """
+        บันทึกข้อมูลผู้ใช้ (แทนที่เรคคอร์ดเดิม)
+
+        Args:
+            user: ข้อมูลผู้ใช้
+            token_hash: hash ของ token ใหม่ (ไม่ระบุ = ใช้ token เดิม)
+        """
+        if not is_valid_user_id(user.id):
+            raise ValueError(f"รหัสผู้ใช้ไม่ถูกต้อง: {user.id!r}")
+        shard = self.shard_for(user.id)
+        record = {"id": user.id, "user": user.dict()}
+        with self._locked_shard(shard) as fd:
+            # อ่าน token เดิมภายใต้ล็อก ไม่ให้ทับ token ที่เพิ่งออกให้พร้อมกัน
+            if token_hash is None:
+                entry = self._refresh(shard).entries.get(user.id)
+                token_hash = entry.token_hash if entry else None
+            if token_hash:
+                record["token_hash"] = token_hash
+            self._write_locked(fd, record)
+            index = self._remember_written(shard, user)
+        if index.garbage >= COMPACT_MIN_GARBAGE and index.garbage > len(index.entries):
+            self.compact(shard)
+
+    def delete(self, user_id: str) -> bool:
+        """
+        ลบข้อมูลผู้ใช้
+
+        Args:
+            user_id: รหัสผู้ใช้
+
+        Returns:
+            bool: True ถ้ามีผู้ใช้และลบแล้ว
+        """
+        if not self.exists(user_id):
+            return False
+        self._append(self.shard_for(user_id), {"id": user_id, "deleted": True})
+        with self._cache_lock:
+            self._cache.pop(user_id, None)
+        return True
+
+    def issue_token(self, user_id: str) -> Optional[str]:
+        """
+        สร้าง token ใหม่ให้ผู้ใช้ (token เดิมใช้ไม่ได้อีก) เก็บเฉพาะค่า hash
+
+        Args:
+            user_id: รหัสผู้ใช้
+
+        Returns:
+            Optional[str]: token ใหม่ หรือ None ถ้าไม่พบผู้ใช้
+        """
+        user = self.get(user_id)
+        if user is None:
+            return None
+        token = secrets.token_urlsafe(32)
+        self.put(user, token_hash=hash_token(token))
+        return token
+
+    def create(self, user: User) -> str:
+        """
+        สร้างผู้ใช้ใหม่พร้อม token ในเรคคอร์ดเดียว (ตรวจและเขียนภายใต้ล็อกของ shard)
+
+        Args:
+            user: ข้อมูลผู้ใช้ใหม่
+
+        Returns:
+            str: token ของผู้ใช้ (ส่งให้ client ครั้งเดียว เก็บเฉพาะค่า hash)
+
+        Raises:
+            UserExistsError: ถ้ามีผู้ใช้รหัสนี้อยู่แล้ว
+        """
+        if not is_valid_user_id(user.id):
+            raise ValueError(f"รหัสผู้ใช้ไม่ถูกต้อง: {user.id!r}")
+        shard = self.shard_for(user.id)
+        token = secrets.token_urlsafe(32)
+        with self._locked_shard(shard) as fd:
+            if user.id in self._refresh(shard).entries:
+                raise UserExistsError(f"มีผู้ใช้รหัส {user.id} อยู่แล้ว")
+            self._write_locked(fd, {"id": user.id, "user": user.dict(), "token_hash": hash_token(token)})
+            self._remember_written(shard, user)
+        return token
+
+    def update(self, user_id: str, mutate: Callable[[User], bool]) -> Optional[User]:
+        """
+        แก้ไขข้อมูลผู้ใช้แบบอ่าน-แก้-เขียนภายใต้ล็อกของ shard
+        (การบันทึกที่เกิดขึ้นพร้อมกันจะรอจนเขียนเสร็จ จึงไม่ทับหรือถูกทับการแก้ไขนี้)
+
+        Args:
+            user_id: รหัสผู้ใช้
+            mutate: ฟังก์ชันที่แก้ไข User ที่อ่านล่าสุด คืน True ถ้ามีการเปลี่ยนแปลงที่ต้องบันทึก
+
+        Returns:
+            Optional[User]: ข้อมูลผู้ใช้หลังแก้ไข หรือ None ถ้าไม่พบผู้ใช้
+        """
+        shard = self.shard_for(user_id)
+        with self._locked_shard(shard) as fd:
+            user = self.get(user_id)
+            if user is None:
+                return None
+            if not mutate(user):
+                return user
+            record = {"id": user_id, "user": user.dict()}
+            entry = self._refresh(shard).entries.get(user_id)
+            if entry is not None and entry.token_hash:
+                record["token_hash"] = entry.token_hash
+            self._write_locked(fd, record)
+            index = self._remember_written(shard, user)
+        if index.garbage >= COMPACT_MIN_GARBAGE and index.garbage > len(index.entries):
+            self.compact(shard)
+        return user
+
+    def has_token(self, user_id: str) -> bool:
+        """ผู้ใช้มี token สำหรับยืนยันตัวตนหรือไม่"""
+        entry = self._refresh(self.shard_for(user_id)).entries.get(user_id)
+        return entry is not None and bool(entry.token_hash)
+
+    def verify_token(self, user_id: str, token: Optional[str]) -> bool:
+        """
+        ตรวจสอบ token ของผู้ใช้ (ใช้ index ในหน่วยความจำ ไม่ต้องอ่านเรคคอร์ด)
+
+        Args:
+            user_id: รหัสผู้ใช้
+            token: token จากคำขอ
+
+        Returns:
+            bool: True ถ้าผู้ใช้มี token และตรงกัน
+        """
+        entry = self._refresh(self.shard_for(user_id)).entries.get(user_id)
+        if entry is None or not entry.token_hash or not token:
+            return False
+        return secrets.compare_digest(entry.token_hash, hash_token(token))
+
+    def _shard_names(self) -> List[str]:
+        return sorted(
+            filename[:-len(".jsonl")]
+            for filename in os.listdir(self.base_dir)
+            if filename.endswith(".jsonl")
+        )
+
+    def user_ids(self) -> List[str]:
+        """
+        รหัสผู้ใช้ทั้งหมด
+
+        Returns:
+            List[str]: รหัสผู้ใช้
+        """
+        ids: List[str] = []
+        for shard in self._shard_names():
+            ids.extend(self._refresh(shard).entries.keys())
+        return ids
+
+    def iter_users(self) -> Iterator[User]:
+        """
+        วนอ่านข้อมูลผู้ใช้ทั้งหมด
+
+        Returns:
+            Iterator[User]: ข้อมูลผู้ใช้ทีละคน
+        """
+        for user_id in self.user_ids():
+            user = self.get(user_id)
+            if user is not None:
+                yield user
+
+    def count(self) -> int:
+        """จำนวนผู้ใช้ทั้งหมด"""
+        return sum(len(self._refresh(shard).entries) for shard in self._shard_names())
+
+    def compact(self, shard: str) -> None:
+        """
+        เขียน shard ใหม่ให้เหลือเฉพาะเรคคอร์ดล่าสุดของผู้ใช้แต่ละคน
+        แล้วแทนที่ไฟล์เดิมแบบ atomic (process อื่นจะเห็น inode เปลี่ยนและสแกนใหม่)
+
+        Args:
+            shard: ชื่อ shard
+        """
+        path = self._shard_path(shard)
+        with self._locked_shard(shard):
+            index = self._refresh(shard)
+            removed = index.garbage
+            with open(path, 'rb') as src, atomic_open(path, 'wb', encoding=None) as dst:
+                for entry in sorted(index.entries.values(), key=lambda e: e.offset):
+                    src.seek(entry.offset)
+                    dst.write(src.read(entry.length) + b"\n")
+            self._refresh(shard)
+        logger.info(f"compact shard {shard} ของข้อมูลผู้ใช้ (ลบเรคคอร์ดเก่า {removed} รายการ)")
+
+    def import_legacy(self, user_file: str) -> bool:
+        """
+        นำเข้าไฟล์ user.json แบบผู้ใช้คนเดียว (ครั้งเดียว) แล้วเปลี่ยนชื่อไฟล์เดิมเป็น .migrated
+
+        ผู้ใช้ที่นำเข้าจะได้ token ใหม่ ซึ่งเขียนไว้ในไฟล์ <user_file>.token (อ่านได้เฉพาะเจ้าของไฟล์)
+
+        Args:
+            user_file: พาธของไฟล์ user.json
+
+        Returns:
+            bool: True ถ้ามีการนำเข้า
+        """
+        if not os.path.exists(user_file):
+            return False
+        try:
+            with open(user_file, 'r', encoding='utf-8') as f:
+                user = User.parse_obj(json_codec.load(f))
+            try:
+                token = self.create(user)
+            except UserExistsError:
+                token = None
+            if token:
+                token_file = f"{user_file}.token"
+                fd = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(token + "\n")
+                logger.warning(f"สร้าง token ของผู้ใช้ {user.id} ที่นำเข้าแล้ว ใช้ค่าใน {token_file} เป็น header X-User-Token")
+            os.replace(user_file, f"{user_file}.migrated")
+            logger.info(f"นำเข้าข้อมูลผู้ใช้ {user.id} จาก {user_file}")
+            return True
+        except Exception as e:
+            logger.error(f"ไม่สามารถนำเข้าข้อมูลผู้ใช้จาก {user_file}: {str(e)}")
+            return False
@@ -1,7 +1,7 @@
 # backend/src/utils/vector_creator.py
 import os
-import json
 import shutil
+import time
 import faiss
 import numpy as np
 from typing import Dict, List, Any, Optional, Tuple
@@ -9,6 +9,13 @@ from pathlib import Path
 from sentence_transformers import SentenceTransformer
 from colorama import init, Fore, Style
 
+from src.utils.index_versions import (
+    INDEX_SUBDIRS, create_version_dir, resolve_index_dir,
+    publish_version, discard_version, prune_versions
+)
+from src.utils.atomic_write import write_bytes_atomic, write_json_atomic
+from src.utils import json_codec
+
 # เริ่มต้นใช้งาน colorama
 init(autoreset=True)
 
@@ -21,7 +28,11 @@ class VectorCreator:
                 processed_data_dir: str, 
                 vector_db_dir: str,
                 embedding_model=None,
-                clear_vector_db: bool = True):
+                clear_vector_db: bool = True,
+                keep_versions: Optional[int] = None,
+                batch_size: Optional[int] = None,
+                processes: Optional[int] = None,
+                chunk_size: Optional[int] = None):
         """
         กำหนดค่าเริ่มต้นสำหรับ VectorCreator
         
@@ -29,12 +40,34 @@ class VectorCreator:
             processed_data_dir: โฟลเดอร์ที่เก็บข้อมูลที่ผ่านการประมวลผลแล้ว
             vector_db_dir: โฟลเดอร์ที่จะเก็บฐานข้อมูล vector
             embedding_model: โมเดลสำหรับสร้าง embedding หากไม่ระบุจะใช้การจำลอง
-            clear_vector_db: ล้างฐานข้อมูล vector เดิมก่อนสร้างใหม่
+            clear_vector_db: สร้างเวอร์ชันใหม่จากศูนย์ (False = เริ่มจากสำเนาของเวอร์ชันที่ใช้งานอยู่)
+            keep_versions: จำนวนเวอร์ชันที่เก็บไว้หลัง publish (ค่าเริ่มต้นจาก VECTOR_DB_KEEP_VERSIONS)
+            batch_size: ขนาด batch ของการ encode (ค่าเริ่มต้นจาก EMBEDDING_BATCH_SIZE)
+            processes: จำนวน process สำหรับ encode (1 = process เดียว, 0 = ให้ SentenceTransformers เลือกเอง)
+            chunk_size: จำนวนข้อความที่ส่งให้แต่ละ process ต่อครั้ง (0 = คำนวณอัตโนมัติ)
         """
         self.processed_data_dir = Path(processed_data_dir)
-        self.vector_db_dir = Path(vector_db_dir)
         self.embedding_model = embedding_model
         
+        # สร้างลงโฟลเดอร์ของเวอร์ชันใหม่ ผู้อ่านยังใช้เวอร์ชันเดิมจนกว่าจะ publish
+        self.vector_db_root = Path(vector_db_dir)
+        self.version_dir = create_version_dir(self.vector_db_root)
+        self.version = self.version_dir.name
+        self.vector_db_dir = self.version_dir
+        from src.utils.config import (
+            VECTOR_DB_KEEP_VERSIONS, EMBEDDING_BATCH_SIZE, EMBEDDING_PROCESSES, EMBEDDING_CHUNK_SIZE
+        )
+        self.keep_versions = VECTOR_DB_KEEP_VERSIONS if keep_versions is None else keep_versions
+        
+        # การตั้งค่าการ encode
+        self.batch_size = max(1, EMBEDDING_BATCH_SIZE if batch_size is None else batch_size)
+        self.processes = max(0, EMBEDDING_PROCESSES if processes is None else processes)
+        self.chunk_size = max(0, EMBEDDING_CHUNK_SIZE if chunk_size is None else chunk_size)
+        self.encode_stats: List[Dict[str, Any]] = []
+        
+        # embeddings ที่สร้างไว้ล่วงหน้าโดย build plan: (ข้อความ -> แถว, matrix)
+        self._shared_embeddings: Optional[Tuple[Dict[str, int], np.ndarray]] = None
+        
         # โฟลเดอร์ย่อยสำหรับแต่ละประเภทของข้อมูล
         self.job_vector_dir = self.vector_db_dir / "job_knowledge"
         self.advice_vector_dir = self.vector_db_dir / "career_advice"
@@ -50,35 +83,44 @@ class VectorCreator:
         self.advice_index_path = self.advice_vector_dir / "faiss_index.bin"
         self.advice_metadata_path = self.advice_vector_dir / "metadata.json"
         
-        # ล้างฐานข้อมูล vector เดิมถ้าจำเป็น
-        if clear_vector_db:
-            self._clear_vector_database()
+        # ไม่ล้างข้อมูลเดิม: เริ่มจากสำเนาของเวอร์ชันที่ใช้งานอยู่
+        if not clear_vector_db:
+            self._copy_current_version()
         
         print(f"{Fore.CYAN}VectorCreator เริ่มต้นเรียบร้อย")
         print(f"{Fore.CYAN}📂 โฟลเดอร์ข้อมูลที่ประมวลผลแล้ว: {self.processed_data_dir}")
         print(f"{Fore.CYAN}📂 โฟลเดอร์สำหรับเก็บฐานข้อมูล vector: {self.vector_db_dir}")
         print(f"{Fore.CYAN}🤖 โมเดล Embedding: {type(self.embedding_model).__name__ if self.embedding_model else 'ไม่ได้ระบุ (จะใช้การจำลอง)'}") 
     
-    def _clear_vector_database(self) -> None:
-        """ล้างฐานข้อมูล vector เดิม"""
-        print(f"{Fore.YELLOW}ℹ️ กำลังล้างฐานข้อมูล vector เดิม...")
-        
-        # ลบไฟล์ FAISS index ถ้ามีอยู่
-        if self.job_index_path.exists():
-            os.remove(self.job_index_path)
-            print(f"{Fore.GREEN}✅ ลบไฟล์ {self.job_index_path} เรียบร้อย")
-        
-        if self.job_metadata_path.exists():
-            os.remove(self.job_metadata_path)
-            print(f"{Fore.GREEN}✅ ลบไฟล์ {self.job_metadata_path} เรียบร้อย")
-        
-        if self.advice_index_path.exists():
-            os.remove(self.advice_index_path)
-            print(f"{Fore.GREEN}✅ ลบไฟล์ {self.advice_index_path} เรียบร้อย")
-        
-        if self.advice_metadata_path.exists():
-            os.remove(self.advice_metadata_path)
-            print(f"{Fore.GREEN}✅ ลบไฟล์ {self.advice_metadata_path} เรียบร้อย")
+    def _copy_current_version(self) -> None:
+        """คัดลอก index ของเวอร์ชันที่ใช้งานอยู่มาไว้ในเวอร์ชันใหม่"""
+        current_dir = Path(resolve_index_dir(self.vector_db_root))
+        for subdir in INDEX_SUBDIRS:
+            source = current_dir / subdir
+            if source.is_dir():
+                shutil.copytree(source, self.version_dir / subdir, dirs_exist_ok=True)
+                print(f"{Fore.GREEN}✅ คัดลอก {source} ไปยังเวอร์ชันใหม่เรียบร้อย")
+    
+    def publish(self) -> None:
+        """สลับให้ผู้อ่านใช้เวอร์ชันที่สร้างขึ้นนี้ และลบเวอร์ชันเก่าที่เกินจำนวนที่เก็บไว้"""
+        publish_version(self.vector_db_root, self.version)
+        prune_versions(self.vector_db_root, self.keep_versions)
+        print(f"{Fore.GREEN}✅ เปลี่ยนไปใช้ vector database เวอร์ชัน {self.version} เรียบร้อย")
+    
+    def discard(self) -> None:
+        """ลบเวอร์ชันที่สร้างไม่สำเร็จ ผู้อ่านยังใช้เวอร์ชันเดิมต่อไป"""
+        discard_version(self.vector_db_root, self.version)
+        print(f"{Fore.YELLOW}⚠️ ยกเลิก vector database เวอร์ชัน {self.version} และใช้เวอร์ชันเดิมต่อไป")
+    
+    @staticmethod
+    def _save_index(index, index_path: Path) -> None:
+        """บันทึก FAISS index แบบ atomic พร้อมไฟล์ checksum (VectorSearch ใช้ตรวจสอบก่อนสลับเวอร์ชัน)"""
+        write_bytes_atomic(index_path, faiss.serialize_index(index).tobytes(), checksum=True)
+    
+    @staticmethod
+    def _save_metadata(metadata: Dict[str, Any], metadata_path: Path) -> None:
+        """บันทึก metadata แบบ atomic พร้อมไฟล์ checksum"""
+        write_json_atomic(metadata_path, metadata, checksum=True)
     
     def _create_mock_embedding(self, text: str, dimension: int = 384) -> np.ndarray:
         """
@@ -105,6 +147,97 @@ class VectorCreator:
         else:
             return self._create_mock_embedding(text, dimension)
     
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        สร้าง embeddings ของข้อความ โดยใช้ embeddings จาก build plan ถ้ามีครบทุกข้อความ
+        
+        Args:
+            texts: ข้อความที่ต้องการสร้าง embedding
+            
+        Returns:
+            numpy array ขนาด (จำนวนข้อความ, dimension)
+        """
+        if self._shared_embeddings is not None:
+            row_by_text, matrix = self._shared_embeddings
+            rows = [row_by_text.get(text) for text in texts]
+            if all(row is not None for row in rows):
+                print(f"{Fore.CYAN}♻️ ใช้ embeddings ที่สร้างไว้แล้ว {len(texts)} รายการ")
+                return matrix[rows]
+        
+        print(f"{Fore.CYAN}🧠 กำลังสร้าง embeddings จำนวน {len(texts)} รายการ...")
+        start_time = time.perf_counter()
+        
+        if self.embedding_model:
+            # ใช้โมเดลจริง
+            embeddings, processes = self._encode_with_model(texts)
+        else:
+            # ใช้การจำลอง
+            print(f"{Fore.YELLOW}⚠️ ไม่พบโมเดล embedding จะใช้การจำลอง")
+            embeddings, processes = np.array([self._get_embedding(text) for text in texts]), 1
+        
+        elapsed = time.perf_counter() - start_time
+        texts_per_second = len(texts) / elapsed if elapsed > 0 else 0.0
+        self.encode_stats.append({
+            "texts": len(texts),
+            "seconds": round(elapsed, 3),
+            "texts_per_second": round(texts_per_second, 1),
+            "batch_size": self.batch_size,
+            "processes": processes
+        })
+        print(f"{Fore.GREEN}✅ encode {len(texts)} ข้อความใน {elapsed:.1f} วินาที ({texts_per_second:.1f} ข้อความ/วินาที, {processes} process)")
+        return embeddings
+    
+    def _encode_with_model(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        """
+        encode ข้อความด้วยโมเดลจริง โดยเรียงตามความยาวก่อนแบ่ง batch เพื่อลด padding
+        
+        ใช้ multi-process pool ของ SentenceTransformers เมื่อกำหนด processes ไว้มากกว่า 1 (หรือ 0)
+        และมีข้อความมากพอสำหรับทุก process
+        
+        Args:
+            texts: ข้อความที่ต้องการสร้าง embedding
+            
+        Returns:
+            (embeddings เรียงตามลำดับของ texts, จำนวน process ที่ใช้)
+        """
+        # เรียงจากยาวไปสั้น ข้อความใน batch เดียวกันจะยาวใกล้เคียงกัน
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        sorted_texts = [texts[i] for i in order]
+        
+        use_pool = (
+            self.processes != 1
+            and hasattr(self.embedding_model, "start_multi_process_pool")
+            and len(texts) >= self.batch_size * max(self.processes, 2)
+        )
+        
+        if use_pool:
+            target_devices = ["cpu"] * self.processes if self.processes > 1 else None
+            pool = self.embedding_model.start_multi_process_pool(target_devices=target_devices)
+            processes = len(pool["processes"])
+            print(f"{Fore.CYAN}⚙️ encode ด้วย {processes} process (batch {self.batch_size})")
+            try:
+                sorted_embeddings = self.embedding_model.encode_multi_process(
+                    sorted_texts,
+                    pool,
+                    batch_size=self.batch_size,
+                    chunk_size=self.chunk_size or None
+                )
+            finally:
+                self.embedding_model.stop_multi_process_pool(pool)
+        else:
+            processes = 1
+            sorted_embeddings = self.embedding_model.encode(
+                sorted_texts,
+                batch_size=self.batch_size,
+                show_progress_bar=True
+            )
+        
+        # คืนลำดับเดิม
+        sorted_embeddings = np.asarray(sorted_embeddings)
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        return embeddings, processes
+    
     def _load_job_data(self) -> List[Dict[str, Any]]:
         """
         โหลดข้อมูลอาชีพจากไฟล์ที่ทำความสะอาดแล้ว
@@ -125,7 +258,7 @@ class VectorCreator:
         for file_path in job_files:
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                    data = json_codec.load(f)
                     job_data.append(data)
             except Exception as e:
                 print(f"{Fore.RED}❌ เกิดข้อผิดพลาดในการอ่านไฟล์ {file_path}: {str(e)}")
@@ -148,7 +281,7 @@ class VectorCreator:
         
         try:
             with open(advice_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+                data = json_codec.load(f)
                 
                 if isinstance(data, dict) and "career_advices" in data:
                     advices = data["career_advices"]
@@ -242,10 +375,13 @@ class VectorCreator:
         
         return " ".join(text_parts)
     
-    def create_job_embeddings(self) -> Dict[str, Any]:
+    def create_job_embeddings(self, job_data: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """
         สร้าง embeddings สำหรับข้อมูลอาชีพและบันทึกลงใน FAISS
         
+        Args:
+            job_data: ข้อมูลอาชีพที่โหลดไว้แล้ว (ถ้าไม่ระบุจะโหลดจากไฟล์)
+            
         Returns:
             ผลลัพธ์ของการสร้าง embeddings
         """
@@ -257,7 +393,8 @@ class VectorCreator:
         
         try:
             # โหลดข้อมูลอาชีพ
-            job_data = self._load_job_data()
+            if job_data is None:
+                job_data = self._load_job_data()
             
             if not job_data:
                 result["error"] = "ไม่พบข้อมูลอาชีพ"
@@ -284,15 +421,7 @@ class VectorCreator:
                 return result
             
             # สร้าง embeddings
-            print(f"{Fore.CYAN}🧠 กำลังสร้าง embeddings จำนวน {len(job_texts)} รายการ...")
-            
-            if self.embedding_model:
-                # ใช้โมเดลจริง
-                embeddings = self.embedding_model.encode(job_texts, show_progress_bar=True)
-            else:
-                # ใช้การจำลอง
-                print(f"{Fore.YELLOW}⚠️ ไม่พบโมเดล embedding จะใช้การจำลอง")
-                embeddings = np.array([self._get_embedding(text) for text in job_texts])
+            embeddings = self._encode_texts(job_texts)
             
             # สร้าง FAISS index
             print(f"{Fore.CYAN}📊 กำลังสร้าง FAISS index...")
@@ -307,7 +436,7 @@ class VectorCreator:
             
             # บันทึก FAISS index
             print(f"{Fore.CYAN}💾 กำลังบันทึก FAISS index ไปที่ {self.job_index_path}...")
-            faiss.write_index(index, str(self.job_index_path))
+            self._save_index(index, self.job_index_path)
             
             # บันทึก metadata
             print(f"{Fore.CYAN}💾 กำลังบันทึก metadata ไปที่ {self.job_metadata_path}...")
@@ -317,8 +446,7 @@ class VectorCreator:
                 "job_data": job_data
             }
             
-            with open(self.job_metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2)
+            self._save_metadata(metadata, self.job_metadata_path)
             
             print(f"{Fore.GREEN}✅ สร้าง embeddings สำหรับข้อมูลอาชีพสำเร็จ: {len(job_ids)} vectors")
             
@@ -332,10 +460,13 @@ class VectorCreator:
             result["error"] = str(e)
             return result
     
-    def create_advice_embeddings(self) -> Dict[str, Any]:
+    def create_advice_embeddings(self, advice_data: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """
         สร้าง embeddings สำหรับข้อมูลคำแนะนำอาชีพและบันทึกลงใน FAISS
         
+        Args:
+            advice_data: ข้อมูลคำแนะนำอาชีพที่โหลดไว้แล้ว (ถ้าไม่ระบุจะโหลดจากไฟล์)
+            
         Returns:
             ผลลัพธ์ของการสร้าง embeddings
         """
@@ -347,7 +478,8 @@ class VectorCreator:
         
         try:
             # โหลดข้อมูลคำแนะนำอาชีพ
-            advice_data = self._load_career_advice_data()
+            if advice_data is None:
+                advice_data = self._load_career_advice_data()
             
             if not advice_data:
                 result["error"] = "ไม่พบข้อมูลคำแนะนำอาชีพ"
@@ -360,11 +492,13 @@ class VectorCreator:
             advice_texts = []
             advice_ids_to_index = {}
             
-            for i, advice in enumerate(advice_data):
-                # ตรวจสอบ ID
-                if "id" not in advice:
-                    advice["id"] = f"advice_{i}"
-                
+            # กำหนด ID ให้รายการที่ไม่มี (สร้างสำเนา ไม่แก้ข้อมูลที่ใช้ร่วมกับ index อื่น)
+            advice_data = [
+                advice if "id" in advice else dict(advice, id=f"advice_{i}")
+                for i, advice in enumerate(advice_data)
+            ]
+            
+            for advice in advice_data:
                 advice_text = self._prepare_advice_text_for_embedding(advice)
                 advice_texts.append(advice_text)
                 advice_ids.append(advice["id"])
@@ -375,15 +509,7 @@ class VectorCreator:
                 return result
             
             # สร้าง embeddings
-            print(f"{Fore.CYAN}🧠 กำลังสร้าง embeddings จำนวน {len(advice_texts)} รายการ...")
-            
-            if self.embedding_model:
-                # ใช้โมเดลจริง
-                embeddings = self.embedding_model.encode(advice_texts, show_progress_bar=True)
-            else:
-                # ใช้การจำลอง
-                print(f"{Fore.YELLOW}⚠️ ไม่พบโมเดล embedding จะใช้การจำลอง")
-                embeddings = np.array([self._get_embedding(text) for text in advice_texts])
+            embeddings = self._encode_texts(advice_texts)
             
             # สร้าง FAISS index
             print(f"{Fore.CYAN}📊 กำลังสร้าง FAISS index...")
@@ -398,7 +524,7 @@ class VectorCreator:
             
             # บันทึก FAISS index
             print(f"{Fore.CYAN}💾 กำลังบันทึก FAISS index ไปที่ {self.advice_index_path}...")
-            faiss.write_index(index, str(self.advice_index_path))
+            self._save_index(index, self.advice_index_path)
             
             # บันทึก metadata
             print(f"{Fore.CYAN}💾 กำลังบันทึก metadata ไปที่ {self.advice_metadata_path}...")
@@ -429,8 +555,7 @@ class VectorCreator:
                 "advice_data": simplified_advice_data
             }
             
-            with open(self.advice_metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2)
+            self._save_metadata(metadata, self.advice_metadata_path)
             
             print(f"{Fore.GREEN}✅ สร้าง embeddings สำหรับข้อมูลคำแนะนำอาชีพสำเร็จ: {len(advice_ids)} vectors")
             
@@ -444,9 +569,45 @@ class VectorCreator:
             result["error"] = str(e)
             return result
     
+    def _plan_shared_embeddings(self,
+                                job_data: List[Dict[str, Any]],
+                                advice_data: List[Dict[str, Any]],
+                                user_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        สร้าง embeddings ของข้อความทั้งหมดที่ทุก index ใช้ในครั้งเดียว
+        
+        ข้อความที่ซ้ำกันระหว่าง index (เช่น อาชีพใน index อาชีพและ index รวม) จะถูก encode ครั้งเดียว
+        
+        Args:
+            job_data: ข้อมูลอาชีพ
+            advice_data: ข้อมูลคำแนะนำอาชีพ
+            user_data: ข้อมูลผู้ใช้
+            
+        Returns:
+            Dict[str, Any]: build plan ได้แก่ "texts" (จำนวนข้อความทั้งหมด), "unique_texts" (จำนวนข้อความที่ไม่ซ้ำ)
+            และ "encode" (dict สถิติการ encode จาก encode_stats มีเฉพาะเมื่อมีข้อความให้ encode)
+        """
+        texts = [self._prepare_job_text_for_embedding(job) for job in job_data if "id" in job]
+        texts += [self._prepare_advice_text_for_embedding(advice) for advice in advice_data]
+        texts += [self._prepare_user_text_for_embedding(user) for user in user_data if "id" in user]
+        unique_texts = list(dict.fromkeys(texts))
+        
+        print(f"{Fore.CYAN}🗺️ build plan: ข้อความ {len(texts)} รายการ ไม่ซ้ำ {len(unique_texts)} รายการ")
+        plan = {"texts": len(texts), "unique_texts": len(unique_texts)}
+        self._shared_embeddings = None
+        if unique_texts:
+            matrix = np.asarray(self._encode_texts(unique_texts), dtype=np.float32)
+            self._shared_embeddings = ({text: i for i, text in enumerate(unique_texts)}, matrix)
+            plan["encode"] = self.encode_stats[-1]
+        
+        return plan
+    
     def create_all_embeddings(self) -> Dict[str, Any]:
         """
-        สร้าง embeddings ทั้งหมด ทั้งข้อมูลอาชีพและคำแนะนำอาชีพ
+        สร้าง embeddings ทั้งหมด ทั้งข้อมูลอาชีพและคำแนะนำอาชีพ และข้อมูลรวม
+        
+        โหลดข้อมูลแต่ละแหล่งและ encode ข้อความแต่ละแบบเพียงครั้งเดียว แล้วประกอบทั้งสาม index
+        จาก embeddings ชุดเดียวกัน
         
         Returns:
             ผลลัพธ์ของการสร้าง embeddings
@@ -455,22 +616,49 @@ class VectorCreator:
         print(f"{Fore.CYAN}= เริ่มต้นการสร้าง Vector Database ทั้งหมด")
         print(f"{Fore.CYAN}{'='*60}")
         
-        # สร้าง embeddings สำหรับข้อมูลอาชีพ
-        print(f"\n{Fore.CYAN}{'='*20} สร้าง embeddings สำหรับข้อมูลอาชีพ {'='*20}")
-        job_result = self.create_job_embeddings()
+        # โหลดข้อมูลแต่ละแหล่งครั้งเดียว
+        job_data = self._load_job_data()
+        advice_data = self._load_career_advice_data()
+        user_data = self._load_user_data()
         
-        # สร้าง embeddings สำหรับข้อมูลคำแนะนำอาชีพ
-        print(f"\n{Fore.CYAN}{'='*20} สร้าง embeddings สำหรับข้อมูลคำแนะนำอาชีพ {'='*20}")
-        advice_result = self.create_advice_embeddings()
-
-        # สร้าง embeddings แบบรวม
-        print(f"\n{Fore.CYAN}{'='*20} สร้าง embeddings แบบรวม {'='*20}")
-        combined_result = self.create_combined_embeddings()  # เพิ่มบรรทัดนี้
+        plan = None
+        try:
+            print(f"\n{Fore.CYAN}{'='*20} สร้าง embeddings ของข้อความทั้งหมด {'='*20}")
+            plan = self._plan_shared_embeddings(job_data, advice_data, user_data)
+        except Exception as e:
+            # ถ้า build plan ล้มเหลว แต่ละ index จะ encode ข้อความของตัวเองแทน
+            print(f"{Fore.RED}❌ เกิดข้อผิดพลาดในการสร้าง embeddings ล่วงหน้า: {str(e)}")
+        
+        try:
+            # สร้าง embeddings สำหรับข้อมูลอาชีพ
+            print(f"\n{Fore.CYAN}{'='*20} สร้าง embeddings สำหรับข้อมูลอาชีพ {'='*20}")
+            job_result = self.create_job_embeddings(job_data)
+            
+            # สร้าง embeddings สำหรับข้อมูลคำแนะนำอาชีพ
+            print(f"\n{Fore.CYAN}{'='*20} สร้าง embeddings สำหรับข้อมูลคำแนะนำอาชีพ {'='*20}")
+            advice_result = self.create_advice_embeddings(advice_data)
+            
+            # สร้าง embeddings แบบรวม
+            print(f"\n{Fore.CYAN}{'='*20} สร้าง embeddings แบบรวม {'='*20}")
+            combined_result = self.create_combined_embeddings(job_data, advice_data, user_data)
+        finally:
+            # คืนหน่วยความจำของ matrix ที่ใช้ร่วมกัน
+            self._shared_embeddings = None
+        
+        # publish เฉพาะเมื่อทุกส่วนสร้างสำเร็จ ไม่ให้ผู้อ่านเห็น index ที่ไม่ครบ
+        published = all(r["success"] for r in (job_result, advice_result, combined_result))
+        if published:
+            self.publish()
+        else:
+            self.discard()
         
         return {
             "job_embeddings": job_result,
             "advice_embeddings": advice_result,
-            "combined_embeddings": combined_result
+            "combined_embeddings": combined_result,
+            "version": self.version,
+            "published": published,
+            "build_plan": plan
         }
     
     def search_similar_jobs(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
@@ -495,7 +683,7 @@ class VectorCreator:
             
             # โหลด metadata
             with open(self.job_metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+                metadata = json_codec.load(f)
             
             # สร้าง embedding สำหรับคำค้นหา
             query_embedding = None
@@ -573,7 +761,7 @@ class VectorCreator:
             
             # โหลด metadata
             with open(self.advice_metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+                metadata = json_codec.load(f)
             
             # สร้าง embedding สำหรับคำค้นหา
             query_embedding = None
@@ -649,7 +837,7 @@ class VectorCreator:
         try:
             # โหลด metadata
             with open(self.job_metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+                metadata = json_codec.load(f)
             
             # หาข้อมูลอาชีพจาก job_id
             for job in metadata["job_data"]:
@@ -681,7 +869,7 @@ class VectorCreator:
         try:
             # โหลด metadata
             with open(self.advice_metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+                metadata = json_codec.load(f)
             
             # หาข้อมูลคำแนะนำจาก advice_id
             for advice in metadata["advice_data"]:
@@ -695,10 +883,18 @@ class VectorCreator:
             print(f"{Fore.RED}❌ เกิดข้อผิดพลาดในการดึงข้อมูลคำแนะนำ: {str(e)}")
             return None
         
-    def create_combined_embeddings(self) -> Dict[str, Any]:
+    def create_combined_embeddings(self,
+                                   job_data: Optional[List[Dict[str, Any]]] = None,
+                                   advice_data: Optional[List[Dict[str, Any]]] = None,
+                                   user_data: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """
         สร้าง embeddings แบบรวมข้อมูลอาชีพและคำแนะนำเข้าด้วยกัน
         
+        Args:
+            job_data: ข้อมูลอาชีพที่โหลดไว้แล้ว (ถ้าไม่ระบุจะโหลดจากไฟล์)
+            advice_data: ข้อมูลคำแนะนำที่โหลดไว้แล้ว (ถ้าไม่ระบุจะโหลดจากไฟล์)
+            user_data: ข้อมูลผู้ใช้ที่โหลดไว้แล้ว (ถ้าไม่ระบุจะโหลดจากไฟล์)
+            
         Returns:
             ผลลัพธ์ของการสร้าง embeddings
         """
@@ -710,13 +906,16 @@ class VectorCreator:
         
         try:
             # โหลดข้อมูลอาชีพ
-            job_data = self._load_job_data()
+            if job_data is None:
+                job_data = self._load_job_data()
             
             # โหลดข้อมูลคำแนะนำ
-            advice_data = self._load_career_advice_data()
+            if advice_data is None:
+                advice_data = self._load_career_advice_data()
             
             # โหลดข้อมูลผู้ใช้
-            user_data = self._load_user_data()
+            if user_data is None:
+                user_data = self._load_user_data()
             
             if not job_data and not advice_data and not user_data:
                 result["error"] = "ไม่พบข้อมูลอาชีพ, คำแนะนำ และผู้ใช้"
@@ -775,15 +974,7 @@ class VectorCreator:
                 return result
             
             # สร้าง embeddings
-            print(f"{Fore.CYAN}🧠 กำลังสร้าง embeddings จำนวน {len(combined_texts)} รายการ...")
-            
-            if self.embedding_model:
-                # ใช้โมเดลจริง
-                embeddings = self.embedding_model.encode(combined_texts, show_progress_bar=True)
-            else:
-                # ใช้การจำลอง
-                print(f"{Fore.YELLOW}⚠️ ไม่พบโมเดล embedding จะใช้การจำลอง")
-                embeddings = np.array([self._get_embedding(text) for text in combined_texts])
+            embeddings = self._encode_texts(combined_texts)
             
             # สร้าง FAISS index
             print(f"{Fore.CYAN}📊 กำลังสร้าง FAISS index...")
@@ -804,7 +995,7 @@ class VectorCreator:
             # บันทึก FAISS index
             combined_index_path = combined_vector_dir / "faiss_index.bin"
             print(f"{Fore.CYAN}💾 กำลังบันทึก FAISS index ไปที่ {combined_index_path}...")
-            faiss.write_index(index, str(combined_index_path))
+            self._save_index(index, combined_index_path)
             
             # บันทึก metadata
             combined_metadata_path = combined_vector_dir / "metadata.json"
@@ -850,8 +1041,7 @@ class VectorCreator:
                 "item_data": simplified_items
             }
             
-            with open(combined_metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2)
+            self._save_metadata(metadata, combined_metadata_path)
             
             print(f"{Fore.GREEN}✅ สร้าง embeddings แบบรวมข้อมูลสำเร็จ: {len(combined_ids)} vectors")
             
@@ -982,7 +1172,7 @@ class VectorCreator:
             
             if os.path.exists(users_file):
                 with open(users_file, 'r', encoding='utf-8') as f:
-                    users_data = json.load(f)
+                    users_data = json_codec.load(f)
                     
                     # ตรวจสอบโครงสร้างข้อมูล
                     if isinstance(users_data, list):
@@ -1055,33 +1245,3 @@ if __name__ == "__main__":
         
     except Exception as e:
         print(f"{Fore.RED}❌ เกิดข้อผิดพลาดในการทดสอบ: {str(e)}")
-
-
-    def create_all_embeddings(self) -> Dict[str, Any]:
-        """
-        สร้าง embeddings ทั้งหมด ทั้งข้อมูลอาชีพและคำแนะนำอาชีพ และข้อมูลรวม
-        
-        Returns:
-            ผลลัพธ์ของการสร้าง embeddings
-        """
-        print(f"{Fore.CYAN}{'='*60}")
-        print(f"{Fore.CYAN}= เริ่มต้นการสร้าง Vector Database ทั้งหมด")
-        print(f"{Fore.CYAN}{'='*60}")
-        
-        # สร้าง embeddings สำหรับข้อมูลอาชีพ
-        print(f"\n{Fore.CYAN}{'='*20} สร้าง embeddings สำหรับข้อมูลอาชีพ {'='*20}")
-        job_result = self.create_job_embeddings()
-        
-        # สร้าง embeddings สำหรับข้อมูลคำแนะนำอาชีพ
-        print(f"\n{Fore.CYAN}{'='*20} สร้าง embeddings สำหรับข้อมูลคำแนะนำอาชีพ {'='*20}")
-        advice_result = self.create_advice_embeddings()
-        
-        # สร้าง embeddings แบบรวมข้อมูล
-        print(f"\n{Fore.CYAN}{'='*20} สร้าง embeddings แบบรวมข้อมูล {'='*20}")
-        combined_result = self.create_combined_embeddings()
-        
-        return {
-            "job_embeddings": job_result,
-            "advice_embeddings": advice_result,
-            "combined_embeddings": combined_result
-        }
\ No newline at end of file
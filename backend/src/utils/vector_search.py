@@ -1,9 +1,11 @@
 # backend/src/utils/vector_search.py
 import os
-import json
 import numpy as np
 import faiss
 import re
+import time
+import threading
+from dataclasses import dataclass, replace
 from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import sys
@@ -28,6 +30,42 @@ except ImportError:
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     logger = logging.getLogger("vector_search")
 
+from src.utils.index_versions import get_current_version, resolve_index_dir, pointer_signature
+from src.utils.atomic_write import verify_checksum
+from src.utils import json_codec
+
+# คำศัพท์ที่ใช้บ่อยในอาชีพไอที (ใช้ร่วมกับการดึงทักษะจาก Resume)
+TECH_KEYWORDS = frozenset([
+    "programmer", "developer", "software", "web", "frontend", "backend", 
+    "fullstack", "full stack", "data scientist", "data analyst", "devops", 
+    "database", "engineer", "ux", "ui", "python", "java", "javascript", 
+    "react", "angular", "node", "typescript", "c#", "c++", "php", "ruby", 
+    "software engineer", "project manager", "scrum master", "product owner",
+    "mobile", "android", "ios", "cloud", "aws", "azure", "network",
+    "security", "system", "administrator", "qa", "testing"
+])
+
+@dataclass(frozen=True)
+class IndexGeneration:
+    """
+    ชุด index และ metadata ที่โหลดจากเวอร์ชันเดียวกัน
+
+    ไม่มีการแก้ไขหลังสร้าง การ reload จะสร้าง generation ใหม่แล้วสลับ reference
+    คำค้นหาที่ถือ generation เดิมอยู่จึงทำงานต่อจนจบได้โดยไม่ได้รับผลกระทบ
+    """
+    version: Optional[str]
+    base_dir: str
+    signature: Optional[Tuple[int, int]]
+    job_index: Any
+    advice_index: Any
+    combined_index: Any
+    job_metadata: Any
+    advice_metadata: Any
+    combined_metadata: Any
+    # False ถ้ามีไฟล์ที่ checksum ไม่ตรง (ไฟล์ที่ไม่มี checksum ถือว่าใช้ได้)
+    intact: bool = True
+
+
 class VectorSearch:
     def __init__(self, vector_db_dir: str, embedding_model=None):
         """
@@ -38,15 +76,7 @@ class VectorSearch:
             embedding_model: โมเดลสำหรับสร้าง embeddings (ถ้าไม่ระบุจะใช้การจำลอง vector)
         """
         # ไฟล์สำหรับคำศัพท์ที่ใช้บ่อยในอาชีพไอที
-        self.tech_keywords = set([
-            "programmer", "developer", "software", "web", "frontend", "backend", 
-            "fullstack", "full stack", "data scientist", "data analyst", "devops", 
-            "database", "engineer", "ux", "ui", "python", "java", "javascript", 
-            "react", "angular", "node", "typescript", "c#", "c++", "php", "ruby", 
-            "software engineer", "project manager", "scrum master", "product owner",
-            "mobile", "android", "ios", "cloud", "aws", "azure", "network",
-            "security", "system", "administrator", "qa", "testing"
-        ])
+        self.tech_keywords = set(TECH_KEYWORDS)
         
         # คำที่เกี่ยวข้องกับการสืบค้นข้อมูลอาชีพ
         self.job_query_keywords = set([
@@ -108,22 +138,12 @@ class VectorSearch:
         self.vector_db_dir = vector_db_dir
         self.embedding_model = embedding_model
         
-        # โฟลเดอร์สำหรับแต่ละประเภทข้อมูล
-        self.job_knowledge_dir = os.path.join(vector_db_dir, "job_knowledge")
-        self.career_advice_dir = os.path.join(vector_db_dir, "career_advice")
-        self.combined_knowledge_dir = os.path.join(vector_db_dir, "combined_knowledge")
-        
-        # ไฟล์ FAISS index และ metadata
-        self.job_index_file = os.path.join(self.job_knowledge_dir, "faiss_index.bin")
-        self.job_metadata_file = os.path.join(self.job_knowledge_dir, "metadata.json")
-        
-        self.advice_index_file = os.path.join(self.career_advice_dir, "faiss_index.bin")
-        self.advice_metadata_file = os.path.join(self.career_advice_dir, "metadata.json")
-        
-        self.combined_index_file = os.path.join(self.combined_knowledge_dir, "faiss_index.bin")
-        self.combined_metadata_file = os.path.join(self.combined_knowledge_dir, "metadata.json")
-        
-        print(f"{Fore.CYAN}📂 โฟลเดอร์ฐานข้อมูล vector: {vector_db_dir}")
+        # โหลด index และ metadata ของเวอร์ชันที่ใช้งานอยู่
+        # (_loaded_ns แยกข้อมูลของ instance นี้จาก instance ก่อน restart ซึ่งอาจอ่านไฟล์อาชีพคนละชุด)
+        self._loaded_ns = time.time_ns()
+        self._reload_lock = threading.Lock()
+        self._activate(self._load_generation())
+        print(f"{Fore.CYAN}📂 โฟลเดอร์ฐานข้อมูล vector: {vector_db_dir} (เวอร์ชัน: {self._generation.version or 'โครงสร้างแบบเดิม'})")
         print(f"{Fore.CYAN}📄 ไฟล์ job index: {self.job_index_file}")
         print(f"{Fore.CYAN}📄 ไฟล์ job metadata: {self.job_metadata_file}")
         print(f"{Fore.CYAN}📄 ไฟล์ advice index: {self.advice_index_file}")
@@ -131,11 +151,6 @@ class VectorSearch:
         print(f"{Fore.CYAN}📄 ไฟล์ combined index: {self.combined_index_file}")
         print(f"{Fore.CYAN}📄 ไฟล์ combined metadata: {self.combined_metadata_file}{Style.RESET_ALL}")
         
-        # โหลด metadata
-        self.job_metadata = self._load_metadata(self.job_metadata_file)
-        self.advice_metadata = self._load_metadata(self.advice_metadata_file)
-        self.combined_metadata = self._load_metadata(self.combined_metadata_file)
-        
         # ดึงข้อมูลที่จัดเก็บไว้
         self.processed_data_dir = os.path.join(project_root, "data", "processed")
         try:
@@ -153,6 +168,7 @@ class VectorSearch:
         if len(self.job_metadata) == 0 and len(self.advice_metadata) == 0 and len(self.combined_metadata) == 0:
             print(f"{Fore.YELLOW}⚠️ ไม่พบข้อมูล metadata จะลองโหลดจาก embedding_data.json แทน{Style.RESET_ALL}")
             self._load_fallback_metadata()
+            self._generation = replace(self._generation, job_metadata=self.job_metadata, advice_metadata=self.advice_metadata)
         
         if len(self.job_metadata) > 0 and len(self.advice_metadata) > 0:
             print(f"{Fore.GREEN}✅ VectorSearch เริ่มต้นสำเร็จ: {len(self.job_metadata)} job metadata, {len(self.advice_metadata)} advice metadata{Style.RESET_ALL}")
@@ -163,6 +179,139 @@ class VectorSearch:
         
         logger.info(f"VectorSearch เริ่มต้นสำเร็จ: {len(self.job_metadata)} job metadata, {len(self.advice_metadata)} advice metadata, {len(self.combined_metadata)} combined metadata")
     
+    def _load_index(self, index_file: str):
+        """โหลด FAISS index จากไฟล์ (คืนค่า None ถ้าไม่มีไฟล์หรือโหลดไม่ได้)"""
+        if not os.path.exists(index_file):
+            return None
+        try:
+            return faiss.read_index(index_file)
+        except Exception as e:
+            logger.error(f"เกิดข้อผิดพลาดในการโหลด FAISS index {index_file}: {str(e)}")
+            return None
+    
+    def _load_generation(self) -> IndexGeneration:
+        """
+        โหลด index และ metadata ทั้งหมดของเวอร์ชันที่ไฟล์ pointer ชี้อยู่
+        
+        Returns:
+            IndexGeneration: ชุดข้อมูลของเวอร์ชันนั้น
+        """
+        # อ่าน signature ก่อน resolve ถ้ามีการสลับระหว่างโหลด ครั้งถัดไปจะ reload อีกรอบ
+        signature = pointer_signature(self.vector_db_dir)
+        version = get_current_version(self.vector_db_dir)
+        base_dir = resolve_index_dir(self.vector_db_dir)
+        
+        job_dir = os.path.join(base_dir, "job_knowledge")
+        advice_dir = os.path.join(base_dir, "career_advice")
+        combined_dir = os.path.join(base_dir, "combined_knowledge")
+        job_metadata_file = os.path.join(job_dir, "metadata.json")
+        advice_metadata_file = os.path.join(advice_dir, "metadata.json")
+        combined_metadata_file = os.path.join(combined_dir, "metadata.json")
+        
+        job_metadata = self._load_metadata(job_metadata_file)
+        advice_metadata = self._load_metadata(advice_metadata_file)
+        combined_metadata = self._load_metadata(combined_metadata_file)
+        
+        # ใช้ index เฉพาะเมื่อมี metadata คู่กัน
+        job_index = self._load_index(os.path.join(job_dir, "faiss_index.bin")) if os.path.exists(job_metadata_file) else None
+        advice_index = self._load_index(os.path.join(advice_dir, "faiss_index.bin")) if os.path.exists(advice_metadata_file) else None
+        combined_index = self._load_index(os.path.join(combined_dir, "faiss_index.bin")) if os.path.exists(combined_metadata_file) else None
+        
+        intact = all(
+            verify_checksum(os.path.join(directory, filename)) is not False
+            for directory in (job_dir, advice_dir, combined_dir)
+            for filename in ("faiss_index.bin", "metadata.json")
+            if os.path.exists(os.path.join(directory, filename))
+        )
+        
+        return IndexGeneration(
+            version=version,
+            base_dir=base_dir,
+            signature=signature,
+            job_index=job_index,
+            advice_index=advice_index,
+            combined_index=combined_index,
+            job_metadata=job_metadata,
+            advice_metadata=advice_metadata,
+            combined_metadata=combined_metadata,
+            intact=intact
+        )
+    
+    def _activate(self, generation: IndexGeneration) -> None:
+        """สลับไปใช้ generation ใหม่ (การกำหนด reference เป็น atomic)"""
+        self.job_knowledge_dir = os.path.join(generation.base_dir, "job_knowledge")
+        self.career_advice_dir = os.path.join(generation.base_dir, "career_advice")
+        self.combined_knowledge_dir = os.path.join(generation.base_dir, "combined_knowledge")
+        
+        self.job_index_file = os.path.join(self.job_knowledge_dir, "faiss_index.bin")
+        self.job_metadata_file = os.path.join(self.job_knowledge_dir, "metadata.json")
+        self.advice_index_file = os.path.join(self.career_advice_dir, "faiss_index.bin")
+        self.advice_metadata_file = os.path.join(self.career_advice_dir, "metadata.json")
+        self.combined_index_file = os.path.join(self.combined_knowledge_dir, "faiss_index.bin")
+        self.combined_metadata_file = os.path.join(self.combined_knowledge_dir, "metadata.json")
+        
+        self.job_metadata = generation.job_metadata
+        self.advice_metadata = generation.advice_metadata
+        self.combined_metadata = generation.combined_metadata
+        self._generation = generation
+    
+    def _current_generation(self) -> IndexGeneration:
+        """
+        คืน generation ปัจจุบันทันที และเริ่มโหลดเวอร์ชันใหม่เบื้องหลังเมื่อไฟล์ pointer ถูกเปลี่ยน
+        
+        คำค้นหาไม่ต้องรอการโหลด index ใหม่ จะใช้เวอร์ชันเดิมจนกว่าเวอร์ชันใหม่จะโหลดเสร็จ
+        คำค้นหาควรเรียกครั้งเดียวตอนเริ่มและใช้ค่าที่ได้ตลอดการค้นหา
+        
+        Returns:
+            IndexGeneration: generation ที่ใช้สำหรับคำค้นหานี้
+        """
+        generation = self._generation
+        if pointer_signature(self.vector_db_dir) == generation.signature:
+            return generation
+        
+        # ให้ thread เดียวโหลด ถ้ามีการโหลดอยู่แล้วก็ไม่ต้องทำอะไร
+        if self._reload_lock.acquire(blocking=False):
+            try:
+                threading.Thread(target=self._reload_generation, name="vector-search-reload", daemon=True).start()
+            except Exception:
+                self._reload_lock.release()
+                raise
+        return generation
+    
+    def _reload_generation(self) -> None:
+        """โหลดเวอร์ชันที่ไฟล์ pointer ชี้อยู่แล้วสลับไปใช้ (ทำงานใน thread เบื้องหลังที่ถือ _reload_lock)"""
+        signature = pointer_signature(self.vector_db_dir)
+        try:
+            # อาจมีการ reload ไปแล้วก่อนได้ lock
+            if signature == self._generation.signature:
+                return
+            print(f"{Fore.CYAN}🔄 พบ vector database เวอร์ชันใหม่ กำลังโหลด...{Style.RESET_ALL}")
+            new_generation = self._load_generation()
+            if not new_generation.intact:
+                # ใช้เวอร์ชันเดิมต่อ และไม่ลองโหลดเวอร์ชันนี้ซ้ำจนกว่าจะมีการสลับเวอร์ชันอีกครั้ง
+                logger.error(f"ไฟล์ของ vector database เวอร์ชัน {new_generation.version} เสียหาย จะใช้เวอร์ชันเดิมต่อไป")
+                self._generation = replace(self._generation, signature=new_generation.signature)
+                return
+            self._activate(new_generation)
+            logger.info(f"สลับไปใช้ vector database เวอร์ชัน {new_generation.version}: {len(new_generation.job_metadata)} job metadata, {len(new_generation.advice_metadata)} advice metadata")
+        except Exception as e:
+            # ไม่ลองโหลดซ้ำในทุกคำค้นหา จนกว่าจะมีการสลับเวอร์ชันอีกครั้ง
+            logger.error(f"เกิดข้อผิดพลาดในการโหลด vector database เวอร์ชันใหม่: {str(e)}")
+            self._generation = replace(self._generation, signature=signature)
+        finally:
+            self._reload_lock.release()
+    
+    def data_version(self) -> str:
+        """
+        เวอร์ชันของข้อมูลที่ instance นี้ใช้ค้นหาอยู่ (เปลี่ยนเมื่อสลับไปใช้ generation ใหม่)
+        ใช้สร้าง ETag ของ response ที่สร้างจากการค้นหา
+        
+        Returns:
+            str: เวอร์ชันของข้อมูล
+        """
+        generation = self._current_generation()
+        return f"{self._loaded_ns}:{generation.version}:{generation.signature}"
+    
     def _load_fallback_metadata(self):
         """โหลดข้อมูล metadata จากไฟล์ fallback (embedding_data.json)"""
         try:
@@ -174,7 +323,7 @@ class VectorSearch:
             if os.path.exists(embedding_data_path):
                 print(f"{Fore.CYAN}📄 พบไฟล์ fallback สำหรับข้อมูลอาชีพ: {embedding_data_path}{Style.RESET_ALL}")
                 with open(embedding_data_path, 'r', encoding='utf-8') as f:
-                    fallback_data = json.load(f)
+                    fallback_data = json_codec.load(f)
                     self.job_metadata = fallback_data
                     
                     # เพิ่มข้อมูลอาชีพเข้าไปใน jobs_data
@@ -189,7 +338,7 @@ class VectorSearch:
             if os.path.exists(advice_data_path):
                 print(f"{Fore.CYAN}📄 พบไฟล์ fallback สำหรับข้อมูลคำแนะนำ: {advice_data_path}{Style.RESET_ALL}")
                 with open(advice_data_path, 'r', encoding='utf-8') as f:
-                    self.advice_metadata = json.load(f)
+                    self.advice_metadata = json_codec.load(f)
                 
                 print(f"{Fore.GREEN}✅ โหลดข้อมูลคำแนะนำจาก fallback สำเร็จ: {len(self.advice_metadata)} รายการ{Style.RESET_ALL}")
             
@@ -202,7 +351,7 @@ class VectorSearch:
         try:
             if os.path.exists(metadata_file):
                 with open(metadata_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                    data = json_codec.load(f)
                     # ตรวจสอบโครงสร้างข้อมูล
                     if isinstance(data, dict) and "job_data" in data:
                         # กรณีโครงสร้างแบบของ JobDataNormalizer
@@ -233,7 +382,7 @@ class VectorSearch:
                         file_path = os.path.join(self.normalized_jobs_dir, filename)
                         try:
                             with open(file_path, 'r', encoding='utf-8') as f:
-                                job_data = json.load(f)
+                                job_data = json_codec.load(f)
                                 job_id = job_data.get('id')
                                 if job_id:
                                     jobs_data[job_id] = job_data
@@ -467,8 +616,11 @@ class VectorSearch:
             print(f"{Fore.YELLOW}ℹ️ คำสำคัญที่พบ: {', '.join(keywords)}{Style.RESET_ALL}")
             logger.info(f"คำค้นหาที่ปรับปรุง: \"{corrected_query}\", คำสำคัญที่พบ: {', '.join(keywords)}")
         
+        # ใช้ generation เดียวตลอดการค้นหา แม้จะมีการสลับเวอร์ชันระหว่างนั้น
+        generation = self._current_generation()
+        
         # ตรวจสอบว่า index มีอยู่จริง
-        if not os.path.exists(self.job_index_file) or not os.path.exists(self.job_metadata_file):
+        if generation.job_index is None:
             warning_msg = "ไม่พบไฟล์ FAISS index หรือ metadata สำหรับข้อมูลอาชีพ จะใช้การค้นหาแบบ fallback แทน"
             logger.warning(warning_msg)
             print(f"{Fore.YELLOW}⚠️ {warning_msg}{Style.RESET_ALL}")
@@ -477,9 +629,8 @@ class VectorSearch:
             return self._fallback_search(corrected_query, keywords, limit)
         
         try:
-            print(f"{Fore.CYAN}⏳ กำลังโหลด FAISS index...{Style.RESET_ALL}")
-            # โหลด FAISS index
-            index = faiss.read_index(self.job_index_file)
+            # ใช้ FAISS index ที่โหลดไว้แล้ว
+            index = generation.job_index
             
             print(f"{Fore.CYAN}⏳ กำลังสร้าง embedding สำหรับคำค้นหา...{Style.RESET_ALL}")
             # สร้าง embedding สำหรับคำค้นหา
@@ -505,10 +656,10 @@ class VectorSearch:
                 # แปลงผลลัพธ์
                 results = []
                 for i, idx in enumerate(indices[0]):
-                    if idx < 0 or idx >= len(self.job_metadata):
+                    if idx < 0 or idx >= len(generation.job_metadata):
                         continue  # ข้ามดัชนีที่ไม่ถูกต้อง
                         
-                    job_id = self.job_metadata[idx]["id"]
+                    job_id = generation.job_metadata[idx]["id"]
                     job_data = self.get_job_by_id(job_id)
                     
                     if job_data:
@@ -640,8 +791,11 @@ class VectorSearch:
             print(f"{Fore.CYAN}🔖 กรองผลลัพธ์ด้วยแท็ก: {', '.join(filter_tags)}{Style.RESET_ALL}")
             logger.info(f"กรองผลลัพธ์ด้วยแท็ก: {filter_tags}")
         
+        # ใช้ generation เดียวตลอดการค้นหา แม้จะมีการสลับเวอร์ชันระหว่างนั้น
+        generation = self._current_generation()
+        
         # ตรวจสอบว่า index มีอยู่จริง
-        if not os.path.exists(self.advice_index_file) or not os.path.exists(self.advice_metadata_file):
+        if generation.advice_index is None:
             warning_msg = "ไม่พบไฟล์ FAISS index หรือ metadata สำหรับข้อมูลคำแนะนำอาชีพ จะใช้การค้นหาแบบ fallback แทน"
             logger.warning(warning_msg)
             print(f"{Fore.YELLOW}⚠️ {warning_msg}{Style.RESET_ALL}")
@@ -650,9 +804,8 @@ class VectorSearch:
             return self._fallback_search_advices(corrected_query, keywords, limit)
         
         try:
-            print(f"{Fore.CYAN}⏳ กำลังโหลด FAISS index...{Style.RESET_ALL}")
-            # โหลด FAISS index
-            index = faiss.read_index(self.advice_index_file)
+            # ใช้ FAISS index ที่โหลดไว้แล้ว
+            index = generation.advice_index
             
             print(f"{Fore.CYAN}⏳ กำลังสร้าง embedding สำหรับคำค้นหา...{Style.RESET_ALL}")
             # สร้าง embedding สำหรับคำค้นหา
@@ -682,10 +835,10 @@ class VectorSearch:
                 filtered_count = 0
                 
                 for i, idx in enumerate(indices[0]):
-                    if idx < 0 or idx >= len(self.advice_metadata):
+                    if idx < 0 or idx >= len(generation.advice_metadata):
                         continue  # ข้ามดัชนีที่ไม่ถูกต้อง
                         
-                    item = self.advice_metadata[idx]
+                    item = generation.advice_metadata[idx]
                     
                     # กรองตาม tags ถ้ามีการระบุ
                     if filter_tags:
@@ -797,8 +950,11 @@ class VectorSearch:
             print(f"{Fore.CYAN}🔖 กรองผลลัพธ์ด้วยแท็ก: {', '.join(filter_tags)}{Style.RESET_ALL}")
             logger.info(f"กรองผลลัพธ์ด้วยแท็ก: {filter_tags}")
         
+        # ใช้ generation เดียวตลอดการค้นหา แม้จะมีการสลับเวอร์ชันระหว่างนั้น
+        generation = self._current_generation()
+        
         # ตรวจสอบว่า index มีอยู่จริง
-        if not os.path.exists(self.advice_index_file) or not os.path.exists(self.advice_metadata_file):
+        if generation.advice_index is None:
             warning_msg = "ไม่พบไฟล์ FAISS index หรือ metadata สำหรับข้อมูลคำแนะนำอาชีพ จะใช้การค้นหาแบบ fallback แทน"
             logger.warning(warning_msg)
             print(f"{Fore.YELLOW}⚠️ {warning_msg}{Style.RESET_ALL}")
@@ -807,9 +963,8 @@ class VectorSearch:
             return self._fallback_search_advices(corrected_query, keywords, limit)
         
         try:
-            print(f"{Fore.CYAN}⏳ กำลังโหลด FAISS index...{Style.RESET_ALL}")
-            # โหลด FAISS index
-            index = faiss.read_index(str(self.advice_index_file))
+            # ใช้ FAISS index ที่โหลดไว้แล้ว
+            index = generation.advice_index
             
             print(f"{Fore.CYAN}⏳ กำลังสร้าง embedding สำหรับคำค้นหา...{Style.RESET_ALL}")
             # สร้าง embedding สำหรับคำค้นหา
@@ -839,10 +994,10 @@ class VectorSearch:
                 filtered_count = 0
                 
                 for i, idx in enumerate(indices[0]):
-                    if idx < 0 or idx >= len(self.advice_metadata):
+                    if idx < 0 or idx >= len(generation.advice_metadata):
                         continue  # ข้ามดัชนีที่ไม่ถูกต้อง
                         
-                    item = self.advice_metadata[idx]
+                    item = generation.advice_metadata[idx]
                     
                     # กรองตาม tags ถ้ามีการระบุ
                     if filter_tags:
@@ -946,8 +1101,11 @@ class VectorSearch:
         
         print(f"{Fore.CYAN}🔍 ประเภทคำถาม: {', '.join(query_types)}{Style.RESET_ALL}")
         
+        # ใช้ generation เดียวตลอดการค้นหา แม้จะมีการสลับเวอร์ชันระหว่างนั้น
+        generation = self._current_generation()
+        
         # ตรวจสอบว่า index แบบรวมมีอยู่จริง
-        if not os.path.exists(self.combined_index_file) or not os.path.exists(self.combined_metadata_file):
+        if generation.combined_index is None:
             warning_msg = "ไม่พบไฟล์ FAISS index หรือ metadata สำหรับข้อมูลแบบรวม จะใช้การค้นหาแยกประเภทแทน"
             logger.warning(warning_msg)
             print(f"{Fore.YELLOW}⚠️ {warning_msg}{Style.RESET_ALL}")
@@ -979,9 +1137,8 @@ class VectorSearch:
                 return jobs
         
         try:
-            print(f"{Fore.CYAN}⏳ กำลังโหลด FAISS index...{Style.RESET_ALL}")
-            # โหลด FAISS index แบบรวม
-            index = faiss.read_index(self.combined_index_file)
+            # ใช้ FAISS index แบบรวมที่โหลดไว้แล้ว
+            index = generation.combined_index
             
             print(f"{Fore.CYAN}⏳ กำลังสร้าง embedding สำหรับคำค้นหา...{Style.RESET_ALL}")
             
@@ -1032,8 +1189,9 @@ class VectorSearch:
                     type_weights["user"] = 0.5
                 
                 # โหลด metadata จาก combined_metadata ด้วยความระมัดระวัง
-                item_types = self.combined_metadata.get("item_types", []) if isinstance(self.combined_metadata, dict) else []
-                item_data = self.combined_metadata.get("item_data", []) if isinstance(self.combined_metadata, dict) else []
+                combined_metadata = generation.combined_metadata
+                item_types = combined_metadata.get("item_types", []) if isinstance(combined_metadata, dict) else []
+                item_data = combined_metadata.get("item_data", []) if isinstance(combined_metadata, dict) else []
                 
                 processed_results = []
                 
@@ -1197,6 +1355,27 @@ class VectorSearch:
         
         return query_types
 
+    def classify_query(self, query: str) -> Dict[str, Any]:
+        """
+        จำแนกคำถามโดยไม่ค้นหาข้อมูล (ใช้เลือกโมเดลหรือคำตอบสำเร็จรูป)
+        
+        Args:
+            query: คำถาม
+            
+        Returns:
+            Dict[str, Any]: {"query_types": ประเภทคำถาม, "keywords": คำสำคัญ,
+                             "in_scope": พบคำสำคัญด้านอาชีพไอทีหรือไม่}
+        """
+        corrected_query, keywords = self._normalize_query(query)
+        known_keywords = self.tech_keywords | self.job_query_keywords | self.resume_keywords | self.user_keywords
+        in_scope = any(kw.lower() in known_keywords for kw in keywords)
+        
+        return {
+            "query_types": self._identify_query_type(query, keywords),
+            "keywords": keywords,
+            "in_scope": in_scope,
+        }
+
     def _fallback_search_users(self, query: str, keywords: List[str], limit: int = 5) -> List[Dict[str, Any]]:
         """
         ค้นหาผู้ใช้แบบ fallback ในกรณีที่ไม่มี FAISS index
@@ -1221,7 +1400,7 @@ class VectorSearch:
                 return []
             
             with open(users_file, 'r', encoding='utf-8') as f:
-                users_data = json.load(f)
+                users_data = json_codec.load(f)
             
             for user in users_data:
                 score = 0
@@ -1275,4 +1454,24 @@ class VectorSearch:
             logger.error(f"เกิดข้อผิดพลาดในการค้นหาข้อมูลผู้ใช้: {str(e)}")
             return []
     
-    
\ No newline at end of file
+    
+
+
+_shared_vector_search: Optional[VectorSearch] = None
+_shared_vector_search_lock = threading.Lock()
+
+
+def get_shared_vector_search() -> VectorSearch:
+    """
+    ดึง VectorSearch ที่ใช้ร่วมกันทั้งแอป (สร้างครั้งแรกจากค่าคอนฟิก และสลับ generation เองเมื่อมีเวอร์ชันใหม่)
+    
+    Returns:
+        VectorSearch: instance ที่ใช้ร่วมกัน
+    """
+    global _shared_vector_search
+    if _shared_vector_search is None:
+        with _shared_vector_search_lock:
+            if _shared_vector_search is None:
+                from src.utils.config import VECTOR_DB_DIR
+                _shared_vector_search = VectorSearch(VECTOR_DB_DIR)
+    return _shared_vector_search
@@ -4,6 +4,7 @@ import { useState, useEffect, useRef } from "react";
 import { Send, User2, Loader2 } from "lucide-react";
 import ReactMarkdown from "react-markdown";
 import { useRouter } from "next/navigation";
+import { authHeaders } from "@/lib/api";
 
 const MODES = [
   { name: "ทางการ", key: "formal", avatar: "/F1.png" },
@@ -55,7 +56,9 @@ export default function ModernChatPage() {
 
   const fetchUserData = async () => {
     try {
-      const response = await fetch(`${BASE_URL}/registration/user-info`);
+      const response = await fetch(`${BASE_URL}/registration/user-info`, {
+        headers: authHeaders(),
+      });
       const text = await response.text();
       if (!response.ok || text.startsWith("<!DOCTYPE html>")) throw new Error();
       const data = JSON.parse(text);
@@ -93,7 +96,7 @@ export default function ModernChatPage() {
     try {
       const response = await fetch(`${BASE_URL}/chat/`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: authHeaders({ "Content-Type": "application/json" }),
         body: JSON.stringify({
           personality: mode.key,
           message: inputValue,
@@ -11,6 +11,7 @@ import {
   Plus,
   Trash2,
 } from "lucide-react";
+import { authHeaders, saveUserToken } from "@/lib/api";
 
 // Registration flow component
 const UserRegistration = () => {
@@ -403,10 +404,14 @@ const removeTag = (type, tag) => {
       // Send to backend API
       const response = await fetch(`${BASE_URL}/registration/`, {
         method: "POST",
+        headers: authHeaders(),
         body: formData,
       });
   
       if (response.ok) {
+        // เก็บ token ของผู้ใช้ใหม่ไว้ใช้กับคำขอถัดไป
+        saveUserToken(response);
+        
         // Move to success step
         setCurrentStep(6);
         
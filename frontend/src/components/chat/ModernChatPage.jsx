@@ -7,6 +7,7 @@ import MessageList from "./MessageList";
 import ChatInput from "./ChatInput";
 import ChatHeader from "./ChatHeader";
 import UserInfoModal from "./UserInfoModal";
+import { authHeaders } from "@/lib/api";
 
 export default function ModernChatPage() {
   const BASE_URL = process.env.NEXT_PUBLIC_API_BASE;
@@ -32,7 +33,9 @@ export default function ModernChatPage() {
   useEffect(() => {
     const fetchUserData = async () => {
       try {
-        const response = await fetch(`${BASE_URL}/registration/user-info`);
+        const response = await fetch(`${BASE_URL}/registration/user-info`, {
+          headers: authHeaders(),
+        });
 
         const text = await response.text();
         console.log("Raw response:", text);
@@ -89,9 +92,9 @@ export default function ModernChatPage() {
 
       const response = await fetch(`${BASE_URL}/chat/`, {
         method: "POST",
-        headers: {
+        headers: authHeaders({
           "Content-Type": "application/json",
-        },
+        }),
         body: JSON.stringify({
           personality: chatStyle,
           message: inputValue,
@@ -3,6 +3,7 @@
 
 import { useState, useEffect } from 'react'
 import { X, User } from 'lucide-react'
+import { authHeaders } from '@/lib/api'
 
 export default function UserProfileModal({ isOpen, onClose }) {
 const BASE_URL = process.env.NEXT_PUBLIC_API_BASE;
@@ -19,7 +20,9 @@ const BASE_URL = process.env.NEXT_PUBLIC_API_BASE;
   const fetchUserData = async () => {
     try {
       setLoading(true)
-      const response = await fetch(`${BASE_URL}/registration/user-info`)
+      const response = await fetch(`${BASE_URL}/registration/user-info`, {
+        headers: authHeaders(),
+      })
           console.log('user data',data)
       
       if (!response.ok) {
@@ -1,8 +1,41 @@
 const BASE_URL = process.env.NEXT_PUBLIC_API_BASE;
 
+const USER_ID_KEY = "careerAdvisorUserId";
+const USER_TOKEN_KEY = "careerAdvisorUserToken";
+
+// รหัสผู้ใช้ของเบราว์เซอร์นี้ (สร้างครั้งแรกแล้วเก็บใน localStorage)
+export function getUserId() {
+  let userId = localStorage.getItem(USER_ID_KEY);
+  if (!userId) {
+    userId = crypto.randomUUID();
+    localStorage.setItem(USER_ID_KEY, userId);
+  }
+  return userId;
+}
+
+// เก็บ token ที่ได้จาก header X-User-Token ตอนลงทะเบียน (API ส่งให้ครั้งเดียว)
+export function saveUserToken(response) {
+  const token = response.headers.get("X-User-Token");
+  if (token) {
+    localStorage.setItem(USER_TOKEN_KEY, token);
+  }
+}
+
+// header สำหรับระบุและยืนยันตัวตนผู้ใช้ในทุกคำขอ
+export function authHeaders(headers = {}) {
+  const result = { ...headers, "X-User-ID": getUserId() };
+  const token = localStorage.getItem(USER_TOKEN_KEY);
+  if (token) {
+    result["X-User-Token"] = token;
+  }
+  return result;
+}
+
 export async function checkUserStatus() {
   try {
-    const response = await fetch(`${BASE_URL}/registration/user-status`);
+    const response = await fetch(`${BASE_URL}/registration/user-status`, {
+      headers: authHeaders(),
+    });
 
     if (!response.ok) {
       throw new Error(`API responded with status: ${response.status}`);
@@ -21,9 +54,9 @@ export async function sendChatMessage(message, personality = "friendly") {
   try {
     const response = await fetch(`${BASE_URL}/chat/`, {
       method: "POST",
-      headers: {
+      headers: authHeaders({
         "Content-Type": "application/json",
-      },
+      }),
       body: JSON.stringify({
         message: message,
         personality: personality,
@@ -44,7 +77,9 @@ export async function sendChatMessage(message, personality = "friendly") {
 // ฟังก์ชันดึงประวัติการแชท (ถ้าต้องการใช้ในอนาคต)
 export async function getChatHistory(limit = 10) {
   try {
-    const response = await fetch(`${BASE_URL}/chat/history?limit=${limit}`);
+    const response = await fetch(`${BASE_URL}/chat/history?limit=${limit}`, {
+      headers: authHeaders(),
+    });
 
     if (!response.ok) {
       throw new Error(`API responded with status: ${response.status}`);
@@ -60,7 +95,9 @@ export async function getChatHistory(limit = 10) {
 // ฟังก์ชันดึงข้อมูลผู้ใช้
 export async function getUserInfo() {
   try {
-    const response = await fetch(`${BASE_URL}/registration/user-info`);
+    const response = await fetch(`${BASE_URL}/registration/user-info`, {
+      headers: authHeaders(),
+    });
 
     if (!response.ok) {
       throw new Error(`API responded with status: ${response.status}`);